@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Throughput benchmark of the extcmd output pumps.
+
+Runs a command that prints a lot of short lines (and one that prints a few
+very long lines) through the threaded and the polling implementation of
+ExternalCommandWithDelegate, with a chain of delegates similar to the one used
+by the job runner, and reports the wall-clock and CPU time of each. Run it
+from the top-level plainbox directory:
+
+    $ PYTHONPATH=. python3 contrib/bench-extcmd.py [NUM_LINES]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from plainbox.impl.runner import CommandOutputWriter
+from plainbox.impl.runner import IOLogRecordGenerator
+from plainbox.vendor import extcmd
+
+
+class LineCounter(extcmd.DelegateBase):
+
+    def __init__(self):
+        self.count = 0
+
+    def on_line(self, stream_name, line):
+        self.count += 1
+
+
+def bench(cls, cmd, tmp):
+    io_log_gen = IOLogRecordGenerator()
+    record_list = []
+    io_log_gen.on_new_record.connect(record_list.append)
+    counter = LineCounter()
+    delegate = extcmd.Chain([
+        counter, io_log_gen, CommandOutputWriter(
+            os.path.join(tmp, 'stdout'), os.path.join(tmp, 'stderr'))])
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    cls(delegate).call(cmd)
+    elapsed = time.perf_counter() - start
+    cpu_elapsed = time.process_time() - cpu_start
+    return elapsed, cpu_elapsed, counter.count
+
+
+def main():
+    num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    cmd_list = [
+        ("short lines", ['seq', '1', str(num_lines)]),
+        ("long lines", [
+            'sh', '-c', 'for i in $(seq 1 50); do'
+            ' head -c 1048576 /dev/zero | tr "\\0" x; echo; done']),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for cmd_name, cmd in cmd_list:
+            for name, cls in (
+                    ("threaded", extcmd.ExternalCommandWithDelegate),
+                    ("polling", extcmd.PollingExternalCommandWithDelegate)):
+                elapsed, cpu_elapsed, count = bench(cls, cmd, tmp)
+                print("{:<12} {:<9} {:>8} lines: wall {:8.1f}ms"
+                      " cpu {:8.1f}ms".format(
+                          cmd_name, name, count, elapsed * 1000,
+                          cpu_elapsed * 1000))
+
+
+if __name__ == "__main__":
+    main()
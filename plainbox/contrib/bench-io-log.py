@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Micro-benchmark of the IO log formats.
+
+Writes and reads synthetic IO logs, one record per line of output, in the
+JSON (gzip) format and in the binary format (compressed or not) and reports
+the time it takes and the size of each file, along with the time it takes to
+look at the last few records. Run it from the top-level
+plainbox directory:
+
+    $ PYTHONPATH=. python3 contrib/bench-io-log.py [NUM_RECORDS]
+"""
+
+import gzip
+import io
+import os
+import sys
+import tempfile
+import time
+
+from plainbox.impl.result import BinaryIOLogRecordWriter
+from plainbox.impl.result import IOLogRecord
+from plainbox.impl.result import IOLogRecordWriter
+from plainbox.impl.result import open_io_log
+
+
+def write_json(pathname, record_list):
+    with gzip.open(pathname, mode='wb') as gzip_stream, \
+            io.TextIOWrapper(gzip_stream, encoding='UTF-8') as stream:
+        writer = IOLogRecordWriter(stream)
+        for record in record_list:
+            writer.write_record(record)
+
+
+def write_binary(pathname, record_list, compress):
+    with BinaryIOLogRecordWriter(open(pathname, 'wb'), compress) as writer:
+        for record in record_list:
+            writer.write_record(record)
+
+
+def read(pathname):
+    with open_io_log(pathname) as reader:
+        for record in reader:
+            pass
+
+
+def tail(pathname):
+    with open_io_log(pathname) as reader:
+        reader.tail(10)
+
+
+def main():
+    num_records = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    record_list = [
+        IOLogRecord(
+            i * 0.001, 'stderr' if i % 10 == 0 else 'stdout',
+            "[{:>8}] some output of the test, line {}\n".format(
+                i, i).encode("UTF-8"))
+        for i in range(num_records)]
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, write_fn in (
+                ("json+gzip", write_json),
+                ("binary+zlib",
+                 lambda p, r: write_binary(p, r, compress=True)),
+                ("binary", lambda p, r: write_binary(p, r, compress=False))):
+            pathname = os.path.join(tmp, name)
+            start = time.perf_counter()
+            write_fn(pathname, record_list)
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            read(pathname)
+            read_time = time.perf_counter() - start
+            start = time.perf_counter()
+            tail(pathname)
+            tail_time = time.perf_counter() - start
+            print("{:<12} {} records: write {:8.1f}ms read {:8.1f}ms"
+                  " tail {:8.1f}ms size {:9d} bytes".format(
+                      name, num_records, write_time * 1000, read_time * 1000,
+                      tail_time * 1000, os.stat(pathname).st_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Benchmark of loading job definitions with and without the job cache.
+
+Loads all the jobs of a v1 provider three times: with the cache disabled,
+with an empty (cold) cache and with a populated (warm) cache. The cache is
+kept in a temporary directory. Run it from the top-level plainbox directory:
+
+    $ PYTHONPATH=. python3 contrib/bench-job-cache.py [PROVIDER_BASE_DIR]
+
+By default the jobs from the checkbox tree (the parent of this directory)
+are used.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from plainbox.impl.providers.cache import JobDefinitionCache
+from plainbox.impl.providers.v1 import Provider1
+
+
+class NoCache(JobDefinitionCache):
+
+    def load(self, filename):
+        return None
+
+    def store(self, filename, key, record_list, job_list):
+        pass
+
+
+def load_all_jobs(base_dir, cache):
+    provider = Provider1(base_dir, "bench", "benchmark provider")
+    provider._job_cache = cache
+    start = time.perf_counter()
+    job_list = provider.get_builtin_jobs()
+    # Checksums are needed by each session anyway
+    for job in job_list:
+        job.get_checksum()
+    return len(job_list), time.perf_counter() - start
+
+
+def main():
+    if len(sys.argv) > 1:
+        base_dir = sys.argv[1]
+    else:
+        base_dir = os.path.join(os.path.dirname(__file__), '..', '..')
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = JobDefinitionCache(cache_dir)
+        for label, job_cache in (
+                ("no cache", NoCache(cache_dir)),
+                ("cold cache", cache),
+                ("warm cache", cache)):
+            count, elapsed = load_all_jobs(base_dir, job_cache)
+            print("{:<12} {:5d} jobs in {:8.2f}ms".format(
+                label, count, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Micro-benchmark of resource expression evaluation.
+
+Evaluates a few typical requirement expressions against a synthetic list of
+package resources, both by looking at each resource (the old way) and with
+the help of a ResourceIndex. Run it from the top-level plainbox directory:
+
+    $ PYTHONPATH=. python3 contrib/bench-resource-expression.py [NUM_PACKAGES]
+"""
+
+import sys
+import timeit
+
+from plainbox.impl.resource import Resource
+from plainbox.impl.resource import ResourceExpression
+from plainbox.impl.resource import ResourceIndex
+
+
+def main():
+    num_packages = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    resource_list = [
+        Resource({
+            'name': 'package-{}'.format(i),
+            'version': '1.{}'.format(i % 10),
+        }) for i in range(num_packages)]
+    resource_list.append(Resource({'name': 'stress', 'version': '1.0'}))
+    # Build the index once, like SessionState does for each resource job.
+    # The map for each attribute is built on first use, do that upfront.
+    resource_index = ResourceIndex(resource_list)
+    resource_index.lookup('name', [])
+    for text in (
+            "package.name == 'stress'",
+            "package.name in ('stress', 'fwts')",
+            "package.name == 'missing'",
+            "package.name == 'stress' and package.version >= '1.0'",
+            "package.name != 'stress'"):
+        expr = ResourceExpression(text)
+        number = 20
+        linear = timeit.timeit(
+            lambda: expr.evaluate(resource_list), number=number) / number
+        indexed = timeit.timeit(
+            lambda: expr.evaluate(resource_list, resource_index),
+            number=number) / number
+        print("{:<55} linear: {:9.3f}ms indexed: {:9.3f}ms".format(
+            text, linear * 1000, indexed * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Micro-benchmark of the RFC822 parser implementations.
+
+Parses synthetic output of the package (dpkg-query) and udev_resource
+resource jobs, as well as a synthetic job definition file, with each of the
+available parsers and checks that they all produce the same records. Run it
+from the top-level plainbox directory:
+
+    $ PYTHONPATH=. python3 contrib/bench-rfc822.py [NUM_RECORDS]
+"""
+
+import io
+import sys
+import timeit
+
+from plainbox.impl.rfc822 import RFC822_PARSERS
+from plainbox.impl.rfc822 import gen_rfc822_records
+
+
+class NamedStringIO(io.StringIO):
+
+    name = "jobs.txt"
+
+
+def make_package_output(num_records):
+    return "".join(
+        "name: package-{0}\nversion: 1.{0}-0ubuntu1\n\n".format(i)
+        for i in range(num_records))
+
+
+def make_udev_output(num_records):
+    return "".join(
+        "path: /devices/pci0000:00/0000:00:{0:02x}.0\n"
+        "bus: pci\n"
+        "category: OTHER\n"
+        "driver: driver{0}\n"
+        "product_id: {0}\n"
+        "vendor_id: 32902\n"
+        "subproduct_id: 8\n"
+        "subvendor_id: 4136\n"
+        "product: Device {0} Controller\n"
+        "vendor: Intel Corporation\n"
+        "\n".format(i)
+        for i in range(num_records))
+
+
+def make_job_file(num_records):
+    return "".join(
+        "name: test/job-{0}\n"
+        "plugin: shell\n"
+        "requires: package.name == 'package-{0}'\n"
+        "command:\n"
+        " echo {0}\n"
+        " true\n"
+        "_description:\n"
+        " Check that the job number {0} works.\n"
+        " .\n"
+        " Nothing else.\n"
+        "\n".format(i)
+        for i in range(num_records))
+
+
+def parse_lines(text, parser):
+    # This is how SessionState parses the output of resource and local jobs
+    return [(record.data, record.origin) for record in gen_rfc822_records(
+        iter(text.splitlines(True)), parser=parser)]
+
+
+def parse_file(text, parser):
+    # This is how providers parse job definition files
+    return [(record.data, record.origin) for record in gen_rfc822_records(
+        NamedStringIO(text), parser=parser)]
+
+
+def main():
+    num_records = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    for title, text, func in (
+            ("package resource", make_package_output(num_records),
+             parse_lines),
+            ("udev_resource", make_udev_output(num_records), parse_lines),
+            ("job definitions", make_job_file(num_records), parse_file)):
+        result_map = {}
+        for parser in sorted(RFC822_PARSERS):
+            result_map[parser] = func(text, parser)
+            number = 5
+            elapsed = timeit.timeit(
+                lambda: func(text, parser), number=number) / number
+            print("{:<20} {:>6} records {:<10} {:9.3f}ms".format(
+                title, num_records, parser, elapsed * 1000))
+        results = list(result_map.values())
+        if any(result != results[0] for result in results):
+            raise SystemExit("parsers produced different records!")
+
+
+if __name__ == "__main__":
+    main()
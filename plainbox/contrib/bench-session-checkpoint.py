@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Micro-benchmark of session checkpoints.
+
+Simulates what ``plainbox run`` does for each job of sessions of growing size
+(set the running job, checkpoint, store the result, checkpoint) and measures
+the average cost of a checkpoint, with and without the journal, and with each
+of the durability policies. Run it from the top-level plainbox directory:
+
+    $ PYTHONPATH=. python3 contrib/bench-session-checkpoint.py [NUM_RUNS]
+"""
+
+import sys
+import tempfile
+import time
+
+from plainbox.impl.job import JobDefinition
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.session.manager import SessionManager
+from plainbox.impl.session.storage import SessionStorageRepository
+
+
+def bench(num_jobs, num_runs, journal, durability='strict'):
+    job_list = [
+        JobDefinition({
+            'name': 'job-{}'.format(i),
+            'plugin': 'shell',
+            'command': 'true',
+        }) for i in range(num_jobs)]
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = SessionManager.create_session(
+            job_list, SessionStorageRepository(tmp))
+        manager = SessionManager(
+            manager.state, manager.storage, journal, durability)
+        state = manager.state
+        state.update_desired_job_list(job_list)
+        manager.checkpoint()
+        elapsed = 0
+        for job in job_list[:num_runs]:
+            state.metadata.running_job_name = job.name
+            start = time.perf_counter()
+            manager.checkpoint()
+            elapsed += time.perf_counter() - start
+            state.update_job_result(job, MemoryJobResult({
+                'outcome': 'pass',
+                'io_log': [(0.0, 'stdout', b'output\n')],
+            }))
+            state.metadata.running_job_name = None
+            start = time.perf_counter()
+            manager.checkpoint()
+            elapsed += time.perf_counter() - start
+        manager.flush()
+        return elapsed / (num_runs * 2)
+
+
+def main():
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    for num_jobs in (100, 1000, 5000):
+        snapshot = bench(num_jobs, num_runs, journal=False)
+        journal = bench(num_jobs, num_runs, journal=True)
+        print("{:>5} jobs, per checkpoint: snapshot {:8.3f}ms"
+              " journal {:8.3f}ms".format(
+                  num_jobs, snapshot * 1000, journal * 1000))
+    for durability in SessionManager.DURABILITY_CHOICES:
+        elapsed = bench(100, num_runs, True, durability)
+        print("  100 jobs, per checkpoint: journal ({}) {:8.3f}ms".format(
+            durability, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Micro-benchmark of session resume.
+
+Suspends a session where every job has a result (half of them with an IO log
+kept in memory, half of them with an IO log file) and measures how long it
+takes to resume it, with results restored eagerly and lazily. Run it from the
+top-level plainbox directory:
+
+    $ PYTHONPATH=. python3 contrib/bench-session-resume.py [NUM_JOBS]
+"""
+
+import sys
+import timeit
+
+from plainbox.impl.job import JobDefinition
+from plainbox.impl.result import DiskJobResult
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.session.resume import SessionResumeHelper
+from plainbox.impl.session.state import SessionState
+from plainbox.impl.session.suspend import SessionSuspendHelper
+
+
+def make_session_data(num_jobs):
+    job_list = [
+        JobDefinition({
+            'name': 'job-{}'.format(i),
+            'plugin': 'shell',
+            'command': 'true',
+        }) for i in range(num_jobs)]
+    state = SessionState(job_list)
+    state.update_desired_job_list(job_list)
+    for i, job in enumerate(job_list):
+        if i % 2:
+            result = MemoryJobResult({
+                'outcome': 'pass',
+                'comments': 'comment {}'.format(i),
+                'return_code': 0,
+                'execution_duration': 0.5,
+                'io_log': [
+                    (0.1 * n, 'stdout', 'line {}\n'.format(n).encode())
+                    for n in range(10)],
+            })
+        else:
+            result = DiskJobResult({
+                'outcome': 'fail',
+                'return_code': 1,
+                'execution_duration': 0.5,
+                'io_log_filename': '/tmp/io-logs/job-{}.record.gz'.format(i),
+            })
+        state.update_job_result(job, result)
+    return job_list, SessionSuspendHelper().suspend(state)
+
+
+def main():
+    num_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    job_list, data = make_session_data(num_jobs)
+    for lazy in (False, True):
+        helper = SessionResumeHelper(job_list, lazy)
+        number = 3
+        elapsed = timeit.timeit(
+            lambda: helper.resume(data), number=number) / number
+        print("{} jobs, {:<6} resume {:9.3f}ms".format(
+            num_jobs, "lazy" if lazy else "eager", elapsed * 1000))
+
+
+if __name__ == "__main__":
+    main()
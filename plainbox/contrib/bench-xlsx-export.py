@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Benchmark of the XLSX exporter on a large session.
+
+Creates a session with NUM_JOBS jobs (grouped in categories, a few of them
+are attachments) with LOG_MIB MiB of IO logs in total, stored on disk like
+the runner does, and exports it with the default options and with the
+constant-memory option. Each export runs in a separate process so that its
+peak RSS can be measured. The exit code is 1 if the constant-memory export
+needs more than RSS_BUDGET_MIB MiB. Run it from the top-level plainbox
+directory:
+
+    $ PYTHONPATH=. python3 contrib/bench-xlsx-export.py \\
+        [NUM_JOBS [LOG_MIB [RSS_BUDGET_MIB]]]
+"""
+
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from plainbox.impl.exporter.xlsx import XLSXSessionStateExporter
+from plainbox.impl.job import JobDefinition
+from plainbox.impl.result import BinaryIOLogRecordWriter
+from plainbox.impl.result import DiskJobResult
+from plainbox.impl.result import IOLogRecord
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.session import SessionState
+
+# Number of tests in each category
+JOBS_PER_CATEGORY = 100
+# One in this many jobs is an attachment
+JOBS_PER_ATTACHMENT = 500
+# Size of each line of the synthetic IO logs
+LINE_SIZE = 80
+# Number of lines in each IO log record
+LINES_PER_RECORD = 50
+
+
+def write_io_log(pathname, size, line_pool, start):
+    with BinaryIOLogRecordWriter(open(pathname, 'wb')) as writer:
+        written = 0
+        delay = 0.0
+        index = start
+        while written < size:
+            data = "".join(
+                line_pool[(index + 13 * i) % len(line_pool)]
+                for i in range(LINES_PER_RECORD)).encode("UTF-8")
+            writer.write_record(IOLogRecord(delay, 'stdout', data))
+            written += len(data)
+            delay += 0.001
+            index += 7
+
+
+def make_session(num_jobs, log_size, io_log_dir):
+    # Lines are made of random words so that they don't compress too well
+    rng = random.Random(0)
+    word_list = ["word{}".format(i) for i in range(1000)]
+    line_pool = [
+        " ".join(rng.sample(word_list, 12))[:LINE_SIZE - 1] + "\n"
+        for i in range(1009)]
+    job_list = []
+    result_list = []
+    log_size_per_job = log_size // num_jobs
+    category = None
+    for index in range(num_jobs):
+        if index % JOBS_PER_CATEGORY == 0:
+            category = JobDefinition({
+                'name': 'category-{}'.format(index // JOBS_PER_CATEGORY),
+                'plugin': 'local',
+                'command': 'true',
+                'description': 'Category {}'.format(index),
+            })
+            job_list.append(category)
+            result_list.append(MemoryJobResult({'outcome': 'pass'}))
+        if index % JOBS_PER_ATTACHMENT == 0:
+            job = JobDefinition({
+                'name': 'attachment-{}'.format(index),
+                'plugin': 'attachment',
+                'command': 'true',
+            })
+        else:
+            job = JobDefinition({
+                'name': 'job-{}'.format(index),
+                'plugin': 'shell',
+                'command': 'true',
+                'description': 'Synthetic test {}'.format(index),
+            }, via=category.get_checksum())
+        pathname = os.path.join(io_log_dir, "{}.record.bin".format(index))
+        write_io_log(
+            pathname, log_size_per_job, line_pool, rng.randrange(1009))
+        job_list.append(job)
+        result_list.append(DiskJobResult({
+            'outcome': 'pass' if index % 7 else 'fail',
+            'io_log_filename': pathname,
+        }))
+    session = SessionState(job_list)
+    session.update_desired_job_list(job_list)
+    for job, result in zip(job_list, result_list):
+        session.update_job_result(job, result)
+    return session
+
+
+def measure_export(session, option_list, pathname):
+    """
+    Export the session in a child process
+
+    :returns:
+        A tuple (elapsed time, peak RSS in MiB, size of the file in MiB)
+    """
+    start = time.time()
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 1
+        try:
+            exporter = XLSXSessionStateExporter(option_list)
+            with open(pathname, 'wb') as stream:
+                exporter.dump_from_session(session, stream)
+            exit_code = 0
+        finally:
+            os._exit(exit_code)
+    pid, status, rusage = os.wait4(pid, 0)
+    if status != 0:
+        raise SystemExit("Export failed")
+    elapsed = time.time() - start
+    # ru_maxrss is expressed in KiB on Linux
+    return (elapsed, rusage.ru_maxrss / 1024,
+            os.path.getsize(pathname) / (1024 * 1024))
+
+
+def main():
+    num_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    log_mib = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    rss_budget_mib = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+    tmp_dir = tempfile.mkdtemp(prefix="bench-xlsx-")
+    try:
+        print("Creating a session with {} jobs and {} MiB of IO logs".format(
+            num_jobs, log_mib))
+        session = make_session(num_jobs, log_mib * 1024 * 1024, tmp_dir)
+        baseline_mib = resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss / 1024
+        print("Peak RSS before exporting: {:.1f} MiB".format(baseline_mib))
+        option_list = [
+            XLSXSessionStateExporter.OPTION_WITH_SUMMARY,
+            XLSXSessionStateExporter.OPTION_WITH_TEXT_ATTACHMENTS,
+        ]
+        peak_mib = None
+        for name, extra_option_list in (
+                ('default', []),
+                ('constant-memory',
+                 [XLSXSessionStateExporter.OPTION_CONSTANT_MEMORY])):
+            elapsed, peak_mib, size_mib = measure_export(
+                session, option_list + extra_option_list,
+                os.path.join(tmp_dir, "{}.xlsx".format(name)))
+            print("{:<16} {:8.2f}s peak RSS {:8.1f} MiB, file {:6.1f} MiB"
+                  .format(name, elapsed, peak_mib, size_mib))
+    finally:
+        shutil.rmtree(tmp_dir)
+    if peak_mib > rss_budget_mib:
+        print("Constant-memory export exceeded the budget of {} MiB".format(
+            rss_budget_mib))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -143,6 +143,9 @@ class IJobResult(metaclass=ABCMeta):
     # A temporary state before the user decides on the outcome of a manual
     # job or any other job that requires manual verification
     OUTCOME_UNDECIDED = 'undecided'
+    # The timeout outcome is used when a job was killed because it ran for
+    # longer than it was allowed to (see JobDefinition.timeout)
+    OUTCOME_TIMEOUT = 'timeout'
 
     # List of all valid values of OUTCOME_xxx
     ALL_OUTCOME_LIST = [
@@ -153,6 +156,7 @@ class IJobResult(metaclass=ABCMeta):
         OUTCOME_NOT_SUPPORTED,
         OUTCOME_NOT_IMPLEMENTED,
         OUTCOME_UNDECIDED,
+        OUTCOME_TIMEOUT,
     ]
 
     @abstractproperty
@@ -278,6 +278,31 @@ class PlainBoxConfig(config.Config):
             config.ChoiceValidator(['auto', 'src', 'deb', 'stub', 'ihv'])],
         default="auto")
 
+    session_durability = config.Variable(
+        section="common",
+        help_text=("When to flush session checkpoints to disk: after each"
+                   " checkpoint (strict), a little later but together with"
+                   " other checkpoints (group) or only around jobs that can"
+                   " suspend, reboot or stress the machine (relaxed)"),
+        validator_list=[
+            config.ChoiceValidator(['strict', 'group', 'relaxed'])],
+        default="strict")
+
+    session_group_commit_delay = config.Variable(
+        section="common",
+        kind=float,
+        help_text=("Maximum delay, in seconds, before session checkpoints"
+                   " are flushed to disk with the group durability policy"),
+        default=1.0)
+
+    job_timeout_multiplier = config.Variable(
+        section="common",
+        kind=float,
+        help_text=("Kill jobs that don't have an explicit timeout after"
+                   " running for this many times their estimated duration"
+                   " (0 disables this)"),
+        default=0.0)
+
     class Meta:
 
         # TODO: properly depend on xdg and use real code that also handles
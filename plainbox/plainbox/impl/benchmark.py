@@ -0,0 +1,346 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+:mod:`plainbox.impl.benchmark` -- synthetic benchmarks of plainbox core
+=======================================================================
+
+This module generates synthetic providers, with an arbitrary number of jobs,
+and measures how long the core parts of plainbox take to process them. The
+generated jobs look like real ones: they are spread over many job definition
+files, are organized in groups where most jobs depend on the first job of the
+group and on some other nearby jobs and have requirement programs that use
+resources. Resource jobs get results with many resource records, as they
+would on a real system.
+
+Everything is generated from a seed so that two runs with the same seed
+process exactly the same data. See :class:`Benchmark` for the list of
+measured phases.
+
+.. warning::
+
+    THIS MODULE DOES NOT HAVE STABLE PUBLIC API
+"""
+
+import io
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+
+from plainbox import __version__ as plainbox_version
+from plainbox.abc import IJobResult
+from plainbox.impl.exporter import get_all_exporters
+from plainbox.impl.providers.cache import JobDefinitionCache
+from plainbox.impl.providers.v1 import Provider1
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.session.manager import SessionManager
+from plainbox.impl.session.state import SessionState
+from plainbox.impl.session.storage import SessionStorage
+
+
+logger = logging.getLogger("plainbox.benchmark")
+
+# Use the most precise clock that is available
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class SyntheticProvider(Provider1):
+    """
+    Provider of synthetic jobs, see :class:`SyntheticJobGenerator`
+
+    Each provider has a private job definition cache, stored in the
+    ``cache`` directory next to the jobs.
+    """
+
+    def __init__(self, base_dir):
+        super(SyntheticProvider, self).__init__(
+            base_dir, "synthetic", "Synthetic jobs for benchmarks",
+            JobDefinitionCache(os.path.join(base_dir, "cache")))
+
+
+class SyntheticJobGenerator:
+    """
+    Generator of synthetic job definitions and of results of those jobs
+    """
+
+    # Number of jobs in each job definition file
+    JOBS_PER_FILE = 250
+    # One in this many jobs is a resource job
+    JOBS_PER_RESOURCE = 50
+    # Jobs are organized in groups of this size
+    JOBS_PER_GROUP = 25
+    # Number of records produced by each resource job
+    RECORDS_PER_RESOURCE = 40
+    # Number of distinct values of the 'category' resource attribute
+    NUM_CATEGORIES = 8
+
+    def __init__(self, num_jobs, seed=0):
+        self.num_jobs = num_jobs
+        self.seed = seed
+        self.num_resource_jobs = max(1, num_jobs // self.JOBS_PER_RESOURCE)
+
+    def get_resource_name(self, index):
+        """
+        Get the name of the specified resource job
+        """
+        return "resource_{}".format(index)
+
+    def get_job_name(self, index):
+        """
+        Get the name of the specified (non-resource) job
+        """
+        return "group-{}/job-{}".format(index // self.JOBS_PER_GROUP, index)
+
+    def gen_job_text(self):
+        """
+        Generate the text of all job definitions, one job at a time
+
+        Resource jobs come first, like in most real providers.
+        """
+        rng = random.Random(self.seed)
+        for index in range(self.num_resource_jobs):
+            yield (
+                "name: {name}\n"
+                "plugin: resource\n"
+                "command: synthetic-resource {index}\n"
+                "estimated_duration: 0.5\n"
+                "description: Synthetic resource job {index}\n"
+            ).format(name=self.get_resource_name(index), index=index)
+        num_test_jobs = self.num_jobs - self.num_resource_jobs
+        for index in range(num_test_jobs):
+            lines = [
+                "name: {}".format(self.get_job_name(index)),
+                "plugin: {}".format("manual" if index % 10 == 9 else "shell"),
+            ]
+            depends = set()
+            group_start = index - index % self.JOBS_PER_GROUP
+            if index != group_start and rng.random() < 0.7:
+                depends.add(self.get_job_name(group_start))
+            for i in range(rng.randint(0, 2)):
+                if index > 0:
+                    depends.add(self.get_job_name(
+                        rng.randint(max(0, index - 100), index - 1)))
+            if depends:
+                lines.append("depends: {}".format(" ".join(sorted(depends))))
+            requires = []
+            for i in range(rng.choice((0, 1, 1, 2))):
+                requires.append("{}.category == 'category-{}'".format(
+                    self.get_resource_name(
+                        rng.randrange(self.num_resource_jobs)),
+                    rng.randrange(self.NUM_CATEGORIES)))
+            if requires:
+                lines.append("requires:")
+                lines.extend(" {}".format(program) for program in requires)
+            lines.extend([
+                "command: synthetic-test {} --verbose".format(index),
+                "estimated_duration: {}".format(rng.randint(1, 60)),
+                "description:",
+                " Synthetic test {}.".format(index),
+                " .",
+                " This job checks something that is not really there.",
+            ])
+            yield "\n".join(lines) + "\n"
+
+    def write_job_files(self, jobs_dir):
+        """
+        Write all job definitions to files in the specified directory
+        """
+        os.makedirs(jobs_dir, exist_ok=True)
+        text_list = list(self.gen_job_text())
+        for start in range(0, len(text_list), self.JOBS_PER_FILE):
+            pathname = os.path.join(jobs_dir, "synthetic-{:05}.txt".format(
+                start // self.JOBS_PER_FILE))
+            with open(pathname, 'wt', encoding='UTF-8') as stream:
+                stream.write("\n".join(
+                    text_list[start:start + self.JOBS_PER_FILE]))
+
+    def get_result(self, job):
+        """
+        Get a synthetic result of the specified job
+        """
+        if job.plugin == 'resource':
+            index = int(job.name.rsplit('_', 1)[1])
+            rng = random.Random(self.seed + index)
+            io_log = []
+            for record_index in range(self.RECORDS_PER_RESOURCE):
+                for line in (
+                    "name: item-{}".format(record_index),
+                    "category: category-{}".format(
+                        rng.randrange(self.NUM_CATEGORIES)),
+                    "value: {}".format(rng.randint(0, 1000)),
+                    ""
+                ):
+                    io_log.append((
+                        0.0, 'stdout', (line + "\n").encode("UTF-8")))
+            return MemoryJobResult({
+                'outcome': IJobResult.OUTCOME_PASS,
+                'return_code': 0,
+                'execution_duration': 0.5,
+                'io_log': io_log,
+            })
+        index = int(job.name.rsplit('-', 1)[1])
+        passed = index % 7 != 0
+        return MemoryJobResult({
+            'outcome': (IJobResult.OUTCOME_PASS if passed
+                        else IJobResult.OUTCOME_FAIL),
+            'return_code': 0 if passed else 1,
+            'execution_duration': 1.0,
+            'comments': None if passed else "Synthetic failure",
+            'io_log': [
+                (0.0, 'stdout', "Running test {}\n".format(index).encode()),
+                (0.5, 'stdout', b"Done\n"),
+            ],
+        })
+
+
+class Benchmark:
+    """
+    Benchmark of plainbox core with a synthetic provider
+
+    The following phases are measured, in this order:
+
+    ``load_jobs``
+        loading all jobs from the provider, with an empty job cache
+    ``load_jobs_cached``
+        loading all jobs again, from the job cache
+    ``session_state``
+        creating a :class:`SessionState` with all the jobs
+    ``update_desired_job_list``
+        selecting all the jobs to run
+    ``resource_results``
+        storing results of all resource jobs
+    ``recompute_readiness``
+        re-computing readiness of all the jobs from scratch
+    ``job_results``
+        storing results of all the other jobs
+    ``checkpoint``
+        saving the whole session to disk
+    ``resume``
+        loading the session back from disk
+    ``export_<name>``
+        exporting the session with each of the available exporters
+    """
+
+    def __init__(self, num_jobs, seed=0, repeat=1):
+        self.generator = SyntheticJobGenerator(num_jobs, seed)
+        self.repeat = repeat
+
+    def run(self):
+        """
+        Run the benchmark
+
+        :returns:
+            A dictionary with the description of the benchmark and the
+            timings, in seconds. Each phase is run :attr:`repeat` times,
+            the best time is reported.
+        """
+        base_dir = tempfile.mkdtemp(prefix="plainbox-bench-")
+        try:
+            self.generator.write_job_files(os.path.join(base_dir, "jobs"))
+            timings = {}
+            for i in range(self.repeat):
+                shutil.rmtree(os.path.join(base_dir, "cache"), True)
+                shutil.rmtree(os.path.join(base_dir, "session"), True)
+                for phase, elapsed in self._run_once(base_dir):
+                    logger.info("%s: %.3fs", phase, elapsed)
+                    timings[phase] = min(timings.get(phase, elapsed), elapsed)
+        finally:
+            shutil.rmtree(base_dir)
+        return {
+            'num_jobs': self.generator.num_jobs,
+            'num_resource_jobs': self.generator.num_resource_jobs,
+            'seed': self.generator.seed,
+            'repeat': self.repeat,
+            'timings': timings,
+        }
+
+    def _run_once(self, base_dir):
+        """
+        Run all the phases once, generating (phase, elapsed) tuples
+        """
+        start = _clock()
+        job_list = SyntheticProvider(base_dir).get_builtin_jobs()
+        yield 'load_jobs', _clock() - start
+        assert len(job_list) == self.generator.num_jobs
+        start = _clock()
+        job_list = SyntheticProvider(base_dir).get_builtin_jobs()
+        yield 'load_jobs_cached', _clock() - start
+        start = _clock()
+        state = SessionState(job_list)
+        yield 'session_state', _clock() - start
+        start = _clock()
+        problem_list = state.update_desired_job_list(job_list)
+        yield 'update_desired_job_list', _clock() - start
+        assert problem_list == [], problem_list
+        resource_job_list = [
+            job for job in job_list if job.plugin == 'resource']
+        other_job_list = [
+            job for job in job_list if job.plugin != 'resource']
+        result_list = [
+            self.generator.get_result(job) for job in resource_job_list]
+        start = _clock()
+        for job, result in zip(resource_job_list, result_list):
+            state.update_job_result(job, result)
+        yield 'resource_results', _clock() - start
+        start = _clock()
+        state._recompute_job_readiness()
+        yield 'recompute_readiness', _clock() - start
+        result_list = [
+            self.generator.get_result(job) for job in other_job_list]
+        start = _clock()
+        for job, result in zip(other_job_list, result_list):
+            state.update_job_result(job, result)
+        yield 'job_results', _clock() - start
+        storage = SessionStorage.create(
+            os.path.join(base_dir, "session"), legacy_mode=False)
+        manager = SessionManager(state, storage, journal=False)
+        start = _clock()
+        manager.checkpoint()
+        yield 'checkpoint', _clock() - start
+        start = _clock()
+        SessionManager.load_session(job_list, storage)
+        yield 'resume', _clock() - start
+        for name, exporter_cls in get_all_exporters().items():
+            exporter = exporter_cls()
+            stream = io.BytesIO()
+            start = _clock()
+            exporter.dump_from_session(state, stream)
+            yield 'export_{}'.format(name), _clock() - start
+
+
+def get_environment():
+    """
+    Describe the environment the benchmarks are running in
+
+    :returns:
+        A dictionary with the version of plainbox and python and a
+        description of the machine.
+    """
+    return {
+        'plainbox_version': ".".join(str(part) for part in plainbox_version),
+        'python_version': platform.python_version(),
+        'python_implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': multiprocessing.cpu_count(),
+    }
@@ -28,6 +28,7 @@
 
 from abc import abstractmethod, ABCMeta
 import argparse
+import cProfile
 import errno
 import logging
 import pdb
@@ -35,6 +36,9 @@ import sys
 
 from plainbox.impl.logging import adjust_logging
 from plainbox.impl.providers.v1 import all_providers
+from plainbox.impl.tracing import span
+from plainbox.impl.tracing import start_tracing
+from plainbox.impl.tracing import stop_tracing
 
 
 logger = logging.getLogger("plainbox.commands")
@@ -108,6 +112,8 @@ class PlainBoxToolBase(metaclass=ABCMeta):
         self._config = None  # set in _late_init()
         self._provider = None  # set in _late_init()
         self._parser = None  # set in _late_init()
+        self._profile = None  # set in _late_init()
+        self._profile_pathname = None  # set in _late_init()
 
     def main(self, argv=None):
         """
@@ -133,6 +139,8 @@ class PlainBoxToolBase(metaclass=ABCMeta):
             pass
         else:
             return self.dispatch_and_catch_exceptions(ns)
+        finally:
+            self.final_cleanup()
 
     @classmethod
     @abstractmethod
@@ -181,11 +189,20 @@ class PlainBoxToolBase(metaclass=ABCMeta):
         adjust_logging(
             level=early_ns.log_level, trace_list=early_ns.trace,
             debug_console=early_ns.debug_console)
+        # Start tracing and profiling as early as possible so that all of
+        # the initialization below is covered as well
+        if early_ns.trace_file is not None:
+            start_tracing(early_ns.trace_file)
+        if early_ns.profile is not None:
+            self._profile_pathname = early_ns.profile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
         # Load plainbox configuration
         self._config = self.get_config_cls().get()
         # Load and initialize checkbox provider
         # TODO: rename to provider, switch to plugins
-        all_providers.load()
+        with span("load providers", "provider"):
+            all_providers.load()
         # If the default value of 'None' was set for the checkbox (provider)
         # argument then load the actual provider name from the configuration
         # object (default for that is 'auto').
@@ -213,6 +230,20 @@ class PlainBoxToolBase(metaclass=ABCMeta):
         dispatched. This is empty here but maybe useful for subclasses.
         """
 
+    def final_cleanup(self):
+        """
+        Do the cleanup that has to happen just before exiting, no matter how
+        the command has finished. This stops profiling and tracing started
+        in :meth:`late_init()` and saves the collected data.
+        """
+        if self._profile is not None:
+            self._profile.disable()
+            logger.debug(
+                "Saving profiling data to %r", self._profile_pathname)
+            self._profile.dump_stats(self._profile_pathname)
+            self._profile = None
+        stop_tracing()
+
     def construct_early_parser(self):
         """
         Create a parser that captures some of the early data we need to
@@ -306,6 +337,22 @@ class PlainBoxToolBase(metaclass=ABCMeta):
             action="store_true",
             default=False,
             help="crash on SIGINT/KeyboardInterrupt, useful with --pdb")
+        # Add the --trace-file argument
+        group.add_argument(
+            "--trace-file",
+            metavar="FILE",
+            action="store",
+            default=None,
+            help=("write a trace of the time spent in each phase to FILE"
+                  " (in Chrome trace event format or, for *.jsonl files,"
+                  " as JSON lines)"))
+        # Add the --profile argument
+        group.add_argument(
+            "--profile",
+            metavar="FILE",
+            action="store",
+            default=None,
+            help="run with cProfile and write the statistics to FILE")
 
     def dispatch_command(self, ns):
         # Argh the horrror!
@@ -324,7 +371,8 @@ class PlainBoxToolBase(metaclass=ABCMeta):
                 and getattr(ns, "command", None) is None):
             self._parser.error(argparse._("too few arguments"))
         else:
-            return ns.command.invoked(ns)
+            with span(self.get_exec_name(), "command"):
+                return ns.command.invoked(ns)
 
     def dispatch_and_catch_exceptions(self, ns):
         try:
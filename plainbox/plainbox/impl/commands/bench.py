@@ -0,0 +1,99 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+:mod:`plainbox.impl.commands.bench` -- bench sub-command
+========================================================
+
+.. warning::
+
+    THIS MODULE DOES NOT HAVE STABLE PUBLIC API
+"""
+
+from argparse import FileType
+import json
+import logging
+import sys
+
+from plainbox.impl.benchmark import Benchmark
+from plainbox.impl.benchmark import get_environment
+from plainbox.impl.commands import PlainBoxCommand
+
+
+logger = logging.getLogger("plainbox.commands.bench")
+
+
+class BenchInvocation:
+    """
+    Invocation of the 'bench' command
+    """
+
+    def __init__(self, ns):
+        self.ns = ns
+
+    def run(self):
+        result_list = []
+        for num_jobs in self.ns.size or BenchCommand.DEFAULT_SIZES:
+            print("Running benchmark with {} jobs...".format(num_jobs),
+                  file=sys.stderr)
+            result_list.append(
+                Benchmark(num_jobs, self.ns.seed, self.ns.repeat).run())
+        json.dump({
+            'environment': get_environment(),
+            'results': result_list,
+        }, self.ns.output, indent=2, sort_keys=True)
+        self.ns.output.write("\n")
+        self.ns.output.flush()
+        return 0
+
+
+class BenchCommand(PlainBoxCommand):
+    """
+    Implementation of ``$ plainbox dev bench``
+    """
+
+    # Sizes of the synthetic providers used by default
+    DEFAULT_SIZES = (1000, 10000, 50000)
+
+    def invoked(self, ns):
+        return BenchInvocation(ns).run()
+
+    def register_parser(self, subparsers):
+        parser = subparsers.add_parser(
+            "bench", help="run synthetic benchmarks of plainbox",
+            description="""
+            Generate synthetic providers with the selected number of jobs and
+            measure how long it takes to load the jobs, to set up and update
+            a session, to save and resume it and to export it with each of the
+            available exporters. The results are written as JSON.
+            """)
+        parser.set_defaults(command=self)
+        parser.add_argument(
+            "-s", "--size", metavar="NUM-JOBS", type=int, action="append",
+            help=("number of jobs in the synthetic provider, can be used"
+                  " multiple times (default: {})".format(
+                      ", ".join(str(size) for size in self.DEFAULT_SIZES))))
+        parser.add_argument(
+            "-r", "--repeat", metavar="N", type=int, default=1,
+            help="run each benchmark N times and keep the best time")
+        parser.add_argument(
+            "--seed", metavar="SEED", type=int, default=0,
+            help="seed of the generator of synthetic jobs (default: 0)")
+        parser.add_argument(
+            "-o", "--output", metavar="FILE", type=FileType("wt"),
+            default=sys.stdout,
+            help="save the results to FILE (default: stdout)")
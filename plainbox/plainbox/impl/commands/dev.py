@@ -30,6 +30,7 @@ from logging import getLogger
 
 from plainbox.impl.commands import PlainBoxCommand
 from plainbox.impl.commands.analyze import AnalyzeCommand
+from plainbox.impl.commands.bench import BenchCommand
 from plainbox.impl.commands.crash import CrashCommand
 from plainbox.impl.commands.logtest import LogTestCommand
 from plainbox.impl.commands.parse import ParseCommand
@@ -62,3 +63,4 @@ class DevCommand(PlainBoxCommand):
         ParseCommand().register_parser(subdev)
         CrashCommand().register_parser(subdev)
         LogTestCommand().register_parser(subdev)
+        BenchCommand().register_parser(subdev)
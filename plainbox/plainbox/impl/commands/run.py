@@ -26,14 +26,16 @@
     THIS MODULE DOES NOT HAVE STABLE PUBLIC API
 """
 
+from argparse import ArgumentTypeError
 from argparse import FileType
 from logging import getLogger
 from os.path import join
 from shutil import copyfileobj
-import io
 import sys
+import tempfile
 
 from requests.exceptions import ConnectionError, InvalidSchema, HTTPError
+from requests.exceptions import Timeout
 
 from plainbox.abc import IJobResult
 from plainbox.impl.providers.checkbox import CheckBoxDebProvider
@@ -43,22 +45,40 @@ from plainbox.impl.commands.checkbox import CheckBoxInvocationMixIn
 from plainbox.impl.depmgr import DependencyDuplicateError
 from plainbox.impl.exporter import ByteStringStreamTranslator
 from plainbox.impl.exporter import get_all_exporters
+from plainbox.impl.exporter.fanout import SessionStateExportFanOut
 from plainbox.impl.result import DiskJobResult, MemoryJobResult
 from plainbox.impl.runner import JobRunner
 from plainbox.impl.runner import authenticate_warmup
 from plainbox.impl.runner import slugify
+from plainbox.impl.scheduler import JobScheduler
 from plainbox.impl.session import SessionStateLegacyAPI as SessionState
+from plainbox.impl.tracing import span
 from plainbox.impl.transport import get_all_transports
 
 
 logger = getLogger("plainbox.commands.run")
 
 
+def _positive_int(text):
+    """
+    Argument type for numbers of workers, which must be at least 1
+    """
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise ArgumentTypeError(
+            "must be a positive number: {!r}".format(text))
+    return value
+
+
 class RunInvocation(CheckBoxInvocationMixIn):
 
-    def __init__(self, provider, ns):
+    def __init__(self, provider, ns, config=None):
         super(RunInvocation, self).__init__(provider)
         self.ns = ns
+        self.config = config
 
     def run(self):
         ns = self.ns
@@ -74,8 +94,10 @@ class RunInvocation(CheckBoxInvocationMixIn):
         else:
             exporter = self._prepare_exporter(ns)
             transport = self._prepare_transport(ns)
+            extra_output_list = self._prepare_extra_outputs(ns)
             job_list = self.get_job_list(ns)
-            return self._run_jobs(ns, job_list, exporter, transport)
+            return self._run_jobs(
+                ns, job_list, exporter, transport, extra_output_list)
 
     def _print_output_format_list(self, ns):
         print("Available output formats: {}".format(
@@ -103,6 +125,29 @@ class RunInvocation(CheckBoxInvocationMixIn):
             raise SystemExit(str(exc))
         return exporter
 
+    def _prepare_extra_outputs(self, ns):
+        extra_output_list = []
+        for spec in ns.extra_output or ():
+            output_format, sep, filename = spec.partition(':')
+            if not sep or not filename:
+                raise SystemExit(
+                    "Invalid extra output, expected FORMAT:FILE: {}".format(
+                        spec))
+            try:
+                exporter_cls = get_all_exporters()[output_format]
+            except KeyError:
+                raise SystemExit("Unknown output format: {}".format(
+                    output_format))
+            # Open the file now, like argparse does for --output-file, so
+            # that a bad path is reported before any job runs
+            try:
+                stream = open(filename, 'wb')
+            except (IOError, OSError) as exc:
+                raise SystemExit("Unable to open extra output: {}".format(
+                    exc))
+            extra_output_list.append((exporter_cls(), stream))
+        return extra_output_list
+
     def _prepare_transport(self, ns):
         if ns.transport not in get_all_transports():
             return None
@@ -151,7 +196,8 @@ class RunInvocation(CheckBoxInvocationMixIn):
             session.metadata.running_job_name = None
             session.persistent_save()
 
-    def _run_jobs(self, ns, job_list, exporter, transport=None):
+    def _run_jobs(self, ns, job_list, exporter, transport=None,
+                  extra_output_list=()):
         # Compute the run list, this can give us notification about problems in
         # the selected jobs. Currently we just display each problem
         matching_job_list = self._get_matching_job_list(ns, job_list)
@@ -169,6 +215,10 @@ class RunInvocation(CheckBoxInvocationMixIn):
             print("Second job defined in: {0}".format(
                 exc.duplicate_job.origin))
             raise SystemExit(exc)
+        if self.config is not None:
+            session.set_durability(
+                self.config.session_durability,
+                self.config.session_group_commit_delay)
         with session.open():
             if session.previous_session_file():
                 if self.ask_for_resume():
@@ -191,33 +241,45 @@ class RunInvocation(CheckBoxInvocationMixIn):
                 interaction_callback = self._interaction_callback
             else:
                 interaction_callback = None
+            if self.config is not None and self.config.job_timeout_multiplier:
+                timeout_multiplier = self.config.job_timeout_multiplier
+            else:
+                timeout_multiplier = None
             runner = JobRunner(
                 session.session_dir,
                 session.jobs_io_log_dir,
                 interaction_callback=interaction_callback,
-                dry_run=ns.dry_run
+                dry_run=ns.dry_run,
+                timeout_multiplier=timeout_multiplier
             )
             self._run_jobs_with_session(ns, session, runner)
-            # Get a stream with exported session data.
-            exported_stream = io.BytesIO()
-            data_subset = exporter.get_session_data_subset(session)
-            exporter.dump(data_subset, exported_stream)
-            exported_stream.seek(0)  # Need to rewind the file, puagh
-            # Write the stream to file if requested
-            self._save_results(ns.output_file, exported_stream)
-            # Invoke the transport?
-            if transport:
-                exported_stream.seek(0)
-                try:
-                    transport.send(exported_stream.read())
-                except InvalidSchema as exc:
-                    print("Invalid destination URL: {0}".format(exc))
-                except ConnectionError as exc:
-                    print(("Unable to connect "
-                           "to destination URL: {0}").format(exc))
-                except HTTPError as exc:
-                    print(("Server returned an error when "
-                           "receiving or processing: {0}").format(exc))
+            # Get a stream with exported session data. The data is written
+            # to a temporary file, one job at a time, so that large sessions
+            # are never kept in memory.
+            with tempfile.TemporaryFile() as exported_stream:
+                with span("export", "exporter", format=ns.output_format):
+                    self._export_results(
+                        session, exporter, exported_stream,
+                        extra_output_list)
+                exported_stream.seek(0)  # Need to rewind the file, puagh
+                # Write the stream to file if requested
+                self._save_results(ns.output_file, exported_stream)
+                # Invoke the transport?
+                if transport:
+                    exported_stream.seek(0)
+                    try:
+                        transport.send(exported_stream)
+                    except InvalidSchema as exc:
+                        print("Invalid destination URL: {0}".format(exc))
+                    except Timeout as exc:
+                        print("Timed out sending to destination URL: {0}"
+                              .format(exc))
+                    except ConnectionError as exc:
+                        print(("Unable to connect "
+                               "to destination URL: {0}").format(exc))
+                    except HTTPError as exc:
+                        print(("Server returned an error when "
+                               "receiving or processing: {0}").format(exc))
 
         # FIXME: sensible return value
         return 0
@@ -234,6 +296,24 @@ class RunInvocation(CheckBoxInvocationMixIn):
         # Otherwise, do pre-authentication
         return True
 
+    def _export_results(self, session, exporter, stream, extra_output_list):
+        # Export to all the formats at once, so that IO logs of the session
+        # are read only once, regardless of the number of formats
+        fan_out = SessionStateExportFanOut()
+        fan_out.add_sink(exporter, stream)
+        try:
+            # Extra outputs are optional, if any of them fails the main
+            # output is still saved
+            for extra_exporter, extra_stream in extra_output_list:
+                print("Saving results to {}".format(extra_stream.name))
+                fan_out.add_sink(extra_exporter, extra_stream, optional=True)
+            failed_list = fan_out.dump_from_session(session)
+        finally:
+            for extra_exporter, extra_stream in extra_output_list:
+                extra_stream.close()
+        for extra_exporter, extra_stream in failed_list:
+            print("Unable to save results to {}".format(extra_stream.name))
+
     def _save_results(self, output_file, input_stream):
         if output_file is sys.stdout:
             print("[ Results ]".center(80, '='))
@@ -297,12 +377,19 @@ class RunInvocation(CheckBoxInvocationMixIn):
             print("Estimated duration cannot be determined for manual jobs.")
 
     def _run_jobs_with_session(self, ns, session, runner):
-        # TODO: run all resource jobs concurrently with multiprocessing
         # TODO: make local job discovery nicer, it would be best if
         # desired_jobs could be managed entirely internally by SesionState. In
         # such case the list of jobs to run would be changed during iteration
         # but would be otherwise okay).
+        # Keep track of jobs added by local jobs, see
+        # _update_after_local_job()
+        self._local_job_list_added = []
+        session.on_job_list_added.connect(self._local_job_list_added.extend)
+        self._run_resource_jobs_with_session(ns, session, runner)
         print("[ Running All Jobs ]".center(80, '='))
+        if ns.jobs > 1:
+            self._run_jobs_concurrently_with_session(ns, session, runner)
+            return
         again = True
         while again:
             again = False
@@ -314,16 +401,119 @@ class RunInvocation(CheckBoxInvocationMixIn):
                     continue
                 self._run_single_job_with_session(ns, session, runner, job)
                 session.persistent_save()
-                if job.plugin == "local":
-                    # After each local job runs rebuild the list of matching
-                    # jobs and run everything again
-                    new_matching_job_list = self._get_matching_job_list(
-                        ns, session.job_list)
-                    self._update_desired_job_list(
-                        session, new_matching_job_list)
+                if job.plugin == "local" and self._update_after_local_job(
+                        ns, session):
+                    # The run list has changed, run everything again
                     again = True
                     break
 
+    def _update_after_local_job(self, ns, session):
+        """
+        Update the desired job list after a local job has run.
+
+        :returns:
+            True if the local job has added any new jobs and the desired job
+            list was updated (thus the run list may have changed), False
+            otherwise
+
+        Local jobs that don't generate anything new (often because all the
+        jobs they would generate are known already) don't cause the
+        (expensive) dependency resolution to happen again.
+        """
+        if not self._local_job_list_added:
+            return False
+        # Only the jobs added by this local job can change what matches,
+        # the rest was already considered when the run list was computed.
+        # The list is cleared in place as the signal is connected to it
+        new_job_list = list(self._local_job_list_added)
+        del self._local_job_list_added[:]
+        if not self._get_matching_job_list(ns, new_job_list):
+            return False
+        # Rebuild the list of matching jobs (this keeps the pattern order).
+        # The job list is copied as excluded jobs are removed from it.
+        new_matching_job_list = self._get_matching_job_list(
+            ns, session.job_list[:])
+        self._update_desired_job_list(session, new_matching_job_list)
+        return True
+
+    def _run_jobs_concurrently_with_session(self, ns, session, runner):
+        """
+        Run all the jobs using :class:`JobScheduler` with ns.jobs workers.
+
+        Automated jobs run concurrently, everything else is started with
+        :meth:`_run_single_job_with_session()`, one job at a time.
+        """
+        scheduler = JobScheduler(session, runner, ns.jobs)
+
+        def job_started(job):
+            print("[ {} ]".format(job.name).center(80, '-'))
+            print("Running... (output in {}.*)".format(
+                join(session.jobs_io_log_dir, slugify(job.name))))
+            session.metadata.running_job_name = job.name
+            session.persistent_save()
+
+        def job_finished(job, job_result):
+            print("[ {} ]".format(job.name).center(80, '-'))
+            print("Outcome: {}".format(job_result.outcome))
+            print("Comments: {}".format(job_result.comments))
+            if session.metadata.running_job_name == job.name:
+                session.metadata.running_job_name = None
+            session.persistent_save()
+
+        def run_job_serially(job):
+            self._run_single_job_with_session(ns, session, runner, job)
+            session.persistent_save()
+            if job.plugin == "local":
+                # The scheduler will pick up new jobs on its own
+                self._update_after_local_job(ns, session)
+
+        scheduler.on_job_started.connect(job_started)
+        scheduler.on_job_finished.connect(job_finished)
+        scheduler.run(run_job_serially)
+
+    def _get_ready_resource_job_list(self, session):
+        """
+        Get a list of resource jobs from the run list that can start right now
+        and that don't have a result yet.
+        """
+        job_list = []
+        for job in session.run_list:
+            if job.plugin != "resource":
+                continue
+            job_state = session.job_state_map[job.name]
+            if job_state.result.outcome is not None:
+                continue
+            if job_state.can_start():
+                job_list.append(job)
+        return job_list
+
+    def _run_resource_jobs_with_session(self, ns, session, runner):
+        """
+        Run all the resource jobs from the run list concurrently.
+
+        Resource jobs are executed in waves. Each wave consists of all the
+        resource jobs that can start (their dependencies are satisfied) and
+        it is executed with a pool of ns.resource_workers worker threads.
+        Results are presented to the session in run list order, regardless of
+        the order in which the jobs have finished, so that readiness
+        computation and checkpoints stay reproducible. Resource jobs that
+        could not run in any wave are left for the regular, serial, phase.
+        """
+        job_list = self._get_ready_resource_job_list(session)
+        if not job_list:
+            return
+        print("[ Gathering Resources ]".center(80, '='))
+        while job_list:
+            for job in job_list:
+                print("Running {}...".format(job.name))
+            result_list = runner.run_job_list(
+                job_list, max_workers=ns.resource_workers)
+            for job, job_result in zip(job_list, result_list):
+                print("{}: {}".format(job.name, job_result.outcome))
+                session.update_job_result(job, job_result)
+            session.persistent_save()
+            job_list = self._get_ready_resource_job_list(session)
+
     def _run_single_job_with_session(self, ns, session, runner, job):
         print("[ {} ]".format(job.name).center(80, '-'))
         if job.description is not None:
@@ -361,11 +551,12 @@ class RunInvocation(CheckBoxInvocationMixIn):
 
 class RunCommand(PlainBoxCommand, CheckBoxCommandMixIn):
 
-    def __init__(self, provider):
+    def __init__(self, provider, config=None):
         self.provider = provider
+        self.config = config
 
     def invoked(self, ns):
-        return RunInvocation(self.provider, ns).run()
+        return RunInvocation(self.provider, ns, self.config).run()
 
     def register_parser(self, subparsers):
         parser = subparsers.add_parser("run", help="run a test job")
@@ -377,6 +568,16 @@ class RunCommand(PlainBoxCommand, CheckBoxCommandMixIn):
         group.add_argument(
             '-n', '--dry-run', action='store_true',
             help="Don't actually run any jobs")
+        group = parser.add_argument_group(title="execution options")
+        group.add_argument(
+            '-j', '--jobs', metavar='N', type=_positive_int, default=1,
+            help=("Run up to N automated jobs at the same time, as soon as"
+                  " their dependencies are satisfied (defaults to 1)"))
+        group.add_argument(
+            '--resource-workers', metavar='N', type=_positive_int,
+            default=None,
+            help=("Run up to N resource jobs at the same time"
+                  " (defaults to the number of CPUs)"))
         group = parser.add_argument_group("output options")
         assert 'text' in get_all_exporters()
         group.add_argument(
@@ -395,6 +596,10 @@ class RunCommand(PlainBoxCommand, CheckBoxCommandMixIn):
             metavar='FILE', type=FileType("wb"),
             help=('Save test results to the specified FILE'
                   ' (or to stdout if FILE is -)'))
+        group.add_argument(
+            '--extra-output', metavar='FORMAT:FILE', action='append',
+            help=('Also save test results in the specified FORMAT to FILE,'
+                  ' can be used multiple times'))
         group.add_argument(
             '-t', '--transport',
             metavar='TRANSPORT', choices=['?'] + list(
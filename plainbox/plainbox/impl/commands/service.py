@@ -80,7 +80,8 @@ class ServiceInvocation:
         provider_list = [self.provider]
         session_list = []  # TODO: load sessions
         logger.debug("Constructing Service object")
-        service_obj = Service(provider_list, session_list)
+        service_obj = Service(provider_list, session_list,
+                              max_workers=self.ns.jobs)
         logger.debug("Constructing ServiceWrapper")
         service_wrp = ServiceWrapper(service_obj, on_exit=lambda: loop.quit())
         logger.info("Publishing all objects on DBus")
@@ -100,6 +101,8 @@ class ServiceInvocation:
                 " It is recommended to call the Exit() method on the"
                 " exported service object instead"))
         finally:
+            # Wait for the jobs, normally they were killed by Exit() already
+            service_obj.shutdown()
             logger.debug("Releasing %s", bus_name)
             # XXX: ugly but that's how one can reliably release a bus name
             del bus_name
@@ -129,4 +132,8 @@ class ServiceCommand(PlainBoxCommand):
             '--bus-name', action="store",
             default="com.canonical.certification.PlainBox1",
             help="Use the specified DBus bus name")
+        parser.add_argument(
+            '-j', '--jobs', metavar='N', type=int, default=None,
+            help=("Run up to N jobs at the same time, other jobs wait in"
+                  " a queue (defaults to the number of CPUs)"))
         parser.set_defaults(command=self)
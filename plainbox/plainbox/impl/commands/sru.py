@@ -28,10 +28,12 @@
 """
 import logging
 import os
+import shutil
 import sys
 import tempfile
 
 from requests.exceptions import ConnectionError, InvalidSchema, HTTPError
+from requests.exceptions import Timeout
 
 from plainbox.impl.applogic import WhiteList
 from plainbox.impl.applogic import get_matching_job_list
@@ -40,12 +42,14 @@ from plainbox.impl.commands import PlainBoxCommand
 from plainbox.impl.commands.check_config import CheckConfigInvocation
 from plainbox.impl.commands.checkbox import CheckBoxCommandMixIn
 from plainbox.impl.commands.checkbox import CheckBoxInvocationMixIn
+from plainbox.impl.commands.run import _positive_int
 from plainbox.impl.config import ValidationError, Unset
 from plainbox.impl.depmgr import DependencyDuplicateError
-from plainbox.impl.exporter import ByteStringStreamTranslator
 from plainbox.impl.exporter.xml import XMLSessionStateExporter
 from plainbox.impl.runner import JobRunner
+from plainbox.impl.scheduler import JobScheduler
 from plainbox.impl.session import SessionStateLegacyAPI as SessionState
+from plainbox.impl.tracing import span
 from plainbox.impl.transport.certification import CertificationTransport
 from plainbox.impl.transport.certification import InvalidSecureIDError
 
@@ -104,9 +108,13 @@ class _SRUInvocation(CheckBoxInvocationMixIn):
                 dry_run=self.ns.dry_run
             )
             self._run_all_jobs()
-            if self.config.fallback_file is not Unset:
-                self._save_results()
-            self._submit_results()
+            # Export the session once, both the fallback file and the
+            # submission are copied from the same temporary file
+            with tempfile.NamedTemporaryFile(mode='w+b') as stream:
+                self._export_results(stream)
+                if self.config.fallback_file is not Unset:
+                    self._save_results(stream)
+                self._submit_results(stream)
         # FIXME: sensible return value
         return 0
 
@@ -119,14 +127,18 @@ class _SRUInvocation(CheckBoxInvocationMixIn):
                 logger.warning("- %s", problem)
             logger.warning("Problematic jobs will not be considered")
 
-    def _save_results(self):
+    def _export_results(self, stream):
+        with span("export", "exporter", format="xml"):
+            self.exporter.dump_from_session(self.session, stream)
+        stream.flush()
+
+    def _save_results(self, stream):
         print("Saving results to {0}".format(self.config.fallback_file))
-        data = self.exporter.get_session_data_subset(self.session)
-        with open(self.config.fallback_file, "wt", encoding="UTF-8") as stream:
-            translating_stream = ByteStringStreamTranslator(stream, "UTF-8")
-            self.exporter.dump(data, translating_stream)
+        stream.seek(0)
+        with open(self.config.fallback_file, "wb") as fallback_stream:
+            shutil.copyfileobj(stream, fallback_stream)
 
-    def _submit_results(self):
+    def _submit_results(self, stream):
         print("Submitting results to {0} for secure_id {1}".format(
               self.config.c3_url, self.config.secure_id))
         options_string = "secure_id={0}".format(self.config.secure_id)
@@ -137,35 +149,34 @@ class _SRUInvocation(CheckBoxInvocationMixIn):
         except InvalidSecureIDError as exc:
             print(exc)
             return False
-        # Prepare the data for submission
-        data = self.exporter.get_session_data_subset(self.session)
-        with tempfile.NamedTemporaryFile(mode='w+b') as stream:
-            # Dump the data to the temporary file
-            self.exporter.dump(data, stream)
-            # Flush and rewind
-            stream.flush()
-            stream.seek(0)
-            try:
-                # Send the data, reading from the temporary file
-                result = transport.send(stream)
-                if 'url' in result:
-                    print("Successfully sent, submission status at {0}".format(
-                          result['url']))
-                else:
-                    print("Successfully sent, server response: {0}".format(
-                          result))
-
-            except InvalidSchema as exc:
-                print("Invalid destination URL: {0}".format(exc))
-            except ConnectionError as exc:
-                print("Unable to connect to destination URL: {0}".format(exc))
-            except HTTPError as exc:
-                print(("Server returned an error when "
-                       "receiving or processing: {0}").format(exc))
-            except IOError as exc:
-                print("Problem reading a file: {0}".format(exc))
+        # Rewind the exported data
+        stream.seek(0)
+        try:
+            # Send the data, reading from the temporary file
+            result = transport.send(stream)
+            if 'url' in result:
+                print("Successfully sent, submission status at {0}".format(
+                      result['url']))
+            else:
+                print("Successfully sent, server response: {0}".format(
+                      result))
+
+        except InvalidSchema as exc:
+            print("Invalid destination URL: {0}".format(exc))
+        except Timeout as exc:
+            print("Timed out sending to destination URL: {0}".format(exc))
+        except ConnectionError as exc:
+            print("Unable to connect to destination URL: {0}".format(exc))
+        except HTTPError as exc:
+            print(("Server returned an error when "
+                   "receiving or processing: {0}").format(exc))
+        except IOError as exc:
+            print("Problem reading a file: {0}".format(exc))
 
     def _run_all_jobs(self):
+        if self.ns.jobs > 1:
+            self._run_all_jobs_concurrently()
+            return
         again = True
         while again:
             again = False
@@ -185,6 +196,33 @@ class _SRUInvocation(CheckBoxInvocationMixIn):
                     again = True
                     break
 
+    def _run_all_jobs_concurrently(self):
+        scheduler = JobScheduler(
+            self.session, self.runner, self.ns.jobs, self.config)
+
+        def job_started(job):
+            print("- {}: started".format(job.name))
+            sys.stdout.flush()
+
+        def job_finished(job, job_result):
+            print("- {}: {}".format(job.name, job_result.outcome))
+            sys.stdout.flush()
+            if job_result.comments is not None:
+                print("comments: {0}".format(job_result.comments))
+            self.session.persistent_save()
+
+        def run_job_serially(job):
+            self._run_single_job(job)
+            self.session.persistent_save()
+            if job.plugin == "local":
+                # After each local job runs rebuild the list of matching
+                # jobs, the scheduler will pick up new jobs on its own
+                self._set_job_selection()
+
+        scheduler.on_job_started.connect(job_started)
+        scheduler.on_job_finished.connect(job_finished)
+        scheduler.run(run_job_serially)
+
     def _run_single_job(self, job):
         print("- {}:".format(job.name), end=' ')
         sys.stdout.flush()
@@ -286,6 +324,10 @@ class SRUCommand(PlainBoxCommand, CheckBoxCommandMixIn):
             default=False,
             help=("Skip all usual jobs."
                   " Only local, resource and attachment jobs are started"))
+        group.add_argument(
+            '-j', '--jobs', metavar='N', type=_positive_int, default=1,
+            help=("Run up to N automated jobs at the same time, as soon as"
+                  " their dependencies are satisfied (defaults to 1)"))
         # Call enhance_parser from CheckBoxCommandMixIn
         self.enhance_parser(parser)
 
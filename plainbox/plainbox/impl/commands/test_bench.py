@@ -0,0 +1,83 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+plainbox.impl.commands.test_bench
+=================================
+
+Test definitions for plainbox.impl.commands.bench module
+"""
+
+from unittest import TestCase
+import argparse
+import io
+import json
+
+import mock
+
+from plainbox.impl.commands.bench import BenchCommand
+from plainbox.impl.commands.bench import BenchInvocation
+from plainbox.testing_utils.io import TestIO
+
+
+class TestBenchCommand(TestCase):
+
+    def setUp(self):
+        self.parser = argparse.ArgumentParser(prog='test')
+        subparsers = self.parser.add_subparsers()
+        BenchCommand().register_parser(subparsers)
+
+    def test_defaults(self):
+        ns = self.parser.parse_args(['bench'])
+        self.assertIsInstance(ns.command, BenchCommand)
+        self.assertEqual(ns.size, None)
+        self.assertEqual(ns.repeat, 1)
+        self.assertEqual(ns.seed, 0)
+
+    def test_sizes(self):
+        ns = self.parser.parse_args(['bench', '-s', '10', '--size', '20'])
+        self.assertEqual(ns.size, [10, 20])
+
+
+class TestBenchInvocation(TestCase):
+
+    @mock.patch('plainbox.impl.commands.bench.Benchmark')
+    def test_run(self, mock_benchmark):
+        mock_benchmark().run.side_effect = lambda: {'timings': {'a': 1.0}}
+        mock_benchmark.reset_mock()
+        ns = mock.Mock(size=[10, 20], seed=5, repeat=3, output=io.StringIO())
+        with TestIO() as test_io:
+            retval = BenchInvocation(ns).run()
+        self.assertEqual(retval, 0)
+        self.assertEqual(mock_benchmark.call_args_list, [
+            ((10, 5, 3),), ((20, 5, 3),)])
+        self.assertIn("Running benchmark with 20 jobs", test_io.stderr)
+        data = json.loads(ns.output.getvalue())
+        self.assertEqual(data['results'], [
+            {'timings': {'a': 1.0}}, {'timings': {'a': 1.0}}])
+        self.assertIn('python_version', data['environment'])
+
+    @mock.patch('plainbox.impl.commands.bench.Benchmark')
+    def test_run_default_sizes(self, mock_benchmark):
+        mock_benchmark().run.return_value = {}
+        mock_benchmark.reset_mock()
+        ns = mock.Mock(size=None, seed=0, repeat=1, output=io.StringIO())
+        with TestIO():
+            BenchInvocation(ns).run()
+        self.assertEqual(
+            [call[0][0] for call in mock_benchmark.call_args_list],
+            list(BenchCommand.DEFAULT_SIZES))
@@ -61,16 +61,17 @@ class TestDevCommand(TestCase):
         self.assertEqual(
             io.stdout, cleandoc(
                 """
-                usage: test dev [-h] {script,special,analyze,parse,crash,logtest} ...
+                usage: test dev [-h] {script,special,analyze,parse,crash,logtest,bench} ...
 
                 positional arguments:
-                  {script,special,analyze,parse,crash,logtest}
+                  {script,special,analyze,parse,crash,logtest,bench}
                     script              run a command from a job
                     special             special/internal commands
                     analyze             analyze how selected jobs would be executed
                     parse               parse stdin with the specified parser
                     crash               crash the application
                     logtest             log messages at various levels
+                    bench               run synthetic benchmarks of plainbox
 
                 optional arguments:
                   -h, --help            show this help message and exit
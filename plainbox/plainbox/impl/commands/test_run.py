@@ -31,14 +31,19 @@ import tempfile
 
 from collections import OrderedDict
 from inspect import cleandoc
-from mock import patch
+from mock import Mock, patch
 from unittest import TestCase
 
+from plainbox.abc import IJobResult
 from plainbox.impl.box import main
+from plainbox.impl.commands.run import RunInvocation
 from plainbox.impl.exporter.json import JSONSessionStateExporter
 from plainbox.impl.exporter.rfc822 import RFC822SessionStateExporter
 from plainbox.impl.exporter.text import TextSessionStateExporter
 from plainbox.impl.exporter.xml import XMLSessionStateExporter
+from plainbox.impl.job import JobDefinition
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.session import SessionState
 from plainbox.testing_utils.io import TestIO
 
 
@@ -65,10 +70,11 @@ class TestRun(TestCase):
             self.assertEqual(call.exception.args, (0,))
         self.maxDiff = None
         expected = """
-        usage: plainbox run [-h] [--not-interactive] [-n] [-f FORMAT] [-p OPTIONS]
-                            [-o FILE] [-t TRANSPORT] [--transport-where WHERE]
-                            [--transport-options OPTIONS] [-i PATTERN] [-x PATTERN]
-                            [-w WHITELIST]
+        usage: plainbox run [-h] [--not-interactive] [-n] [-j N]
+                            [--resource-workers N] [-f FORMAT] [-p OPTIONS] [-o FILE]
+                            [--extra-output FORMAT:FILE] [-t TRANSPORT]
+                            [--transport-where WHERE] [--transport-options OPTIONS]
+                            [-i PATTERN] [-x PATTERN] [-w WHITELIST]
 
         optional arguments:
           -h, --help            show this help message and exit
@@ -77,6 +83,12 @@ class TestRun(TestCase):
           --not-interactive     Skip tests that require interactivity
           -n, --dry-run         Don't actually run any jobs
 
+        execution options:
+          -j N, --jobs N        Run up to N automated jobs at the same time, as soon
+                                as their dependencies are satisfied (defaults to 1)
+          --resource-workers N  Run up to N resource jobs at the same time (defaults
+                                to the number of CPUs)
+
         output options:
           -f FORMAT, --output-format FORMAT
                                 Save test results in the specified FORMAT (pass ? for
@@ -87,6 +99,9 @@ class TestRun(TestCase):
           -o FILE, --output-file FILE
                                 Save test results to the specified FILE (or to stdout
                                 if FILE is -)
+          --extra-output FORMAT:FILE
+                                Also save test results in the specified FORMAT to
+                                FILE, can be used multiple times
           -t TRANSPORT, --transport TRANSPORT
                                 use TRANSPORT to send results somewhere (pass ? for a
                                 list of choices)
@@ -156,13 +171,70 @@ class TestRun(TestCase):
             self.assertEqual(call.exception.args, (0,))
         expected = """
         Each format may support a different set of options
-        json: with-io-log, squash-io-log, flatten-io-log, with-run-list, with-job-list, with-resource-map, with-job-defs, with-attachments, with-comments, with-job-via, with-job-hash, machine-json
-        rfc822: with-io-log, squash-io-log, flatten-io-log, with-run-list, with-job-list, with-resource-map, with-job-defs, with-attachments, with-comments, with-job-via, with-job-hash
-        text: with-io-log, squash-io-log, flatten-io-log, with-run-list, with-job-list, with-resource-map, with-job-defs, with-attachments, with-comments, with-job-via, with-job-hash
+        json: with-io-log, squash-io-log, flatten-io-log, with-run-list, with-job-list, with-resource-map, with-job-defs, with-attachments, with-comments, with-job-via, with-job-hash, with-resource-usage, machine-json
+        rfc822: with-io-log, squash-io-log, flatten-io-log, with-run-list, with-job-list, with-resource-map, with-job-defs, with-attachments, with-comments, with-job-via, with-job-hash, with-resource-usage
+        text: with-io-log, squash-io-log, flatten-io-log, with-run-list, with-job-list, with-resource-map, with-job-defs, with-attachments, with-comments, with-job-via, with-job-hash, with-resource-usage
         xml: 
         """
         self.assertEqual(io.combined, cleandoc(expected) + "\n")
 
+    def test_invalid_resource_workers(self):
+        for value in ('0', '-1', 'many'):
+            with TestIO(combined=True) as io:
+                with self.assertRaises(SystemExit) as call:
+                    main(['run', '--resource-workers', value])
+                self.assertEqual(call.exception.args, (2,))
+            self.assertIn(
+                "argument --resource-workers: must be a positive number",
+                io.combined)
+
+    def test_invalid_jobs(self):
+        for value in ('0', '-1', 'many'):
+            with TestIO(combined=True) as io:
+                with self.assertRaises(SystemExit) as call:
+                    main(['run', '--jobs', value])
+                self.assertEqual(call.exception.args, (2,))
+            self.assertIn(
+                "argument -j/--jobs: must be a positive number", io.combined)
+
     def tearDown(self):
         shutil.rmtree(self._sandbox)
         os.environ = self._env
+
+
+class LocalJobTests(TestCase):
+
+    def _make_job(self, name, plugin):
+        return JobDefinition({'name': name, 'plugin': plugin})
+
+    def test_successive_local_jobs(self):
+        # Each of the local jobs adds a new job, all of them must run
+        local_list = [self._make_job('local-{}'.format(index), 'local')
+                      for index in range(2)]
+        generated_map = {
+            job.name: self._make_job(
+                'generated-{}'.format(index), 'shell')
+            for index, job in enumerate(local_list)}
+        session = SessionState(local_list)
+        session.update_desired_job_list(local_list)
+        session.persistent_save = Mock()
+        ran_list = []
+
+        def run_single_job(ns, session, runner, job):
+            ran_list.append(job.name)
+            session.update_job_result(job, MemoryJobResult({
+                'outcome': IJobResult.OUTCOME_PASS}))
+            if job.name in generated_map:
+                session.add_job(generated_map[job.name])
+
+        ns = Mock(jobs=1, whitelist=None, exclude_pattern_list=[],
+                  include_pattern_list=['.*'])
+        invocation = RunInvocation(Mock(), ns)
+        with patch.object(invocation, '_run_resource_jobs_with_session'), \
+                patch.object(invocation, '_run_single_job_with_session',
+                             side_effect=run_single_job), \
+                patch('sys.stdout'):
+            invocation._run_jobs_with_session(ns, session, Mock())
+        self.assertEqual(
+            sorted(ran_list),
+            ['generated-0', 'generated-1', 'local-0', 'local-1'])
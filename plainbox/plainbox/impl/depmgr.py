@@ -32,6 +32,8 @@ from itertools import chain
 from itertools import repeat
 from logging import getLogger
 
+from plainbox.impl.tracing import traced
+
 
 logger = getLogger("plainbox.depmgr")
 
@@ -183,6 +185,10 @@ class DependencySolver:
 
     Uses a simple depth-first search to discover the sequence of jobs that can
     run. Use the resolve_dependencies() class method to get the solution.
+
+    The search is iterative (so very long dependency chains are not a
+    problem) and does not stop at the first problem. Use :meth:`solve()` to
+    get both the solution and the list of all the problems that were found.
     """
 
     # Node colors:
@@ -193,6 +199,7 @@ class DependencySolver:
     COLOR_WHITE, COLOR_GRAY, COLOR_BLACK = range(3)
 
     @classmethod
+    @traced("resolve dependencies", "depmgr")
     def resolve_dependencies(cls, job_list, visit_list=None):
         """
         Solve the dependency graph expressed as a list of job definitions.
@@ -213,62 +220,116 @@ class DependencySolver:
         """
         return cls(job_list)._solve(visit_list)
 
-    def __init__(self, job_list):
+    def __init__(self, job_list, strict=True):
         """
         Instantiate a new dependency solver with the specified list of jobs
 
+        :param job_list:
+            list of known jobs
+        :param strict:
+            if True (the default) duplicate jobs cause an exception to be
+            raised right away, otherwise they are reported as problems by
+            :meth:`solve()` and only the first of the duplicate jobs is used
+
         :raises DependencyDuplicateError:
-            if the initial job_list has any duplicate jobs
+            if the initial job_list has any duplicate jobs (in strict mode)
         """
         # Remember the jobs that were passed
         self._job_list = job_list
         # Build a map of jobs (by name)
-        self._job_map = self._get_job_map(job_list)
+        if strict:
+            self._job_map = self._get_job_map(job_list)
+            self._duplicate_list = []
+        else:
+            self._job_map, self._duplicate_list = (
+                self._get_job_map_and_duplicate_list(job_list))
         # Job colors, maps from job.name to COLOR_xxx
-        self._job_color_map = {job.name: self.COLOR_WHITE for job in job_list}
-        # The computed solution, made out of job instances. This is not
-        # necessarily the only solution but the algorithm computes the same
-        # value each time, given the same input.
-        self._solution = []
-
-    def _solve(self, visit_list=None):
+        self._job_color_map = {
+            name: self.COLOR_WHITE for name in self._job_map}
+        # Sorted list of dependencies of each visited job, see
+        # _get_dependency_list()
+        self._dependency_map = {}
+        # Names of jobs that cannot run: jobs with missing dependencies, jobs
+        # that are a part of a dependency loop and all the jobs that depend
+        # on any of those.
+        self._broken_set = set()
+        # All the problems found so far, in the order they were found in
+        self._problem_list = []
+        # Problems found while visiting each job (by job name)
+        self._problem_map = {}
+
+    @traced("solve dependencies", "depmgr")
+    def solve(self, visit_list=None):
         """
-        Internal method of DependencySolver.
+        Solve the dependency graph, collecting all the problems.
 
-        Solves the dependency graph and returns the solution.
-
-        Calls _visit() on each of the initial nodes/jobs
+        :param list visit_list: (optional) list of jobs to solve
+        :returns:
+            A tuple (solution, problem_list). The solution is a list of jobs
+            to execute in order, it contains all the jobs from visit_list
+            that can run, along with their dependencies. The problem_list is
+            a list of DependencyError instances that describe all the
+            problems that prevented some of the jobs from visit_list from
+            getting into the solution.
+
+        Each job from visit_list that has a missing dependency, that is a
+        part of a dependency loop or that depends (directly or indirectly) on
+        such a job is left out of the solution. The solution is identical to
+        what :meth:`resolve_dependencies()` would return if visit_list was
+        stripped of all those jobs.
+
+        This method can be called any number of times, with different
+        visit_list values. Only jobs that were never visited before are
+        examined again so solving for a visit_list that differs by just a
+        few jobs is cheap.
         """
-        # Visit the visit list
-        logger.debug("Starting solve")
         if visit_list is None:
             visit_list = self._job_list
+        logger.debug("Starting solve")
         for job in visit_list:
             self._visit(job)
         logger.debug("Done solving")
-        # Return the solution
-        return self._solution
+        solution = self._get_solution(
+            [job for job in visit_list if job.name not in self._broken_set])
+        problem_list = self._get_problem_list(visit_list)
+        return solution, problem_list
 
-    def _visit(self, job, trail=None):
+    def _solve(self, visit_list=None):
+        """
+        Internal method of DependencySolver.
+
+        Solves the dependency graph and returns the solution.
+
+        Raises the first problem that was found, if any.
+        """
+        solution, problem_list = self.solve(visit_list)
+        if problem_list:
+            raise problem_list[0]
+        return solution
+
+    def _visit(self, job):
         """
         Internal method of DependencySolver
 
-        Called each time a node is visited. Nodes already seen in _visited are
-        skipped. Attempts to enumerate all dependencies (both direct and
-        resource) and resolve them. Missing jobs cause DependencyMissingError
-        to be raised. Calls _visit recursively on all dependencies.
-        """
-        color = self._job_color_map[job.name]
-        logger.debug("Visiting job %s (color %s)", job, color)
-        if color == self.COLOR_WHITE:
-            # This node has not been visited yet. Let's mark it as GRAY (being
-            # visited) and iterate through the list of dependencies
-            self._job_color_map[job.name] = self.COLOR_GRAY
-            # If the trail was not specified start a trail for this node
-            if trail is None:
-                trail = [job]
-            # Visit each dependency
-            for dep_type, job_name in sorted(self._get_dependency_set(job)):
+        Walks the graph of all the dependencies of the specified job, unless
+        the job was visited already. Colors all the jobs black and finds all
+        the problems (missing jobs and dependency loops) along the way.
+
+        The walk is an iterative depth-first search. Dependencies of each job
+        are visited in a sorted order so that the results are always the
+        same, given the same input.
+        """
+        if self._job_color_map[job.name] != self.COLOR_WHITE:
+            return
+        logger.debug("Visiting job %s", job)
+        self._job_color_map[job.name] = self.COLOR_GRAY
+        # The trail is the path from the initial job to the job being visited
+        # right now, all jobs on the trail are gray. The stack holds an
+        # iterator over the remaining dependencies of each job on the trail.
+        trail = [job]
+        stack = [iter(self._get_dependency_list(job))]
+        while stack:
+            for dep_type, job_name in stack[-1]:
                 logger.debug("Found dependency %s: %s", dep_type, job_name)
                 # Dependency is just a name, we need to resolve it
                 # to a job instance. This can fail (missing dependencies)
@@ -276,30 +337,124 @@ class DependencySolver:
                 try:
                     next_job = self._job_map[job_name]
                 except KeyError:
-                    raise DependencyMissingError(job, job_name, dep_type)
-                else:
-                    # For each dependency that we visit let's reuse the trail
-                    # to give proper error messages if a dependency loop exists
+                    self._add_problem(DependencyMissingError(
+                        trail[-1], job_name, dep_type))
+                    self._broken_set.add(trail[-1].name)
+                    continue
+                color = self._job_color_map[next_job.name]
+                if color == self.COLOR_WHITE:
+                    # Descend into this job, the remaining dependencies of
+                    # the current job are visited after it's done.
                     logger.debug("Visiting dependency: %r", next_job)
-                    # Update the trail as we visit that node
+                    self._job_color_map[next_job.name] = self.COLOR_GRAY
                     trail.append(next_job)
-                    self._visit(next_job, trail)
-                    trail.pop()
-            # We've visited (recursively) all dependencies of this node,
-            # let's color it black and append it to the solution list.
-            logger.debug("Appending %r to solution", job)
-            self._job_color_map[job.name] = self.COLOR_BLACK
-            self._solution.append(job)
-        elif color == self.COLOR_GRAY:
-            # This node is not fully traced yet but has been visited already
-            # so we've found a dependency loop. We need to cut the initial
-            # part of the trail so that we only report the part that actually
-            # forms a loop
-            raise DependencyCycleError(trail[trail.index(job):])
-        else:
-            assert color == self.COLOR_BLACK
-            # This node has been visited and is fully traced.
-            # We can just skip it and go back
+                    stack.append(iter(self._get_dependency_list(next_job)))
+                    break
+                elif color == self.COLOR_GRAY:
+                    # This node is not fully traced yet but has been visited
+                    # already so we've found a dependency loop. We need to cut
+                    # the initial part of the trail so that we only report the
+                    # part that actually forms a loop
+                    loop = trail[trail.index(next_job):]
+                    self._add_problem(
+                        DependencyCycleError(loop + [next_job]))
+                    self._broken_set.update(
+                        loop_job.name for loop_job in loop)
+                else:
+                    assert color == self.COLOR_BLACK
+                    # This node has been visited and is fully traced.
+                    if next_job.name in self._broken_set:
+                        self._broken_set.add(trail[-1].name)
+            else:
+                # We've visited all dependencies of this node, let's color it
+                # black and go back to the job that depends on it.
+                stack.pop()
+                done_job = trail.pop()
+                self._job_color_map[done_job.name] = self.COLOR_BLACK
+                if trail and done_job.name in self._broken_set:
+                    self._broken_set.add(trail[-1].name)
+
+    def _add_problem(self, problem):
+        """
+        Internal method of DependencySolver
+
+        Remember a problem that was found while visiting the affected job
+        """
+        logger.debug("Found problem: %s", problem)
+        self._problem_list.append(problem)
+        self._problem_map.setdefault(
+            problem.affected_job.name, []).append(problem)
+
+    def _get_solution(self, visit_list):
+        """
+        Internal method of DependencySolver
+
+        Computes the solution for jobs that were already visited and that
+        can run. Only the jobs reachable from visit_list are included and
+        each job comes after all of its dependencies.
+        """
+        solution = []
+        done_set = set()
+        for job in visit_list:
+            if job.name in done_set:
+                continue
+            done_set.add(job.name)
+            trail = [job]
+            stack = [iter(self._dependency_map[job.name])]
+            while stack:
+                for dep_type, job_name in stack[-1]:
+                    if job_name not in done_set:
+                        done_set.add(job_name)
+                        next_job = self._job_map[job_name]
+                        trail.append(next_job)
+                        stack.append(iter(self._dependency_map[job_name]))
+                        break
+                else:
+                    stack.pop()
+                    logger.debug("Appending %r to solution", trail[-1])
+                    solution.append(trail.pop())
+        return solution
+
+    def _get_problem_list(self, visit_list):
+        """
+        Internal method of DependencySolver
+
+        Computes the list of problems (including duplicates) that affect any
+        of the jobs reachable from visit_list, in the order they were found.
+        """
+        problem_set = set()
+        seen_set = set()
+        todo_list = [job.name for job in visit_list
+                     if job.name in self._broken_set]
+        while todo_list:
+            job_name = todo_list.pop()
+            if job_name in seen_set:
+                continue
+            seen_set.add(job_name)
+            problem_set.update(
+                id(problem)
+                for problem in self._problem_map.get(job_name, ()))
+            todo_list.extend(
+                dep_name
+                for dep_type, dep_name in self._dependency_map[job_name]
+                if dep_name in self._broken_set)
+        return self._duplicate_list + [
+            problem for problem in self._problem_list
+            if id(problem) in problem_set]
+
+    def _get_dependency_list(self, job):
+        """
+        Internal method of DependencySolver
+
+        Returns a sorted list of pairs (dep_type, job_name), as computed by
+        _get_dependency_set(). The list is computed only once for each job.
+        """
+        try:
+            return self._dependency_map[job.name]
+        except KeyError:
+            dependency_list = sorted(self._get_dependency_set(job))
+            self._dependency_map[job.name] = dependency_list
+            return dependency_list
 
     @staticmethod
     def _get_job_map(job_list):
@@ -317,6 +472,25 @@ class DependencySolver:
                 job_map[job.name] = job
         return job_map
 
+    @staticmethod
+    def _get_job_map_and_duplicate_list(job_list):
+        """
+        Internal method of DependencySolver.
+
+        Computes a map of job.name => job and a list of
+        DependencyDuplicateError, one for each collision. The first job with
+        any given name is used.
+        """
+        job_map = {}
+        duplicate_list = []
+        for job in job_list:
+            if job.name in job_map:
+                duplicate_list.append(
+                    DependencyDuplicateError(job_map[job.name], job))
+            else:
+                job_map[job.name] = job
+        return job_map, duplicate_list
+
     @staticmethod
     def _get_dependency_set(job):
         """
@@ -0,0 +1,347 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+:mod:`plainbox.impl.executor` -- bounded pool of job workers
+============================================================
+
+The service runs jobs on behalf of its clients. :class:`JobExecutor` runs
+them in a bounded number of worker threads. Jobs that wait for a free worker
+are kept in one queue per session and the queues are served in turn, so that
+a client that queues many jobs doesn't hold up all the others. Queued jobs
+can be cancelled, running jobs can be killed and the whole executor can be
+shut down.
+
+.. warning::
+
+    THIS MODULE DOES NOT HAVE STABLE PUBLIC API
+"""
+
+from collections import OrderedDict
+from collections import deque
+import logging
+import multiprocessing
+import threading
+import time
+
+logger = logging.getLogger("plainbox.executor")
+
+
+class JobTicket:
+    """
+    Handle of a job submitted to a :class:`JobExecutor`
+
+    The state of a ticket is one of the ``STATE_`` constants. It starts as
+    STATE_QUEUED, becomes STATE_RUNNING once a worker picks the job up and
+    ends as either STATE_DONE, STATE_FAILED (the job raised an exception) or
+    STATE_CANCELLED (the job was cancelled before it started).
+    """
+
+    STATE_QUEUED = 'queued'
+    STATE_RUNNING = 'running'
+    STATE_DONE = 'done'
+    STATE_FAILED = 'failed'
+    STATE_CANCELLED = 'cancelled'
+
+    def __init__(self, executor, key, func, args, kill):
+        self._executor = executor
+        self._func = func
+        self._args = args
+        self._kill = kill
+        self._finished = threading.Event()
+        self.key = key
+        self.state = self.STATE_QUEUED
+        self.kill_requested = False
+
+    def __repr__(self):
+        return "<{} key:{!r} state:{!r}>".format(
+            self.__class__.__name__, self.key, self.state)
+
+    def cancel(self):
+        """
+        Cancel the job if it is queued or kill it if it is running
+
+        :returns:
+            True if the job was cancelled or killed, False if it has finished
+            already or if it cannot be killed
+        """
+        return self._executor.cancel(self)
+
+    def wait(self, timeout=None):
+        """
+        Wait until the job has finished or was cancelled
+
+        :returns:
+            True unless the timeout has expired first
+        """
+        return self._finished.wait(timeout)
+
+
+class JobExecutor:
+    """
+    Pool of worker threads that run jobs queued per session
+
+    Worker threads are started when needed, up to max_workers of them, and
+    then wait for more jobs until the executor is shut down. Workers are
+    daemon threads so that a job that cannot be killed never prevents the
+    process from exiting.
+    """
+
+    def __init__(self, max_workers=None):
+        """
+        Initialize a new executor
+
+        :param max_workers:
+            Maximum number of jobs running at the same time. Defaults to the
+            number of CPUs available on this machine.
+        """
+        if max_workers is None:
+            max_workers = multiprocessing.cpu_count()
+        if max_workers < 1:
+            raise ValueError("max_workers must be a positive number")
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        # key -> deque of queued tickets, in the order of service
+        self._queue_map = OrderedDict()
+        self._num_queued = 0
+        self._running_set = set()
+        self._thread_list = []
+        self._num_idle = 0
+        self._shutdown = False
+        self._num_done = 0
+        self._num_failed = 0
+        self._num_cancelled = 0
+
+    @property
+    def max_workers(self):
+        """
+        maximum number of jobs running at the same time
+        """
+        return self._max_workers
+
+    def submit(self, key, func, *args, kill=None):
+        """
+        Queue a call to func(*args)
+
+        :param key:
+            Key of the queue for the job, normally the session the job
+            belongs to
+        :param kill:
+            Optional callable that, when called from another thread, makes
+            func return early
+        :returns:
+            A :class:`JobTicket`
+        :raises RuntimeError:
+            If the executor was shut down
+        """
+        ticket = JobTicket(self, key, func, args, kill)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit jobs after shutdown")
+            if key not in self._queue_map:
+                self._queue_map[key] = deque()
+            self._queue_map[key].append(ticket)
+            self._num_queued += 1
+            if (self._num_idle < self._num_queued
+                    and len(self._thread_list) < self._max_workers):
+                thread = threading.Thread(
+                    target=self._worker, name="job-worker-{}".format(
+                        len(self._thread_list)))
+                thread.daemon = True
+                thread.start()
+                self._thread_list.append(thread)
+            else:
+                self._condition.notify()
+        logger.debug("Queued %r", ticket)
+        return ticket
+
+    def cancel(self, ticket):
+        """
+        Cancel a queued job or kill a running one
+
+        See :meth:`JobTicket.cancel()`
+        """
+        with self._lock:
+            if ticket.state == ticket.STATE_QUEUED:
+                self._remove_queued(ticket)
+                ticket.state = ticket.STATE_CANCELLED
+                self._num_cancelled += 1
+                cancelled = True
+            elif ticket.state == ticket.STATE_RUNNING:
+                ticket.kill_requested = True
+                cancelled = False
+            else:
+                return False
+        if cancelled:
+            logger.info("Cancelled %r", ticket)
+            ticket._finished.set()
+            return True
+        if ticket._kill is None:
+            logger.warning("Cannot kill %r", ticket)
+            return False
+        logger.info("Killing %r", ticket)
+        ticket._kill()
+        return True
+
+    def get_queue_depth(self, key=None):
+        """
+        Get the number of queued jobs
+
+        :param key:
+            Key of the queue to look at, all the queues by default
+        """
+        with self._lock:
+            if key is None:
+                return self._num_queued
+            return len(self._queue_map.get(key, ()))
+
+    def get_metrics(self):
+        """
+        Get the current state of the executor
+
+        :returns:
+            A dictionary with the maximum number of workers
+            (``max_workers``), the number of worker threads (``workers``),
+            the number of jobs that are queued (``queued``) and running
+            (``running``) and the number of jobs that have finished
+            (``done``), raised an exception (``failed``) or were cancelled
+            (``cancelled``) so far.
+        """
+        with self._lock:
+            return {
+                'max_workers': self._max_workers,
+                'workers': len(self._thread_list),
+                'queued': self._num_queued,
+                'running': len(self._running_set),
+                'done': self._num_done,
+                'failed': self._num_failed,
+                'cancelled': self._num_cancelled,
+            }
+
+    def shutdown(self, timeout=None, wait=True):
+        """
+        Stop accepting jobs, cancel all the queued jobs and wait for the
+        running ones
+
+        :param timeout:
+            Number of seconds to wait for running jobs. Jobs that are still
+            running then are killed and waited for up to timeout seconds
+            more. By default running jobs are waited for without limit.
+        :param wait:
+            If False, running jobs are killed at once and this method
+            returns without waiting for them
+        :returns:
+            True if all the jobs have finished
+
+        Calling this method again just waits for the running jobs.
+        """
+        with self._lock:
+            self._shutdown = True
+            cancelled_list = []
+            for queue in self._queue_map.values():
+                cancelled_list.extend(queue)
+            self._queue_map.clear()
+            self._num_queued = 0
+            for ticket in cancelled_list:
+                ticket.state = ticket.STATE_CANCELLED
+            self._num_cancelled += len(cancelled_list)
+            self._condition.notify_all()
+            thread_list = list(self._thread_list)
+        for ticket in cancelled_list:
+            ticket._finished.set()
+        if cancelled_list:
+            logger.info("Cancelled %d queued job(s)", len(cancelled_list))
+        if not wait:
+            self._kill_running()
+            return self._join(thread_list, 0)
+        if self._join(thread_list, timeout):
+            return True
+        self._kill_running()
+        if self._join(thread_list, timeout):
+            return True
+        logger.error("Some jobs could not be stopped")
+        return False
+
+    def _kill_running(self):
+        with self._lock:
+            running_list = list(self._running_set)
+        if running_list:
+            logger.warning("Killing %d job(s) that are still running",
+                           len(running_list))
+        for ticket in running_list:
+            self.cancel(ticket)
+
+    def _join(self, thread_list, timeout):
+        if timeout is not None:
+            deadline = time.time() + timeout
+        for thread in thread_list:
+            if timeout is None:
+                thread.join()
+            else:
+                thread.join(max(0, deadline - time.time()))
+        return not any(thread.is_alive() for thread in thread_list)
+
+    def _remove_queued(self, ticket):
+        queue = self._queue_map[ticket.key]
+        queue.remove(ticket)
+        if not queue:
+            del self._queue_map[ticket.key]
+        self._num_queued -= 1
+
+    def _pop_queued(self):
+        """
+        Take the next ticket, from the queues in turn
+        """
+        for key, queue in self._queue_map.items():
+            ticket = queue.popleft()
+            if queue:
+                self._queue_map.move_to_end(key)
+            else:
+                del self._queue_map[key]
+            self._num_queued -= 1
+            return ticket
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                ticket = self._pop_queued()
+                while ticket is None:
+                    if self._shutdown:
+                        return
+                    self._num_idle += 1
+                    self._condition.wait()
+                    self._num_idle -= 1
+                    ticket = self._pop_queued()
+                ticket.state = ticket.STATE_RUNNING
+                self._running_set.add(ticket)
+            logger.debug("Running %r", ticket)
+            try:
+                ticket._func(*ticket._args)
+            except Exception:
+                logger.exception("Job %r failed", ticket)
+                state = ticket.STATE_FAILED
+            else:
+                state = ticket.STATE_DONE
+            with self._lock:
+                self._running_set.discard(ticket)
+                ticket.state = state
+                if state == ticket.STATE_DONE:
+                    self._num_done += 1
+                else:
+                    self._num_failed += 1
+            ticket._finished.set()
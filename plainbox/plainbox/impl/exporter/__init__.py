@@ -31,6 +31,11 @@ from collections import OrderedDict
 from io import RawIOBase
 from logging import getLogger
 import base64
+import codecs
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping  # python3.2
 
 import pkg_resources
 
@@ -53,6 +58,40 @@ class classproperty:
         return self.func(owner)
 
 
+class LazyMap(Mapping):
+    """
+    Read-only mapping with values computed on demand.
+
+    The keys are known in advance but each value is computed by calling a
+    function, with the key as the only argument, each time it is accessed.
+    Values are never stored so iterating over :meth:`items()` only keeps one
+    value in memory at a time.
+    """
+
+    def __init__(self, key_list, value_fn):
+        self._key_list = key_list
+        self._key_set = frozenset(key_list)
+        self._value_fn = value_fn
+
+    def __getitem__(self, key):
+        if key not in self._key_set:
+            raise KeyError(key)
+        return self._value_fn(key)
+
+    def __contains__(self, key):
+        return key in self._key_set
+
+    def __iter__(self):
+        return iter(self._key_list)
+
+    def __len__(self):
+        return len(self._key_list)
+
+    def __repr__(self):
+        return "<{} with {} item(s)>".format(
+            self.__class__.__name__, len(self._key_list))
+
+
 class SessionStateExporterBase(metaclass=ABCMeta):
     """
     Base class for "exporter" that write out the state of the session after all
@@ -77,6 +116,7 @@ class SessionStateExporterBase(metaclass=ABCMeta):
     OPTION_WITH_COMMENTS = 'with-comments'
     OPTION_WITH_JOB_VIA = 'with-job-via'
     OPTION_WITH_JOB_HASH = 'with-job-hash'
+    OPTION_WITH_RESOURCE_USAGE = 'with-resource-usage'
 
     SUPPORTED_OPTION_LIST = (
         OPTION_WITH_IO_LOG,
@@ -90,6 +130,7 @@ class SessionStateExporterBase(metaclass=ABCMeta):
         OPTION_WITH_COMMENTS,
         OPTION_WITH_JOB_VIA,
         OPTION_WITH_JOB_HASH,
+        OPTION_WITH_RESOURCE_USAGE,
     )
 
     def __init__(self, option_list=None):
@@ -118,17 +159,44 @@ class SessionStateExporterBase(metaclass=ABCMeta):
         care must be taken when processing io_log (and in the future,
         attachments) as those can be arbitrarily large.
         """
-        data = {
-            'result_map': {}
-        }
-        if self.OPTION_WITH_JOB_LIST in self._option_list:
+        data = self.get_lazy_session_data_subset(session)
+        data['result_map'] = dict(data['result_map'].items())
+        if 'attachment_map' in data:
+            data['attachment_map'] = dict(data['attachment_map'].items())
+        return data
+
+    def get_lazy_session_data_subset(self, session, option_list=None):
+        """
+        Compute a subset of session data, lazily.
+
+        This returns the same data as :meth:`get_session_data_subset()` except
+        that ``result_map`` and ``attachment_map`` are :class:`LazyMap`
+        instances. The record of each job (including the IO log or the
+        attachment, which can be arbitrarily large) is computed only when it
+        is accessed and is not kept afterwards. Exporters that write each
+        record as soon as it is computed only need as much memory as the
+        largest record, regardless of the size of the session.
+
+        The optional option_list argument overrides the options of the
+        exporter.
+        """
+        if option_list is None:
+            option_list = self._option_list
+        job_state_map = session.job_state_map
+        data = {}
+        data['result_map'] = LazyMap(
+            [job_name for job_name, job_state in job_state_map.items()
+             if job_state.result.outcome is not None],
+            lambda job_name: self._get_result_record(
+                job_state_map[job_name], option_list))
+        if self.OPTION_WITH_JOB_LIST in option_list:
             data['job_list'] = [job.name for job in session.job_list]
-        if self.OPTION_WITH_RUN_LIST in self._option_list:
+        if self.OPTION_WITH_RUN_LIST in option_list:
             data['run_list'] = [job.name for job in session.run_list]
-        if self.OPTION_WITH_DESIRED_JOB_LIST in self._option_list:
+        if self.OPTION_WITH_DESIRED_JOB_LIST in option_list:
             data['desired_job_list'] = [job.name
                                         for job in session.desired_job_list]
-        if self.OPTION_WITH_RESOURCE_MAP in self._option_list:
+        if self.OPTION_WITH_RESOURCE_MAP in option_list:
             data['resource_map'] = {
                 # TODO: there is no method to get all data from a Resource
                 # instance and there probably should be. Or just let there be
@@ -141,68 +209,70 @@ class SessionStateExporterBase(metaclass=ABCMeta):
                 for resource_name, resource_list
                 in session._resource_map.items()
             }
-        if self.OPTION_WITH_ATTACHMENTS in self._option_list:
-            data['attachment_map'] = {}
-        for job_name, job_state in session.job_state_map.items():
-            if job_state.result.outcome is None:
-                continue
-            data['result_map'][job_name] = OrderedDict()
-            data['result_map'][job_name]['outcome'] = job_state.result.outcome
-            if job_state.result.execution_duration:
-                data['result_map'][job_name]['execution_duration'] = \
-                    job_state.result.execution_duration
-            if self.OPTION_WITH_COMMENTS in self._option_list:
-                data['result_map'][job_name]['comments'] = \
-                    job_state.result.comments
-
-            # Add Parent hash if requested
-            if self.OPTION_WITH_JOB_VIA in self._option_list:
-                data['result_map'][job_name]['via'] = \
-                    job_state.job.via
-
-            # Add Job hash if requested
-            if self.OPTION_WITH_JOB_HASH in self._option_list:
-                data['result_map'][job_name]['hash'] = \
-                    job_state.job.get_checksum()
-
-            # Add Job definitions if requested
-            if self.OPTION_WITH_JOB_DEFS in self._option_list:
-                for prop in ('plugin',
-                             'requires',
-                             'depends',
-                             'command',
-                             'description',
-                             ):
-                    if not getattr(job_state.job, prop):
-                        continue
-                    data['result_map'][job_name][prop] = getattr(
-                        job_state.job, prop)
-
-            # Add Attachments if requested
-            if job_state.job.plugin == 'attachment':
-                if self.OPTION_WITH_ATTACHMENTS in self._option_list:
-                    raw_bytes = b''.join(
-                        (record[2] for record in
-                         job_state.result.get_io_log() if record[1] == 'stdout'))
-                    data['attachment_map'][job_name] = \
-                        base64.standard_b64encode(raw_bytes).decode('ASCII')
-                continue  # Don't add attachments IO logs to the result_map
-
-            # Add IO log if requested
-            if self.OPTION_WITH_IO_LOG in self._option_list:
-                # If requested, squash the IO log so that only textual data is
-                # saved, discarding stream name and the relative timestamp.
-                if self.OPTION_SQUASH_IO_LOG in self._option_list:
-                    io_log_data = self._squash_io_log(
-                        job_state.result.get_io_log())
-                elif self.OPTION_FLATTEN_IO_LOG in self._option_list:
-                    io_log_data = self._flatten_io_log(
-                        job_state.result.get_io_log())
-                else:
-                    io_log_data = self._io_log(job_state.result.get_io_log())
-                data['result_map'][job_name]['io_log'] = io_log_data
+        if self.OPTION_WITH_ATTACHMENTS in option_list:
+            data['attachment_map'] = LazyMap(
+                [job_name for job_name, job_state in job_state_map.items()
+                 if job_state.result.outcome is not None
+                 and job_state.job.plugin == 'attachment'],
+                lambda job_name: base64.standard_b64encode(
+                    job_state_map[job_name].result.stdout_bytes()
+                ).decode('ASCII'))
         return data
 
+    def _get_result_record(self, job_state, option_list):
+        """
+        Compute the record of one job, as stored in ``result_map``
+        """
+        record = OrderedDict()
+        record['outcome'] = job_state.result.outcome
+        if job_state.result.execution_duration:
+            record['execution_duration'] = \
+                job_state.result.execution_duration
+        if (self.OPTION_WITH_RESOURCE_USAGE in option_list
+                and job_state.result.resource_usage):
+            record['resource_usage'] = job_state.result.resource_usage
+        if self.OPTION_WITH_COMMENTS in option_list:
+            record['comments'] = job_state.result.comments
+
+        # Add Parent hash if requested
+        if self.OPTION_WITH_JOB_VIA in option_list:
+            record['via'] = job_state.job.via
+
+        # Add Job hash if requested
+        if self.OPTION_WITH_JOB_HASH in option_list:
+            record['hash'] = job_state.job.get_checksum()
+
+        # Add Job definitions if requested
+        if self.OPTION_WITH_JOB_DEFS in option_list:
+            for prop in ('plugin',
+                         'requires',
+                         'depends',
+                         'command',
+                         'description',
+                         ):
+                if not getattr(job_state.job, prop):
+                    continue
+                record[prop] = getattr(job_state.job, prop)
+
+        # Attachments are stored in attachment_map, don't add their IO logs
+        if job_state.job.plugin == 'attachment':
+            return record
+
+        # Add IO log if requested
+        if self.OPTION_WITH_IO_LOG in option_list:
+            # If requested, squash the IO log so that only textual data is
+            # saved, discarding stream name and the relative timestamp.
+            if self.OPTION_SQUASH_IO_LOG in option_list:
+                io_log_data = self._squash_io_log(
+                    job_state.result.get_io_log())
+            elif self.OPTION_FLATTEN_IO_LOG in option_list:
+                io_log_data = self._flatten_io_log(
+                    job_state.result.get_io_log())
+            else:
+                io_log_data = self._io_log(job_state.result.get_io_log())
+            record['io_log'] = io_log_data
+        return record
+
     @classmethod
     def _squash_io_log(cls, io_log):
         # Squash the IO log by discarding everything except for the 'data'
@@ -243,6 +313,18 @@ class SessionStateExporterBase(metaclass=ABCMeta):
         """
         # TODO: Add a way for the stream to be binary as well.
 
+    def dump_from_session(self, session, stream):
+        """
+        Dump the data of the specified session to stream.
+
+        This is equivalent to calling :meth:`dump()` with the data returned
+        by :meth:`get_session_data_subset()`. Exporters that can write the
+        data of each job as soon as it is computed should override this
+        method to use :meth:`get_lazy_session_data_subset()` instead, so
+        that the data of the whole session is never kept in memory.
+        """
+        self.dump(self.get_session_data_subset(session), stream)
+
 
 class ByteStringStreamTranslator(RawIOBase):
     """
@@ -271,13 +353,16 @@ class ByteStringStreamTranslator(RawIOBase):
         """
         self.dest_stream = dest_stream
         self.encoding = encoding
+        # Exporters that write incrementally can split a multi-byte
+        # character across two writes, decode incrementally to handle that.
+        self._decoder = codecs.getincrementaldecoder(encoding)()
 
     def write(self, data):
         """ Writes to the stream, takes bytes and decodes them per the
             object's specified encoding prior to writing.
             :param data: the chunk of data to write.
         """
-        return self.dest_stream.write(data.decode(self.encoding))
+        return self.dest_stream.write(self._decoder.decode(data))
 
 
 def get_all_exporters():
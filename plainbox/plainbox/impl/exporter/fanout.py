@@ -0,0 +1,285 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+:mod:`plainbox.impl.exporter.fanout` -- export to many formats at once
+======================================================================
+
+Exporting a session to several formats one after another means reading the
+IO log of every job once for each format. :class:`SessionStateExportFanOut`
+runs all the exporters at the same time, each one in a worker thread, over a
+shared view of the session. IO logs are read through a shared cache, bounded
+in size, so that the log of each job is read from disk once, by whichever
+exporter needs it first, and dropped as soon as all the other exporters have
+used it.
+
+.. warning::
+
+    THIS MODULE DOES NOT HAVE STABLE PUBLIC API
+"""
+
+from collections import OrderedDict
+import logging
+import sys
+import threading
+
+from plainbox.impl.tracing import span
+
+
+logger = logging.getLogger("plainbox.exporter.fanout")
+
+
+class SessionStateExportFanOut:
+    """
+    Exporter of one session to several (exporter, stream) sinks at once
+
+    Each sink is an exporter (an instance of
+    :class:`~plainbox.impl.exporter.SessionStateExporterBase`) and a binary
+    stream that it writes to. Each exporter gets exactly the same output as
+    it would when exporting the session on its own.
+    """
+
+    # Maximum size of the IO logs kept in memory by default, in bytes
+    DEFAULT_MAX_CACHED_BYTES = 32 * 1024 * 1024
+
+    def __init__(self, max_cached_bytes=DEFAULT_MAX_CACHED_BYTES,
+                 use_threads=True):
+        """
+        Initialize a fan-out without any sinks
+
+        :param max_cached_bytes:
+            Maximum total size of the data of the IO logs kept in memory. An
+            exporter that falls behind the others by more than that reads
+            the logs it missed again. A single log that is bigger than that
+            is still kept until another log is read.
+        :param use_threads:
+            If True, each exporter runs in a separate thread. Otherwise they
+            run one after another, which only saves reading IO logs that
+            are still in the cache.
+        """
+        self._max_cached_bytes = max_cached_bytes
+        self._use_threads = use_threads
+        self._sink_list = []
+        # Indices of optional sinks in _sink_list
+        self._optional_set = set()
+
+    def add_sink(self, exporter, stream, optional=False):
+        """
+        Add an exporter and the stream that it should write to
+
+        Failures of optional sinks are logged instead of being raised, see
+        :meth:`dump_from_session()`.
+        """
+        self._sink_list.append((exporter, stream))
+        if optional:
+            self._optional_set.add(len(self._sink_list) - 1)
+
+    @property
+    def sink_list(self):
+        """
+        List of (exporter, stream) pairs
+        """
+        return self._sink_list
+
+    def dump_from_session(self, session):
+        """
+        Export the specified session to all the sinks
+
+        Exceptions raised by any of the exporters of sinks that are not
+        optional are re-raised once all the exporters have finished.
+
+        :returns:
+            List of (exporter, stream) pairs of optional sinks that failed
+        """
+        if not self._sink_list:
+            return []
+        cache = _IOLogCache(self._max_cached_bytes, len(self._sink_list))
+        view = _SessionView(session, cache)
+        exc_info_list = [None] * len(self._sink_list)
+        if not self._use_threads or len(self._sink_list) == 1:
+            for index in range(len(self._sink_list)):
+                self._dump_one(index, view, exc_info_list)
+        else:
+            self._dump_concurrently(view, exc_info_list)
+        logger.debug(
+            "Exported to %d sink(s), %d IO log(s) read, %d re-read",
+            len(self._sink_list), cache.num_reads, cache.num_rereads)
+        failed_list = []
+        required_exc_info = None
+        for index, exc_info in enumerate(exc_info_list):
+            if exc_info is None:
+                continue
+            if index in self._optional_set:
+                failed_list.append(self._sink_list[index])
+            elif required_exc_info is None:
+                required_exc_info = exc_info
+                continue
+            logger.error("Exporter failed", exc_info=exc_info)
+        if required_exc_info is not None:
+            raise required_exc_info[1].with_traceback(required_exc_info[2])
+        return failed_list
+
+    def _dump_one(self, index, view, exc_info_list):
+        exporter, stream = self._sink_list[index]
+        try:
+            with span("export sink", "exporter",
+                      exporter=exporter.__class__.__name__):
+                exporter.dump_from_session(view, stream)
+        except BaseException:
+            exc_info_list[index] = sys.exc_info()
+
+    def _dump_concurrently(self, view, exc_info_list):
+        thread_list = [
+            threading.Thread(
+                target=self._dump_one, args=(index, view, exc_info_list),
+                name="export-{}".format(exporter.__class__.__name__))
+            for index, (exporter, stream) in enumerate(self._sink_list)]
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join()
+
+
+class _IOLogCache:
+    """
+    Thread-safe cache of IO logs, shared by all the sinks of a fan-out
+
+    The log of each job is read once and kept until it was used by each sink
+    or until it is the least recently used entry of a full cache. The cache
+    is full when the total size of the data of the logs is over max_bytes,
+    the most recently read log is always kept. Sinks that ask for a log that
+    is being read by another sink wait for that read to finish instead of
+    reading it again.
+    """
+
+    def __init__(self, max_bytes, num_users):
+        self._max_bytes = max_bytes
+        self._num_users = num_users
+        self._lock = threading.Lock()
+        # job name -> [io_log, number of uses, size], in least recently used
+        # order
+        self._entry_map = OrderedDict()
+        self._num_bytes = 0
+        # job name -> event set when the log is read
+        self._pending_map = {}
+        self._read_set = set()
+        self.num_reads = 0
+        self.num_rereads = 0
+
+    def get_io_log(self, job_name, result):
+        """
+        Get the IO log of the specified job, as a tuple of IOLogRecords
+        """
+        while True:
+            with self._lock:
+                entry = self._entry_map.pop(job_name, None)
+                if entry is not None:
+                    entry[1] += 1
+                    if entry[1] < self._num_users:
+                        self._entry_map[job_name] = entry
+                    else:
+                        self._num_bytes -= entry[2]
+                    return entry[0]
+                event = self._pending_map.get(job_name)
+                if event is None:
+                    event = self._pending_map[job_name] = threading.Event()
+                    break
+            # Someone else is reading this log, wait and look again
+            event.wait()
+        try:
+            io_log = tuple(result.get_io_log())
+        except BaseException:
+            with self._lock:
+                del self._pending_map[job_name]
+            event.set()
+            raise
+        # The log is added to the cache before waking up the waiting sinks,
+        # so that they find it there instead of reading it again
+        with self._lock:
+            del self._pending_map[job_name]
+            self.num_reads += 1
+            if job_name in self._read_set:
+                self.num_rereads += 1
+            self._read_set.add(job_name)
+            if self._num_users > 1:
+                size = sum(len(record.data) for record in io_log)
+                self._entry_map[job_name] = [io_log, 1, size]
+                self._num_bytes += size
+                while (self._num_bytes > self._max_bytes
+                       and len(self._entry_map) > 1):
+                    entry = self._entry_map.popitem(last=False)[1]
+                    self._num_bytes -= entry[2]
+        event.set()
+        return io_log
+
+
+class _SessionView:
+    """
+    View of a session that reads IO logs through an :class:`_IOLogCache`
+
+    Everything except for the job state map is taken from the session.
+    """
+
+    def __init__(self, session, cache):
+        self._session = session
+        self.job_state_map = OrderedDict(
+            (job_name, _JobStateView(job_state, cache))
+            for job_name, job_state in session.job_state_map.items())
+
+    def __getattr__(self, attr):
+        return getattr(self._session, attr)
+
+
+class _JobStateView:
+    """
+    View of a job state with a result that reads IO logs from a cache
+    """
+
+    def __init__(self, job_state, cache):
+        self._job_state = job_state
+        self.job = job_state.job
+        self.result = _JobResultView(job_state.job.name, job_state.result,
+                                     cache)
+
+    def __getattr__(self, attr):
+        return getattr(self._job_state, attr)
+
+
+class _JobResultView:
+    """
+    View of a job result that reads IO logs from a cache
+    """
+
+    def __init__(self, job_name, result, cache):
+        self._job_name = job_name
+        self._result = result
+        self._cache = cache
+
+    def __getattr__(self, attr):
+        return getattr(self._result, attr)
+
+    def get_io_log(self):
+        return iter(self._cache.get_io_log(self._job_name, self._result))
+
+    @property
+    def io_log(self):
+        return self._cache.get_io_log(self._job_name, self._result)
+
+    def stdout_bytes(self):
+        return b''.join(
+            record.data for record in self.get_io_log()
+            if record.stream_name == 'stdout')
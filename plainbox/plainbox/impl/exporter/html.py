@@ -143,3 +143,12 @@ class HTMLSessionStateExporter(XMLSessionStateExporter):
         r_tree = transformer(root)
         inlined_result_tree = HTMLResourceInliner().inline_resources(r_tree)
         stream.write(ET.tostring(inlined_result_tree, pretty_print=True))
+
+    def dump_from_session(self, session, stream):
+        """
+        Public method to dump the HTML report of a session to a stream
+
+        The XSLT transformation needs the whole XML document so this cannot
+        be done incrementally, like the XML exporter does.
+        """
+        self.dump(self.get_session_data_subset(session), stream)
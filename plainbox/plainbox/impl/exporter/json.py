@@ -27,6 +27,7 @@
 
 import json
 
+from plainbox.impl.exporter import LazyMap
 from plainbox.impl.exporter import SessionStateExporterBase
 
 
@@ -41,7 +42,17 @@ class JSONSessionStateExporter(SessionStateExporterBase):
         SessionStateExporterBase.SUPPORTED_OPTION_LIST + (
             OPTION_MACHINE_JSON,))
 
+    # Encoded data is written to the stream in chunks of at least this size
+    WRITE_BUFFER_SIZE = 64 * 1024
+
     def dump(self, data, stream):
+        """
+        Dump data to stream.
+
+        The data may be returned by either :meth:`get_session_data_subset()`
+        or :meth:`get_lazy_session_data_subset()`, in the latter case the
+        record of each job is encoded and written as soon as it is computed.
+        """
         if self.OPTION_MACHINE_JSON in self._option_list:
             encoder = json.JSONEncoder(
                 ensure_ascii=False,
@@ -51,5 +62,71 @@ class JSONSessionStateExporter(SessionStateExporterBase):
             encoder = json.JSONEncoder(
                 ensure_ascii=False,
                 indent=4)
-        for chunk in encoder.iterencode(data):
-            stream.write(chunk.encode('UTF-8'))
+        buf = []
+        buf_size = 0
+        for chunk in self._iterencode(encoder, data, 0):
+            buf.append(chunk)
+            buf_size += len(chunk)
+            if buf_size >= self.WRITE_BUFFER_SIZE:
+                stream.write("".join(buf).encode('UTF-8'))
+                buf = []
+                buf_size = 0
+        if buf:
+            stream.write("".join(buf).encode('UTF-8'))
+
+    def dump_from_session(self, session, stream):
+        """
+        Dump the data of the specified session to stream.
+
+        The data of each job is encoded and written one job at a time.
+        """
+        self.dump(self.get_lazy_session_data_subset(session), stream)
+
+    def _iterencode(self, encoder, obj, level):
+        """
+        Encode obj, which is nested at the specified level, in chunks
+
+        This works like encoder.iterencode(obj), for dictionaries, except that
+        it supports :class:`LazyMap` instances as values, which are encoded
+        one value at a time.
+        The output is identical to what encoder.iterencode() produces for
+        an equivalent dictionary.
+        """
+        if encoder.indent is None:
+            indent = None
+        elif isinstance(encoder.indent, int):
+            indent = ' ' * encoder.indent
+        else:
+            indent = encoder.indent
+        if indent is None:
+            newline_indent = ''
+            inner_newline_indent = ''
+        else:
+            newline_indent = '\n' + indent * level
+            inner_newline_indent = '\n' + indent * (level + 1)
+        if not obj:
+            yield '{}'
+            return
+        yield '{'
+        first = True
+        for key, value in obj.items():
+            if first:
+                first = False
+                yield inner_newline_indent
+            else:
+                yield encoder.item_separator + inner_newline_indent
+            yield encoder.encode(key)
+            yield encoder.key_separator
+            if isinstance(value, LazyMap):
+                for chunk in self._iterencode(encoder, value, level + 1):
+                    yield chunk
+            elif indent is None:
+                for chunk in encoder.iterencode(value):
+                    yield chunk
+            else:
+                # Values are encoded as if they were at the top level, indent
+                # them to match their actual nesting level. Strings never
+                # contain unescaped newlines so this only affects whitespace.
+                for chunk in encoder.iterencode(value):
+                    yield chunk.replace('\n', inner_newline_indent)
+        yield newline_indent + '}'
@@ -0,0 +1,232 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+plainbox.impl.exporter.test_fanout
+==================================
+
+Test definitions for plainbox.impl.exporter.fanout module
+"""
+
+from io import BytesIO
+from unittest import TestCase
+import threading
+import time
+
+import mock
+
+from plainbox.abc import IJobResult
+from plainbox.impl.exporter.fanout import SessionStateExportFanOut
+from plainbox.impl.exporter.fanout import _IOLogCache
+from plainbox.impl.exporter.json import JSONSessionStateExporter
+from plainbox.impl.exporter.text import TextSessionStateExporter
+from plainbox.impl.exporter.xml import XMLSessionStateExporter
+from plainbox.impl.job import JobDefinition
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.session import SessionState
+
+
+class _CountingJobResult(MemoryJobResult):
+    """
+    MemoryJobResult that counts how many times its IO log was read
+    """
+
+    def __init__(self, data):
+        super(_CountingJobResult, self).__init__(data)
+        self.num_reads = 0
+
+    def get_io_log(self):
+        self.num_reads += 1
+        return super(_CountingJobResult, self).get_io_log()
+
+
+class SessionStateExportFanOutTests(TestCase):
+
+    def setUp(self):
+        job_list = [
+            JobDefinition({
+                'plugin': 'shell', 'name': 'job-{}'.format(index),
+                'command': 'true'})
+            for index in range(20)
+        ] + [
+            JobDefinition({
+                'plugin': 'attachment', 'name': 'dmi_attachment',
+                'command': 'dmi'}),
+        ]
+        self.session = SessionState(job_list)
+        self.session.update_desired_job_list(job_list)
+        self.result_list = []
+        for index, job in enumerate(job_list):
+            result = _CountingJobResult({
+                'outcome': IJobResult.OUTCOME_PASS,
+                'io_log': [(0, 'stdout', 'output {}\n'.format(
+                    index).encode('UTF-8'))],
+            })
+            self.session.update_job_result(job, result)
+            self.result_list.append(result)
+
+    def _make_exporter_list(self):
+        return [
+            JSONSessionStateExporter([
+                JSONSessionStateExporter.OPTION_WITH_IO_LOG,
+                JSONSessionStateExporter.OPTION_WITH_ATTACHMENTS]),
+            XMLSessionStateExporter(
+                system_id="", timestamp="2012-12-21T12:00:00",
+                client_version="1.0"),
+            TextSessionStateExporter(),
+        ]
+
+    def _get_expected_output(self):
+        output_list = []
+        for exporter in self._make_exporter_list():
+            stream = BytesIO()
+            exporter.dump_from_session(self.session, stream)
+            output_list.append(stream.getvalue())
+        for result in self.result_list:
+            result.num_reads = 0
+        return output_list
+
+    def _dump(self, **kwargs):
+        fan_out = SessionStateExportFanOut(**kwargs)
+        for exporter in self._make_exporter_list():
+            fan_out.add_sink(exporter, BytesIO())
+        fan_out.dump_from_session(self.session)
+        return [stream.getvalue() for exporter, stream in fan_out.sink_list]
+
+    def test_same_output(self):
+        expected = self._get_expected_output()
+        self.assertEqual(self._dump(), expected)
+
+    def test_same_output_without_threads(self):
+        expected = self._get_expected_output()
+        self.assertEqual(self._dump(use_threads=False), expected)
+
+    def test_io_logs_read_once(self):
+        self._get_expected_output()
+        # Without threads the exporters run one after another, the cache is
+        # large enough to keep all the IO logs until the last one needs them
+        self._dump(use_threads=False, max_cached_bytes=1024)
+        self.assertEqual(
+            [result.num_reads for result in self.result_list],
+            [1] * len(self.result_list))
+
+    def test_no_sinks(self):
+        SessionStateExportFanOut().dump_from_session(self.session)
+
+    def test_exporter_failure(self):
+        fan_out = SessionStateExportFanOut()
+        failing_exporter = mock.Mock()
+        failing_exporter.dump_from_session.side_effect = ValueError("boom")
+        json_stream = BytesIO()
+        fan_out.add_sink(failing_exporter, BytesIO())
+        fan_out.add_sink(JSONSessionStateExporter(), json_stream)
+        with self.assertRaises(ValueError):
+            fan_out.dump_from_session(self.session)
+        # Other exporters still finish their work
+        self.assertNotEqual(json_stream.getvalue(), b'')
+
+    def test_optional_exporter_failure(self):
+        fan_out = SessionStateExportFanOut()
+        failing_exporter = mock.Mock()
+        failing_exporter.dump_from_session.side_effect = ValueError("boom")
+        failing_stream = BytesIO()
+        json_stream = BytesIO()
+        fan_out.add_sink(JSONSessionStateExporter(), json_stream)
+        fan_out.add_sink(failing_exporter, failing_stream, optional=True)
+        failed_list = fan_out.dump_from_session(self.session)
+        self.assertEqual(failed_list, [(failing_exporter, failing_stream)])
+        self.assertNotEqual(json_stream.getvalue(), b'')
+
+
+class _YieldingLock:
+    """
+    Lock that lets the other threads run each time it is released
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+        time.sleep(0.01)
+
+
+class IOLogCacheTests(TestCase):
+
+    def _make_result(self, size):
+        return _CountingJobResult({
+            'outcome': IJobResult.OUTCOME_PASS,
+            'io_log': [(0, 'stdout', b'x' * size)],
+        })
+
+    def test_bounded_by_size(self):
+        cache = _IOLogCache(max_bytes=100, num_users=2)
+        result_list = [self._make_result(40) for index in range(3)]
+        for index, result in enumerate(result_list):
+            cache.get_io_log(index, result)
+        # The first log was dropped to make room for the last one
+        for index in (1, 2, 0):
+            cache.get_io_log(index, result_list[index])
+        self.assertEqual(
+            [result.num_reads for result in result_list], [2, 1, 1])
+        self.assertEqual(cache.num_rereads, 1)
+
+    def test_log_bigger_than_cache(self):
+        cache = _IOLogCache(max_bytes=100, num_users=2)
+        big_result = self._make_result(1000)
+        small_result = self._make_result(10)
+        cache.get_io_log('big', big_result)
+        cache.get_io_log('big', big_result)
+        self.assertEqual(big_result.num_reads, 1)
+        # A big log is only kept until another log is read
+        cache.get_io_log('big', big_result)
+        cache.get_io_log('small', small_result)
+        cache.get_io_log('big', big_result)
+        self.assertEqual(big_result.num_reads, 3)
+
+    def test_concurrent_users_read_once(self):
+        num_users = 8
+        cache = _IOLogCache(max_bytes=100, num_users=num_users)
+        cache._lock = _YieldingLock()
+        result = self._make_result(10)
+        get_io_log = result.get_io_log
+
+        def slow_get_io_log():
+            # Give the other users time to ask for the same log
+            time.sleep(0.1)
+            return get_io_log()
+        result.get_io_log = slow_get_io_log
+        barrier = threading.Barrier(num_users)
+        io_log_list = []
+
+        def use_cache():
+            barrier.wait()
+            io_log_list.append(cache.get_io_log('job', result))
+        thread_list = [
+            threading.Thread(target=use_cache) for index in range(num_users)]
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join()
+        self.assertEqual(result.num_reads, 1)
+        self.assertEqual(cache.num_reads, 1)
+        self.assertEqual(cache.num_rereads, 0)
+        self.assertEqual(len(io_log_list), num_users)
+        self.assertEqual(len(set(map(id, io_log_list))), 1)
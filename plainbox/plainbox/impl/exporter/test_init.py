@@ -29,8 +29,11 @@ from io import StringIO, BytesIO
 from tempfile import TemporaryDirectory
 from unittest import TestCase
 
+import mock
+
 from plainbox.abc import IJobResult
 from plainbox.impl.exporter import ByteStringStreamTranslator
+from plainbox.impl.exporter import LazyMap
 from plainbox.impl.exporter import SessionStateExporterBase
 from plainbox.impl.exporter import classproperty
 from plainbox.impl.job import JobDefinition
@@ -100,6 +103,24 @@ class SessionStateExporterBaseTests(TestCase):
         }
         self.assertEqual(data, expected_data)
 
+    def test_resource_usage(self):
+        exporter = self.TestSessionStateExporter([
+            SessionStateExporterBase.OPTION_WITH_RESOURCE_USAGE])
+        job = make_job('job_a')
+        session = SessionState([job])
+        session.update_job_result(job, MemoryJobResult({
+            'outcome': IJobResult.OUTCOME_PASS,
+            'resource_usage': {'cpu_user_time': 1.5},
+        }))
+        data = exporter.get_session_data_subset(session)
+        self.assertEqual(
+            data['result_map']['job_a']['resource_usage'],
+            {'cpu_user_time': 1.5})
+        # Nothing is exported without the option
+        data = self.TestSessionStateExporter().get_session_data_subset(
+            session)
+        self.assertNotIn('resource_usage', data['result_map']['job_a'])
+
     def make_realistic_test_session(self, session_dir):
         # Create a more realistic session with two jobs but with richer set
         # of data in the actual jobs and results.
@@ -187,6 +208,56 @@ class SessionStateExporterBaseTests(TestCase):
         # This is to make sure we didn't miss anything by being too smart
         self.assertEqual(data, expected_data)
 
+    def test_lazy_session_data_subset(self):
+        exporter = self.TestSessionStateExporter(
+            self.TestSessionStateExporter.supported_option_list)
+        session = self.make_realistic_test_session(None)
+        lazy_data = exporter.get_lazy_session_data_subset(session)
+        self.assertIsInstance(lazy_data['result_map'], LazyMap)
+        self.assertIsInstance(lazy_data['attachment_map'], LazyMap)
+        data = exporter.get_session_data_subset(session)
+        self.assertEqual(list(lazy_data), list(data))
+        self.assertEqual(dict(lazy_data['result_map']), data['result_map'])
+        self.assertEqual(
+            dict(lazy_data['attachment_map']), data['attachment_map'])
+
+    def test_lazy_session_data_subset_option_list(self):
+        exporter = self.TestSessionStateExporter(
+            self.TestSessionStateExporter.supported_option_list)
+        session = self.make_realistic_test_session(None)
+        data = exporter.get_lazy_session_data_subset(session, ())
+        self.assertEqual(list(data), ['result_map'])
+        self.assertEqual(
+            dict(data['result_map']),
+            {'job_a': {'outcome': 'pass'}, 'job_b': {'outcome': 'pass'}})
+
+    def test_attachments(self):
+        exporter = self.TestSessionStateExporter([
+            SessionStateExporterBase.OPTION_WITH_ATTACHMENTS,
+            SessionStateExporterBase.OPTION_WITH_IO_LOG])
+        job = JobDefinition({
+            'plugin': 'attachment',
+            'name': 'job_a',
+            'command': 'cat /proc/cpuinfo',
+        })
+        session = SessionState([job])
+        session.update_job_result(job, MemoryJobResult({
+            'outcome': IJobResult.OUTCOME_PASS,
+            'io_log': [(0, 'stdout', b'foo\n'), (0, 'stderr', b'bar\n')],
+        }))
+        data = exporter.get_session_data_subset(session)
+        self.assertEqual(data['attachment_map'], {'job_a': 'Zm9vCg=='})
+        self.assertEqual(data['result_map'], {'job_a': {'outcome': 'pass'}})
+
+    def test_dump_from_session(self):
+        exporter = self.TestSessionStateExporter()
+        session = self.make_test_session()
+        stream = BytesIO()
+        with mock.patch.object(exporter, 'dump') as mock_dump:
+            exporter.dump_from_session(session, stream)
+        mock_dump.assert_called_once_with(
+            exporter.get_session_data_subset(session), stream)
+
     def test_io_log_processors(self):
         # Test all of the io_log processors that are built into
         # the base SessionStateExporter class
@@ -220,3 +291,35 @@ class ByteStringStreamTranslatorTests(TestCase):
         translator.write(source_stream.getvalue())
 
         self.assertEqual('This is a bytes literal', dest_stream.getvalue())
+
+    def test_split_character(self):
+        dest_stream = StringIO()
+        translator = ByteStringStreamTranslator(dest_stream, 'utf-8')
+        data = 'zażółć'.encode('utf-8')
+        for i in range(len(data)):
+            translator.write(data[i:i + 1])
+        self.assertEqual('zażółć', dest_stream.getvalue())
+
+
+class LazyMapTests(TestCase):
+
+    def setUp(self):
+        self.value_fn = mock.Mock(side_effect=lambda key: key * 2)
+        self.lazy_map = LazyMap(['b', 'a'], self.value_fn)
+
+    def test_mapping(self):
+        self.assertEqual(list(self.lazy_map), ['b', 'a'])
+        self.assertEqual(len(self.lazy_map), 2)
+        self.assertIn('a', self.lazy_map)
+        self.assertNotIn('c', self.lazy_map)
+        self.assertEqual(self.lazy_map['a'], 'aa')
+        self.assertEqual(
+            list(self.lazy_map.items()), [('b', 'bb'), ('a', 'aa')])
+        with self.assertRaises(KeyError):
+            self.lazy_map['c']
+
+    def test_values_are_not_stored(self):
+        self.assertEqual(self.value_fn.call_count, 0)
+        self.lazy_map['a']
+        self.lazy_map['a']
+        self.assertEqual(self.value_fn.call_count, 2)
@@ -24,10 +24,17 @@ plainbox.impl.exporter.test_json
 Test definitions for plainbox.impl.exporter.json module
 """
 
+from collections import OrderedDict
 from unittest import TestCase
 from io import BytesIO
+import json
 
+from plainbox.abc import IJobResult
+from plainbox.impl.exporter import LazyMap
 from plainbox.impl.exporter.json import JSONSessionStateExporter
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.session import SessionState
+from plainbox.impl.testing_utils import make_job
 
 
 class JSONSessionStateExporterTests(TestCase):
@@ -61,3 +68,50 @@ class JSONSessionStateExporterTests(TestCase):
             '{"foo":"bar"}'
         ).encode('UTF-8')
         self.assertEqual(stream.getvalue(), expected_bytes)
+
+    def test_lazy_dump(self):
+        data = OrderedDict((
+            ('result_map', LazyMap(
+                ['job_a', 'job_b'],
+                lambda job_name: OrderedDict((
+                    ('outcome', 'pass'), ('io_log', [job_name]))))),
+            ('job_list', ['job_a', 'job_b']),
+            ('attachment_map', LazyMap([], None)),
+        ))
+        equivalent_data = OrderedDict((
+            ('result_map', OrderedDict(data['result_map'].items())),
+            ('job_list', data['job_list']),
+            ('attachment_map', {}),
+        ))
+        for option_list in ([], [self.exporter_cls.OPTION_MACHINE_JSON]):
+            exporter = self.exporter_cls(option_list)
+            stream = BytesIO()
+            exporter.dump(data, stream)
+            expected_stream = BytesIO()
+            exporter.dump(equivalent_data, expected_stream)
+            self.assertEqual(stream.getvalue(), expected_stream.getvalue())
+            self.assertEqual(
+                json.loads(stream.getvalue().decode('UTF-8')),
+                equivalent_data)
+        self.assertEqual(
+            stream.getvalue(),
+            b'{"result_map":{"job_a":{"outcome":"pass","io_log":["job_a"]},'
+            b'"job_b":{"outcome":"pass","io_log":["job_b"]}},'
+            b'"job_list":["job_a","job_b"],"attachment_map":{}}')
+
+    def test_dump_from_session(self):
+        job_list = [make_job('job_{}'.format(i)) for i in range(3)]
+        session = SessionState(job_list)
+        for job in job_list:
+            session.update_job_result(job, MemoryJobResult({
+                'outcome': IJobResult.OUTCOME_PASS,
+                'io_log': [(0, 'stdout', b'ok\n')],
+            }))
+        exporter = self.exporter_cls(
+            self.exporter_cls.supported_option_list)
+        stream = BytesIO()
+        exporter.dump_from_session(session, stream)
+        expected_stream = BytesIO()
+        exporter.dump(
+            exporter.get_session_data_subset(session), expected_stream)
+        self.assertEqual(stream.getvalue(), expected_stream.getvalue())
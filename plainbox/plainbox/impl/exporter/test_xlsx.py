@@ -0,0 +1,168 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+plainbox.impl.exporter.test_xlsx
+================================
+
+Test definitions for plainbox.impl.exporter.xlsx module
+"""
+
+from io import BytesIO
+from unittest import TestCase
+import zipfile
+
+from plainbox.abc import IJobResult
+from plainbox.impl.exporter.xlsx import XLSXSessionStateExporter
+from plainbox.impl.job import JobDefinition
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.session import SessionState
+
+
+class XLSXSessionStateExporterTests(TestCase):
+
+    def _make_record(self, name, plugin='shell', via=None,
+                     outcome=IJobResult.OUTCOME_PASS):
+        return {
+            'plugin': plugin, 'via': via, 'hash': 'hash-' + name,
+            'outcome': outcome, 'description': 'description of ' + name,
+        }
+
+    def test_tree(self):
+        result_map = {
+            'category': self._make_record('category', 'local'),
+            'sub-category': self._make_record(
+                'sub-category', 'local', 'hash-category'),
+            'b-test': self._make_record('b-test', via='hash-category'),
+            'a-test': self._make_record(
+                'a-test', via='hash-sub-category',
+                outcome=IJobResult.OUTCOME_FAIL),
+            'attachment': self._make_record(
+                'attachment', 'attachment', 'hash-category'),
+            'top-test': self._make_record(
+                'top-test', outcome=IJobResult.OUTCOME_SKIP),
+        }
+        node_list, max_level, category_status = (
+            XLSXSessionStateExporter()._tree(result_map))
+        # Tests come before categories, attachments are not displayed
+        self.assertEqual(node_list, [
+            ('top-test', 0, False),
+            ('category', 0, True),
+            ('b-test', 1, False),
+            ('sub-category', 1, True),
+            ('a-test', 2, False),
+        ])
+        self.assertEqual(max_level, 3)
+        self.assertEqual(category_status, {
+            'hash-category': IJobResult.OUTCOME_FAIL,
+            'hash-sub-category': IJobResult.OUTCOME_FAIL,
+        })
+
+    def test_tree_deep(self):
+        # Deeply nested categories used to exceed the recursion limit
+        result_map = {}
+        for index in range(5000):
+            result_map['job-{}'.format(index)] = self._make_record(
+                'job-{}'.format(index), 'local',
+                'hash-job-{}'.format(index - 1) if index else None)
+        node_list, max_level, category_status = (
+            XLSXSessionStateExporter()._tree(result_map))
+        self.assertEqual(len(node_list), 5000)
+        self.assertEqual(max_level, 5000)
+        self.assertEqual(
+            category_status['hash-job-0'], IJobResult.OUTCOME_PASS)
+
+    def test_decode(self):
+        decode = XLSXSessionStateExporter._decode
+        self.assertEqual(decode([], 10, 'strict'), (None, False))
+        self.assertEqual(decode([b''], 10, 'strict'), ('', False))
+        # Multi-byte characters split between chunks
+        self.assertEqual(
+            decode([b'za\xc5', b'\xbc\xc3\xb3\xc5\x82\xc4\x87'], 10,
+                   'strict'),
+            ('zażółć', False))
+        self.assertEqual(
+            decode([b'abc', b'def', b'ghi'], 5, 'strict'), ('abcde', True))
+        with self.assertRaises(UnicodeDecodeError):
+            decode([b'\xff'], 10, 'strict')
+        with self.assertRaises(UnicodeDecodeError):
+            decode([b'\xc5'], 10, 'strict')
+        self.assertEqual(decode([b'\xff'], 10, 'replace'), ('�', False))
+
+    def _make_session(self):
+        category = JobDefinition({
+            'plugin': 'local', 'name': 'category', 'command': 'true',
+            'description': 'Category'})
+        job_list = [category] + [
+            JobDefinition({
+                'plugin': 'shell', 'name': 'test-{}'.format(index),
+                'command': 'true', 'description': 'Test'},
+                via=category.get_checksum())
+            for index in range(3)
+        ] + [
+            JobDefinition({
+                'plugin': 'attachment', 'name': 'big_attachment',
+                'command': 'true'}),
+        ]
+        session = SessionState(job_list)
+        session.update_desired_job_list(job_list)
+        session.update_job_result(category, MemoryJobResult({
+            'outcome': IJobResult.OUTCOME_PASS}))
+        for job in job_list[1:-1]:
+            session.update_job_result(job, MemoryJobResult({
+                'outcome': IJobResult.OUTCOME_PASS,
+                'io_log': [(0, 'stdout', b'x' * 1000)] * 100,
+            }))
+        session.update_job_result(job_list[-1], MemoryJobResult({
+            'outcome': IJobResult.OUTCOME_PASS,
+            'io_log': [(0, 'stdout', b'line\n' * 1000)] * 300,
+        }))
+        return session
+
+    def _get_text(self, stream, name):
+        # Strings are either in the worksheet or in the shared strings table
+        with zipfile.ZipFile(stream) as archive:
+            text = archive.read(name)
+            if 'xl/sharedStrings.xml' in archive.namelist():
+                text += archive.read('xl/sharedStrings.xml')
+        return text
+
+    def test_dump_from_session(self):
+        option_list = [
+            XLSXSessionStateExporter.OPTION_WITH_SUMMARY,
+            XLSXSessionStateExporter.OPTION_WITH_TEXT_ATTACHMENTS,
+        ]
+        session = self._make_session()
+        for extra_option_list in (
+                [], [XLSXSessionStateExporter.OPTION_CONSTANT_MEMORY]):
+            exporter = XLSXSessionStateExporter(
+                option_list + extra_option_list)
+            exporter.MAX_ATTACHMENT_LENGTH = 1000
+            stream = BytesIO()
+            exporter.dump_from_session(session, stream)
+            self.assertEqual(exporter.total, 3)
+            self.assertEqual(exporter.total_pass, 3)
+            # IO logs are truncated to fit in a cell
+            results = self._get_text(stream, 'xl/worksheets/sheet1.xml')
+            self.assertIn(b'[...]', results)
+            self.assertNotIn(b'x' * 32768, results)
+            # Attachments are truncated to MAX_ATTACHMENT_LENGTH characters
+            log_files = self._get_text(stream, 'xl/worksheets/sheet3.xml')
+            self.assertIn(b'[...]', log_files)
+            # The title, the name of the attachment, an empty row, 200 lines
+            # of the attachment, the truncation mark and another empty row
+            self.assertEqual(log_files.count(b'<row '), 205)
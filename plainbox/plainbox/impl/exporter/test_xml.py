@@ -26,11 +26,18 @@ Test definitions for plainbox.impl.exporter.xml module
 """
 from unittest import TestCase
 import io
+import json
+
+import mock
 
 from pkg_resources import resource_string
 
+from plainbox.abc import IJobResult
 from plainbox.testing_utils import resource_json
 from plainbox.impl.exporter.xml import XMLSessionStateExporter, XMLValidator
+from plainbox.impl.job import JobDefinition
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.session import SessionState
 from plainbox.testing_utils.testcases import TestCaseWithParameters
 
 
@@ -94,3 +101,93 @@ class XMLExporterTests(TestCase):
         self.assertTrue(
             validator.validate_text(
                 self.actual_result))
+
+    def test_resource_usage(self):
+        data = resource_json(
+            "plainbox", "test-data/xml-exporter/example-data.json",
+            exact=True)
+        job_name = sorted(data['result_map'])[0]
+        data['result_map'][job_name]['resource_usage'] = {
+            'cpu_user_time': 1.5, 'max_rss': 1024}
+        exporter = XMLSessionStateExporter(
+            system_id="",
+            timestamp="2012-12-21T12:00:00",
+            client_version="1.0")
+        root = exporter.get_root_element(data)
+        info_list = root.findall("context/info[@command='resource_usage']")
+        self.assertEqual(len(info_list), 1)
+        self.assertEqual(json.loads(info_list[0].text), {
+            job_name: {'cpu_user_time': 1.5, 'max_rss': 1024}})
+        self.assertTrue(XMLValidator().validate_element(root))
+
+    def test_dump_from_session(self):
+        job_list = [
+            JobDefinition({
+                'plugin': 'shell', 'name': 'test_job', 'command': 'true'}),
+            JobDefinition({
+                'plugin': 'attachment', 'name': 'dmi_attachment',
+                'command': 'dmi'}),
+            JobDefinition({
+                'plugin': 'attachment', 'name': 'other_attachment',
+                'command': 'other'}),
+            JobDefinition({
+                'plugin': 'resource', 'name': 'lsb', 'command': 'lsb'}),
+        ]
+        session = SessionState(job_list)
+        session.update_desired_job_list(job_list)
+        session.update_job_result(job_list[0], MemoryJobResult({
+            'outcome': IJobResult.OUTCOME_FAIL,
+            'io_log': [(0, 'stdout', 'zażółć\n'.encode('UTF-8'))],
+            'resource_usage': {'max_rss': 1024},
+        }))
+        session.update_job_result(job_list[1], MemoryJobResult({
+            'outcome': IJobResult.OUTCOME_PASS,
+            'io_log': [(0, 'stdout', b'dmi data\n')],
+        }))
+        session.update_job_result(job_list[2], MemoryJobResult({
+            'outcome': IJobResult.OUTCOME_PASS,
+            'io_log': [(0, 'stdout', b'other data\n')],
+        }))
+        session.update_job_result(job_list[3], MemoryJobResult({
+            'outcome': IJobResult.OUTCOME_PASS,
+            'io_log': [(0, 'stdout', b'distributor_id: Ubuntu\n'),
+                       (0, 'stdout', b'release: 13.10\n')],
+        }))
+        exporter = XMLSessionStateExporter(
+            system_id="",
+            timestamp="2012-12-21T12:00:00",
+            client_version="1.0")
+        stream = io.BytesIO()
+        exporter.dump_from_session(session, stream)
+        expected_stream = io.BytesIO()
+        exporter.dump(
+            exporter.get_session_data_subset(session), expected_stream)
+        self.assertEqual(stream.getvalue(), expected_stream.getvalue())
+        root = exporter.get_root_element(
+            exporter.get_session_data_subset(session))
+        self.assertEqual(root.find("hardware/dmi").text, "dmi data\n")
+        self.assertEqual(
+            root.find("context/info[@command='other_attachment']").text,
+            "other data\n")
+        self.assertEqual(
+            root.find("questions/question/comment").text, "zażółć\n")
+        self.assertEqual(
+            json.loads(root.find(
+                "context/info[@command='resource_usage']").text),
+            {'test_job': {'max_rss': 1024}})
+
+    def test_dump_without_xmlfile(self):
+        data = resource_json(
+            "plainbox", "test-data/xml-exporter/example-data.json",
+            exact=True)
+        exporter = XMLSessionStateExporter(
+            system_id="",
+            timestamp="2012-12-21T12:00:00",
+            client_version="1.0")
+        stream = io.BytesIO()
+        with mock.patch("plainbox.impl.exporter.xml.ET") as mock_ET:
+            # Pretend that lxml is too old for incremental writing
+            del mock_ET.xmlfile
+            exporter._dump_tree = mock.Mock()
+            exporter.dump(data, stream)
+        self.assertEqual(exporter._dump_tree.call_count, 1)
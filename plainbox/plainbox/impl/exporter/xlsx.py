@@ -29,6 +29,7 @@ XLSX exporter
 
 from base64 import standard_b64decode
 from collections import defaultdict, OrderedDict
+import codecs
 import re
 
 from plainbox.impl.exporter import SessionStateExporterBase
@@ -58,14 +59,25 @@ class XLSXSessionStateExporter(SessionStateExporterBase):
     OPTION_WITH_SUMMARY = 'with-summary'
     OPTION_WITH_DESCRIPTION = 'with-job-description'
     OPTION_WITH_TEXT_ATTACHMENTS = 'with-text-attachments'
+    OPTION_CONSTANT_MEMORY = 'constant-memory'
 
     SUPPORTED_OPTION_LIST = (
         OPTION_WITH_SYSTEM_INFO,
         OPTION_WITH_SUMMARY,
         OPTION_WITH_DESCRIPTION,
         OPTION_WITH_TEXT_ATTACHMENTS,
+        OPTION_CONSTANT_MEMORY,
     )
 
+    # Maximum number of characters in a cell, as defined by Excel
+    MAX_CELL_LENGTH = 32767
+    # Maximum number of characters of each attachment in the 'Log Files'
+    # worksheet, each line of the attachment takes one row
+    MAX_ATTACHMENT_LENGTH = 1024 * 1024
+    # Text written in place of the part of an IO log or attachment that
+    # doesn't fit in a cell or in the worksheet
+    TRUNCATED_TEXT = '[...]'
+
     def __init__(self, option_list=None):
         """
         Initialize a new XLSXSessionStateExporter.
@@ -86,7 +98,8 @@ class XLSXSessionStateExporter(SessionStateExporterBase):
             SessionStateExporterBase.OPTION_WITH_JOB_VIA,
             SessionStateExporterBase.OPTION_WITH_JOB_HASH,
             SessionStateExporterBase.OPTION_WITH_RESOURCE_MAP,
-            SessionStateExporterBase.OPTION_WITH_ATTACHMENTS)
+            SessionStateExporterBase.OPTION_WITH_ATTACHMENTS,
+            SessionStateExporterBase.OPTION_WITH_RESOURCE_USAGE)
         self._option_list += tuple(option_list)
         self.total_pass = 0
         self.total_fail = 0
@@ -263,13 +276,14 @@ class XLSXSessionStateExporter(SessionStateExporterBase):
         self.worksheet1.write(17, 2, hw_info['bluetooth'], self.format06)
         if "package" in data["resource_map"]:
             self.worksheet1.write(19, 1, 'Packages Installed', self.format03)
+            self._set_empty_row(
+                self.worksheet1, 20, {'level': 1, 'hidden': True})
+            self.worksheet1.set_row(
+                21, None, None, {'level': 1, 'hidden': True}
+            )
             self.worksheet1.write_row(
                 21, 1, ['Name', 'Version'], self.format07
             )
-            for i in range(20, 22):
-                self.worksheet1.set_row(
-                    i, None, None, {'level': 1, 'hidden': True}
-                )
             for i, pkg in enumerate(data["resource_map"]["package"]):
                 self.worksheet1.write_row(
                     22 + i, 1,
@@ -279,22 +293,28 @@ class XLSXSessionStateExporter(SessionStateExporterBase):
                 self.worksheet1.set_row(
                     22 + i, None, None, {'level': 1, 'hidden': True}
                 )
-            self.worksheet1.set_row(
-                22+len(data["resource_map"]["package"]),
-                None, None, {'collapsed': True}
-            )
+            self._set_empty_row(
+                self.worksheet1, 22 + len(data["resource_map"]["package"]),
+                {'collapsed': True})
 
     def write_summary(self, data):
         self.worksheet2.set_column(0, 0, 5)
         self.worksheet2.set_column(1, 1, 2)
         self.worksheet2.set_column(3, 3, 27)
+        # Rows are written in order, see dump()
+        self.worksheet2.write_row(
+            2, 11, ['Fail', self.total_fail], self.format14)
         self.worksheet2.write(3, 1, 'Failures summary', self.format03)
+        self.worksheet2.write_row(
+            3, 11, ['Skip', self.total_skip], self.format14)
         self.worksheet2.write(4, 1, '✔', self.format10)
         self.worksheet2.write(
             4, 2,
             '{} Tests passed - Success Rate: {:.2f}% ({}/{})'.format(
             self.total_pass, self.total_pass / self.total * 100,
             self.total_pass, self.total), self.format02)
+        self.worksheet2.write_row(
+            4, 11, ['Pass', self.total_pass], self.format14)
         self.worksheet2.write(5, 1, '✘', self.format11)
         self.worksheet2.write(
             5, 2,
@@ -307,11 +327,6 @@ class XLSXSessionStateExporter(SessionStateExporterBase):
             '{} Tests skipped - Skip Rate: {:.2f}% ({}/{})'.format(
             self.total_skip, self.total_skip / self.total * 100,
             self.total_skip, self.total), self.format02)
-        self.worksheet2.write_column(
-            'L3', ['Fail', 'Skip', 'Pass'], self.format14)
-        self.worksheet2.write_column(
-            'M3', [self.total_fail, self.total_skip, self.total_pass],
-            self.format14)
         # Configure the series.
         chart = self.workbook.add_chart({'type': 'pie'})
         chart.set_legend({'position': 'none'})
@@ -329,167 +344,208 @@ class XLSXSessionStateExporter(SessionStateExporterBase):
             'x_offset': 0, 'y_offset': 10, 'x_scale': 0.25, 'y_scale': 0.25
         })
 
-    def _set_category_status(self, result_map, via, child):
-        for parent in [j for j in result_map if result_map[j]['hash'] == via]:
-            if 'category_status' not in result_map[parent]:
-                result_map[parent]['category_status'] = None
-            child_status = result_map[child]['outcome']
-            if 'category_status' in result_map[child]:
-                child_status = result_map[child]['category_status']
-            if child_status == IJobResult.OUTCOME_FAIL:
-                result_map[parent]['category_status'] = IJobResult.OUTCOME_FAIL
-            elif (
-                child_status == IJobResult.OUTCOME_PASS and
-                result_map[parent]['category_status'] != IJobResult.OUTCOME_FAIL
-            ):
-                result_map[parent]['category_status'] = IJobResult.OUTCOME_PASS
-            elif (
-                result_map[parent]['category_status'] not in
-                (IJobResult.OUTCOME_PASS, IJobResult.OUTCOME_FAIL)
-            ):
-                result_map[parent]['category_status'] = IJobResult.OUTCOME_SKIP
-
-    def _tree(self, result_map, via=None, level=0, max_level=0):
-        res = {}
-        for job_name in [j for j in result_map if result_map[j]['via'] == via]:
-            if re.search(
-                    'resource|attachment',
-                    result_map[job_name]['plugin']):
+    def _update_category_status(self, category_status, via, child_status):
+        # A category fails if any of its tests or sub-categories fails,
+        # passes if any of them passes and is skipped otherwise
+        if child_status in (IJobResult.OUTCOME_FAIL,
+                            IJobResult.OUTCOME_TIMEOUT):
+            category_status[via] = IJobResult.OUTCOME_FAIL
+        elif (
+            child_status == IJobResult.OUTCOME_PASS and
+            category_status.get(via) != IJobResult.OUTCOME_FAIL
+        ):
+            category_status[via] = IJobResult.OUTCOME_PASS
+        elif (
+            category_status.get(via) not in
+            (IJobResult.OUTCOME_PASS, IJobResult.OUTCOME_FAIL)
+        ):
+            category_status[via] = IJobResult.OUTCOME_SKIP
+
+    def _tree(self, result_map):
+        """
+        Compute the tree of tests, as defined by the via links of each job
+
+        Jobs with a via link to (the hash of) another job are displayed under
+        that job, as a category. Resource and attachment jobs (and all the
+        jobs that they generated) are not displayed.
+
+        :returns:
+            A tuple (node_list, max_level, category_status) where node_list
+            is a list of (job_name, level, is_category) tuples, in the order
+            they should be displayed, max_level is the depth of the tree and
+            category_status maps the hash of each category to its outcome.
+        """
+        # The tree is walked without recursion, sessions with thousands of
+        # nested jobs would exceed the recursion limit otherwise.
+        children_map = defaultdict(list)
+        for job_name, job_data in result_map.items():
+            if re.search('resource|attachment', job_data['plugin']):
                 continue
-            level += 1
-            # Find the maximum depth of the test tree
-            if level > max_level:
-                max_level = level
-            res[job_name], max_level = self._tree(
-                result_map, result_map[job_name]['hash'], level, max_level)
-            # Generate parent categories status
-            if via is not None:
-                self._set_category_status(result_map, via, job_name)
-            level -= 1
-        return res, max_level
-
-    def _write_job(self, tree, result_map, max_level, level=0):
-        for job, children in OrderedDict(
-                sorted(
-                    tree.items(),
-                    key=lambda t: 'z' + t[0] if t[1] else 'a' + t[0])).items():
-            self._lineno += 1
-            if children:
-                self.worksheet3.write(
-                    self._lineno, level + 1,
-                    result_map[job]['description'], self.format15)
-                if (
-                    result_map[job]['category_status'] ==
-                    IJobResult.OUTCOME_PASS
-                ):
-                    self.worksheet3.write(
-                        self._lineno, max_level + 2, 'PASS', self.format10)
-                elif (
-                    result_map[job]['category_status'] ==
-                    IJobResult.OUTCOME_FAIL
-                ):
-                    self.worksheet3.write(
-                        self._lineno, max_level + 2, 'FAIL', self.format11)
-                elif (
-                    result_map[job]['category_status'] ==
-                    IJobResult.OUTCOME_SKIP
-                ):
-                    self.worksheet3.write(
-                        self._lineno, max_level + 2, 'skip', self.format12)
-                if self.OPTION_WITH_DESCRIPTION in self._option_list:
-                    self.worksheet4.write(
-                        self._lineno, level + 1,
-                        result_map[job]['description'], self.format15)
-                if level:
-                    self.worksheet3.set_row(
-                        self._lineno, 13, None, {'level': level})
-                    if self.OPTION_WITH_DESCRIPTION in self._option_list:
-                        self.worksheet4.set_row(
-                            self._lineno, 13, None, {'level': level})
-                else:
-                    self.worksheet3.set_row(self._lineno, 13)
-                    if self.OPTION_WITH_DESCRIPTION in self._option_list:
-                        self.worksheet4.set_row(self._lineno, 13)
-                self._write_job(children, result_map, max_level, level + 1)
+            children_map[job_data['via']].append(job_name)
+
+        def sorted_children(via):
+            # Tests come first, then categories, each sorted by name
+            return sorted(children_map.get(via, ()), key=lambda job_name: (
+                'z' + job_name
+                if children_map.get(result_map[job_name]['hash'])
+                else 'a' + job_name))
+
+        node_list = []
+        seen = set()
+        stack = [(job_name, 0) for job_name in reversed(sorted_children(None))]
+        while stack:
+            job_name, level = stack.pop()
+            if job_name in seen:
+                continue
+            seen.add(job_name)
+            children = sorted_children(result_map[job_name]['hash'])
+            node_list.append((job_name, level, bool(children)))
+            stack.extend(
+                (child, level + 1) for child in reversed(children))
+        max_level = max([level + 1 for job_name, level, is_category
+                         in node_list] or [0])
+        # Each job appears after its category in node_list, going backwards
+        # gives the final outcome of all the sub-categories of a category
+        # before it is used.
+        category_status = {}
+        for job_name, level, is_category in reversed(node_list):
+            if level == 0:
+                continue
+            job_data = result_map[job_name]
+            if is_category:
+                child_status = category_status.get(job_data['hash'])
             else:
-                self.worksheet3.write(
-                    self._lineno, max_level + 1, job,
-                    self.format08 if self._lineno % 2 else self.format09)
-                if self.OPTION_WITH_DESCRIPTION in self._option_list:
-                    link_cell = xl_rowcol_to_cell(self._lineno, max_level + 1)
-                    self.worksheet3.write_url(
-                        self._lineno, max_level + 1,
-                        'internal:Test Descriptions!' + link_cell,
-                        self.format08 if self._lineno % 2 else self.format09,
-                        job)
-                    self.worksheet4.write(
-                        self._lineno, max_level + 1, job,
-                        self.format08 if self._lineno % 2 else self.format09)
-                self.total += 1
-                if result_map[job]['outcome'] == IJobResult.OUTCOME_PASS:
-                    self.worksheet3.write(
-                        self._lineno, max_level, '✔', self.format10)
-                    self.worksheet3.write(
-                        self._lineno, max_level + 2, 'PASS', self.format10)
-                    self.total_pass += 1
-                elif result_map[job]['outcome'] == IJobResult.OUTCOME_FAIL:
-                    self.worksheet3.write(
-                        self._lineno, max_level, '✘', self.format11)
-                    self.worksheet3.write(
-                        self._lineno, max_level + 2, 'FAIL', self.format11)
-                    self.total_fail += 1
-                elif result_map[job]['outcome'] == IJobResult.OUTCOME_SKIP:
-                    self.worksheet3.write(
-                        self._lineno, max_level, '-', self.format12)
-                    self.worksheet3.write(
-                        self._lineno, max_level + 2, 'skip', self.format12)
-                    self.total_skip += 1
-                elif result_map[job]['outcome'] == \
-                        IJobResult.OUTCOME_NOT_SUPPORTED:
-                    self.worksheet3.write(
-                        self._lineno, max_level, '-', self.format12)
-                    self.worksheet3.write(
-                        self._lineno, max_level + 2,
-                        'not supported', self.format12)
-                    self.total_skip += 1
-                else:
-                    self.worksheet3.write(
-                        self._lineno, max_level, '-',    self.format12)
-                    self.worksheet3.write(
-                        self._lineno, max_level + 2, None, self.format12)
-                    self.total_skip += 1
-                io_log = ' '
-                if result_map[job]['io_log']:
-                    io_log = standard_b64decode(
-                        result_map[job]['io_log'].encode()).decode(
-                            'UTF-8').rstrip()
-                io_lines = len(io_log.splitlines()) - 1
-                desc_lines = len(result_map[job]['description'].splitlines())
-                desc_lines -= 1
-                self.worksheet3.write(
-                    self._lineno, max_level + 3, io_log,
-                    self.format16 if self._lineno % 2 else self.format17)
-                if self.OPTION_WITH_DESCRIPTION in self._option_list:
-                    self.worksheet4.write(
-                        self._lineno, max_level + 2,
-                        result_map[job]['description'],
-                        self.format16 if self._lineno % 2 else self.format17)
-                if level:
-                    self.worksheet3.set_row(
-                        self._lineno, 12 + 9.71 * io_lines,
-                        None, {'level': level})
-                    if self.OPTION_WITH_DESCRIPTION in self._option_list:
-                        self.worksheet4.set_row(
-                            self._lineno, 12 + 9.71 * desc_lines,
-                            None, {'level': level})
-                else:
-                    self.worksheet3.set_row(self._lineno, 12 + 9.71 * io_lines)
-                    if self.OPTION_WITH_DESCRIPTION in self._option_list:
-                        self.worksheet4.set_row(
-                            self._lineno, 12 + 9.71 * desc_lines)
+                child_status = job_data['outcome']
+            self._update_category_status(
+                category_status, job_data['via'], child_status)
+        return node_list, max_level, category_status
+
+    def _write_category(self, job, job_data, status, level, max_level):
+        self.worksheet3.write(
+            self._lineno, level + 1, job_data['description'], self.format15)
+        if status == IJobResult.OUTCOME_PASS:
+            self.worksheet3.write(
+                self._lineno, max_level + 2, 'PASS', self.format10)
+        elif status == IJobResult.OUTCOME_FAIL:
+            self.worksheet3.write(
+                self._lineno, max_level + 2, 'FAIL', self.format11)
+        elif status == IJobResult.OUTCOME_SKIP:
+            self.worksheet3.write(
+                self._lineno, max_level + 2, 'skip', self.format12)
+        if self.OPTION_WITH_DESCRIPTION in self._option_list:
+            self.worksheet4.write(
+                self._lineno, level + 1, job_data['description'],
+                self.format15)
+        if level:
+            self.worksheet3.set_row(self._lineno, 13, None, {'level': level})
+            if self.OPTION_WITH_DESCRIPTION in self._option_list:
+                self.worksheet4.set_row(
+                    self._lineno, 13, None, {'level': level})
+        else:
+            self.worksheet3.set_row(self._lineno, 13)
+            if self.OPTION_WITH_DESCRIPTION in self._option_list:
+                self.worksheet4.set_row(self._lineno, 13)
+
+    def _write_test(self, job, job_data, level, max_level):
+        self.worksheet3.write(
+            self._lineno, max_level + 1, job,
+            self.format08 if self._lineno % 2 else self.format09)
+        if self.OPTION_WITH_DESCRIPTION in self._option_list:
+            link_cell = xl_rowcol_to_cell(self._lineno, max_level + 1)
+            self.worksheet3.write_url(
+                self._lineno, max_level + 1,
+                'internal:Test Descriptions!' + link_cell,
+                self.format08 if self._lineno % 2 else self.format09,
+                job)
+            self.worksheet4.write(
+                self._lineno, max_level + 1, job,
+                self.format08 if self._lineno % 2 else self.format09)
+        self.total += 1
+        if job_data['outcome'] == IJobResult.OUTCOME_PASS:
+            self.worksheet3.write(
+                self._lineno, max_level, '✔', self.format10)
+            self.worksheet3.write(
+                self._lineno, max_level + 2, 'PASS', self.format10)
+            self.total_pass += 1
+        elif job_data['outcome'] == IJobResult.OUTCOME_FAIL:
+            self.worksheet3.write(
+                self._lineno, max_level, '✘', self.format11)
+            self.worksheet3.write(
+                self._lineno, max_level + 2, 'FAIL', self.format11)
+            self.total_fail += 1
+        elif job_data['outcome'] == IJobResult.OUTCOME_TIMEOUT:
+            self.worksheet3.write(
+                self._lineno, max_level, '✘', self.format11)
+            self.worksheet3.write(
+                self._lineno, max_level + 2, 'TIMEOUT', self.format11)
+            self.total_fail += 1
+        elif job_data['outcome'] == IJobResult.OUTCOME_SKIP:
+            self.worksheet3.write(
+                self._lineno, max_level, '-', self.format12)
+            self.worksheet3.write(
+                self._lineno, max_level + 2, 'skip', self.format12)
+            self.total_skip += 1
+        elif job_data['outcome'] == IJobResult.OUTCOME_NOT_SUPPORTED:
+            self.worksheet3.write(
+                self._lineno, max_level, '-', self.format12)
+            self.worksheet3.write(
+                self._lineno, max_level + 2,
+                'not supported', self.format12)
+            self.total_skip += 1
+        else:
+            self.worksheet3.write(
+                self._lineno, max_level, '-', self.format12)
+            self.worksheet3.write(
+                self._lineno, max_level + 2, None, self.format12)
+            self.total_skip += 1
+        io_log, truncated = self._decode(
+            self._get_io_log_chunks(job),
+            self.MAX_CELL_LENGTH - len(self.TRUNCATED_TEXT) - 1, 'replace')
+        if io_log is None:
+            io_log = ' '
+        else:
+            io_log = io_log.rstrip()
+            if truncated:
+                io_log += '\n' + self.TRUNCATED_TEXT
+        io_lines = len(io_log.splitlines()) - 1
+        desc_lines = len(job_data['description'].splitlines())
+        desc_lines -= 1
+        self.worksheet3.write(
+            self._lineno, max_level + 3, io_log,
+            self.format16 if self._lineno % 2 else self.format17)
+        resource_usage = job_data.get('resource_usage')
+        if resource_usage:
+            self.worksheet3.write_row(
+                self._lineno, max_level + 4, [
+                    round(resource_usage['cpu_user_time']
+                          + resource_usage['cpu_system_time'], 2),
+                    resource_usage['max_rss'],
+                    resource_usage['block_input']
+                    + resource_usage['block_output'],
+                    resource_usage['voluntary_context_switches']
+                    + resource_usage['involuntary_context_switches']
+                ],
+                self.format16 if self._lineno % 2 else self.format17)
+        if self.OPTION_WITH_DESCRIPTION in self._option_list:
+            self.worksheet4.write(
+                self._lineno, max_level + 2, job_data['description'],
+                self.format16 if self._lineno % 2 else self.format17)
+        if level:
+            self.worksheet3.set_row(
+                self._lineno, 12 + 9.71 * io_lines, None, {'level': level})
+            if self.OPTION_WITH_DESCRIPTION in self._option_list:
+                self.worksheet4.set_row(
+                    self._lineno, 12 + 9.71 * desc_lines,
+                    None, {'level': level})
+        else:
+            self.worksheet3.set_row(self._lineno, 12 + 9.71 * io_lines)
+            if self.OPTION_WITH_DESCRIPTION in self._option_list:
+                self.worksheet4.set_row(
+                    self._lineno, 12 + 9.71 * desc_lines)
 
     def write_results(self, data):
-        tree, max_level = self._tree(data['result_map'])
+        result_map = data['result_map']
+        node_list, max_level, category_status = self._tree(result_map)
         self.worksheet3.write(3, 1, 'Tests Performed', self.format03)
         self.worksheet3.freeze_panes(6, 0)
         self.worksheet3.set_tab_color('#DC4C00')  # Orange
@@ -498,8 +554,12 @@ class XLSXSessionStateExporter(SessionStateExporterBase):
         self.worksheet3.set_column(max_level + 1, max_level + 0, 48)
         self.worksheet3.set_column(max_level + 2, max_level + 1, 12)
         self.worksheet3.set_column(max_level + 3, max_level + 2, 65)
+        self.worksheet3.set_column(max_level + 4, max_level + 7, 14)
         self.worksheet3.write_row(
-            5, max_level + 1, ['Name', 'Result', 'I/O Log'], self.format07
+            5, max_level + 1, [
+                'Name', 'Result', 'I/O Log', 'CPU Time (s)', 'Max RSS (KiB)',
+                'Block I/O', 'Context Switches'
+            ], self.format07
         )
         if self.OPTION_WITH_DESCRIPTION in self._option_list:
             self.worksheet4.write(3, 1, 'Tests Descriptions', self.format03)
@@ -513,7 +573,15 @@ class XLSXSessionStateExporter(SessionStateExporterBase):
                 5, max_level + 1, ['Name', 'Description'], self.format07
             )
         self._lineno = 5
-        self._write_job(tree, data['result_map'], max_level)
+        for job, level, is_category in node_list:
+            self._lineno += 1
+            job_data = result_map[job]
+            if is_category:
+                self._write_category(
+                    job, job_data, category_status.get(job_data['hash']),
+                    level, max_level)
+            else:
+                self._write_test(job, job_data, level, max_level)
         self.worksheet3.autofilter(5, max_level, self._lineno, max_level + 3)
 
     def write_attachments(self, data):
@@ -522,49 +590,149 @@ class XLSXSessionStateExporter(SessionStateExporterBase):
         i = 4
         for name in data['attachment_map']:
             try:
-                content = standard_b64decode(
-                    data['attachment_map'][name].encode()).decode('UTF-8')
+                content, truncated = self._decode(
+                    self._get_attachment_chunks(name),
+                    self.MAX_ATTACHMENT_LENGTH, 'strict')
             except UnicodeDecodeError:
                 # Skip binary attachments
                 continue
+            line_list = (content or '').splitlines()
+            if truncated:
+                line_list.append(self.TRUNCATED_TEXT)
             self.worksheet5.write(i, 1, name, self.format03)
             i += 1
-            self.worksheet5.set_row(
-                i, None, None, {'level': 1, 'hidden': True}
-            )
+            self._set_empty_row(
+                self.worksheet5, i, {'level': 1, 'hidden': True})
             j = 1
-            for line in content.splitlines():
+            for line in line_list:
+                if len(line) > self.MAX_CELL_LENGTH:
+                    line = line[:self.MAX_CELL_LENGTH - len(
+                        self.TRUNCATED_TEXT)] + self.TRUNCATED_TEXT
                 self.worksheet5.write(j + i, 1, line, self.format13)
                 self.worksheet5.set_row(
                     j + i, None, None, {'level': 1, 'hidden': True}
                 )
                 j += 1
-            self.worksheet5.set_row(i + j, None, None, {'collapsed': True})
+            self._set_empty_row(self.worksheet5, i + j, {'collapsed': True})
             i += j + 1  # Insert a newline between attachments
 
+    @staticmethod
+    def _decode(chunk_iter, max_length, errors):
+        """
+        Decode at most max_length characters of UTF-8 text
+
+        :param chunk_iter:
+            Iterable of bytes, only the chunks needed to get max_length
+            characters are read
+        :returns:
+            A tuple (text, truncated), text is None if there are no chunks
+            at all
+        """
+        decoder = codecs.getincrementaldecoder('UTF-8')(errors)
+        piece_list = []
+        length = 0
+        got_data = False
+        for chunk in chunk_iter:
+            got_data = True
+            piece = decoder.decode(chunk)
+            piece_list.append(piece)
+            length += len(piece)
+            if length > max_length:
+                return ''.join(piece_list)[:max_length], True
+        if not got_data:
+            return None, False
+        piece_list.append(decoder.decode(b'', True))
+        text = ''.join(piece_list)
+        if len(text) > max_length:
+            return text[:max_length], True
+        return text, False
+
+    @staticmethod
+    def _b64_chunks(value):
+        if value:
+            return [standard_b64decode(value.encode())]
+        return []
+
+    def _set_empty_row(self, worksheet, row, options):
+        worksheet.set_row(row, None, None, options)
+        if self.OPTION_CONSTANT_MEMORY in self._option_list:
+            # Rows without any cells are not written in constant memory mode
+            worksheet.write_blank(row, 1, None, self.format02)
+
+    def _add_worksheet(self, name):
+        worksheet = self.workbook.add_worksheet(name)
+        # The title row is written first, in constant memory mode each row
+        # must be written before the rows that follow it
+        worksheet.outline_settings(True, False, False, True)
+        worksheet.hide_gridlines(2)
+        worksheet.fit_to_pages(1, 0)
+        worksheet.set_row(1, 30)
+        worksheet.write(1, 1, 'System Testing Report', self.format01)
+        return worksheet
+
     def dump(self, data, stream):
         """
         Public method to dump the XLSX report to a stream
         """
-        self.workbook = Workbook(stream)
+        result_map = data['result_map']
+        attachment_map = data['attachment_map']
+        self._dump(
+            data, stream,
+            lambda job_name: self._b64_chunks(
+                result_map[job_name].get('io_log')),
+            lambda name: self._b64_chunks(attachment_map[name]))
+
+    def dump_from_session(self, session, stream):
+        """
+        Dump the XLSX report of the specified session to a stream
+
+        IO logs and attachments are read from the session one job at a time
+        and only the part that is displayed is decoded. With the
+        ``constant-memory`` option each row is also flushed to disk as soon
+        as it is complete, the memory used doesn't depend on the size of the
+        session then.
+        """
+        option_list = [
+            option for option in self._option_list
+            if option != self.OPTION_WITH_IO_LOG]
+        data = self.get_lazy_session_data_subset(session, option_list)
+        # Without IO logs the records of all jobs are small, the tree of
+        # tests needs all of them anyway.
+        data['result_map'] = OrderedDict(data['result_map'].items())
+        job_state_map = session.job_state_map
+
+        def get_io_log_chunks(job_name):
+            for record in job_state_map[job_name].result.get_io_log():
+                yield record.data
+
+        def get_attachment_chunks(name):
+            for record in job_state_map[name].result.get_io_log():
+                if record.stream_name == 'stdout':
+                    yield record.data
+
+        self._dump(data, stream, get_io_log_chunks, get_attachment_chunks)
+
+    def _dump(self, data, stream, get_io_log_chunks, get_attachment_chunks):
+        self._get_io_log_chunks = get_io_log_chunks
+        self._get_attachment_chunks = get_attachment_chunks
+        if self.OPTION_CONSTANT_MEMORY in self._option_list:
+            self.workbook = Workbook(stream, {'constant_memory': True})
+        else:
+            self.workbook = Workbook(stream)
         self._set_formats()
+        # In constant memory mode rows of each worksheet must be written in
+        # order, all the methods below take care of that.
         if self.OPTION_WITH_SYSTEM_INFO in self._option_list:
-            self.worksheet1 = self.workbook.add_worksheet('System Info')
+            self.worksheet1 = self._add_worksheet('System Info')
             self.write_systeminfo(data)
-        self.worksheet3 = self.workbook.add_worksheet('Test Results')
+        self.worksheet3 = self._add_worksheet('Test Results')
         if self.OPTION_WITH_DESCRIPTION in self._option_list:
-            self.worksheet4 = self.workbook.add_worksheet('Test Descriptions')
+            self.worksheet4 = self._add_worksheet('Test Descriptions')
         self.write_results(data)
         if self.OPTION_WITH_SUMMARY in self._option_list:
-            self.worksheet2 = self.workbook.add_worksheet('Summary')
+            self.worksheet2 = self._add_worksheet('Summary')
             self.write_summary(data)
         if self.OPTION_WITH_TEXT_ATTACHMENTS in self._option_list:
-            self.worksheet5 = self.workbook.add_worksheet('Log Files')
+            self.worksheet5 = self._add_worksheet('Log Files')
             self.write_attachments(data)
-        for worksheet in self.workbook.worksheets():
-            worksheet.outline_settings(True, False, False, True)
-            worksheet.hide_gridlines(2)
-            worksheet.fit_to_pages(1, 0)
-            worksheet.write(1, 1, 'System Testing Report', self.format01)
-            worksheet.set_row(1, 30)
         self.workbook.close()
@@ -32,6 +32,7 @@ from base64 import standard_b64decode
 from collections import OrderedDict
 from datetime import datetime
 from io import BytesIO
+import json
 import logging
 
 from lxml import etree as ET
@@ -114,7 +115,8 @@ class XMLSessionStateExporter(SessionStateExporterBase):
         IJobResult.OUTCOME_PASS: IJobResult.OUTCOME_PASS,
         IJobResult.OUTCOME_FAIL: IJobResult.OUTCOME_FAIL,
         IJobResult.OUTCOME_SKIP: IJobResult.OUTCOME_SKIP,
-        IJobResult.OUTCOME_NOT_SUPPORTED: IJobResult.OUTCOME_SKIP}
+        IJobResult.OUTCOME_NOT_SUPPORTED: IJobResult.OUTCOME_SKIP,
+        IJobResult.OUTCOME_TIMEOUT: IJobResult.OUTCOME_FAIL}
 
     def __init__(self, option_list=None, system_id=None, timestamp=None,
                  client_version=None, client_name='plainbox'):
@@ -152,7 +154,8 @@ class XMLSessionStateExporter(SessionStateExporterBase):
             SessionStateExporterBase.OPTION_WITH_JOB_DEFS,
             SessionStateExporterBase.OPTION_WITH_RESOURCE_MAP,
             SessionStateExporterBase.OPTION_WITH_COMMENTS,
-            SessionStateExporterBase.OPTION_WITH_ATTACHMENTS)
+            SessionStateExporterBase.OPTION_WITH_ATTACHMENTS,
+            SessionStateExporterBase.OPTION_WITH_RESOURCE_USAGE)
         # Generate a dummy system hash if needed
         if system_id is None:
             # FIXME: Compute an real system_id for submission to
@@ -173,8 +176,68 @@ class XMLSessionStateExporter(SessionStateExporterBase):
     def dump(self, data, stream):
         """
         Public method to dump the XML report to a stream
+
+        The data may be returned by either :meth:`get_session_data_subset()`
+        or :meth:`get_lazy_session_data_subset()`. The report is written
+        incrementally, one job (or attachment) at a time, so with lazy data
+        only one record of the session is kept in memory at a time.
+        """
+        self._dump(data, stream, self._get_resource_usage_map(data))
+
+    def dump_from_session(self, session, stream):
+        """
+        Dump the XML report of the specified session to a stream
+
+        Only one record of the session is kept in memory at a time.
         """
-        root = self.get_root_element(data)
+        data = self.get_lazy_session_data_subset(session)
+        # The resource usage of all jobs is needed before any of the questions
+        # are written, get it without computing the (expensive) full records
+        usage_data = self.get_lazy_session_data_subset(
+            session, (self.OPTION_WITH_RESOURCE_USAGE,))
+        self._dump(data, stream, self._get_resource_usage_map(usage_data))
+
+    def _dump(self, data, stream, resource_usage_map):
+        if not hasattr(ET, "xmlfile"):
+            # lxml older than 3.1 cannot write incrementally
+            self._dump_tree(data, stream, resource_usage_map)
+            return
+        # The output is identical to what _dump_tree() writes. Elements are
+        # written as soon as they are created, the whitespace that pretty
+        # printing would add is added explicitly.
+        # The xmlfile API does not allow writing anything outside of the root
+        # element, the declaration and the final newline are written
+        # directly.
+        stream.write(b"<?xml version='1.0' encoding='UTF-8'?>\n")
+        with ET.xmlfile(stream, encoding="UTF-8") as xf:
+            with xf.element("system", attrib={"version": "1.0"}):
+                for tag, child_gen in self._get_sections(
+                        data, resource_usage_map):
+                    xf.write("\n  ")
+                    self._write_section(xf, tag, child_gen)
+                xf.write("\n")
+        stream.write(b"\n")
+
+    def _write_section(self, xf, tag, child_gen):
+        """
+        Write one section of the XML report, one child element at a time
+        """
+        child_gen = iter(child_gen)
+        for child in child_gen:
+            break
+        else:
+            xf.write(ET.Element(tag))
+            return
+        with xf.element(tag):
+            while child is not None:
+                xf.write("\n    ")
+                _indent(child, 2)
+                xf.write(child)
+                child = next(child_gen, None)
+            xf.write("\n  ")
+
+    def _dump_tree(self, data, stream, resource_usage_map):
+        root = self._get_root_element(data, resource_usage_map)
         # XXX: this is pretty terrible but I have not found another
         # way of getting around the problem.
         #
@@ -195,20 +258,48 @@ class XMLSessionStateExporter(SessionStateExporterBase):
         """
         Get the XML element of the document exported from the given data
         """
+        return self._get_root_element(
+            data, self._get_resource_usage_map(data))
+
+    def _get_root_element(self, data, resource_usage_map):
         root = ET.Element("system", attrib={"version": "1.0"})
-        self._add_context(root, data)
-        self._add_hardware(root, data)
-        self._add_questions(root, data)
-        self._add_software(root, data)
-        self._add_summary(root, data)
+        for tag, child_gen in self._get_sections(data, resource_usage_map):
+            ET.SubElement(root, tag).extend(child_gen)
         return root
 
-    def _add_context(self, element, data):
+    def _get_sections(self, data, resource_usage_map):
+        """
+        Get a list of (tag, child_gen) for each section of the XML report
+
+        The child_gen is an iterator of the child elements of the section,
+        they are created lazily.
         """
-        Add the context section of the XML report
+        return [
+            ("context", self._gen_context(data, resource_usage_map)),
+            ("hardware", self._gen_hardware(data)),
+            ("questions", self._gen_questions(data)),
+            ("software", self._gen_software(data)),
+            ("summary", self._gen_summary(data)),
+        ]
+
+    def _get_resource_usage_map(self, data):
         """
-        context = ET.SubElement(element, "context")
-        for name in data["attachment_map"]:
+        Get the resource usage of all the jobs, by job name
+        """
+        resource_usage_map = OrderedDict()
+        # Look at one record at a time, they may be computed lazily
+        for job_name in sorted(data["result_map"]):
+            resource_usage = data["result_map"][job_name].get(
+                "resource_usage")
+            if resource_usage:
+                resource_usage_map[job_name] = resource_usage
+        return resource_usage_map
+
+    def _gen_context(self, data, resource_usage_map):
+        """
+        Generate the elements of the context section of the XML report
+        """
+        for name, attachment in data["attachment_map"].items():
             # The following attachments are used by the hardware section
             if name in ['dmi_attachment',
                         'sysfs_attachment',
@@ -219,42 +310,51 @@ class XMLSessionStateExporter(SessionStateExporterBase):
             # to be removed.
             # The new certification website displays the job name instead.
             # So send what it expects.
-            info = ET.SubElement(context, "info", attrib={"command": name})
+            info = ET.Element("info", attrib={"command": name})
             # Special case of plain text attachments, they are sent without any
             # base64 encoding, this may change if we add the MIME type to the
             # list of attributes
             content = ""
             try:
                 content = standard_b64decode(
-                    data["attachment_map"][name].encode()).decode("UTF-8")
+                    attachment.encode()).decode("UTF-8")
             except UnicodeDecodeError:
-                content = data["attachment_map"][name]
+                content = attachment
             finally:
                 info.text = content
-
-    def _add_hardware(self, element, data):
+            yield info
+        # The resource usage of all the jobs is sent as one JSON document as
+        # there is no other place for it in the schema.
+        if resource_usage_map:
+            info = ET.Element("info", attrib={"command": "resource_usage"})
+            info.text = json.dumps(resource_usage_map, sort_keys=True)
+            yield info
+
+    def _gen_hardware(self, data):
         """
-        Add the hardware section of the XML report
+        Generate the elements of the hardware section of the XML report
         """
         def as_text(attachment):
             return standard_b64decode(
                 data["attachment_map"][attachment].encode()).decode(
                     "ASCII", "ignore")
-        hardware = ET.SubElement(element, "hardware")
         # Attach the content of "dmi_attachment"
-        dmi = ET.SubElement(hardware, "dmi")
+        dmi = ET.Element("dmi")
         if "dmi_attachment" in data["attachment_map"]:
             dmi.text = as_text("dmi_attachment")
+        yield dmi
         # Attach the content of "sysfs_attachment"
-        sysfs_attributes = ET.SubElement(hardware, "sysfs-attributes")
+        sysfs_attributes = ET.Element("sysfs-attributes")
         if "sysfs_attachment" in data["attachment_map"]:
             sysfs_attributes.text = as_text("sysfs_attachment")
+        yield sysfs_attributes
         # Attach the content of "udev_attachment"
-        udev = ET.SubElement(hardware, "udev")
+        udev = ET.Element("udev")
         if "udev_attachment" in data["attachment_map"]:
             udev.text = as_text("udev_attachment")
+        yield udev
         if "cpuinfo" in data["resource_map"]:
-            processors = ET.SubElement(hardware, "processors")
+            processors = ET.Element("processors")
             for i in range(int(data["resource_map"]["cpuinfo"][0]["count"])):
                 processor = ET.SubElement(
                     processors, "processor",
@@ -269,6 +369,7 @@ class XMLSessionStateExporter(SessionStateExporterBase):
                             ("name", key),
                             ("type", "str"))))
                     cpu_property.text = value
+            yield processors
 
     def _add_answer_choices(self, element):
         """
@@ -281,11 +382,11 @@ class XMLSessionStateExporter(SessionStateExporterBase):
                 answer_choices, "value", attrib={"type": "str"})
             value.text = status
 
-    def _add_questions(self, element, data):
+    def _gen_questions(self, data):
         """
-        Add the questions section of the XML report, using the result map
+        Generate the elements of the questions section of the XML report,
+        using the result map
         """
-        questions = ET.SubElement(element, "questions")
         for job_name, job_data in data["result_map"].items():
             # Resource jobs are managed in the hardware/software/summary
             # sections and regular attachments are listed in the context
@@ -293,8 +394,7 @@ class XMLSessionStateExporter(SessionStateExporterBase):
             # hardware section).
             if job_data["plugin"] in ("resource", "local", "attachment"):
                 continue
-            question = ET.SubElement(
-                questions, "question", attrib={"name": job_name})
+            question = ET.Element("question", attrib={"name": job_name})
             answer = ET.SubElement(
                 question, "answer", attrib={"type": "multiple_choice"})
             if job_data["outcome"]:
@@ -310,14 +410,14 @@ class XMLSessionStateExporter(SessionStateExporterBase):
                     job_data["io_log"].encode()).decode('UTF-8')
             else:
                 comment.text = ""
+            yield question
 
-    def _add_software(self, element, data):
+    def _gen_software(self, data):
         """
-        Add the software section of the XML report
+        Generate the elements of the software section of the XML report
         """
-        software = ET.SubElement(element, "software")
         if "lsb" in data["resource_map"]:
-            lsbrelease = ET.SubElement(software, "lsbrelease")
+            lsbrelease = ET.Element("lsbrelease")
             for key, value in data["resource_map"]["lsb"][0].items():
                 lsb_property = ET.SubElement(
                     lsbrelease, "property",
@@ -325,8 +425,9 @@ class XMLSessionStateExporter(SessionStateExporterBase):
                         ("name", key),
                         ("type", "str"))))
                 lsb_property.text = value
+            yield lsbrelease
         if "package" in data["resource_map"]:
-            packages = ET.SubElement(software, "packages")
+            packages = ET.Element("packages")
             for id, package_dict in enumerate(data["resource_map"]["package"]):
                 package = ET.SubElement(
                     packages, "package", attrib=OrderedDict((
@@ -340,48 +441,60 @@ class XMLSessionStateExporter(SessionStateExporterBase):
                             ("name", key),
                             ("type", "str"))))
                     package_property.text = value
+            yield packages
 
-    def _add_summary(self, element, data):
+    def _gen_summary(self, data):
         """
-        Add the summary section of the XML report
+        Generate the elements of the summary section of the XML report
         """
-        summary = ET.SubElement(element, "summary")
         # Insert client identifier
-        ET.SubElement(
-            summary, "client", attrib=OrderedDict((
+        yield ET.Element(
+            "client", attrib=OrderedDict((
                 ("name", self._client_name),
                 ("version", self._client_version))))
         # Insert the generation timestamp
-        ET.SubElement(
-            summary, "date_created", attrib={"value": self._timestamp})
+        yield ET.Element("date_created", attrib={"value": self._timestamp})
         # Dump some data from 'dpkg' resource
         if "dpkg" in data["resource_map"]:
-            ET.SubElement(
-                summary, "architecture", attrib={
+            yield ET.Element(
+                "architecture", attrib={
                     "value": data["resource_map"]["dpkg"][0]["architecture"]})
         # Dump some data from 'lsb' resource
         if "lsb" in data["resource_map"]:
-            ET.SubElement(
-                summary, "distribution", attrib={
+            yield ET.Element(
+                "distribution", attrib={
                     "value": data["resource_map"]["lsb"][0]["distributor_id"]})
-            ET.SubElement(
-                summary, "distroseries", attrib={
+            yield ET.Element(
+                "distroseries", attrib={
                     "value": data["resource_map"]["lsb"][0]["release"]})
         # Dump some data from 'uname' resource
         if "uname" in data["resource_map"]:
-            ET.SubElement(
-                summary, "kernel-release", attrib={
+            yield ET.Element(
+                "kernel-release", attrib={
                     "value": data["resource_map"]["uname"][0]["release"]})
         # NOTE: this element is a legacy from the previous certification
         # website. It is retained for compatibility.
-        ET.SubElement(
-            summary, "private", attrib={"value": "False"})
+        yield ET.Element("private", attrib={"value": "False"})
         # NOTE: as above, legacy compatibility
-        ET.SubElement(
-            summary, "contactable", attrib={"value": "False"})
+        yield ET.Element("contactable", attrib={"value": "False"})
         # NOTE: as above, legacy compatibility
-        ET.SubElement(
-            summary, "live_cd", attrib={"value": "False"})
+        yield ET.Element("live_cd", attrib={"value": "False"})
         # Insert the system identifier string
-        ET.SubElement(
-            summary, "system_id", attrib={"value": self._system_id})
+        yield ET.Element("system_id", attrib={"value": self._system_id})
+
+
+def _indent(element, level):
+    """
+    Add the whitespace that pretty printing would add to element
+
+    The element is assumed to be nested at the specified level, only the
+    children of the element (and not the tail of the element itself) are
+    changed. Like in pretty printing, elements with text are left alone.
+    """
+    if len(element) == 0 or element.text:
+        return
+    element.text = "\n" + "  " * (level + 1)
+    for child in element:
+        _indent(child, level + 1)
+        child.tail = "\n" + "  " * (level + 1)
+    child.tail = "\n" + "  " * level
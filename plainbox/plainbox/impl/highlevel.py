@@ -23,11 +23,11 @@
 """
 
 import logging
-from threading import Thread
 from io import BytesIO
 
 from plainbox import __version__ as plainbox_version
 from plainbox.abc import IJobResult
+from plainbox.impl.executor import JobExecutor
 from plainbox.impl.exporter import get_all_exporters
 from plainbox.impl.result import MemoryJobResult
 from plainbox.impl.runner import JobRunner
@@ -39,10 +39,14 @@ logger = logging.getLogger("plainbox.highlevel")
 
 class Service:
 
-    def __init__(self, provider_list, session_list):
+    # Number of seconds shutdown() waits for running jobs before killing them
+    SHUTDOWN_TIMEOUT = 10
+
+    def __init__(self, provider_list, session_list, max_workers=None):
         # TODO: session_list will be changed to session_manager_list
         self._provider_list = provider_list
         self._session_list = session_list
+        self._executor = JobExecutor(max_workers)
 
     @property
     def version(self):
@@ -56,6 +60,22 @@ class Service:
     def session_list(self):
         return self._session_list
 
+    @property
+    def executor(self):
+        """
+        :class:`~plainbox.impl.executor.JobExecutor` running all the jobs
+        """
+        return self._executor
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT, wait=True):
+        """
+        Cancel all the queued jobs and wait for the running ones
+
+        Jobs that still run after timeout seconds are killed. If wait is
+        False, running jobs are killed at once and not waited for.
+        """
+        return self._executor.shutdown(timeout, wait)
+
     def create_session(self, job_list):
         # TODO: allocate storage
         # TODO: construct state
@@ -84,19 +104,12 @@ class Service:
     def _export_session_to_stream(self, session, output_format, option_list, stream):
         exporter_cls = get_all_exporters()[output_format]
         exporter = exporter_cls(option_list)
-        data_subset = exporter.get_session_data_subset(session)
-        exporter.dump(data_subset, stream)
+        exporter.dump_from_session(session, stream)
 
-    def _run(self, session, job, running_job_wrapper):
+    def _run(self, session, job, runner, running_job_wrapper):
         """
-        Start a JobRunner in a separate thread
+        Run a job with the specified JobRunner, in a worker thread
         """
-        runner = JobRunner(
-            session.session_dir,
-            session.jobs_io_log_dir,
-            command_io_delegate=running_job_wrapper.ui_io_delegate,
-            interaction_callback=running_job_wrapper.emitAskForOutcomeSignal
-        )
         job_state = session.job_state_map[job.name]
         if job_state.can_start():
             job_result = runner.run_job(job)
@@ -110,8 +123,19 @@ class Service:
 
     # FIXME: broken layering, running_job_wrapper is from the dbus layer
     def run_job(self, session, job, running_job_wrapper):
-        runner = Thread(target=self._run,
-                        args=(session, job, running_job_wrapper))
-        runner.start()
-        # FIXME: we need to keep track of this thread
+        """
+        Queue a job to run in the executor
+
+        The ticket of the job is stored as the ticket attribute of
+        running_job_wrapper, the job can be cancelled or killed with it.
+        """
+        runner = JobRunner(
+            session.session_dir,
+            session.jobs_io_log_dir,
+            command_io_delegate=running_job_wrapper.ui_io_delegate,
+            interaction_callback=running_job_wrapper.emitAskForOutcomeSignal
+        )
+        running_job_wrapper.ticket = self._executor.submit(
+            session, self._run, session, job, runner, running_job_wrapper,
+            kill=runner.kill)
         return job
@@ -91,6 +91,44 @@ class JobDefinition(BaseJob, IJobDefinition):
                 "Incorrect value of 'estimated_duration' in job"
                 "%s read from %s"), self.name, self.origin)
 
+    @property
+    def timeout(self):
+        """
+        maximum duration of this job in seconds.
+
+        Jobs that run for longer than that are killed. The value may be None,
+        which indicates that the job may run for as long as it wants (see
+        also the timeout multiplier of :class:`~plainbox.impl.runner.JobRunner`
+        that is applied to the estimated duration).
+        """
+        value = self.get_record_value('timeout')
+        if value is None:
+            return
+        try:
+            value = float(value)
+        except ValueError:
+            value = -1
+        if value <= 0:
+            logger.warning((
+                "Incorrect value of 'timeout' in job"
+                " %s read from %s"), self.name, self.origin)
+            return
+        return value
+
+    @property
+    def exclusive(self):
+        """
+        Whether the job must never run concurrently with any other job.
+
+        This is expressed with the 'exclusive' key of the job definition.
+        Values such as 'yes' or 'true' mark the job as exclusive. Jobs that
+        suspend, reboot or stress the machine should be marked this way.
+        """
+        value = self.get_record_value('exclusive')
+        if value is None:
+            return False
+        return value.strip().lower() in ('yes', 'true', '1')
+
     @property
     def automated(self):
         """
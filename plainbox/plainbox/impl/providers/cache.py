@@ -0,0 +1,195 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+# Written by:
+#   Zygmunt Krynicki <zygmunt.krynicki@canonical.com>
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+:mod:`plainbox.impl.providers.cache` -- cache of parsed job definitions
+=======================================================================
+
+.. warning::
+
+    THIS MODULE DOES NOT HAVE STABLE PUBLIC API
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+from plainbox.impl.job import JobDefinition
+from plainbox.impl.rfc822 import Origin
+
+
+logger = logging.getLogger("plainbox.providers.cache")
+
+
+class JobDefinitionCache:
+    """
+    On-disk cache of job definitions loaded from job definition files.
+
+    Each file with job definitions has a corresponding cache entry. The
+    entry holds the data, origin and checksum of each job defined in that
+    file. An entry is only used if the path, modification time and size of
+    the file, as well as the version of the parser, are the same as when the
+    entry was stored.
+
+    Entries are JSON documents, one per file, stored in the cache directory.
+    Any problem with the cache is logged and otherwise ignored, the caller
+    should simply parse the file as if the cache was not there.
+    """
+
+    # Version of the parser and of the layout of cache entries. Bump this
+    # each time the RFC822 parser, JobDefinition or the format of the entries
+    # changes in a way that would make old entries incorrect.
+    PARSER_VERSION = 1
+
+    def __init__(self, location=None):
+        """
+        Initialize a cache stored in the given directory
+
+        :param location:
+            Directory with cache entries, by default the location returned
+            by :meth:`get_default_location()` is used. The default location
+            is computed each time the cache is used, so that it follows
+            changes of XDG_CACHE_HOME. The directory is created when the
+            first entry is stored.
+        """
+        self._location = location
+
+    @property
+    def location(self):
+        """
+        pathname of the directory with cache entries
+        """
+        if self._location is None:
+            return self.get_default_location()
+        return self._location
+
+    @classmethod
+    def get_default_location(cls):
+        """
+        Compute the default location of the job definition cache
+
+        :returns: ${XDG_CACHE_HOME:-$HOME/.cache}/plainbox/jobs
+        """
+        # Pick XDG_CACHE_HOME from environment
+        xdg_cache_home = os.environ.get('XDG_CACHE_HOME')
+        # If not set or empty use the default ~/.cache/
+        if not xdg_cache_home:
+            xdg_cache_home = os.path.join(os.path.expanduser('~'), '.cache')
+        # Use a directory relative to XDG_CACHE_HOME
+        return os.path.join(xdg_cache_home, 'plainbox', 'jobs')
+
+    def load(self, filename):
+        """
+        Load job definitions of the specified file from the cache
+
+        :param filename:
+            Name of the file with job definitions
+        :returns:
+            A list of JobDefinition instances or None if there is no valid
+            cache entry for that file.
+
+        The returned jobs have their origin and checksum restored. The
+        provider is not set.
+        """
+        try:
+            key = self.get_key(filename)
+            with open(self._get_entry_pathname(filename), 'rt',
+                      encoding='UTF-8') as stream:
+                entry = json.load(stream)
+            if entry.get('key') != key:
+                logger.debug("Cache entry for %r is stale", filename)
+                return None
+            job_list = []
+            for record in entry['records']:
+                job = JobDefinition(record['data'], Origin(
+                    filename, record['line_start'], record['line_end']))
+                # Don't re-compute the checksum, it was computed from the
+                # very same data before the entry was stored.
+                job._checksum = record['checksum']
+                job_list.append(job)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning(
+                "Unable to load cached job definitions of %r: %s",
+                filename, exc)
+            return None
+        logger.debug("Loaded %d cached job definitions of %r",
+                     len(job_list), filename)
+        return job_list
+
+    def store(self, filename, key, record_list, job_list):
+        """
+        Store job definitions of the specified file in the cache
+
+        :param filename:
+            Name of the file with job definitions
+        :param key:
+            Key of the file, as returned by :meth:`get_key()` *before* the
+            file was loaded. This way the entry is simply stale if the file
+            is modified while being loaded.
+        :param record_list:
+            List of RFC822Record instances loaded from that file
+        :param job_list:
+            List of JobDefinition instances created from each of the records
+
+        The entry is written to a temporary file and then renamed so that
+        readers never see a partially written entry.
+        """
+        try:
+            entry = {
+                'key': key,
+                'records': [{
+                    'data': record.data,
+                    'line_start': record.origin.line_start,
+                    'line_end': record.origin.line_end,
+                    'checksum': job.get_checksum(),
+                } for record, job in zip(record_list, job_list)]
+            }
+            os.makedirs(self.location, exist_ok=True)
+            pathname = self._get_entry_pathname(filename)
+            pathname_next = "{}.{}.next".format(pathname, os.getpid())
+            with open(pathname_next, 'wt', encoding='UTF-8') as stream:
+                json.dump(entry, stream)
+            os.replace(pathname_next, pathname)
+        except OSError as exc:
+            logger.warning(
+                "Unable to cache job definitions of %r: %s", filename, exc)
+
+    def get_key(self, filename):
+        """
+        Compute the key that must match for a cache entry to be valid
+
+        The key is made out of the parser version, the absolute path of the
+        file, its modification time (in nanoseconds) and size.
+
+        :raises OSError: if the file cannot be looked at
+        """
+        stat = os.stat(filename)
+        return [self.PARSER_VERSION, os.path.abspath(filename),
+                stat.st_mtime_ns, stat.st_size]
+
+    def _get_entry_pathname(self, filename):
+        """
+        Compute the pathname of the cache entry of the specified file
+        """
+        digest = hashlib.sha1(
+            os.path.abspath(filename).encode('UTF-8')).hexdigest()
+        return os.path.join(self.location, "{}.json".format(digest))
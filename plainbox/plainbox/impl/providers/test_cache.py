@@ -0,0 +1,120 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+# Written by:
+#   Zygmunt Krynicki <zygmunt.krynicki@canonical.com>
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+plainbox.impl.providers.test_cache
+==================================
+
+Test definitions for plainbox.impl.providers.cache module
+"""
+
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+
+from mock import patch
+
+from plainbox.impl.providers.cache import JobDefinitionCache
+from plainbox.impl.providers.v1 import Provider1
+
+
+class JobDefinitionCacheTests(TestCase):
+
+    def setUp(self):
+        self.scratch_dir = TemporaryDirectory()
+        self.base_dir = self.scratch_dir.name
+        os.mkdir(os.path.join(self.base_dir, "jobs"))
+        self.filename = os.path.join(self.base_dir, "jobs", "test.txt")
+        self.write_jobs(
+            "name: foo\n"
+            "plugin: shell\n"
+            "command: true\n"
+            "\n"
+            "name: bar\n"
+            "plugin: manual\n")
+        self.cache = JobDefinitionCache(
+            os.path.join(self.base_dir, "cache"))
+        self.provider = Provider1(
+            self.base_dir, "test", "test", job_cache=self.cache)
+
+    def tearDown(self):
+        self.scratch_dir.cleanup()
+
+    def write_jobs(self, text):
+        with open(self.filename, 'wt', encoding='UTF-8') as stream:
+            stream.write(text)
+
+    def test_default_location(self):
+        with patch.dict('os.environ', {'XDG_CACHE_HOME': '/cache'}):
+            self.assertEqual(
+                JobDefinitionCache.get_default_location(),
+                '/cache/plainbox/jobs')
+
+    def test_default_location_follows_environment(self):
+        cache = JobDefinitionCache()
+        with patch.dict('os.environ', {'XDG_CACHE_HOME': '/cache'}):
+            self.assertEqual(cache.location, '/cache/plainbox/jobs')
+        with patch.dict('os.environ', {'XDG_CACHE_HOME': '/other'}):
+            self.assertEqual(cache.location, '/other/plainbox/jobs')
+
+    def test_empty(self):
+        self.assertIsNone(self.cache.load(self.filename))
+
+    def test_store_and_load(self):
+        key = self.cache.get_key(self.filename)
+        with open(self.filename, 'rt', encoding='UTF-8') as stream:
+            record_list, job_list = self.provider._load_records_and_jobs(
+                stream)
+        self.cache.store(self.filename, key, record_list, job_list)
+        cached_job_list = self.cache.load(self.filename)
+        self.assertEqual(cached_job_list, job_list)
+        for cached_job, job in zip(cached_job_list, job_list):
+            self.assertEqual(cached_job.name, job.name)
+            self.assertEqual(cached_job.origin, job.origin)
+            # The checksum is restored, not computed
+            self.assertEqual(cached_job._checksum, job.get_checksum())
+
+    def test_stale_entry(self):
+        key = self.cache.get_key(self.filename)
+        self.cache.store(self.filename, key, [], [])
+        self.assertEqual(self.cache.load(self.filename), [])
+        self.write_jobs("name: foo\nplugin: shell\n")
+        self.assertIsNone(self.cache.load(self.filename))
+
+    def test_parser_version(self):
+        key = self.cache.get_key(self.filename)
+        self.cache.store(self.filename, key, [], [])
+        with patch.object(JobDefinitionCache, 'PARSER_VERSION', 0):
+            self.assertIsNone(self.cache.load(self.filename))
+
+    def test_corrupted_entry(self):
+        os.makedirs(self.cache.location)
+        with open(self.cache._get_entry_pathname(self.filename), 'wt') as f:
+            f.write("{")
+        self.assertIsNone(self.cache.load(self.filename))
+
+    def test_provider_uses_cache(self):
+        job_list = self.provider.get_builtin_jobs()
+        self.assertEqual([job.name for job in job_list], ['bar', 'foo'])
+        with patch('plainbox.impl.providers.v1.load_rfc822_records') as mock:
+            cached_job_list = self.provider.get_builtin_jobs()
+            self.assertFalse(mock.called)
+        self.assertEqual(cached_job_list, job_list)
+        for job in cached_job_list:
+            self.assertIs(job._provider, self.provider)
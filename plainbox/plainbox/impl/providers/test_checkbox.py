@@ -24,6 +24,10 @@ plainbox.impl.test_checkbox
 Test definitions for plainbox.impl.checkbox module
 """
 
+from tempfile import TemporaryDirectory
+
+from mock import patch
+
 from plainbox.impl.providers.checkbox import CheckBoxAutoProvider
 from plainbox.testing_utils.testcases import TestCaseWithParameters
 
@@ -33,7 +37,11 @@ class TestCheckBox(TestCaseWithParameters):
 
     @classmethod
     def get_parameter_values(cls):
-        for job in CheckBoxAutoProvider().get_builtin_jobs():
+        # Don't cache job definitions in the real XDG_CACHE_HOME
+        with TemporaryDirectory() as scratch_dir:
+            with patch.dict('os.environ', {'XDG_CACHE_HOME': scratch_dir}):
+                job_list = CheckBoxAutoProvider().get_builtin_jobs()
+        for job in job_list:
             yield (job,)
 
     def test_job_resource_expression(self):
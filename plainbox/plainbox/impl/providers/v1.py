@@ -30,7 +30,9 @@ from plainbox.abc import IProvider1, IProviderBackend1
 from plainbox.impl.applogic import WhiteList
 from plainbox.impl.job import JobDefinition
 from plainbox.impl.plugins import PlugInCollection
+from plainbox.impl.providers.cache import JobDefinitionCache
 from plainbox.impl.rfc822 import load_rfc822_records
+from plainbox.impl.tracing import span
 
 
 logger = logging.getLogger("plainbox.providers.v1")
@@ -45,7 +47,7 @@ class Provider1(IProvider1, IProviderBackend1):
     location for all other data.
     """
 
-    def __init__(self, base_dir, name, description):
+    def __init__(self, base_dir, name, description, job_cache=None):
         """
         Initialize the provider with the associated base directory.
 
@@ -53,10 +55,17 @@ class Provider1(IProvider1, IProviderBackend1):
         can be customized by subclassing and overriding the particular methods
         of the IProviderBackend1 class but that should not be necessary in
         normal operation.
+
+        Job definitions are loaded through job_cache, a
+        :class:`~plainbox.impl.providers.cache.JobDefinitionCache`. By
+        default the cache at the default location is used.
         """
         self._base_dir = base_dir
         self._name = name
         self._description = description
+        if job_cache is None:
+            job_cache = JobDefinitionCache()
+        self._job_cache = job_cache
 
     @property
     def name(self):
@@ -157,26 +166,46 @@ class Provider1(IProvider1, IProviderBackend1):
         Load job definitions from somewhere
         """
         if isinstance(somewhere, str):
-            # Load data from a file with the given name
+            # Load data from a file with the given name, using cached job
+            # definitions if possible
             filename = somewhere
-            with open(filename, 'rt', encoding='UTF-8') as stream:
-                return self.load_jobs(stream)
+            with span("load jobs", "provider", filename=filename):
+                job_list = self._job_cache.load(filename)
+                if job_list is not None:
+                    for job in job_list:
+                        job._provider = self
+                    return job_list
+                key = self._job_cache.get_key(filename)
+                with open(filename, 'rt', encoding='UTF-8') as stream:
+                    record_list, job_list = self._load_records_and_jobs(
+                        stream)
+                self._job_cache.store(filename, key, record_list, job_list)
+                return job_list
         if isinstance(somewhere, io.TextIOWrapper):
             stream = somewhere
-            logger.debug("Loading jobs definitions from %r...", stream.name)
-            record_list = load_rfc822_records(stream)
-            job_list = []
-            for record in record_list:
-                job = JobDefinition.from_rfc822_record(record)
-                job._provider = self
-                logger.debug("Loaded %r", job)
-                job_list.append(job)
+            record_list, job_list = self._load_records_and_jobs(stream)
             return job_list
         else:
             raise TypeError(
                 "Unsupported type of 'somewhere': {!r}".format(
                     type(somewhere)))
 
+    def _load_records_and_jobs(self, stream):
+        """
+        Load job definitions from a stream
+
+        :returns: a tuple (record_list, job_list)
+        """
+        logger.debug("Loading jobs definitions from %r...", stream.name)
+        record_list = load_rfc822_records(stream)
+        job_list = []
+        for record in record_list:
+            job = JobDefinition.from_rfc822_record(record)
+            job._provider = self
+            logger.debug("Loaded %r", job)
+            job_list.append(job)
+        return record_list, job_list
+
 
 class DummyProvider1(IProvider1, IProviderBackend1):
     """
@@ -127,13 +127,98 @@ class Resource:
             != object.__getattribute__(other, '_data'))
 
 
+class ResourceIndex:
+    """
+    Index of a list of resources, by attribute value
+
+    The index can be used to quickly find all the resources that have an
+    attribute with a given value, without looking at each resource. The map
+    for each attribute is computed on first use.
+
+    The resource list must not be changed while the index is in use.
+    """
+
+    def __init__(self, resource_list):
+        """
+        Initialize a new index of the given list of resources
+        """
+        self._resource_list = resource_list
+        # Maps from attribute name to a dictionary that maps from attribute
+        # value to a list of resources with that value. None is used for
+        # attributes that cannot be indexed (with unhashable values).
+        self._attr_map = {}
+
+    @property
+    def resource_list(self):
+        """
+        The list of resources this index was built for
+        """
+        return self._resource_list
+
+    def lookup(self, attr, value_list):
+        """
+        Find all resources that have an attribute with any of the values
+
+        :param attr:
+            Name of the attribute to look at
+        :param value_list:
+            List of values to look for
+        :returns:
+            A list of resources that have the attribute set to any of the
+            values from value_list or None if the attribute cannot be
+            indexed.
+        """
+        try:
+            value_map = self._attr_map[attr]
+        except KeyError:
+            value_map = self._attr_map[attr] = self._build_value_map(attr)
+        if value_map is None:
+            return None
+        if len(value_list) == 1:
+            return value_map.get(value_list[0], [])
+        matching_list = []
+        for value in value_list:
+            matching_list.extend(value_map.get(value, ()))
+        return matching_list
+
+    def _build_value_map(self, attr):
+        """
+        Internal method of ResourceIndex.
+
+        Computes a map of values of the specified attribute => list of
+        resources. Returns None if any of the values is unhashable.
+        """
+        value_map = {}
+        for resource in self._resource_list:
+            if not isinstance(resource, Resource):
+                raise TypeError("Each resource must be a Resource instance")
+            data = object.__getattribute__(resource, '_data')
+            if attr not in data:
+                continue
+            try:
+                value_map.setdefault(data[attr], []).append(resource)
+            except TypeError:
+                return None
+        return value_map
+
+
 class ResourceProgram:
     """
     Class for storing and executing resource programs.
 
     This is used by job requirement expressions
+
+    :cvar cache_hit_count:
+        Number of times evaluate_or_raise() has used a cached result, across
+        all programs
+    :cvar cache_miss_count:
+        Number of times evaluate_or_raise() had to evaluate a program while
+        resource versions were available, across all programs
     """
 
+    cache_hit_count = 0
+    cache_miss_count = 0
+
     def __init__(self, program_text):
         """
         Analyze the requirement program and prepare it for execution
@@ -148,6 +233,9 @@ class ResourceProgram:
         for line in program_text.splitlines():
             if line.strip() != "":
                 self._expression_list.append(ResourceExpression(line))
+        # The most recent result of evaluate_or_raise(), see there
+        self._cached_version_tuple = None
+        self._cached_result = None
 
     @property
     def expression_list(self):
@@ -164,7 +252,8 @@ class ResourceProgram:
         return set((expression.resource_name
                     for expression in self._expression_list))
 
-    def evaluate_or_raise(self, resource_map):
+    def evaluate_or_raise(self, resource_map, resource_index_map=None,
+                          resource_version_map=None):
         """
         Evaluate the program with the given map of resources.
 
@@ -175,7 +264,44 @@ class ResourceProgram:
         Returns True
 
         Resources must be a dictionary of mapping resource name to a list of
-        Resource objects.
+        Resource objects. The optional resource_index_map may map resource
+        names to ResourceIndex instances, those are used to speed up
+        evaluation of expressions. Each index is only used if it was built
+        for the very same list of resources as found in resource_map.
+
+        The optional resource_version_map may map resource names to versions
+        of the resource lists from resource_map. Versions must change each
+        time a resource list is replaced and must never be reused for
+        another list. When versions are available the result is remembered
+        and evaluating the program again, with the same versions of all the
+        required resources, just reproduces that result.
+        """
+        if resource_version_map is None:
+            return self._evaluate_or_raise(resource_map, resource_index_map)
+        version_tuple = tuple(
+            resource_version_map.get(expression.resource_name)
+            for expression in self._expression_list)
+        if version_tuple == self._cached_version_tuple:
+            ResourceProgram.cache_hit_count += 1
+        else:
+            ResourceProgram.cache_miss_count += 1
+            try:
+                self._evaluate_or_raise(resource_map, resource_index_map)
+            except ExpressionFailedError as exc:
+                self._cached_result = (exc.__class__, exc.expression)
+            else:
+                self._cached_result = None
+            self._cached_version_tuple = version_tuple
+        if self._cached_result is not None:
+            exc_cls, expression = self._cached_result
+            raise exc_cls(expression)
+        return True
+
+    def _evaluate_or_raise(self, resource_map, resource_index_map):
+        """
+        Internal method of ResourceProgram.
+
+        Evaluates the program, see evaluate_or_raise()
         """
         # First check if we have all required resources
         for expression in self._expression_list:
@@ -183,8 +309,15 @@ class ResourceProgram:
                 raise ExpressionCannotEvaluateError(expression)
         # Then evaluate all expressions
         for expression in self._expression_list:
-            result = expression.evaluate(
-                resource_map[expression.resource_name])
+            resource_list = resource_map[expression.resource_name]
+            resource_index = None
+            if resource_index_map is not None:
+                resource_index = resource_index_map.get(
+                    expression.resource_name)
+                if (resource_index is not None
+                        and resource_index.resource_list is not resource_list):
+                    resource_index = None
+            result = expression.evaluate(resource_list, resource_index)
             if not result:
                 raise ExpressionFailedError(expression)
         return True
@@ -411,6 +544,8 @@ class ResourceExpression:
         self._text = text
         self._lambda = eval("lambda {}: {}".format(
             self._resource_name, self._text))
+        self._index_query = self._compile_index_query(
+            ast.parse(text).body[0].value, self._resource_name)
 
     def __str__(self):
         return self._text
@@ -432,14 +567,28 @@ class ResourceExpression:
         """
         return self._resource_name
 
-    def evaluate(self, resource_list):
+    def evaluate(self, resource_list, resource_index=None):
         """
         Evaluate the expression against a list of resources
 
         Each subsequent resource from the list will be bound to the resource
         name in the expression. The return value is True if any of the attempts
         return a true value, otherwise the result is False.
+
+        If resource_index (a ResourceIndex built for resource_list) is
+        specified and the expression compares an attribute to a constant
+        (with == or in) the index is used to find the matching resources
+        instead of looking at each of them.
         """
+        if resource_index is not None and self._index_query is not None:
+            attr, value_list, exact = self._index_query
+            candidate_list = resource_index.lookup(attr, value_list)
+            if candidate_list is not None:
+                if exact:
+                    # The lookup has answered the whole expression
+                    return bool(candidate_list)
+                # Only the candidates can possibly match
+                resource_list = candidate_list
         # Try each resource in sequence.
         for resource in resource_list:
             if not isinstance(resource, Resource):
@@ -464,6 +613,73 @@ class ResourceExpression:
         # documentation side.
         return False
 
+    @classmethod
+    def _compile_index_query(cls, node, resource_name):
+        """
+        Analyze the expression and see if it can be answered by an index
+
+        Returns a tuple (attr, value_list, exact) or None. The expression
+        can only be true for resources that have the attribute attr set to
+        one of the values from value_list. If exact is True then the
+        expression is true for all such resources.
+
+        Supported expressions are comparisons of an attribute with a constant
+        (resource.attr == 'value' or 'value' == resource.attr), membership
+        tests in a list or tuple of constants (resource.attr in ['a', 'b'])
+        and conjunctions (and) where any of the operands is one of the above.
+        """
+        if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+            for value in node.values:
+                query = cls._compile_index_query(value, resource_name)
+                if query is not None:
+                    return query[0], query[1], False
+            return None
+        if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+            return None
+        left, op, right = node.left, node.ops[0], node.comparators[0]
+        if isinstance(op, ast.Eq):
+            if cls._get_attr_name(right, resource_name) is not None:
+                left, right = right, left
+            attr = cls._get_attr_name(left, resource_name)
+            value_list = cls._get_constant_list([right])
+        elif isinstance(op, ast.In):
+            attr = cls._get_attr_name(left, resource_name)
+            if not isinstance(right, (ast.List, ast.Tuple)):
+                return None
+            value_list = cls._get_constant_list(right.elts)
+        else:
+            return None
+        if attr is None or value_list is None:
+            return None
+        return attr, value_list, True
+
+    @staticmethod
+    def _get_attr_name(node, resource_name):
+        """
+        Return the name of the accessed attribute if node is resource.attr
+        """
+        if (isinstance(node, ast.Attribute)
+                and isinstance(node.value, ast.Name)
+                and node.value.id == resource_name):
+            return node.attr
+
+    @staticmethod
+    def _get_constant_list(node_list):
+        """
+        Return the list of values of nodes if all of them are constant
+        strings or numbers.
+        """
+        value_list = []
+        for node in node_list:
+            try:
+                value = ast.literal_eval(node)
+            except ValueError:
+                return None
+            if not isinstance(value, (str, int, float)):
+                return None
+            value_list.append(value)
+        return value_list
+
     @classmethod
     def _analyze(cls, text):
         """
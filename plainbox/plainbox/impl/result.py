@@ -23,8 +23,17 @@
 
 This module has two basic implementation of :class:`IJobResult`:
 :class:`MemoryJobResult` and :class:`DiskJobResult`.
+
+IO logs of :class:`DiskJobResult` are stored in one of two formats. The
+original one is a gzipped text file with one JSON document per record, see
+:class:`IOLogRecordWriter`. The second one is a binary format with random
+access, see :class:`BinaryIOLogRecordWriter`. Use :func:`open_io_log()` to
+read either of them.
 """
 
+from bisect import bisect_left
+from bisect import bisect_right
+from collections import deque
 from collections import namedtuple
 import base64
 import gzip
@@ -32,6 +41,9 @@ import io
 import json
 import logging
 import inspect
+import os
+import struct
+import zlib
 
 from plainbox.abc import IJobResult
 from plainbox.impl.signal import Signal
@@ -52,6 +64,30 @@ logger = logging.getLogger("plainbox.result")
 IOLogRecord = namedtuple("IOLogRecord", "delay stream_name data".split())
 
 
+def _tail(io_log, n):
+    """
+    Get the last n records of an IO log (any iterable of records)
+    """
+    if n <= 0:
+        return []
+    return list(deque(io_log, maxlen=n))
+
+
+def _range(io_log, start_time, end_time=None, time=0.0):
+    """
+    Iterate over records of an IO log created in the specified time range
+
+    The time of each record is the sum of its delay and of the delays of all
+    the records that precede it, starting at time.
+    """
+    for record in io_log:
+        time += record.delay
+        if end_time is not None and time >= end_time:
+            break
+        if time >= start_time:
+            yield record
+
+
 class _JobResultBase(IJobResult):
     """
     Base class for :`IJobResult` implementations.
@@ -108,6 +144,17 @@ class _JobResultBase(IJobResult):
         """
         return self._data.get('execution_duration')
 
+    @property
+    def resource_usage(self):
+        """
+        The resources used by this jobs command.
+
+        This is either None or a dictionary with CPU times, peak memory
+        usage, block I/O and context switch counts, see
+        :func:`plainbox.impl.runner.get_resource_usage()`
+        """
+        return self._data.get('resource_usage')
+
     @property
     def comments(self):
         """
@@ -139,6 +186,38 @@ class _JobResultBase(IJobResult):
     def io_log(self):
         return tuple(self.get_io_log())
 
+    def tail(self, n):
+        """
+        Get the last n records of the IO log
+
+        :returns: a list of at most n :class:`IOLogRecord` objects
+        """
+        return _tail(self.get_io_log(), n)
+
+    def range(self, start_time, end_time=None):
+        """
+        Iterate over records of the IO log created in the specified range
+
+        :param start_time:
+            Minimum time of the generated records, in seconds since the
+            start of the job
+        :param end_time:
+            Maximum time (excluded) of the generated records, if None
+            everything after start_time is generated.
+
+        The delay of each record is the time since the previous record, the
+        time of a record is the sum of the delays up to that record.
+        """
+        return _range(self.get_io_log(), start_time, end_time)
+
+    def stdout_bytes(self):
+        """
+        Get everything the job has written to stdout, as one bytes object
+        """
+        return b''.join(
+            record.data for record in self.get_io_log()
+            if record.stream_name == 'stdout')
+
 
 class MemoryJobResult(_JobResultBase):
     """
@@ -193,11 +272,54 @@ class DiskJobResult(_JobResultBase):
     def get_io_log(self):
         record_path = self.io_log_filename
         if record_path:
-            with GzipFile(record_path, mode='rb') as gzip_stream, \
-                    io.TextIOWrapper(gzip_stream, encoding='UTF-8') as stream:
-                for record in IOLogRecordReader(stream):
+            with open_io_log(record_path) as reader:
+                for record in reader:
                     yield record
 
+    def tail(self, n):
+        """
+        Get the last n records of the IO log
+
+        :returns: a list of at most n :class:`IOLogRecord` objects
+
+        With binary IO logs only the last blocks of the file are read.
+        """
+        record_path = self.io_log_filename
+        if not record_path:
+            return []
+        with open_io_log(record_path) as reader:
+            return reader.tail(n)
+
+    def range(self, start_time, end_time=None):
+        """
+        Iterate over records of the IO log created in the specified range
+
+        See :meth:`_JobResultBase.range()`. With binary IO logs only the
+        blocks with the selected records are read.
+        """
+        record_path = self.io_log_filename
+        if record_path:
+            with open_io_log(record_path) as reader:
+                for record in reader.range(start_time, end_time):
+                    yield record
+
+    def stdout_bytes(self):
+        """
+        Get everything the job has written to stdout, as one bytes object
+        """
+        record_path = self.io_log_filename
+        if not record_path:
+            return b''
+        with open_io_log(record_path) as reader:
+            if isinstance(reader, BinaryIOLogRecordReader):
+                # Avoid copying data of each record before it is joined
+                record_iter = reader.iter_records(zero_copy=True)
+            else:
+                record_iter = iter(reader)
+            return b''.join(
+                record.data for record in record_iter
+                if record.stream_name == 'stdout')
+
     @property
     def io_log(self):
         caller_frame, filename, lineno = inspect.stack(0)[1][:3]
@@ -241,6 +363,12 @@ class IOLogRecordReader:
     def __init__(self, stream):
         self.stream = stream
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     def close(self):
         self.stream.close()
 
@@ -269,3 +397,428 @@ class IOLogRecordReader:
             if record is None:
                 break
             yield record
+
+    def tail(self, n):
+        """
+        Get the last n records
+
+        :returns: a list of at most n :class:`IOLogRecord` objects
+
+        The whole stream has to be read, see
+        :meth:`BinaryIOLogRecordReader.tail()` for a faster alternative.
+        """
+        return _tail(self, n)
+
+    def range(self, start_time, end_time=None):
+        """
+        Iterate over records created in the specified time range
+
+        See :meth:`BinaryIOLogRecordReader.range()`
+        """
+        return _range(self, start_time, end_time)
+
+
+class BinaryIOLogRecordWriter:
+    """
+    Class for writing :class:`IOLogRecord` instances to a binary stream
+
+    This is the second version of the on-disk format of IO logs. Compared to
+    :class:`IOLogRecordWriter` data is not encoded in any way and stream
+    names are only stored once per block. Records are grouped in blocks that
+    are (optionally) compressed independently. An index of blocks, written
+    when the writer is closed, allows :class:`BinaryIOLogRecordReader` to
+    find any record without reading the records that precede it.
+
+    The stream has the following layout (all integers are little-endian):
+
+    * The magic string :attr:`MAGIC`
+    * Any number of blocks, each one made of the header (kind, size of the
+      payload, size of the payload when uncompressed, the number of records
+      and the start time of the block), as described by
+      :attr:`BLOCK_HEADER`, and the payload.
+      The kind is one of :attr:`BLOCK_STORED`, :attr:`BLOCK_ZLIB` (the
+      payload is compressed with zlib) or :attr:`BLOCK_INDEX`.
+    * The payload of record blocks is a sequence of entries, each one made
+      of the header (stream id, delay and size of the data), as described by
+      :attr:`ENTRY_HEADER`, and the data. The stream id 0 is special, such
+      entries define the name (data) of the next stream id of the block.
+      Stream ids start at 1 in each block, so each block can be read on its
+      own.
+    * The index block, its payload is a sequence of offsets of each record
+      block, the number of records that precede it and its start time, as
+      described by :attr:`INDEX_ENTRY`.
+    * The footer, with the offset of the index block and the magic string
+      :attr:`INDEX_MAGIC`, as described by :attr:`FOOTER`.
+
+    A stream that was not closed properly (there is no index) can still be
+    read, up to the last complete block.
+
+    The delay of each record is the time since the previous record. The
+    start time of a block is the sum of the delays of all the records that
+    precede it, so start times never decrease from one block to the next and
+    the index can be searched by time, see
+    :meth:`BinaryIOLogRecordReader.range()`.
+    """
+
+    # The last byte is the version of the format, bump it each time the
+    # layout of the file changes
+    MAGIC = b'PBIOLOG\x04'
+    INDEX_MAGIC = b'PBIOIDX\x04'
+
+    BLOCK_STORED = 1
+    BLOCK_ZLIB = 2
+    BLOCK_INDEX = 3
+
+    BLOCK_HEADER = struct.Struct('<BIIId')
+    ENTRY_HEADER = struct.Struct('<BdI')
+    INDEX_ENTRY = struct.Struct('<QQd')
+    FOOTER = struct.Struct('<Q8s')
+
+    # Size of the (uncompressed) payload of a block, blocks are written as
+    # soon as they are at least that big.
+    BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, stream, compress=True):
+        """
+        Initialize a writer with the specified binary stream
+
+        :param stream:
+            Stream to write to, the stream doesn't need to be seekable
+        :param compress:
+            If True (the default) blocks are compressed with zlib
+        """
+        self.stream = stream
+        self._compress = compress
+        self._offset = 0
+        self._index = []
+        self._num_records = 0
+        self._block = bytearray()
+        self._block_num_records = 0
+        # Sum of the delays of all the records written so far and of the
+        # records that precede the current block
+        self._time = 0.0
+        self._block_start_time = 0.0
+        self._block_stream_map = {}
+        self._write(self.MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Write the last block and the index, then close the stream
+        """
+        self.flush()
+        index_offset = self._offset
+        payload = b''.join(
+            self.INDEX_ENTRY.pack(*entry) for entry in self._index)
+        self._write(self.BLOCK_HEADER.pack(
+            self.BLOCK_INDEX, len(payload), len(payload), self._num_records,
+            0.0))
+        self._write(payload)
+        self._write(self.FOOTER.pack(index_offset, self.INDEX_MAGIC))
+        self.stream.close()
+
+    def flush(self):
+        """
+        Write all the records that are still buffered, as a block
+        """
+        if not self._block_num_records:
+            return
+        payload = raw_payload = bytes(self._block)
+        kind = self.BLOCK_STORED
+        if self._compress:
+            payload = zlib.compress(raw_payload)
+            kind = self.BLOCK_ZLIB
+        self._index.append(
+            (self._offset, self._num_records, self._block_start_time))
+        self._write(self.BLOCK_HEADER.pack(
+            kind, len(payload), len(raw_payload), self._block_num_records,
+            self._block_start_time))
+        self._write(payload)
+        self._num_records += self._block_num_records
+        self._block = bytearray()
+        self._block_num_records = 0
+        self._block_start_time = self._time
+        self._block_stream_map = {}
+
+    def write_record(self, record):
+        """
+        Write an :class:`IOLogRecord` to the stream.
+        """
+        delay, stream_name, data = record
+        self._time += delay
+        stream_id = self._block_stream_map.get(stream_name)
+        if stream_id is None:
+            stream_id = len(self._block_stream_map) + 1
+            if stream_id > 255:
+                raise ValueError("too many different stream names")
+            name = stream_name.encode("UTF-8")
+            self._block += self.ENTRY_HEADER.pack(0, 0.0, len(name))
+            self._block += name
+            self._block_stream_map[stream_name] = stream_id
+        self._block += self.ENTRY_HEADER.pack(stream_id, delay, len(data))
+        self._block += data
+        self._block_num_records += 1
+        if len(self._block) >= self.BLOCK_SIZE:
+            self.flush()
+
+    def _write(self, data):
+        self.stream.write(data)
+        self._offset += len(data)
+
+
+class BinaryIOLogRecordReader:
+    """
+    Class for reading :class:`IOLogRecord` instances from a binary stream
+
+    See :class:`BinaryIOLogRecordWriter` for the description of the format.
+    Unlike :class:`IOLogRecordReader` this class can start reading at any
+    record, see :meth:`iter_records()`. The stream must be seekable.
+    """
+
+    def __init__(self, stream):
+        """
+        Initialize a reader with the specified binary stream
+
+        :raises ValueError:
+            if the stream does not start with
+            :attr:`BinaryIOLogRecordWriter.MAGIC`
+        """
+        self.stream = stream
+        magic = BinaryIOLogRecordWriter.MAGIC
+        if stream.read(len(magic)) != magic:
+            raise ValueError("not a binary IO log")
+        self._block_offset_list = None
+        self._block_first_record_list = None
+        self._block_start_time_list = None
+        self._num_records = None
+        self._iterator = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        """
+        Number of records in the stream
+        """
+        self._load_index()
+        return self._num_records
+
+    def __iter__(self):
+        """
+        Iterate over the entire stream generating subsequent
+        :class:`IOLogRecord` entries.
+        """
+        return self.iter_records()
+
+    def close(self):
+        self.stream.close()
+
+    def read_record(self):
+        """
+        Read the next record from the stream.
+
+        :returns: None if the stream is empty
+        :returns: next :class:`IOLogRecord` as found in the stream.
+        """
+        if self._iterator is None:
+            self._iterator = self.iter_records()
+        return next(self._iterator, None)
+
+    def iter_records(self, start=0, zero_copy=False):
+        """
+        Iterate over records, starting with the specified record
+
+        :param start:
+            Number of the first record to generate (records are numbered
+            from zero). Only the block with that record and the blocks that
+            follow it are read.
+        :param zero_copy:
+            If True the data of each record is a read-only memoryview of the
+            block it was read from, instead of a bytes object.
+        """
+        self._load_index()
+        block_index = bisect_right(self._block_first_record_list, start) - 1
+        if block_index < 0:
+            return
+        skip = start - self._block_first_record_list[block_index]
+        for offset in self._block_offset_list[block_index:]:
+            payload = self._read_block(offset)
+            for record in self._iter_block_records(payload, skip, zero_copy):
+                yield record
+            skip = 0
+
+    def tail(self, n):
+        """
+        Get the last n records
+
+        :returns: a list of at most n :class:`IOLogRecord` objects
+
+        Only the blocks with those records are read.
+        """
+        return list(self.iter_records(max(0, len(self) - n)))
+
+    def range(self, start_time, end_time=None, zero_copy=False):
+        """
+        Iterate over records created in the specified time range
+
+        :param start_time:
+            Minimum time of the generated records, the time of a record is
+            the sum of its delay and of the delays of all the records that
+            precede it
+        :param end_time:
+            Maximum time (excluded) of the generated records, if None
+            everything after start_time is generated.
+        :param zero_copy:
+            Same as in :meth:`iter_records()`
+
+        Only the blocks with those records are read.
+        """
+        self._load_index()
+        if not self._block_start_time_list:
+            return
+        # Records of the blocks before the last block that starts before
+        # start_time are all older than start_time
+        block_index = max(
+            0, bisect_left(self._block_start_time_list, start_time) - 1)
+        for record in _range(
+                self.iter_records(
+                    self._block_first_record_list[block_index], zero_copy),
+                start_time, end_time,
+                self._block_start_time_list[block_index]):
+            yield record
+
+    def _load_index(self):
+        """
+        Load the index of blocks, or build it if the stream has no index
+        """
+        if self._block_offset_list is not None:
+            return
+        index = self._read_index()
+        if index is None:
+            logger.debug("Binary IO log without index, scanning blocks")
+            index = self._scan_index()
+        entry_list, self._num_records = index
+        self._block_offset_list = [entry[0] for entry in entry_list]
+        self._block_first_record_list = [entry[1] for entry in entry_list]
+        self._block_start_time_list = [entry[2] for entry in entry_list]
+
+    def _read_index(self):
+        """
+        Read the index at the end of the stream
+
+        :returns:
+            ([(block offset, first record, start time), ...],
+            number of records) or None
+        """
+        W = BinaryIOLogRecordWriter
+        size = self.stream.seek(0, os.SEEK_END)
+        if size < len(W.MAGIC) + W.BLOCK_HEADER.size + W.FOOTER.size:
+            return None
+        self.stream.seek(size - W.FOOTER.size)
+        index_offset, magic = W.FOOTER.unpack(self.stream.read(W.FOOTER.size))
+        if magic != W.INDEX_MAGIC:
+            return None
+        self.stream.seek(index_offset)
+        kind, payload_size, raw_size, num_records, start_time = (
+            W.BLOCK_HEADER.unpack(self.stream.read(W.BLOCK_HEADER.size)))
+        if kind != W.BLOCK_INDEX:
+            return None
+        payload = self.stream.read(payload_size)
+        return ([W.INDEX_ENTRY.unpack_from(payload, offset)
+                 for offset in range(0, len(payload), W.INDEX_ENTRY.size)],
+                num_records)
+
+    def _scan_index(self):
+        """
+        Build the index by looking at the header of each block
+
+        :returns:
+            ([(block offset, first record, start time), ...],
+            number of records)
+        """
+        W = BinaryIOLogRecordWriter
+        size = self.stream.seek(0, os.SEEK_END)
+        offset = len(W.MAGIC)
+        index = []
+        num_records = 0
+        while True:
+            self.stream.seek(offset)
+            header = self.stream.read(W.BLOCK_HEADER.size)
+            if len(header) < W.BLOCK_HEADER.size:
+                break
+            kind, payload_size, raw_size, block_num_records, start_time = (
+                W.BLOCK_HEADER.unpack(header))
+            if kind not in (W.BLOCK_STORED, W.BLOCK_ZLIB):
+                break
+            next_offset = offset + W.BLOCK_HEADER.size + payload_size
+            if next_offset > size:
+                # The last block was not written entirely
+                break
+            index.append((offset, num_records, start_time))
+            num_records += block_num_records
+            offset = next_offset
+        return index, num_records
+
+    def _read_block(self, offset):
+        """
+        Read the (uncompressed) payload of the block at the specified offset
+        """
+        W = BinaryIOLogRecordWriter
+        self.stream.seek(offset)
+        kind, payload_size, raw_size, num_records, start_time = (
+            W.BLOCK_HEADER.unpack(self.stream.read(W.BLOCK_HEADER.size)))
+        payload = self.stream.read(payload_size)
+        if kind == W.BLOCK_ZLIB:
+            payload = zlib.decompress(payload)
+        if len(payload) != raw_size:
+            raise ValueError("corrupted binary IO log block")
+        return payload
+
+    def _iter_block_records(self, payload, skip, zero_copy):
+        """
+        Iterate over the records stored in the payload of a block
+        """
+        unpack_from = BinaryIOLogRecordWriter.ENTRY_HEADER.unpack_from
+        header_size = BinaryIOLogRecordWriter.ENTRY_HEADER.size
+        view = memoryview(payload)
+        stream_name_list = [None]
+        offset = 0
+        end = len(payload)
+        while offset < end:
+            stream_id, delay, size = unpack_from(payload, offset)
+            offset += header_size
+            data = view[offset:offset + size]
+            offset += size
+            if stream_id == 0:
+                stream_name_list.append(str(data, "UTF-8"))
+            elif skip:
+                skip -= 1
+            else:
+                yield IOLogRecord(
+                    delay, stream_name_list[stream_id],
+                    data if zero_copy else data.tobytes())
+
+
+def open_io_log(pathname):
+    """
+    Open an IO log file, in any of the supported formats
+
+    :returns:
+        :class:`BinaryIOLogRecordReader` or :class:`IOLogRecordReader`,
+        depending on the format of the file.
+    """
+    stream = open(pathname, 'rb')
+    try:
+        return BinaryIOLogRecordReader(stream)
+    except ValueError:
+        stream.close()
+    return IOLogRecordReader(io.TextIOWrapper(
+        GzipFile(pathname, mode='rb'), encoding='UTF-8'))
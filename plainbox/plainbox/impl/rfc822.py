@@ -35,6 +35,7 @@ from inspect import cleandoc
 
 from plainbox.impl.secure.checkbox_trusted_launcher import RFC822SyntaxError
 from plainbox.impl.secure.checkbox_trusted_launcher import BaseRFC822Record
+from plainbox.impl.tracing import traced
 
 logger = logging.getLogger("plainbox.rfc822")
 
@@ -98,7 +99,8 @@ class RFC822Record(BaseRFC822Record):
         return self._origin
 
 
-def load_rfc822_records(stream, data_cls=dict):
+@traced("parse rfc822 records", "rfc822")
+def load_rfc822_records(stream, data_cls=dict, parser=None):
     """
     Load a sequence of rfc822-like records from a text stream.
 
@@ -108,12 +110,13 @@ def load_rfc822_records(stream, data_cls=dict):
 
     Returns a list of subsequent values as instances RFC822Record class.  If
     the optional data_cls argument is collections.OrderedDict then the values
-    retain their original ordering.
+    retain their original ordering. See :func:`gen_rfc822_records()` for the
+    meaning of the optional parser argument.
     """
-    return list(gen_rfc822_records(stream, data_cls))
+    return list(gen_rfc822_records(stream, data_cls, parser))
 
 
-def gen_rfc822_records(stream, data_cls=dict):
+def gen_rfc822_records(stream, data_cls=dict, parser=None):
     """
     Load a sequence of rfc822-like records from a text stream.
 
@@ -124,6 +127,114 @@ def gen_rfc822_records(stream, data_cls=dict):
     Returns a list of subsequent values as instances RFC822Record class.  If
     the optional data_cls argument is collections.OrderedDict then the values
     retain their original ordering.
+
+    The optional parser argument selects one of the implementations listed
+    in :data:`RFC822_PARSERS`, by default :data:`DEFAULT_RFC822_PARSER` is
+    used. All the implementations produce the same records, origins and
+    errors.
+    """
+    if parser is None:
+        parser = DEFAULT_RFC822_PARSER
+    try:
+        impl = RFC822_PARSERS[parser]
+    except KeyError:
+        raise ValueError("Unknown RFC822 parser: {!r}".format(parser))
+    return impl(stream, data_cls)
+
+
+def _gen_rfc822_records_fast(stream, data_cls):
+    """
+    Fast implementation of :func:`gen_rfc822_records()`
+
+    This implementation behaves exactly like the reference implementation
+    but keeps all of its state in local variables, doesn't log anything for
+    each line and only builds the origin of a record once the record is
+    complete. Single-line values, by far the most common ones, are stored
+    right away without going through cleandoc().
+    """
+    try:
+        filename = stream.name
+    except AttributeError:
+        filename = None
+    data = data_cls()
+    # The most recently seen key and its value. The list of lines of the
+    # value is only created for multi-line values, those are stored in data
+    # once the next key or record begins.
+    key = None
+    value = None
+    value_list = None
+    line_start = None
+    line_end = None
+    for lineno, line in enumerate(stream, start=1):
+        # Empty lines (and lines that only have whitespace) are record
+        # separators
+        if not line or line.isspace():
+            if value_list is not None:
+                data[key] = cleandoc('\n'.join(value_list))
+                value_list = None
+            key = None
+            if data:
+                if filename:
+                    origin = Origin(filename, line_start, line_end)
+                else:
+                    origin = None
+                yield RFC822Record(data, origin)
+                data = data_cls()
+                line_start = None
+                line_end = None
+        elif line[0] == " ":
+            if key is None:
+                raise RFC822SyntaxError(
+                    filename, lineno, "Unexpected multi-line value")
+            if value_list is None:
+                value_list = [value]
+            if line == " .\n":
+                value_list.append(" ")
+            elif line == " ..\n":
+                value_list.append(" .")
+            else:
+                value_list.append(line.rstrip())
+            line_end = lineno
+        else:
+            if value_list is not None:
+                data[key] = cleandoc('\n'.join(value_list))
+                value_list = None
+            key, sep, value = line.partition(":")
+            if not sep:
+                raise RFC822SyntaxError(
+                    filename, lineno, "Unexpected non-empty line")
+            if line_start is None:
+                line_start = lineno
+            key = key.strip()
+            value = value.strip()
+            if key in data:
+                raise RFC822SyntaxError(filename, lineno, (
+                    "Job has a duplicate key {!r} "
+                    "with old value {!r} and new value {!r}").format(
+                        key, data[key], value))
+            # This is what cleandoc() does to a single, stripped line
+            if "\n" in value:
+                data[key] = cleandoc(value)
+            else:
+                data[key] = value.expandtabs()
+            line_end = lineno
+    if value_list is not None:
+        data[key] = cleandoc('\n'.join(value_list))
+    if data:
+        if filename:
+            origin = Origin(filename, line_start, line_end)
+        else:
+            origin = None
+        yield RFC822Record(data, origin)
+
+
+def _gen_rfc822_records_reference(stream, data_cls):
+    """
+    Reference implementation of :func:`gen_rfc822_records()`
+
+    This is a straightforward state machine that logs each line it looks at.
+    It is slow but easy to follow, use it to check the behavior of the fast
+    implementation.
     """
     record = None
     data = None
@@ -256,6 +367,15 @@ def gen_rfc822_records(stream, data_cls=dict):
         logger.debug("yielding record: %r", record)
         yield record
 
+# Map of names of all the available implementations of gen_rfc822_records()
+RFC822_PARSERS = {
+    'fast': _gen_rfc822_records_fast,
+    'reference': _gen_rfc822_records_reference,
+}
+
+# Name of the implementation used by default
+DEFAULT_RFC822_PARSER = 'fast'
+
 
 def dump_rfc822_records(message, stream):
     """Dump a message to the output stream.
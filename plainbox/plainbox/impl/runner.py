@@ -26,13 +26,14 @@
     THIS MODULE DOES NOT HAVE STABLE PUBLIC API
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import collections
 import datetime
-import gzip
-import io
 import logging
+import multiprocessing
 import os
 import string
+import threading
 import time
 
 from plainbox.vendor import extcmd
@@ -41,9 +42,10 @@ from plainbox.abc import IJobRunner, IJobResult
 from plainbox.impl.providers.checkbox import CheckBoxSrcProvider
 from plainbox.impl.result import DiskJobResult
 from plainbox.impl.result import IOLogRecord
-from plainbox.impl.result import IOLogRecordWriter
+from plainbox.impl.result import BinaryIOLogRecordWriter
 from plainbox.impl.result import MemoryJobResult
 from plainbox.impl.signal import Signal
+from plainbox.impl.tracing import span
 
 logger = logging.getLogger("plainbox.runner")
 
@@ -58,6 +60,27 @@ def slugify(_string):
     return ''.join(c if c in valid_chars else '_' for c in _string)
 
 
+def get_resource_usage(rusage):
+    """
+    Convert resource usage, as returned by wait4(), to a dictionary
+
+    The dictionary has the following keys: ``cpu_user_time`` and
+    ``cpu_system_time`` (in seconds), ``max_rss`` (peak resident set size, in
+    kilobytes), ``block_input`` and ``block_output`` (number of block I/O
+    operations), ``voluntary_context_switches`` and
+    ``involuntary_context_switches``.
+    """
+    return {
+        'cpu_user_time': rusage.ru_utime,
+        'cpu_system_time': rusage.ru_stime,
+        'max_rss': rusage.ru_maxrss,
+        'block_input': rusage.ru_inblock,
+        'block_output': rusage.ru_oublock,
+        'voluntary_context_switches': rusage.ru_nvcsw,
+        'involuntary_context_switches': rusage.ru_nivcsw,
+    }
+
+
 def authenticate_warmup():
     """
     Call the checkbox trusted launcher in warmup mode.
@@ -99,6 +122,22 @@ class IOLogRecordGenerator(extcmd.DelegateBase):
         record = IOLogRecord(delay.total_seconds(), stream_name, line)
         self.on_new_record(record)
 
+    def on_lines(self, stream_name, line_list):
+        """
+        Internal method of extcmd.DelegateBase
+
+        Creates a new IOLogRecord for each line of the batch. All the lines
+        were read at the same time so only the first record has a non-zero
+        delay.
+        """
+        now = datetime.datetime.utcnow()
+        delay = (now - self.last_msg).total_seconds()
+        self.last_msg = now
+        on_new_record = self.on_new_record
+        for line in line_list:
+            on_new_record(IOLogRecord(delay, stream_name, line))
+            delay = 0.0
+
     @Signal.define
     def on_new_record(self, record):
         """
@@ -156,6 +195,17 @@ class CommandOutputWriter(extcmd.DelegateBase):
         elif stream_name == 'stderr':
             self.stderr.write(line)
 
+    def on_lines(self, stream_name, line_list):
+        """
+        Internal method of extcmd.DelegateBase
+
+        Called for each batch of lines of output.
+        """
+        if stream_name == 'stdout':
+            self.stdout.writelines(line_list)
+        elif stream_name == 'stderr':
+            self.stderr.writelines(line_list)
+
 
 class FallbackCommandOutputPrinter(extcmd.DelegateBase):
     """
@@ -199,7 +249,7 @@ class JobRunner(IJobRunner):
 
     def __init__(self, session_dir, jobs_io_log_dir,
                  command_io_delegate=None, interaction_callback=None,
-                 dry_run=False):
+                 dry_run=False, timeout_multiplier=None):
         """
         Initialize a new job runner.
 
@@ -207,12 +257,36 @@ class JobRunner(IJobRunner):
         Uses the specified IO delegate for extcmd.ExternalCommandWithDelegate
         to track IO done by the called commands (optional, a simple console
         printer is provided if missing).
+
+        Jobs that don't have an explicit timeout but have an estimated
+        duration are killed after running for timeout_multiplier times their
+        estimated duration (optional, such jobs run for as long as they want
+        if missing).
         """
         self._session_dir = session_dir
         self._jobs_io_log_dir = jobs_io_log_dir
         self._command_io_delegate = command_io_delegate
         self._interaction_callback = interaction_callback
         self._dry_run = dry_run
+        self._timeout_multiplier = timeout_multiplier
+        # Commands that are running now, see kill()
+        self._extcmd_lock = threading.Lock()
+        self._extcmd_set = set()
+        self._killed = False
+
+    def kill(self):
+        """
+        Kill the commands of all the jobs that this runner is running
+
+        This can be called from any thread. Commands that the runner starts
+        afterwards are killed as soon as they start, results of those jobs
+        have the "Job killed on request" comment.
+        """
+        with self._extcmd_lock:
+            self._killed = True
+            extcmd_list = list(self._extcmd_set)
+        for extcmd_popen in extcmd_list:
+            extcmd_popen.kill()
 
     def run_job(self, job, config=None):
         """
@@ -230,9 +304,36 @@ class JobRunner(IJobRunner):
         else:
             if self._dry_run and job.plugin not in self._DRY_RUN_PLUGINS:
                 return self._dry_run_result(job)
-            else:
+            with span("run job", "runner", job=job.name, plugin=job.plugin):
                 return runner(job, config)
 
+    def run_job_list(self, job_list, config=None, max_workers=None):
+        """
+        Run a list of mutually independent jobs concurrently.
+
+        :param job_list:
+            List of jobs to run. The caller is responsible for ensuring that
+            none of the jobs depends on any other job from the same list.
+        :param config:
+            Configuration object passed to each :meth:`run_job()` call
+        :param max_workers:
+            Maximum number of jobs running at the same time. Defaults to the
+            number of CPUs available on this machine.
+        :returns:
+            List of results, in the same order as the jobs in job_list.
+
+        This is mostly useful for resource jobs which are all automated,
+        have no side effects and don't depend on each other. The order in
+        which jobs complete is not observable by the caller.
+        """
+        if max_workers is None:
+            max_workers = multiprocessing.cpu_count()
+        logger.debug(
+            "Running %d jobs with %d workers", len(job_list), max_workers)
+        with ThreadPoolExecutor(max_workers) as executor:
+            return list(executor.map(
+                lambda job: self.run_job(job, config), job_list))
+
     def _dry_run_result(self, job):
         """
         Produce the result that is used when running in dry-run mode
@@ -267,20 +368,46 @@ class JobRunner(IJobRunner):
     def _just_run_command(self, job, config):
         # Run the embedded command
         start_time = time.time()
-        return_code, record_path = self._run_command(job, config)
+        return_code, record_path, timed_out, rusage = (
+            self._supervise_command(job, config))
         execution_duration = time.time() - start_time
         # Convert the return of the command to the outcome of the job
-        if return_code == 0:
+        if timed_out:
+            outcome = IJobResult.OUTCOME_TIMEOUT
+        elif return_code == 0:
             outcome = IJobResult.OUTCOME_PASS
         else:
             outcome = IJobResult.OUTCOME_FAIL
         # Create a result object and return it
-        return DiskJobResult({
+        result = {
             'outcome': outcome,
             'return_code': return_code,
             'io_log_filename': record_path,
             'execution_duration': execution_duration
-        })
+        }
+        if rusage is not None:
+            result['resource_usage'] = get_resource_usage(rusage)
+        if timed_out:
+            result['comments'] = "Job killed after running for {}s".format(
+                self._get_job_timeout(job))
+        elif self._killed:
+            result['comments'] = "Job killed on request"
+        return DiskJobResult(result)
+
+    def _get_job_timeout(self, job):
+        """
+        Compute the timeout of the specified job (in seconds)
+
+        :returns:
+            The explicit timeout of the job, if any, or the estimated duration
+            of the job times the timeout multiplier, if both are known, or
+            None (no timeout) otherwise.
+        """
+        if job.timeout is not None:
+            return job.timeout
+        if (self._timeout_multiplier is not None
+                and job.estimated_duration is not None):
+            return job.estimated_duration * self._timeout_multiplier
 
     def _get_script_env(self, job, config=None, only_changes=False):
         """
@@ -385,43 +512,69 @@ class JobRunner(IJobRunner):
 
         :returns: (return_code, record_path) where return_code is the number
         returned by the exiting child process while record_path is a pathname
-        of a gzipped content readable with :class:`IOLogRecordReader`
+        of a binary IO log readable with :class:`BinaryIOLogRecordReader`
+        (see :func:`~plainbox.impl.result.open_io_log()`)
+        """
+        return_code, record_path, timed_out, rusage = (
+            self._supervise_command(job, config))
+        return return_code, record_path
+
+    def _supervise_command(self, job, config):
+        """
+        Run the shell command associated with the specified job.
+
+        The command runs in a process group of its own. It is killed,
+        together with everything it started, when it runs for longer than
+        the timeout of the job. Anything it leaves behind is killed as well.
+
+        :returns: (return_code, record_path, timed_out, rusage) where
+        return_code and record_path are just as in :meth:`_run_command()`,
+        timed_out tells if the command was killed because of a timeout and
+        rusage is the resource usage of the command (as returned by wait4(),
+        may be None)
         """
         # Bail early if there is nothing do do
         if job.command is None:
-            return None, ()
+            return None, (), False, None
         # Create an equivalent of the CHECKBOX_DATA directory used by
         # some jobs to store logs and other files that may later be used
         # by other jobs.
         self._checkbox_data_dir = os.path.join(
             self._session_dir, "CHECKBOX_DATA")
-        if not os.path.isdir(self._checkbox_data_dir):
-            os.makedirs(self._checkbox_data_dir)
+        # NOTE: exist_ok=True as jobs may be started concurrently by
+        # run_job_list()
+        os.makedirs(self._checkbox_data_dir, exist_ok=True)
         # Get an extcmd delegate for observing all the IO the way we need
         delegate, io_log_gen = self._prepare_io_handling(job, config)
         # Create a subprocess.Popen() like object that uses the delegate
         # system to observe all IO as it occurs in real time.
-        extcmd_popen = extcmd.ExternalCommandWithDelegate(delegate)
+        extcmd_popen = extcmd.PollingExternalCommandWithDelegate(
+            delegate, process_group=True)
+        with self._extcmd_lock:
+            if self._killed:
+                extcmd_popen.kill()
+            self._extcmd_set.add(extcmd_popen)
         # Stream all IOLogRecord entries to disk
         record_path = os.path.join(
-            self._jobs_io_log_dir, "{}.record.gz".format(
+            self._jobs_io_log_dir, "{}.record.bin".format(
                 slugify(job.name)))
-        with gzip.open(record_path, mode='wb') as gzip_stream, \
-                io.TextIOWrapper(
-                    gzip_stream, encoding='UTF-8') as record_stream:
-            writer = IOLogRecordWriter(record_stream)
+        with BinaryIOLogRecordWriter(open(record_path, 'wb')) as writer:
             io_log_gen.on_new_record.connect(writer.write_record)
             # Start the process and wait for it to finish getting the
             # result code. This will actually call a number of callbacks
-            # while the process is running. It will also spawn a few
-            # threads although all callbacks will be fired from a single
-            # thread (which is _not_ the main thread)
+            # while the process is running. All callbacks are fired from
+            # the calling thread, with batches of lines where possible.
             logger.debug("job[%s] starting command: %s", job.name, job.command)
             # Run the job command using extcmd
-            return_code = self._run_extcmd(job, config, extcmd_popen)
+            try:
+                return_code = self._run_extcmd(job, config, extcmd_popen)
+            finally:
+                with self._extcmd_lock:
+                    self._extcmd_set.discard(extcmd_popen)
             logger.debug(
                 "job[%s] command return code: %r", job.name, return_code)
-        return return_code, record_path
+        return (return_code, record_path, extcmd_popen.timed_out,
+                extcmd_popen.rusage)
 
     def _run_extcmd(self, job, config, extcmd_popen):
         # If we need to switch user use pkexec for that
@@ -442,4 +595,5 @@ class JobRunner(IJobRunner):
             cmd = ['bash', '-c', job.command]
             env = self._get_script_env(job, config)
         logger.debug("job[%s] executing %r with env %r", job.name, cmd, env)
-        return extcmd_popen.call(cmd, env=env)
+        return extcmd_popen.call(
+            cmd, env=env, timeout=self._get_job_timeout(job))
@@ -0,0 +1,225 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+# Written by:
+#   Zygmunt Krynicki <zygmunt.krynicki@canonical.com>
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+:mod:`plainbox.impl.scheduler` -- parallel job scheduler
+========================================================
+
+.. warning::
+
+    THIS MODULE DOES NOT HAVE STABLE PUBLIC API
+"""
+
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import logging
+
+from plainbox.impl.session.jobs import JobReadinessInhibitor
+from plainbox.impl.signal import Signal
+
+logger = logging.getLogger("plainbox.scheduler")
+
+
+class JobScheduler:
+    """
+    Scheduler that runs automated jobs of a session concurrently.
+
+    The scheduler walks the run list of a session and dispatches automated
+    jobs to a pool of worker threads as soon as the session considers them
+    ready, that is, as soon as they have no readiness inhibitors. Readiness
+    is recomputed by the session each time a result is presented to it so
+    both direct and resource dependencies are respected.
+
+    Only jobs for which :meth:`is_concurrent()` is true are ever dispatched
+    to the pool. All the other jobs (manual jobs, local jobs and exclusive
+    jobs) are handed back to the application, one at a time and only while
+    no other job is running, through the run_job_serially callback passed to
+    :meth:`run()`. The same callback is used for jobs that cannot run at all
+    (because a dependency has failed or a resource requirement is not met)
+    so that the application can record an appropriate result.
+
+    Among all the ready jobs those with the longest estimated duration are
+    started first, this keeps the tail of the session as short as possible.
+    Results are always presented to the session from the thread that called
+    :meth:`run()`.
+    """
+
+    # Plugins that are safe to run concurrently with other jobs
+    _CONCURRENT_PLUGINS = ('shell', 'attachment', 'resource')
+
+    # Readiness inhibitors that can still go away as other jobs finish
+    _PENDING_CAUSES = (
+        JobReadinessInhibitor.PENDING_DEP,
+        JobReadinessInhibitor.PENDING_RESOURCE)
+
+    def __init__(self, session, runner, max_workers, config=None):
+        """
+        Initialize a new scheduler.
+
+        :param session:
+            The :class:`~plainbox.impl.session.state.SessionState` to take
+            jobs from and present results to.
+        :param runner:
+            The :class:`~plainbox.impl.runner.JobRunner` used to run jobs in
+            worker threads.
+        :param max_workers:
+            Maximum number of jobs running at the same time.
+        :param config:
+            Configuration object passed to the runner
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be a positive number")
+        self._session = session
+        self._runner = runner
+        self._max_workers = max_workers
+        self._config = config
+
+    @Signal.define
+    def on_job_started(self, job):
+        """
+        Signal fired after a job is dispatched to a worker thread
+        """
+        logger.info("Started job %r", job)
+
+    @Signal.define
+    def on_job_finished(self, job, result):
+        """
+        Signal fired after the result of a job that was running in a worker
+        thread is presented to the session
+        """
+        logger.info("Finished job %r with %r", job, result)
+
+    def is_concurrent(self, job):
+        """
+        Check if a job can run concurrently with other jobs.
+
+        Only automated jobs that don't alter the set of known jobs and that
+        are not marked as exclusive can run concurrently.
+        """
+        return job.plugin in self._CONCURRENT_PLUGINS and not job.exclusive
+
+    def run(self, run_job_serially):
+        """
+        Run all the jobs from the run list that don't have a result yet.
+
+        :param run_job_serially:
+            A callable that accepts a job and takes care of running it (or
+            recording that it could not run) and presenting the result to
+            the session. It is never called while any job is still running,
+            except for jobs that cannot start (and thus execute nothing).
+
+        The run list is consulted again after each job finishes so jobs
+        added to it by the application (in response to local jobs) are
+        scheduled as well.
+        """
+        running = {}
+        # Names of jobs that were already handed to run_job_serially(). Those
+        # are never handed out again, even if they didn't get a result, so
+        # that this loop is guaranteed to terminate.
+        serial_set = set()
+        with ThreadPoolExecutor(self._max_workers) as executor:
+            while True:
+                ready_list, serial_list, blocked_list = self._classify(
+                    {job.name for job in running.values()} | serial_set)
+                # Jobs that cannot ever start can be processed right away,
+                # there is no risk of them overlapping with anything.
+                for job in blocked_list:
+                    serial_set.add(job.name)
+                    run_job_serially(job)
+                if blocked_list:
+                    continue
+                # Start as many concurrent jobs as we can
+                for job in ready_list[:self._max_workers - len(running)]:
+                    logger.debug("Dispatching %r", job)
+                    future = executor.submit(
+                        self._runner.run_job, job, self._config)
+                    running[future] = job
+                    self.on_job_started(job)
+                if running:
+                    self._wait_for_any(running)
+                elif serial_list:
+                    job = serial_list[0]
+                    serial_set.add(job.name)
+                    run_job_serially(job)
+                else:
+                    break
+
+    def _wait_for_any(self, running):
+        """
+        Wait for at least one running job to finish and present all finished
+        results to the session, in run list order.
+        """
+        done, not_done = wait(running, return_when=FIRST_COMPLETED)
+        order = {
+            job.name: index
+            for index, job in enumerate(self._session.run_list)}
+        for future in sorted(done, key=lambda future: order.get(
+                running[future].name, len(order))):
+            job = running.pop(future)
+            result = future.result()
+            self._session.update_job_result(job, result)
+            self.on_job_finished(job, result)
+
+    def _classify(self, busy_set):
+        """
+        Classify all the jobs that still need to run.
+
+        :param busy_set:
+            Set of names of jobs that should not be considered as they are
+            either running right now or were already handed to the
+            application.
+        :returns:
+            A tuple (ready_list, serial_list, blocked_list) where ready_list
+            are jobs that can start concurrently right now (longest first),
+            serial_list are jobs that should be started serially (in run
+            list order) and blocked_list are jobs that will never be able to
+            start.
+
+        Jobs that are only waiting for other jobs to finish don't show up in
+        any of the lists. If such jobs remain when nothing is running and
+        nothing else can start they are reported in serial_list.
+        """
+        ready_list = []
+        serial_list = []
+        blocked_list = []
+        waiting_list = []
+        for job in self._session.run_list:
+            if job.name in busy_set:
+                continue
+            job_state = self._session.job_state_map[job.name]
+            if job_state.result.outcome is not None:
+                continue
+            if job_state.can_start():
+                if self.is_concurrent(job):
+                    ready_list.append(job)
+                else:
+                    serial_list.append(job)
+            elif all(inhibitor.cause in self._PENDING_CAUSES
+                     for inhibitor in job_state.readiness_inhibitor_list):
+                waiting_list.append(job)
+            else:
+                blocked_list.append(job)
+        # Start longest jobs first. Jobs with unknown duration are started
+        # last. Sorting is stable so the run list order is kept otherwise.
+        ready_list.sort(key=lambda job: -(job.estimated_duration or 0))
+        # If nothing else is possible then waiting jobs are waiting for
+        # something that will never happen, let the application handle them
+        serial_list.extend(waiting_list)
+        return ready_list, serial_list, blocked_list
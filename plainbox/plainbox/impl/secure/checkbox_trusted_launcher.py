@@ -33,6 +33,7 @@ import hashlib
 import json
 import os
 import re
+import stat
 import subprocess
 from inspect import cleandoc
 
@@ -304,6 +305,269 @@ def gen_rfc822_records(stream, data_cls=dict):
         yield record
 
 
+class JobIndex:
+    """
+    Index of job definitions available in trusted system-wide locations
+
+    The index maps job checksums to the data of the corresponding job
+    definition. Only jobs that can be started by the launcher are kept: jobs
+    that specify a user, local jobs (to be used with ``--via``) and the jobs
+    most recently generated by each of the local jobs.
+
+    Along with the jobs the index keeps the identity (inode, size,
+    modification and change time) of every package directory, jobs
+    directory and job definition file it was built from. The index is
+    current only as long as none of those have changed and the set of
+    package directories matching the pattern is the same. This is checked
+    with a single stat(2) call per path, no file is read or parsed.
+
+    The index is stored as the SHA256 digest of the payload followed by the
+    payload itself (JSON). It is only ever loaded from a regular file owned
+    by the user running the launcher (root when started with pkexec), that
+    nobody else can write to and that lives in a directory that nobody else
+    can write to either.
+    """
+
+    # Version of the on-disk format, bump it each time the format or the
+    # rules that decide which jobs get indexed change.
+    FORMAT_VERSION = 1
+
+    def __init__(self, pattern):
+        # Glob pattern of package directories
+        self.pattern = pattern
+        # List of package directories matching the pattern
+        self.packages = []
+        # Map of path to stat key (or None if it did not exist)
+        self.stat_map = {}
+        # Map of checksum to data of jobs that specify a user
+        self.job_map = {}
+        # Map of checksum to data of local jobs
+        self.local_map = {}
+        # Map of local job checksum to the (environment key, map of checksum
+        # to data) of the jobs generated by the most recent run of that job
+        self.generated_map = {}
+
+    @classmethod
+    def build(cls, pattern):
+        """
+        Build a new index by scanning all the packages matching pattern
+        """
+        index = cls(pattern)
+        for package in glob.glob(pattern):
+            index.packages.append(package)
+            index._stat(package)
+            jobs_dir = os.path.join(package, 'jobs')
+            index._stat(jobs_dir)
+            for dirpath, dirs, filenames in os.walk(jobs_dir):
+                index._stat(dirpath)
+                for name in filenames:
+                    if name.endswith(".txt"):
+                        filename = os.path.join(dirpath, name)
+                        # Look at the file before reading it so that the
+                        # index is stale if it changes while being read
+                        index._stat(filename)
+                        with open(filename, "r", encoding="utf-8") as stream:
+                            for message in load_rfc822_records(stream):
+                                index.add_job_data(message.data)
+        return index
+
+    @classmethod
+    def load(cls, pathname):
+        """
+        Load the index stored in the specified file
+
+        :returns:
+            The loaded index or None if the file does not exist, cannot be
+            trusted, is damaged or has a different format version.
+        """
+        if not cls._is_trusted_directory(os.path.dirname(pathname)):
+            return None
+        try:
+            fd = os.open(pathname, os.O_RDONLY | os.O_NOFOLLOW)
+        except OSError:
+            return None
+        with open(fd, "rb") as stream:
+            # Check the file that was actually opened
+            if not cls._is_trusted_stat(os.fstat(stream.fileno()), True):
+                return None
+            digest = stream.readline().strip()
+            payload = stream.read()
+        if hashlib.sha256(payload).hexdigest().encode("ascii") != digest:
+            return None
+        try:
+            data = json.loads(payload.decode("utf-8"))
+            if data['version'] != cls.FORMAT_VERSION:
+                return None
+            index = cls(data['pattern'])
+            index.packages = data['packages']
+            index.stat_map = data['stat']
+            index.job_map = data['jobs']
+            index.local_map = data['local']
+            index.generated_map = data['generated']
+        except (ValueError, KeyError, TypeError):
+            return None
+        return index
+
+    def save(self, pathname):
+        """
+        Save the index to the specified file
+
+        The directory is created if needed. Nothing is saved if the
+        directory cannot be trusted. The file is written next to its final
+        location and then renamed so that readers never see a partially
+        written index.
+
+        :raises OSError: if the index cannot be written
+        """
+        dirname = os.path.dirname(pathname)
+        os.makedirs(dirname, mode=0o755, exist_ok=True)
+        if not self._is_trusted_directory(dirname):
+            raise PermissionError(
+                "refusing to save index in {!r}".format(dirname))
+        payload = json.dumps({
+            'version': self.FORMAT_VERSION,
+            'pattern': self.pattern,
+            'packages': self.packages,
+            'stat': self.stat_map,
+            'jobs': self.job_map,
+            'local': self.local_map,
+            'generated': self.generated_map,
+        }, sort_keys=True, separators=(',', ':')).encode("utf-8")
+        digest = hashlib.sha256(payload).hexdigest().encode("ascii")
+        pathname_next = "{}.{}.next".format(pathname, os.getpid())
+        fd = os.open(
+            pathname_next,
+            os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o644)
+        try:
+            with open(fd, "wb") as stream:
+                stream.write(digest + b"\n")
+                stream.write(payload)
+            os.replace(pathname_next, pathname)
+        except OSError:
+            os.unlink(pathname_next)
+            raise
+
+    def is_current(self, pattern):
+        """
+        Check if the index still describes jobs in packages matching pattern
+        """
+        if pattern != self.pattern:
+            return False
+        if glob.glob(pattern) != self.packages:
+            return False
+        for path, stat_key in self.stat_map.items():
+            if self._get_stat_key(path) != stat_key:
+                return False
+        return True
+
+    def add_job_data(self, data):
+        """
+        Add the data of a job definition to the index
+        """
+        job = BaseJob(data)
+        if job.user:
+            self.job_map[job.get_checksum()] = data
+        if job.plugin == 'local':
+            self.local_map[job.get_checksum()] = data
+
+    def get_job(self, checksum):
+        """
+        Get the job (that specifies a user) with the specified checksum
+        """
+        return self._get_verified_job(self.job_map, checksum)
+
+    def get_local_job(self, checksum):
+        """
+        Get the local job with the specified checksum
+        """
+        return self._get_verified_job(self.local_map, checksum)
+
+    def get_generated_job(self, via_checksum, environ_key, checksum):
+        """
+        Get a job generated by a local job
+
+        :param via_checksum:
+            Checksum of the local job
+        :param environ_key:
+            Key of the environment the local job runs in, as returned by
+            :meth:`get_environ_key()`
+        :param checksum:
+            Checksum of the generated job
+        :returns:
+            The generated job or None if the local job did not generate
+            that job last time it was started in the same environment.
+        """
+        try:
+            last_environ_key, job_map = self.generated_map[via_checksum]
+        except KeyError:
+            return None
+        if last_environ_key != environ_key:
+            return None
+        return self._get_verified_job(job_map, checksum)
+
+    def set_generated_job_data(self, via_checksum, environ_key, data_list):
+        """
+        Set the data of all the jobs generated by a run of a local job
+        """
+        self.generated_map[via_checksum] = [
+            environ_key, {BaseJob(data).get_checksum(): data
+                          for data in data_list}]
+
+    @staticmethod
+    def get_environ_key(job, environ):
+        """
+        Compute the key of the environment a job would run in
+
+        Only the variables that the job is allowed to see are part of the
+        key, as those are the only ones that can change what it does.
+        """
+        return json.dumps(sorted(
+            (key, environ[key])
+            for key in job.get_environ_settings() if key in environ))
+
+    def _stat(self, path):
+        self.stat_map[path] = self._get_stat_key(path)
+
+    @staticmethod
+    def _get_stat_key(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns]
+
+    @staticmethod
+    def _get_verified_job(job_map, checksum):
+        data = job_map.get(checksum)
+        if data is None:
+            return None
+        job = BaseJob(data)
+        # Never trust the key alone, the checksum is cheap to compute for
+        # a single job.
+        if job.get_checksum() != checksum:
+            return None
+        return job
+
+    @classmethod
+    def _is_trusted_directory(cls, dirname):
+        try:
+            return cls._is_trusted_stat(os.stat(dirname), False)
+        except OSError:
+            return False
+
+    @staticmethod
+    def _is_trusted_stat(st, is_file):
+        if is_file:
+            # The index must be a regular file written by ourselves
+            if not stat.S_ISREG(st.st_mode) or st.st_uid != os.geteuid():
+                return False
+        else:
+            if not stat.S_ISDIR(st.st_mode) or st.st_uid not in (
+                    0, os.geteuid()):
+                return False
+        return not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
 class Runner:
     """
     Runner for jobs
@@ -313,19 +577,52 @@ class Runner:
 
     CHECKBOXES = "/usr/share/checkbox*"
 
-    def __init__(self, builtin_jobs=[], packages=[]):
-        # List of all available jobs in system-wide locations
-        self.builtin_jobs = builtin_jobs
+    INDEX = "/var/cache/checkbox-trusted-launcher/index"
+
+    def __init__(self, packages=[]):
         # List of all checkbox variants, like checkbox-oem(-.*)?
         self.packages = packages
 
-    def path_expand(self, path):
-        for p in glob.glob(path):
-            self.packages.append(p)
-            for dirpath, dirs, filenames in os.walk(os.path.join(p, 'jobs')):
-                for name in filenames:
-                    if name.endswith(".txt"):
-                        yield os.path.join(dirpath, name)
+    def get_job_index(self, rebuild=False):
+        """
+        Get an index of all the jobs in system-wide locations
+
+        The index stored in :attr:`INDEX` is used if it is current, it is
+        built (and stored, if possible) otherwise.
+        """
+        index = None if rebuild else JobIndex.load(self.INDEX)
+        if index is None or not index.is_current(self.CHECKBOXES):
+            index = JobIndex.build(self.CHECKBOXES)
+            self.save_job_index(index)
+        return index
+
+    def save_job_index(self, index):
+        """
+        Store the index, if possible, so that it can be used next time
+        """
+        try:
+            index.save(self.INDEX)
+        except OSError:
+            # This is not fatal, the index is built again next time
+            pass
+
+    def run_via_job(self, via_job, environ):
+        """
+        Run a local job and return the data of the jobs it generated
+        """
+        via_job_result = subprocess.Popen(
+            ['bash', '-c', via_job.command],
+            universal_newlines=True,
+            stdout=subprocess.PIPE,
+            env=via_job.modify_execution_environment(environ, self.packages)
+        )
+        try:
+            return [message.data for message in load_rfc822_records(
+                via_job_result.stdout)]
+        finally:
+            # Always call Popen.wait() in order to avoid zombies
+            via_job_result.stdout.close()
+            via_job_result.wait()
 
     def main(self, argv=None):
         parser = argparse.ArgumentParser(prog="checkbox-trusted-launcher")
@@ -335,6 +632,10 @@ class Runner:
             '--warmup',
             action='store_true',
             help='Return immediately, only useful when used with pkexec(1)')
+        group.add_argument(
+            '--update-index',
+            action='store_true',
+            help='Rebuild the index of jobs, useful after installing jobs')
         parser.add_argument(
             '--via',
             metavar='LOCAL-JOB-HASH',
@@ -348,41 +649,32 @@ class Runner:
         if args.warmup:
             return 0
 
-        for filename in self.path_expand(self.CHECKBOXES):
-            stream = open(filename, "r", encoding="utf-8")
-            for message in load_rfc822_records(stream):
-                self.builtin_jobs.append(BaseJob(message.data))
-            stream.close()
-        lookup_list = [j for j in self.builtin_jobs if j.user]
+        index = self.get_job_index(rebuild=args.update_index)
+        if args.update_index:
+            return 0
+        self.packages.extend(index.packages)
 
         args.ENV = dict(item.split('=') for item in args.ENV)
 
-        if args.via_hash is not None:
-            local_list = [j for j in self.builtin_jobs if j.plugin == 'local']
-            desired_job_list = [j for j in local_list
-                                if j.get_checksum() == args.via_hash]
-            if desired_job_list:
-                via_job = desired_job_list.pop()
-                via_job_result = subprocess.Popen(
-                    ['bash', '-c', via_job.command],
-                    universal_newlines=True,
-                    stdout=subprocess.PIPE,
-                    env=via_job.modify_execution_environment(
-                        args.ENV,
-                        self.packages)
-                )
-                try:
-                    for message in load_rfc822_records(via_job_result.stdout):
-                        lookup_list.append(BaseJob(message.data))
-                finally:
-                    # Always call Popen.wait() in order to avoid zombies
-                    via_job_result.stdout.close()
-                    via_job_result.wait()
-
-        try:
-            target_job = [j for j in lookup_list
-                          if j.get_checksum() == args.hash][0]
-        except IndexError:
+        target_job = index.get_job(args.hash)
+        if target_job is None and args.via_hash is not None:
+            via_job = index.get_local_job(args.via_hash)
+            if via_job is not None:
+                environ_key = index.get_environ_key(via_job, args.ENV)
+                # Jobs generated by the same local job in the same
+                # environment are remembered so that it does not have to
+                # run again for each of them.
+                target_job = index.get_generated_job(
+                    args.via_hash, environ_key, args.hash)
+                if target_job is None:
+                    index.set_generated_job_data(
+                        args.via_hash, environ_key,
+                        self.run_via_job(via_job, args.ENV))
+                    self.save_job_index(index)
+                    target_job = index.get_generated_job(
+                        args.via_hash, environ_key, args.hash)
+
+        if target_job is None:
             return "Job not found"
         try:
             os.execve(
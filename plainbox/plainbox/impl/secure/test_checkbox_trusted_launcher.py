@@ -33,6 +33,7 @@ from tempfile import NamedTemporaryFile, TemporaryDirectory
 from unittest import TestCase
 
 from plainbox.impl.secure.checkbox_trusted_launcher import BaseJob
+from plainbox.impl.secure.checkbox_trusted_launcher import JobIndex
 from plainbox.impl.secure.checkbox_trusted_launcher import load_rfc822_records
 from plainbox.impl.secure.checkbox_trusted_launcher import main
 from plainbox.impl.secure.checkbox_trusted_launcher import Runner
@@ -155,6 +156,10 @@ class RFC822ParserTests(TestCase, RFC822ParserTestsMixIn):
 class TestMain(TestCase):
 
     def setUp(self):
+        self.index_dir = TemporaryDirectory()
+        self.index_patcher = patch.object(
+            Runner, 'INDEX', os.path.join(self.index_dir.name, 'index'))
+        self.index_patcher.start()
         self.scratch_dir = TemporaryDirectory(prefix='checkbox-')
         job_dir = os.path.join(self.scratch_dir.name, 'jobs')
         os.mkdir(job_dir)
@@ -177,7 +182,8 @@ class TestMain(TestCase):
         self.assertEqual(call.exception.args, (0,))
         self.maxDiff = None
         expected = """
-        usage: checkbox-trusted-launcher [-h] (--hash HASH | --warmup)
+        usage: checkbox-trusted-launcher [-h]
+                                         (--hash HASH | --warmup | --update-index)
                                          [--via LOCAL-JOB-HASH]
                                          [NAME=VALUE [NAME=VALUE ...]]
 
@@ -189,6 +195,8 @@ class TestMain(TestCase):
           --hash HASH           job hash to match
           --warmup              Return immediately, only useful when used with
                                 pkexec(1)
+          --update-index        Rebuild the index of jobs, useful after installing
+                                jobs
           --via LOCAL-JOB-HASH  Local job hash to use to match the generated job
         """
         self.assertEqual(io.combined, cleandoc(expected) + "\n")
@@ -206,10 +214,11 @@ class TestMain(TestCase):
                 main([])
             self.assertEqual(call.exception.args, (2,))
         expected = """
-        usage: checkbox-trusted-launcher [-h] (--hash HASH | --warmup)
+        usage: checkbox-trusted-launcher [-h]
+                                         (--hash HASH | --warmup | --update-index)
                                          [--via LOCAL-JOB-HASH]
                                          [NAME=VALUE [NAME=VALUE ...]]
-        checkbox-trusted-launcher: error: one of the arguments --hash --warmup is required
+        checkbox-trusted-launcher: error: one of the arguments --hash --warmup --update-index is required
         """
         self.assertEqual(io.combined, cleandoc(expected) + "\n")
 
@@ -276,5 +285,158 @@ class TestMain(TestCase):
                 self.assertEqual(call.exception.args, ('Fatal error',))
             self.assertEqual(io.combined, '')
 
+    def test_update_index(self):
+        with patch.object(Runner, 'CHECKBOXES', self.scratch_dir.name):
+            with self.assertRaises(SystemExit) as call:
+                main(['--update-index'])
+            self.assertEqual(call.exception.args, (0,))
+        index = JobIndex.load(Runner.INDEX)
+        self.assertEqual(index.packages, [self.scratch_dir.name])
+        self.assertEqual(len(index.job_map), 3)
+
+    def test_run_valid_hash_uses_index(self):
+        with patch.object(Runner, 'CHECKBOXES', self.scratch_dir.name),\
+                patch('os.execve') as mock_execve:
+            with self.assertRaises(SystemExit):
+                main(['--update-index'])
+            with patch('plainbox.impl.secure.checkbox_trusted_launcher.'
+                       'load_rfc822_records') as mock_load:
+                with self.assertRaises(SystemExit):
+                    main(['--hash=9ab0e98cce8866b9a2fa217e87b4e8bb'
+                          '739e5f74977ba5fa30822cab2a178c48'])
+                self.assertFalse(mock_load.called)
+            self.assertEqual(
+                mock_execve.call_args[0][1], ['bash', '-c', 'true'])
+
+    def test_run_generated_job_runs_via_job_once(self):
+        generated_hash = BaseJob({'name': 'gen', 'command': 'ls'}).checksum
+        argv = ['--hash', generated_hash,
+                '--via=a0dc4a9673b8f2d80b1ae4775c'
+                '03e8a777eefa061fc7ecf7a3af2f20a33bb177']
+        with patch.object(Runner, 'CHECKBOXES', self.scratch_dir.name),\
+                patch('os.execve') as mock_execve,\
+                patch('subprocess.Popen') as mock_popen:
+            mock_popen.return_value.stdout = StringIO(
+                'name: gen\ncommand: ls\n')
+            for i in range(2):
+                with self.assertRaises(SystemExit) as call:
+                    main(argv)
+                self.assertEqual(call.exception.args, ('Fatal error',))
+                self.assertEqual(
+                    mock_execve.call_args[0][1], ['bash', '-c', 'ls'])
+            self.assertEqual(mock_popen.call_count, 1)
+
+    def tearDown(self):
+        self.scratch_dir.cleanup()
+        self.index_patcher.stop()
+        self.index_dir.cleanup()
+
+
+class TestJobIndex(TestCase):
+
+    def setUp(self):
+        self.scratch_dir = TemporaryDirectory()
+        self.package = os.path.join(self.scratch_dir.name, 'checkbox')
+        self.pattern = self.package + '*'
+        self.jobs_dir = os.path.join(self.package, 'jobs')
+        os.makedirs(self.jobs_dir)
+        self.filename = os.path.join(self.jobs_dir, 'jobs.txt')
+        with open(self.filename, 'wt') as stream:
+            stream.write('name: root\nuser: root\ncommand: true\n\n'
+                         'name: local\nplugin: local\ncommand: cat\n\n'
+                         'name: plain\ncommand: false\n')
+        self.index_dir = os.path.join(self.scratch_dir.name, 'cache')
+        self.pathname = os.path.join(self.index_dir, 'index')
+        self.root_hash = BaseJob(
+            {'name': 'root', 'user': 'root', 'command': 'true'}).checksum
+        self.local_hash = BaseJob(
+            {'name': 'local', 'plugin': 'local', 'command': 'cat'}).checksum
+
     def tearDown(self):
         self.scratch_dir.cleanup()
+
+    def test_build(self):
+        index = JobIndex.build(self.pattern)
+        self.assertEqual(index.packages, [self.package])
+        self.assertEqual(index.get_job(self.root_hash).command, 'true')
+        self.assertEqual(index.get_local_job(self.local_hash).command, 'cat')
+        # Jobs without a user cannot be started directly
+        self.assertEqual(len(index.job_map), 1)
+        self.assertIsNone(index.get_job(self.local_hash))
+        self.assertTrue(index.is_current(self.pattern))
+        self.assertFalse(index.is_current(self.package))
+
+    def test_get_job_verifies_checksum(self):
+        index = JobIndex.build(self.pattern)
+        index.job_map[self.root_hash] = {'user': 'root', 'command': 'evil'}
+        self.assertIsNone(index.get_job(self.root_hash))
+
+    def test_save_and_load(self):
+        JobIndex.build(self.pattern).save(self.pathname)
+        self.assertEqual(os.stat(self.pathname).st_mode & 0o777, 0o644)
+        index = JobIndex.load(self.pathname)
+        self.assertEqual(index.get_job(self.root_hash).command, 'true')
+        self.assertTrue(index.is_current(self.pattern))
+
+    def test_load_missing(self):
+        self.assertIsNone(JobIndex.load(self.pathname))
+
+    def test_load_damaged(self):
+        JobIndex.build(self.pattern).save(self.pathname)
+        with open(self.pathname, 'ab') as stream:
+            stream.write(b' ')
+        self.assertIsNone(JobIndex.load(self.pathname))
+
+    def test_load_writable_by_others(self):
+        JobIndex.build(self.pattern).save(self.pathname)
+        os.chmod(self.pathname, 0o664)
+        self.assertIsNone(JobIndex.load(self.pathname))
+        os.chmod(self.pathname, 0o644)
+        os.chmod(self.index_dir, 0o777)
+        self.assertIsNone(JobIndex.load(self.pathname))
+
+    def test_load_not_owned(self):
+        JobIndex.build(self.pattern).save(self.pathname)
+        with patch('os.geteuid') as mock_geteuid:
+            mock_geteuid.return_value = os.stat(self.pathname).st_uid + 1
+            self.assertIsNone(JobIndex.load(self.pathname))
+
+    def test_save_untrusted_directory(self):
+        os.makedirs(self.index_dir, mode=0o777)
+        os.chmod(self.index_dir, 0o777)
+        with self.assertRaises(OSError):
+            JobIndex.build(self.pattern).save(self.pathname)
+        self.assertFalse(os.path.exists(self.pathname))
+
+    def test_modified_file(self):
+        index = JobIndex.build(self.pattern)
+        with open(self.filename, 'at') as stream:
+            stream.write('\nname: new\nuser: root\n')
+        self.assertFalse(index.is_current(self.pattern))
+
+    def test_new_file(self):
+        index = JobIndex.build(self.pattern)
+        with open(os.path.join(self.jobs_dir, 'more.txt'), 'wt'):
+            pass
+        self.assertFalse(index.is_current(self.pattern))
+
+    def test_new_package(self):
+        index = JobIndex.build(self.pattern)
+        os.mkdir(self.package + '-oem')
+        self.assertFalse(index.is_current(self.pattern))
+
+    def test_generated_jobs(self):
+        index = JobIndex.build(self.pattern)
+        via_job = index.get_local_job(self.local_hash)
+        environ_key = index.get_environ_key(via_job, {'FOO': 'bar'})
+        index.set_generated_job_data(
+            self.local_hash, environ_key, [{'name': 'gen', 'command': 'ls'}])
+        index.save(self.pathname)
+        index = JobIndex.load(self.pathname)
+        gen_hash = BaseJob({'name': 'gen', 'command': 'ls'}).checksum
+        self.assertEqual(index.get_generated_job(
+            self.local_hash, environ_key, gen_hash).command, 'ls')
+        self.assertIsNone(index.get_generated_job(
+            self.local_hash, 'other', gen_hash))
+        self.assertIsNone(index.get_generated_job(
+            self.root_hash, environ_key, gen_hash))
@@ -22,12 +22,12 @@
 =========================================================
 """
 
-from threading import Thread
 import collections
 import functools
 import itertools
 import logging
 import random
+import weakref
 
 try:
     from inspect import Signature
@@ -475,6 +475,29 @@ class JobResultWrapper(PlainBoxObjectWrapper):
         """
         return dbus.types.Array(self.native.get_io_log(), signature="(dsay)")
 
+    @dbus.service.method(dbus_interface=JOB_RESULT_IFACE,
+                         in_signature='u', out_signature='a(dsay)')
+    def GetIOLogTail(self, n):
+        """
+        The last n records of the input-output log.
+
+        Unlike the io_log property this doesn't read the whole log.
+        """
+        return dbus.types.Array(self.native.tail(n), signature="(dsay)")
+
+    @dbus.service.method(dbus_interface=JOB_RESULT_IFACE,
+                         in_signature='dd', out_signature='a(dsay)')
+    def GetIOLogRange(self, start_time, end_time):
+        """
+        Records of the input-output log created between start_time and
+        end_time (excluded), in seconds since the start of the program.
+
+        The delay of each record is the time since the previous record.
+        """
+        return dbus.types.Array(
+            list(self.native.range(start_time, end_time)),
+            signature="(dsay)")
+
 
 class JobStateWrapper(PlainBoxObjectWrapper):
     """
@@ -598,6 +621,24 @@ class SessionWrapper(PlainBoxObjectWrapper):
             job_name: JobStateWrapper(job_state)
             for job_name, job_state in self.native.job_state_map.items()
         }
+        # Jobs added to the session that don't have wrappers yet, see
+        # check_and_wrap_new_jobs()
+        self._new_job_list = []
+        # The listener only holds a weak reference to the wrapper, otherwise
+        # the session would keep the wrapper alive and __del__() would never
+        # run
+        wrapper_ref = weakref.ref(self)
+
+        def on_job_list_added(job_list):
+            wrapper = wrapper_ref()
+            if wrapper is not None:
+                wrapper._new_job_list.extend(job_list)
+        self._job_list_added_listener = on_job_list_added
+        self.native.on_job_list_added.connect(on_job_list_added)
+
+    def __del__(self):
+        self.native.on_job_list_added.disconnect(
+            self._job_list_added_listener)
 
     def publish_related_objects(self, connection):
         self.publish_self(connection)
@@ -620,8 +661,10 @@ class SessionWrapper(PlainBoxObjectWrapper):
 
     def check_and_wrap_new_jobs(self):
         # Since new jobs may have been added, we need to create and publish
-        # new JobDefinitionWrappers for them.
-        for job in self.native.job_list:
+        # new JobDefinitionWrappers for them. The session tells us about
+        # each group of added jobs so only those need to be looked at.
+        new_job_list, self._new_job_list = self._new_job_list, []
+        for job in new_job_list:
             key = id(job)
             if not key in self._native_id_to_wrapper_map:
                 logger.debug("Creating a new JobDefinitionWrapper for %s",
@@ -741,6 +784,9 @@ class SessionWrapper(PlainBoxObjectWrapper):
                     self.native.job_state_map[job.name])
             self._job_state_map_wrapper[job.name].publish_related_objects(
                     self.connection)
+        # All the jobs have wrappers now, including any that were added
+        # while resuming.
+        self._new_job_list = []
 
     @dbus.service.method(
         dbus_interface=SESSION_IFACE, in_signature='', out_signature='')
@@ -891,13 +937,46 @@ class ServiceWrapper(PlainBoxObjectWrapper):
         """
         return self.native.version
 
+    @dbus.service.property(dbus_interface=SERVICE_IFACE, signature="u")
+    def max_running_jobs(self):
+        """
+        maximum number of jobs running at the same time
+        """
+        return self.native.executor.max_workers
+
+    @dbus.service.property(dbus_interface=SERVICE_IFACE, signature="u")
+    def running_job_count(self):
+        """
+        number of jobs that are running
+        """
+        return self.native.executor.get_metrics()['running']
+
+    @dbus.service.property(dbus_interface=SERVICE_IFACE, signature="u")
+    def queued_job_count(self):
+        """
+        number of jobs waiting for a free worker, in all the sessions
+        """
+        return self.native.executor.get_queue_depth()
+
+    @dbus.service.method(
+        dbus_interface=SERVICE_IFACE, in_signature='', out_signature='a{su}')
+    def GetJobMetrics(self):
+        """
+        Get the number of queued, running, done, failed and cancelled jobs
+        """
+        return self.native.executor.get_metrics()
+
     @dbus.service.method(
         dbus_interface=SERVICE_IFACE, in_signature='', out_signature='')
     def Exit(self):
         """
         Shut down the service and terminate
+
+        Queued jobs are cancelled and running jobs are killed. This method
+        returns without waiting for them, they are waited for once the main
+        loop has terminated.
         """
-        # TODO: raise exception when job is in progress
+        self.native.shutdown(wait=False)
         self._on_exit()
 
     @dbus.service.method(
@@ -944,7 +1023,8 @@ class ServiceWrapper(PlainBoxObjectWrapper):
         dbus_interface=SERVICE_IFACE, in_signature='oo', out_signature='')
     @PlainBoxObjectWrapper.translate
     def RunJob(self, session: 'o', job: 'o'):
-        running_job_wrp = RunningJob(job, session, conn=self.connection)
+        running_job_wrp = RunningJob(job, session, conn=self.connection,
+                                     executor=self.native.executor)
         self.native.run_job(session, job, running_job_wrp)
 
 
@@ -971,7 +1051,7 @@ class RunningJob(dbus.service.Object):
     """
 
     def __init__(self, job, session, conn=None, object_path=None,
-                 bus_name=None):
+                 bus_name=None, executor=None):
         if object_path is None:
             object_path = "/plainbox/jobrunner/{}".format(id(self))
         self.path = object_path
@@ -980,11 +1060,18 @@ class RunningJob(dbus.service.Object):
         self.session = session
         self.result = {}
         self.ui_io_delegate = UIOutputPrinter(self)
+        self.executor = executor
+        # Ticket of the job or of its command in the executor
+        self.ticket = None
 
     @dbus.service.method(
         dbus_interface=RUNNING_JOB_IFACE, in_signature='', out_signature='')
     def Kill(self):
-        pass
+        """
+        Cancel the job if it is waiting for a worker or kill it if it runs
+        """
+        if self.ticket is not None:
+            self.ticket.cancel()
 
     @dbus.service.property(dbus_interface=RUNNING_JOB_IFACE, signature="s")
     def outcome_from_command(self):
@@ -1009,23 +1096,22 @@ class RunningJob(dbus.service.Object):
         self.result['io_log_filename'] = record_path
         self.emitAskForOutcomeSignal()
 
-    def _run_command(self, session, job, parent):
+    def _run_command(self, runner, job):
         """
-        Run a Job command in a separate thread
+        Run a Job command, in a worker thread of the executor
         """
-        ui_io_delegate = UIOutputPrinter(self)
-        runner = JobRunner(session.session_dir, session.jobs_io_log_dir,
-                           command_io_delegate=ui_io_delegate)
         return_code, record_path = runner._run_command(job, None)
-        parent._command_callback(return_code, record_path)
+        self._command_callback(return_code, record_path)
 
     @dbus.service.method(
         dbus_interface=RUNNING_JOB_IFACE, in_signature='', out_signature='')
     def RunCommand(self):
-        # FIXME: this thread object leaks, it needs to be .join()ed
-        runner = Thread(target=self._run_command,
-                        args=(self.session, self.job, self))
-        runner.start()
+        runner = JobRunner(self.session.session_dir,
+                           self.session.jobs_io_log_dir,
+                           command_io_delegate=UIOutputPrinter(self))
+        self.ticket = self.executor.submit(
+            self.session, self._run_command, runner, self.job,
+            kill=runner.kill)
 
     @dbus.service.signal(
         dbus_interface=SERVICE_IFACE, signature='dsay')
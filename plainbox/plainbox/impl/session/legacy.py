@@ -118,12 +118,32 @@ class SessionStateLegacyAPICompatImpl(SessionState, ISessionStateLegacyAPI):
         actions should take place before the next time the 'manager' property
         gets accessed. This is used to implement lazy decision on how to
         map the open/resume/clean methods onto the SessionManager API
+
+    :ivar _manager_kwargs:
+        Keyword arguments used to create the SessionManager, see
+        :meth:`set_durability()`
     """
 
     def __init__(self, job_list):
         super(SessionStateLegacyAPICompatImpl, self).__init__(job_list)
         self._manager = None
         self._commit_hint = None
+        self._manager_kwargs = {}
+
+    def set_durability(self, durability, group_commit_delay=None):
+        """
+        Set the durability policy of persistent_save()
+
+        See :class:`~plainbox.impl.session.manager.SessionManager` for the
+        description of each policy.
+        """
+        self._manager_kwargs = {
+            'durability': durability,
+            'group_commit_delay': group_commit_delay,
+        }
+        if self._manager is not None:
+            self._manager.durability = durability
+            self._manager.group_commit_delay = group_commit_delay
 
     def open(self):
         """
@@ -153,9 +173,11 @@ class SessionStateLegacyAPICompatImpl(SessionState, ISessionStateLegacyAPI):
         """
         Close the session.
 
-        Legacy API, this function does absolutely nothing
+        Legacy API, this function only flushes pending checkpoints to disk
         """
         logger.debug("SessionState.close()")
+        if self._manager is not None:
+            self._manager.flush()
         self._manager = None
         self._commit_hint = None
 
@@ -196,6 +218,7 @@ class SessionStateLegacyAPICompatImpl(SessionState, ISessionStateLegacyAPI):
         logger.debug("_commit_open()")
         self._manager = SessionManager.create_session(
             self.job_list, legacy_mode=True)
+        self._apply_manager_kwargs()
         # Compatibility hack. Since session manager is supposed to
         # create and manage both session state and session storage
         # we need to inject ourselves into its internal attribute.
@@ -210,6 +233,7 @@ class SessionStateLegacyAPICompatImpl(SessionState, ISessionStateLegacyAPI):
             self._manager.create_session(self.job_list)
         self._manager = SessionManager.create_session(
             self.job_list, legacy_mode=True)
+        self._apply_manager_kwargs()
         self._manager._state = self
 
     def _commit_resume(self):
@@ -217,9 +241,14 @@ class SessionStateLegacyAPICompatImpl(SessionState, ISessionStateLegacyAPI):
         last_storage = SessionStorageRepository().get_last_storage()
         assert last_storage is not None, "no saved session to resume"
         self._manager = SessionManager.load_session(
-            self.job_list, last_storage, lambda session: self)
+            self.job_list, last_storage, lambda session: self,
+            **self._manager_kwargs)
         logger.debug("_commit_resume() finished")
 
+    def _apply_manager_kwargs(self):
+        if self._manager_kwargs:
+            self.set_durability(**self._manager_kwargs)
+
     @property
     def session_dir(self):
         """
@@ -30,8 +30,10 @@ from :class:`~plainbox.impl.session.storage.SessionStorageRepository`,
 and :class:`~plainbox.impl.session.suspend.SessionResumeHelper`.
 """
 
-import os
 import logging
+import os
+import threading
+import time
 
 from plainbox.impl.session.resume import SessionResumeHelper
 from plainbox.impl.session.state import SessionState
@@ -39,6 +41,7 @@ from plainbox.impl.session.storage import LockedStorageError
 from plainbox.impl.session.storage import SessionStorage
 from plainbox.impl.session.storage import SessionStorageRepository
 from plainbox.impl.session.suspend import SessionSuspendHelper
+from plainbox.impl.tracing import traced
 
 logger = logging.getLogger("plainbox.session.manager")
 
@@ -88,6 +91,77 @@ class WellKnownDirsHelper:
         return os.path.join(self.storage.location, "io-logs")
 
 
+class GroupCommitHelper:
+    """
+    Helper class that flushes the journal of a storage to disk, from a
+    background thread, shortly after records are appended to it.
+
+    Records appended within the delay are flushed with one call to
+    :meth:`~plainbox.impl.session.storage.SessionStorage.sync_journal()`.
+    The thread only runs while there are records waiting to be flushed.
+    """
+
+    def __init__(self, storage, delay):
+        """
+        Initialize a helper for the specified storage
+
+        :param storage:
+            :class:`~plainbox.impl.session.storage.SessionStorage` to flush
+        :param delay:
+            Maximum delay, in seconds, between :meth:`schedule()` and the
+            moment the journal is flushed.
+        """
+        self._storage = storage
+        self._delay = delay
+        self._condition = threading.Condition()
+        self._deadline = None
+        self._thread = None
+
+    def schedule(self):
+        """
+        Schedule a flush of the journal, unless one is already scheduled
+        """
+        with self._condition:
+            if self._deadline is not None:
+                return
+            self._deadline = time.monotonic() + self._delay
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="plainbox-group-commit")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def flush(self):
+        """
+        Flush the journal right now, cancelling the scheduled flush (if any)
+        """
+        with self._condition:
+            self._deadline = None
+            self._condition.notify()
+        self._sync()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._deadline is not None:
+                    timeout = self._deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if self._deadline is None:
+                    # Flushed by flush(), nothing more to do
+                    self._thread = None
+                    return
+                self._deadline = None
+            self._sync()
+
+    def _sync(self):
+        try:
+            self._storage.sync_journal()
+        except (IOError, OSError) as exc:
+            logger.warning("Unable to flush the session journal: %s", exc)
+
+
 class SessionManager:
     """
     Manager class for coupling SessionStorage with SessionState.
@@ -96,18 +170,89 @@ class SessionManager:
     the :meth:`checkpoint()` method applications can create persistent
     snapshots of the :class:`~plainbox.impl.session.state.SessionState`
     associated with each :class:`SessionManager`.
+
+    Unless journaling is disabled, only the first checkpoint saves the whole
+    session. Subsequent checkpoints append a small record, describing what
+    has changed since the previous checkpoint, to the journal kept by the
+    storage. Once the journal grows larger than the snapshot, the whole
+    session is saved again (compacting the journal).
+
+    The durability policy decides when the journal is flushed to disk with
+    fsync(2). This is where most of the time of each checkpoint goes on slow
+    storage devices:
+
+    ``strict`` (:attr:`DURABILITY_STRICT`)
+        Each checkpoint is flushed before :meth:`checkpoint()` returns.
+    ``group`` (:attr:`DURABILITY_GROUP`)
+        Checkpoints are written right away but flushed by a background
+        thread, together with all the other checkpoints made within
+        :attr:`group_commit_delay` seconds.
+    ``relaxed`` (:attr:`DURABILITY_RELAXED`)
+        Checkpoints are only flushed right before and right after running
+        exclusive jobs, that is, jobs that can suspend, reboot or stress the
+        machine (see :attr:`~plainbox.impl.job.JobDefinition.exclusive`).
+
+    Whatever the policy, a crash can only make the session go back to an
+    earlier checkpoint, never damage it. Full snapshots are always flushed
+    before they replace the previous snapshot and the journal discards
+    records that did not make it to disk entirely.
     """
 
-    def __init__(self, state, storage):
+    DURABILITY_STRICT = 'strict'
+    DURABILITY_GROUP = 'group'
+    DURABILITY_RELAXED = 'relaxed'
+
+    DURABILITY_CHOICES = (
+        DURABILITY_STRICT, DURABILITY_GROUP, DURABILITY_RELAXED)
+
+    # Default maximum delay, in seconds, of the group commit policy
+    GROUP_COMMIT_DELAY = 1.0
+
+    # Journal compaction happens once the journal is larger than the
+    # snapshot multiplied by this ratio (and larger than the minimum size
+    # below). This keeps the average cost of each checkpoint constant.
+    JOURNAL_COMPACT_RATIO = 1.0
+
+    # Journal compaction never happens before the journal has this size
+    JOURNAL_COMPACT_MIN_SIZE = 64 * 1024
+
+    def __init__(self, state, storage, journal=True,
+                 durability=DURABILITY_STRICT, group_commit_delay=None):
         """
         Initialize a manager with a specific
         :class:`~plainbox.impl.session.state.SessionState` and
         :class:`~plainbox.impl.session.storage.SessionStorage`.
+
+        :param journal:
+            If True (the default) then :meth:`checkpoint()` uses the journal
+            of the storage, if False then each checkpoint saves the whole
+            session.
+        :param durability:
+            The durability policy, one of :attr:`DURABILITY_CHOICES`
+        :param group_commit_delay:
+            Maximum delay of the group commit policy, in seconds, by default
+            :attr:`GROUP_COMMIT_DELAY` is used.
         """
         assert isinstance(state, SessionState)
         assert isinstance(storage, SessionStorage)
         self._state = state
         self._storage = storage
+        self._journal = journal
+        self._durability = None
+        self._group_commit_delay = group_commit_delay
+        self._group_commit = None
+        self.durability = durability
+        # Running job at the time of the previous checkpoint
+        self._last_running_job_name = None
+        # State of the journal, see _reset_journal_tracking()
+        self._tracked_state = None
+        self._snapshot_size = None
+        self._journal_size = 0
+        self._added_job_name_set = set()
+        self._result_job_name_set = set()
+        self._saved_desired_job_list = None
+        self._saved_desired_job_name_list = None
+        self._saved_metadata_key = None
         logger.debug(
             "Created SessionManager with state:%r and storage:%r",
             state, storage)
@@ -128,6 +273,53 @@ class SessionManager:
         """
         return self._storage
 
+    @property
+    def durability(self):
+        """
+        durability policy of checkpoints, one of :attr:`DURABILITY_CHOICES`
+
+        Changing the policy flushes everything that was checkpointed so far.
+        """
+        return self._durability
+
+    @durability.setter
+    def durability(self, value):
+        if value not in self.DURABILITY_CHOICES:
+            raise ValueError(
+                "unsupported durability policy: {!r}".format(value))
+        if self._durability is not None and self._durability != value:
+            self.flush()
+        self._durability = value
+
+    @property
+    def group_commit_delay(self):
+        """
+        maximum delay, in seconds, of the group commit durability policy
+        """
+        if self._group_commit_delay is None:
+            return self.GROUP_COMMIT_DELAY
+        return self._group_commit_delay
+
+    @group_commit_delay.setter
+    def group_commit_delay(self, value):
+        if self._group_commit is not None:
+            self._group_commit.flush()
+            self._group_commit = None
+        self._group_commit_delay = value
+
+    def flush(self):
+        """
+        Flush all checkpoints to disk
+
+        This is only useful with durability policies other than
+        ``strict``, for example right before the application exits.
+        """
+        logger.debug("SessionManager.flush()")
+        if self._group_commit is not None:
+            self._group_commit.flush()
+        else:
+            self.storage.sync_journal()
+
     @classmethod
     def create_session(cls, job_list=None, repo=None, legacy_mode=False):
         """
@@ -169,7 +361,8 @@ class SessionManager:
         return cls(state, storage)
 
     @classmethod
-    def load_session(cls, job_list, storage, early_cb=None):
+    @traced("load session", "session")
+    def load_session(cls, job_list, storage, early_cb=None, **kwargs):
         """
         Open a previously checkpointed session.
 
@@ -199,6 +392,9 @@ class SessionManager:
             call returns. The callback accepts one argument, session, which is
             being resumed. This is being passed directly to
             :meth:`plainbox.impl.session.resume.SessionResumeHelper.resume()`
+        :param kwargs:
+            Additional keyword arguments passed to :class:`SessionManager`,
+            such as the durability policy
         :raises:
             Anything that can be raised by
             :meth:`~plainbox.impl.session.storage.SessionStorage.
@@ -209,9 +405,17 @@ class SessionManager:
         """
         logger.debug("SessionManager.open_session()")
         data = storage.load_checkpoint()
-        state = SessionResumeHelper(job_list).resume(data, early_cb)
-        return cls(state, storage)
+        journal = storage.load_journal()
+        # Results are restored lazily, most of them are never looked at
+        state = SessionResumeHelper(job_list, lazy=True).resume(
+            data, early_cb, journal)
+        manager = cls(state, storage, **kwargs)
+        # The journal can be extended, what is on disk describes the session
+        manager._reset_journal_tracking(len(data))
+        manager._journal_size = sum(len(record) for record in journal)
+        return manager
 
+    @traced("checkpoint", "session")
     def checkpoint(self):
         """
         Create a checkpoint of the session.
@@ -220,6 +424,24 @@ class SessionManager:
         :meth:`SessionManager.open_session()`.
         """
         logger.debug("SessionManager.checkpoint()")
+        if self._journal and self._tracked_state is self.state:
+            data = self._get_journal_record()
+            if data is None:
+                logger.debug("Nothing has changed since the last checkpoint")
+                return
+            if self._journal_size + len(data) <= max(
+                    self.JOURNAL_COMPACT_MIN_SIZE,
+                    self._snapshot_size * self.JOURNAL_COMPACT_RATIO):
+                logger.debug(
+                    "Appending %d bytes of journal data to %r",
+                    len(data), self.storage.location)
+                sync = self._is_sync_needed()
+                self.storage.append_journal(data, sync)
+                if not sync and self.durability == self.DURABILITY_GROUP:
+                    self._get_group_commit().schedule()
+                self._journal_size += len(data)
+                self._clear_changes()
+                return
         data = SessionSuspendHelper().suspend(self.state)
         logger.debug(
             "Saving %d bytes of checkpoint data to %r",
@@ -229,6 +451,100 @@ class SessionManager:
         except LockedStorageError:
             self.storage.break_lock()
             self.storage.save_checkpoint(data)
+        self._reset_journal_tracking(len(data))
+
+    def _is_sync_needed(self):
+        """
+        Check if the journal record being saved must be flushed right away
+        """
+        if self.durability == self.DURABILITY_STRICT:
+            return True
+        if self.durability == self.DURABILITY_GROUP:
+            return False
+        # With the relaxed policy, flush the checkpoint made before the
+        # exclusive job starts and the one made after it has finished.
+        for job_name in (self.state.metadata.running_job_name,
+                         self._last_running_job_name):
+            job_state = self.state.job_state_map.get(job_name)
+            if job_state is not None and job_state.job.exclusive:
+                return True
+        return False
+
+    def _get_group_commit(self):
+        if self._group_commit is None:
+            self._group_commit = GroupCommitHelper(
+                self.storage, self.group_commit_delay)
+        return self._group_commit
+
+    def _reset_journal_tracking(self, snapshot_size):
+        """
+        Start tracking changes made to the session after it was saved
+        """
+        if self._tracked_state is not self.state:
+            if self._tracked_state is not None:
+                self._tracked_state.on_job_added.disconnect(
+                    self._on_job_added)
+                self._tracked_state.on_job_result_changed.disconnect(
+                    self._on_job_result_changed)
+            # NOTE: the state can be replaced by the legacy API, see
+            # SessionStateLegacyAPICompatImpl._commit_open(), that's why
+            # this is not done once in __init__()
+            self.state.on_job_added.connect(self._on_job_added)
+            self.state.on_job_result_changed.connect(
+                self._on_job_result_changed)
+            self._tracked_state = self.state
+        self._snapshot_size = snapshot_size
+        self._journal_size = 0
+        self._clear_changes()
+
+    def _clear_changes(self):
+        """
+        Forget about all the changes, they are saved now
+        """
+        self._added_job_name_set.clear()
+        self._result_job_name_set.clear()
+        if self.state.desired_job_list is not self._saved_desired_job_list:
+            self._saved_desired_job_list = self.state.desired_job_list
+            self._saved_desired_job_name_list = [
+                job.name for job in self.state.desired_job_list]
+        self._saved_metadata_key = self._get_metadata_key()
+        self._last_running_job_name = self.state.metadata.running_job_name
+
+    def _get_journal_record(self):
+        """
+        Compute the journal record with all the changes made to the session
+        since the last checkpoint
+
+        :returns: the record (bytes) or None if nothing has changed
+        """
+        desired_job_list_changed = False
+        if self.state.desired_job_list is not self._saved_desired_job_list:
+            desired_job_list_changed = [
+                job.name for job in self.state.desired_job_list
+            ] != self._saved_desired_job_name_list
+            if not desired_job_list_changed:
+                # Don't look at the names again until the list is replaced
+                self._saved_desired_job_list = self.state.desired_job_list
+        metadata_changed = self._get_metadata_key() != self._saved_metadata_key
+        if not (self._added_job_name_set or self._result_job_name_set
+                or desired_job_list_changed or metadata_changed):
+            return None
+        # New jobs need their (possibly empty) result to be saved as well
+        return SessionSuspendHelper().suspend_changes(
+            self.state, sorted(self._added_job_name_set),
+            sorted(self._added_job_name_set | self._result_job_name_set),
+            desired_job_list_changed, metadata_changed)
+
+    def _get_metadata_key(self):
+        metadata = self.state.metadata
+        return (metadata.title, sorted(metadata.flags),
+                metadata.running_job_name)
+
+    def _on_job_added(self, job):
+        self._added_job_name_set.add(job.name)
+
+    def _on_job_result_changed(self, job, result):
+        self._result_job_name_set.add(job.name)
 
     def destroy(self):
         """
@@ -44,6 +44,7 @@ so two assumptions are made:
 """
 
 from collections import deque
+from functools import partial
 import base64
 import binascii
 import gzip
@@ -106,13 +107,22 @@ class SessionResumeHelper:
     failure modes are possible. Those are documented in :meth:`resume()`
     """
 
-    def __init__(self, job_list):
+    def __init__(self, job_list, lazy=False):
         """
         Initialize the helper with a list of known jobs.
+
+        :param lazy:
+            If True, results are restored as lightweight stubs. Only the
+            outcome is restored right away, everything else (comments, IO
+            log or the name of the IO log file, etc) is restored the first
+            time it is accessed. Problems with those values are then
+            reported (with :class:`CorruptedSessionError`) on access rather
+            than by :meth:`resume()`.
         """
         self.job_list = job_list
+        self.lazy = lazy
 
-    def resume(self, data, early_cb=None):
+    def resume(self, data, early_cb=None, journal=None):
         """
         Resume a dormant session.
 
@@ -124,6 +134,10 @@ class SessionResumeHelper:
             be used to register signal listeners on the new session before this
             method call returns. The callback accepts one argument, session,
             which is being resumed.
+        :param journal:
+            An optional list of journal records (bytes), as computed by
+            :meth:`~plainbox.impl.session.suspend.SessionSuspendHelper.
+            suspend_changes()`, that are replayed on top of data.
         :returns:
             resumed session instance
         :rtype:
@@ -156,8 +170,32 @@ class SessionResumeHelper:
             json_repr = json.loads(text)
         except ValueError:
             raise CorruptedSessionError("Cannot interpret session JSON")
+        if journal:
+            self._replay_journal(json_repr, journal)
         return self._resume_json(json_repr, early_cb)
 
+    @classmethod
+    def _replay_journal(cls, json_repr, journal):
+        """
+        Apply all the changes recorded in the journal to the representation
+        of the session.
+        """
+        session_repr = _validate(json_repr, key='session', value_type=dict)
+        for record in journal:
+            try:
+                changes_repr = json.loads(record.decode("UTF-8"))
+            except (UnicodeDecodeError, ValueError):
+                raise CorruptedSessionError("Cannot interpret journal record")
+            _validate(changes_repr, value_type=dict)
+            for key in ('jobs', 'results'):
+                if key in changes_repr:
+                    _validate(session_repr, key=key, value_type=dict).update(
+                        _validate(changes_repr, key=key, value_type=dict))
+            for key in ('desired_job_list', 'metadata'):
+                if key in changes_repr:
+                    session_repr[key] = changes_repr[key]
+        logger.debug("Replayed %d journal record(s)", len(journal))
+
     def _resume_json(self, json_repr, early_cb=None):
         """
         Resume a SessionState object from the JSON representation.
@@ -166,8 +204,9 @@ class SessionResumeHelper:
         and parsing is done. The only error conditions that can happen
         are related to semantic incompatibilities or corrupted internal state.
         """
-        logger.debug("Resuming from json... (see below)")
-        logger.debug(json.dumps(json_repr, indent=4))
+        # NOTE: don't dump the whole representation here, even at debug
+        # level, for big sessions that alone takes longer than the resume.
+        logger.debug("Resuming from json...")
         _validate(json_repr, value_type=dict)
         _validate(json_repr, key="version", choice=[1])
         session_repr = _validate(json_repr, key='session', value_type=dict)
@@ -300,7 +339,10 @@ class SessionResumeHelper:
             results_repr, key=job_name, value_type=list, value_none=True)
         for result_repr in result_list_repr:
             _validate(result_repr, value_type=dict)
-            result = self._build_JobResult(result_repr)
+            if self.lazy:
+                result = self._build_JobResult_stub(result_repr)
+            else:
+                result = self._build_JobResult(result_repr)
             result_list.append(result)
         # Show the _LAST_ result to the session. Currently we only store one
         # result but showing the most recent (last) result should be good
@@ -378,6 +420,7 @@ class SessionResumeHelper:
         execution_duration = _validate(
             result_repr, key='execution_duration', value_type=float,
             value_none=True)
+        resource_usage = cls._build_resource_usage(result_repr)
         # Construct either DiskJobResult or MemoryJobResult
         if 'io_log_filename' in result_repr:
             io_log_filename = _validate(
@@ -387,7 +430,8 @@ class SessionResumeHelper:
                 'comments': comments,
                 'execution_duration': execution_duration,
                 'io_log_filename': io_log_filename,
-                'return_code': return_code
+                'return_code': return_code,
+                'resource_usage': resource_usage
             })
         else:
             io_log = [
@@ -399,9 +443,75 @@ class SessionResumeHelper:
                 'comments': comments,
                 'execution_duration': execution_duration,
                 'io_log': io_log,
-                'return_code': return_code
+                'return_code': return_code,
+                'resource_usage': resource_usage
             })
 
+    @classmethod
+    def _build_JobResult_stub(cls, result_repr):
+        """
+        Convert the representation of MemoryJobResult or DiskJobResult
+        back into an instance that restores its data lazily.
+
+        Only the outcome is validated and restored right away, as the session
+        needs it to compute the readiness of other jobs. See
+        :class:`_JobResultDataStub`.
+        """
+        outcome = _validate(
+            result_repr, key='outcome', value_type=str,
+            value_choice=IJobResult.ALL_OUTCOME_LIST, value_none=True)
+        loader_map = {
+            'comments': partial(
+                _validate, result_repr, key='comments', value_type=str,
+                value_none=True),
+            'return_code': partial(
+                _validate, result_repr, key='return_code', value_type=int,
+                value_none=True),
+            'execution_duration': partial(
+                _validate, result_repr, key='execution_duration',
+                value_type=float, value_none=True),
+            'resource_usage': partial(cls._build_resource_usage, result_repr),
+        }
+        if 'io_log_filename' in result_repr:
+            loader_map['io_log_filename'] = partial(
+                _validate, result_repr, key='io_log_filename', value_type=str)
+            return DiskJobResult(
+                _JobResultDataStub({'outcome': outcome}, loader_map))
+        else:
+            loader_map['io_log'] = partial(
+                cls._build_IOLogRecord_list,
+                _validate(result_repr, key='io_log', value_type=list))
+            return MemoryJobResult(
+                _JobResultDataStub({'outcome': outcome}, loader_map))
+
+    @classmethod
+    def _build_resource_usage(cls, result_repr):
+        """
+        Validate the (optional) resource usage of a job result
+        """
+        if 'resource_usage' not in result_repr:
+            return None
+        resource_usage = _validate(
+            result_repr, key='resource_usage', value_type=dict,
+            value_none=True)
+        if resource_usage is not None:
+            for key, value in resource_usage.items():
+                _validate(
+                    key, value_type=str,
+                    value_type_msg="Each resource usage key must be a string")
+                _validate(
+                    value, value_type=(int, float),
+                    value_type_msg="Each resource usage must be a number")
+        return resource_usage
+
+    @classmethod
+    def _build_IOLogRecord_list(cls, record_list_repr):
+        """
+        Convert the representation of a list of IOLogRecord back to objects
+        """
+        return [cls._build_IOLogRecord(record_repr)
+                for record_repr in record_list_repr]
+
     @classmethod
     def _build_IOLogRecord(cls, record_repr):
         """
@@ -431,6 +541,43 @@ class SessionResumeHelper:
         return IOLogRecord(delay, stream_name, data)
 
 
+class _JobResultDataStub(dict):
+    """
+    Data of a job result restored by
+    :meth:`SessionResumeHelper._build_JobResult_stub()`
+
+    This dictionary starts with the values that are known up front. Other
+    values are computed by their loader (a function without arguments) when
+    they are looked up for the first time. Values that are assigned before
+    they are ever looked up are never loaded.
+    """
+
+    def __init__(self, data, loader_map):
+        super(_JobResultDataStub, self).__init__(data)
+        self._loader_map = loader_map
+
+    def _load(self, key):
+        loader = self._loader_map.pop(key, None)
+        if loader is not None:
+            super(_JobResultDataStub, self).__setitem__(key, loader())
+
+    def __getitem__(self, key):
+        self._load(key)
+        return super(_JobResultDataStub, self).__getitem__(key)
+
+    def __setitem__(self, key, value):
+        self._loader_map.pop(key, None)
+        super(_JobResultDataStub, self).__setitem__(key, value)
+
+    def __contains__(self, key):
+        return (key in self._loader_map
+                or super(_JobResultDataStub, self).__contains__(key))
+
+    def get(self, key, default=None):
+        self._load(key)
+        return super(_JobResultDataStub, self).get(key, default)
+
+
 def _validate(obj, **flags):
     """
     Multi-purpose extraction and validation function.
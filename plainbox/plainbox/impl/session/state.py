@@ -21,25 +21,31 @@
 :mod:`plainbox.impl.session.state` -- session state handling
 ============================================================
 """
+import itertools
 import logging
 
 from plainbox.abc import IJobResult
 from plainbox.impl.depmgr import DependencyDuplicateError
-from plainbox.impl.depmgr import DependencyError
 from plainbox.impl.depmgr import DependencySolver
 from plainbox.impl.resource import ExpressionCannotEvaluateError
 from plainbox.impl.resource import ExpressionFailedError
 from plainbox.impl.resource import Resource
+from plainbox.impl.resource import ResourceIndex
+from plainbox.impl.resource import ResourceProgram
 from plainbox.impl.rfc822 import gen_rfc822_records
 from plainbox.impl.rfc822 import RFC822SyntaxError
 from plainbox.impl.session.jobs import JobReadinessInhibitor
 from plainbox.impl.session.jobs import JobState
 from plainbox.impl.session.jobs import UndesiredJobReadinessInhibitor
 from plainbox.impl.signal import Signal
+from plainbox.impl.tracing import traced
 
 
 logger = logging.getLogger("plainbox.session.state")
 
+# Source of versions of resource lists, see SessionState._store_resource_list()
+_resource_version_counter = itertools.count(1)
+
 
 class SessionMetaData:
     """
@@ -198,6 +204,11 @@ class SessionState:
     :ivar dict metadata: instance of :class:`SessionMetaData`
     """
 
+    # When True, each incremental update of job readiness is cross-checked
+    # against a full re-computation (see _recompute_job_readiness()). This is
+    # expensive and is only meant for debugging and testing.
+    _readiness_cross_check = False
+
     @Signal.define
     def on_job_state_map_changed(self):
         """
@@ -207,10 +218,10 @@ class SessionState:
         such as :meth:`on_job_result_changed()` and :meth:`on_job_added()`.
 
         This signal is fired pretty often, each time a job result is
-        presented to the session and each time a job is added. When
-        both of those events happen at the same time only one notification
-        is sent. The actual state is not sent as it is quite extensive
-        and can be easily looked at by the application.
+        presented to the session and each time a group of jobs is added.
+        When both of those events happen at the same time only one
+        notification is sent. The actual state is not sent as it is quite
+        extensive and can be easily looked at by the application.
         """
 
     @Signal.define
@@ -233,6 +244,21 @@ class SessionState:
         """
         logger.info("New job defined: %r", job)
 
+    @Signal.define
+    def on_job_list_added(self, job_list):
+        """
+        Signal sent once for each group of jobs added to the session.
+
+        Jobs are added in groups by :meth:`add_job_list()`, this includes all
+        the jobs generated by a single local job. The job_list argument
+        contains only the jobs that were actually added, in the order they
+        were added in.
+
+        This signal is fired **after** :meth:`on_job_state_map_changed()` and
+        after :meth:`on_job_added()` was fired for each of the jobs.
+        """
+        logger.info("%d new job(s) defined", len(job_list))
+
     def __init__(self, job_list):
         """
         Initialize a new SessionState with a given list of jobs.
@@ -277,7 +303,22 @@ class SessionState:
         self._desired_job_list = []
         self._run_list = []
         self._resource_map = {}
+        # Maps from resource name to a ResourceIndex of each resource list
+        # from _resource_map, used to speed up evaluation of requirements
+        self._resource_index_map = {}
+        # Maps from resource name to the version of each resource list from
+        # _resource_map, used to reuse results of requirement programs
+        self._resource_version_map = {}
         self._metadata = SessionMetaData()
+        # Reverse dependency indices, both are maintained by
+        # _recompute_job_readiness() and only cover jobs on the run list.
+        # Maps from job name to a set of names of jobs that depend on it
+        self._dependent_map = {}
+        # Maps from resource name to a set of names of jobs that have a
+        # resource program that uses that resource
+        self._consumer_map = {}
+        # Dependency solver used by update_desired_job_list()
+        self._solver = None
         super(SessionState, self).__init__()
 
     def update_desired_job_list(self, desired_job_list):
@@ -291,35 +332,22 @@ class SessionState:
 
         It never fails although it may reduce the actual permitted
         desired_job_list to an empty list. It returns a list of problems (all
-        instances of DependencyError class), one for each job that had to be
-        removed.
-        """
-        # Remember a copy of original desired job list. We may modify this list
-        # so let's not mess up data passed by the caller.
-        self._desired_job_list = list(desired_job_list)
-        # Reset run list just in case desired_job_list is empty
-        self._run_list = []
-        # Try to solve the dependency graph. This is done in a loop as may need
-        # to remove a problematic job and re-try. The loop provides a stop
-        # condition as we will eventually run out of jobs.
-        problems = []
-        while self._desired_job_list:
-            # XXX: it might be more efficient to incorporate this 'recovery
-            # mode' right into the solver, this way we'd probably save some
-            # resources or runtime complexity.
-            try:
-                self._run_list = DependencySolver.resolve_dependencies(
-                    self._job_list, self._desired_job_list)
-            except DependencyError as exc:
-                # When a dependency error is detected remove the affected job
-                # form _desired_job_list and try again.
-                self._desired_job_list.remove(exc.affected_job)
-                # Remember each problem, this can be presented by the UI
-                problems.append(exc)
-                continue
-            else:
-                # Don't iterate the loop if there was no exception
-                break
+        instances of DependencyError class) that caused some jobs to be
+        removed. Each problem is reported once, even if it affects many jobs.
+        """
+        # The solver remembers what it has learned about the dependency graph
+        # so that solving again, after the desired job list has changed, is
+        # cheap. It is discarded when new jobs are added.
+        if self._solver is None:
+            self._solver = DependencySolver(self._job_list, strict=False)
+        # Solve the dependency graph once, this collects all the problems and
+        # leaves out all the desired jobs that cannot run.
+        self._run_list, problems = self._solver.solve(desired_job_list)
+        # Remember a copy of original desired job list, without any of the
+        # problematic jobs. Let's not mess up data passed by the caller.
+        run_name_set = {job.name for job in self._run_list}
+        self._desired_job_list = [
+            job for job in desired_job_list if job.name in run_name_set]
         # Update all job readiness state
         self._recompute_job_readiness()
         # Return all dependency problems to the caller
@@ -384,7 +412,10 @@ class SessionState:
         local jobs don't replace anything. They cannot replace an existing job
         with the same name.
         """
-        assert job in self._job_list
+        # Look the job up by name, comparing it with each known job (by
+        # checksum) is quadratic when results of many jobs are restored.
+        assert (job.name in self._job_state_map
+                and self._job_state_map[job.name].job == job)
         # Store the result in job_state_map
         self._job_state_map[job.name].result = result
         self.on_job_state_map_changed()
@@ -394,8 +425,13 @@ class SessionState:
             self._process_resource_result(job, result)
         elif job.plugin == "local":
             self._process_local_result(job, result)
-        # Update all job readiness state
-        self._recompute_job_readiness()
+        # Update readiness state of all the jobs that are affected by
+        # this result: all the jobs that depend on this job and, if this is a
+        # resource job, all the jobs that use the resources it produces.
+        affected_set = set(self._dependent_map.get(job.name, ()))
+        if job.plugin == "resource":
+            affected_set.update(self._consumer_map.get(job.name, ()))
+        self._update_job_readiness(affected_set)
 
     def add_job(self, new_job):
         """
@@ -416,33 +452,96 @@ class SessionState:
 
         .. note::
 
-            This method recomputes job readiness for all jobs
+            The new job is not on the run list so it cannot affect readiness
+            of any other job. Job readiness is not recomputed.
+
+        This is a shortcut for calling :meth:`add_job_list()` with a list that
+        contains just one job.
         """
-        # See if we have a job with the same name already
-        try:
-            existing_job = self._job_state_map[new_job.name].job
-        except KeyError:
-            # Register the new job in our state
-            self._job_state_map[new_job.name] = JobState(new_job)
-            self._job_list.append(new_job)
-            self.on_job_state_map_changed()
-            self.on_job_added(new_job)
-        else:
-            # If there is a clash report DependencyDuplicateError only when the
-            # hashes are different. This prevents a common "problem" where
-            # "__foo__" local jobs just load all jobs from the "foo" category.
+        self.add_job_list([new_job])
+
+    def add_job_list(self, new_job_list):
+        """
+        Add a group of new jobs to the session
+
+        :param new_job_list: list of jobs being added
+        :returns: list of jobs that were actually added
+
+        :raises DependencyDuplicateError:
+            if a duplicate, clashing job definition is detected, either among
+            the jobs already known to the session or within new_job_list
+            itself. No jobs are added in that case.
+
+        This is the bulk version of :meth:`add_job()`. Each job is checked
+        against the jobs known to the session by looking up its name and
+        comparing checksums of the two definitions. Identical jobs are
+        silently discarded.
+
+        All the jobs are validated before any of them is added. Once they are
+        added :meth:`on_job_state_map_changed()` is fired once, followed by
+        :meth:`on_job_added()` for each job and, finally, a single
+        :meth:`on_job_list_added()`. Since none of the new jobs is on the run
+        list job readiness is not recomputed.
+        """
+        added_job_list, clash_list = self._split_new_job_list(new_job_list)
+        for existing_job, new_job in clash_list:
             if new_job != existing_job:
                 raise DependencyDuplicateError(existing_job, new_job)
-        # Update all job readiness state
-        self._recompute_job_readiness()
+        self._register_job_list(added_job_list)
+        return added_job_list
+
+    def _split_new_job_list(self, new_job_list):
+        """
+        Split a list of new jobs into jobs that can be added and duplicates
+
+        :returns:
+            A tuple (added_job_list, clash_list) where added_job_list are jobs
+            with names that are not known yet (only the first of any jobs
+            sharing a name) and clash_list is a list of pairs (existing_job,
+            new_job) for all the other jobs.
+        """
+        added_job_list = []
+        added_job_map = {}
+        clash_list = []
+        for new_job in new_job_list:
+            existing_job = added_job_map.get(new_job.name)
+            if existing_job is None:
+                existing_job_state = self._job_state_map.get(new_job.name)
+                if existing_job_state is not None:
+                    existing_job = existing_job_state.job
+            if existing_job is None:
+                added_job_map[new_job.name] = new_job
+                added_job_list.append(new_job)
+            else:
+                clash_list.append((existing_job, new_job))
+        return added_job_list, clash_list
+
+    def _register_job_list(self, job_list):
+        """
+        Add already validated jobs to the session and notify everyone
+        """
+        if not job_list:
+            return
+        for job in job_list:
+            self._job_state_map[job.name] = JobState(job)
+        self._job_list.extend(job_list)
+        # The dependency graph has changed, solve it from scratch next time
+        self._solver = None
+        self.on_job_state_map_changed()
+        for job in job_list:
+            self.on_job_added(job)
+        self.on_job_list_added(job_list)
 
     def set_resource_list(self, resource_name, resource_list):
         """
         Add or change a resource with the given name.
 
         Resources silently overwrite any old resources with the same name.
+        Readiness of all the jobs that use this resource is updated.
         """
-        self._resource_map[resource_name] = resource_list
+        self._store_resource_list(resource_name, resource_list)
+        self._update_job_readiness(
+            self._consumer_map.get(resource_name, ()))
 
     def _process_resource_result(self, job, result):
         """
@@ -457,45 +556,50 @@ class SessionState:
             logger.info("Storing resource record %r: %s", job.name, resource)
             new_resource_list.append(resource)
         # Replace any old resources with the new resource list
-        self._resource_map[job.name] = new_resource_list
+        self._store_resource_list(job.name, new_resource_list)
+
+    def _store_resource_list(self, resource_name, resource_list):
+        """
+        Internal method of SessionState.
+
+        Store a new resource list, along with its index and a new version.
+        Versions come from a counter shared by all sessions so that results
+        cached by requirement programs (which may be shared by jobs from
+        different sessions) are never confused.
+        """
+        self._resource_map[resource_name] = resource_list
+        self._resource_index_map[resource_name] = ResourceIndex(resource_list)
+        self._resource_version_map[resource_name] = next(
+            _resource_version_counter)
 
     def _process_local_result(self, job, result):
         """
         Analyze a result of a CheckBox "local" job and generate
         additional job definitions
         """
-        # TODO: refactor using add_job() but make sure we compute
-        # job state map at most once
-
         # First parse all records and create a list of new jobs (confusing
         # name, not a new list of jobs)
         new_job_list = []
         for record in self._gen_rfc822_records_from_io_log(job, result):
             new_job = job.create_child_job_from_record(record)
             new_job_list.append(new_job)
-        # Then for each new job, add it to the job_list, unless it collides
+        # Then add all the new jobs at once, except for those that collide
         # with another job with the same name.
-        for new_job in new_job_list:
-            try:
-                existing_job = self._job_state_map[new_job.name].job
-            except KeyError:
-                self._job_state_map[new_job.name] = JobState(new_job)
-                self._job_list.append(new_job)
-                self.on_job_state_map_changed()
-                self.on_job_added(new_job)
+        added_job_list, clash_list = self._split_new_job_list(new_job_list)
+        for existing_job, new_job in clash_list:
+            # XXX: there should be a channel where such errors could be
+            # reported back to the UI layer. Perhaps update_job_result()
+            # could simply return a list of problems in a similar manner
+            # how update_desired_job_list() does.
+            if new_job != existing_job:
+                logging.warning(
+                    ("Local job %s produced job %r that collides with"
+                     " an existing job %r, the new job was discarded"),
+                    job, new_job, existing_job)
             else:
-                # XXX: there should be a channel where such errors could be
-                # reported back to the UI layer. Perhaps update_job_result()
-                # could simply return a list of problems in a similar manner
-                # how update_desired_job_list() does.
-                if new_job != existing_job:
-                    logging.warning(
-                        ("Local job %s produced job %r that collides with"
-                         " an existing job %r, the new job was discarded"),
-                        job, new_job, existing_job)
-                else:
-                    if not existing_job.via:
-                        existing_job._via = new_job.via
+                if not existing_job.via:
+                    existing_job._via = new_job.via
+        self._register_job_list(added_job_list)
 
     def _gen_rfc822_records_from_io_log(self, job, result):
         """
@@ -571,12 +675,16 @@ class SessionState:
         """
         return self._metadata
 
+    @traced("recompute job readiness", "session")
     def _recompute_job_readiness(self):
         """
         Internal method of SessionState.
 
         Re-computes [job_state.ready
                      for job_state in _job_state_map.values()]
+
+        This also rebuilds the reverse dependency indices that are used by
+        :meth:`_update_job_readiness()`
         """
         # Reset the state of all jobs to have the undesired inhibitor. Since
         # we maintain a state object for _all_ jobs (including ones not in the
@@ -585,67 +693,131 @@ class SessionState:
         for job_state in self._job_state_map.values():
             job_state.readiness_inhibitor_list = [
                 UndesiredJobReadinessInhibitor]
-        # Take advantage of the fact that run_list is topologically sorted and
-        # do a single O(N) pass over _run_list. All "current/update" state is
-        # computed before it needs to be observed (thanks to the ordering)
+        self._dependent_map = {}
+        self._consumer_map = {}
+        # Each job on the run list has its readiness computed independently,
+        # the only things that matter are results of direct dependencies and
+        # the resource map.
         for job in self._run_list:
-            job_state = self._job_state_map[job.name]
-            # Remove the undesired inhibitor as we want to run this job
-            job_state.readiness_inhibitor_list.remove(
-                UndesiredJobReadinessInhibitor)
-            # Check if all job resource requirements are met
-            prog = job.get_resource_program()
-            if prog is not None:
-                try:
-                    prog.evaluate_or_raise(self._resource_map)
-                except ExpressionCannotEvaluateError as exc:
-                    # Lookup the related job (the job that provides the
-                    # resources needed by the expression that cannot be
-                    # evaluated)
-                    related_job = self._job_state_map[
-                        exc.expression.resource_name].job
-                    # Add A PENDING_RESOURCE inhibitor as we are unable to
-                    # determine if the resource requirement is met or not. This
-                    # can happen if the resource job did not ran for any reason
-                    # (it can either be prevented from running by normal means
-                    # or simply be on the run_list but just was not executed
-                    # yet).
-                    inhibitor = JobReadinessInhibitor(
-                        cause=JobReadinessInhibitor.PENDING_RESOURCE,
-                        related_job=related_job,
-                        related_expression=exc.expression)
-                    job_state.readiness_inhibitor_list.append(inhibitor)
-                except ExpressionFailedError as exc:
-                    # Lookup the related job (the job that provides the
-                    # resources needed by the expression that failed)
-                    related_job = self._job_state_map[
-                        exc.expression.resource_name].job
-                    # Add a FAILED_RESOURCE inhibitor as we have all the data
-                    # to run the requirement program but it simply returns a
-                    # non-True value. This typically indicates a missing
-                    # software package or necessary hardware.
-                    inhibitor = JobReadinessInhibitor(
-                        cause=JobReadinessInhibitor.FAILED_RESOURCE,
-                        related_job=related_job,
-                        related_expression=exc.expression)
-                    job_state.readiness_inhibitor_list.append(inhibitor)
-            # Check if all job dependencies ran successfully
-            for dep_name in sorted(job.get_direct_dependencies()):
-                dep_job_state = self._job_state_map[dep_name]
-                # If the dependency did not have a chance to run yet add the
-                # PENDING_DEP inhibitor.
-                if dep_job_state.result.outcome == IJobResult.OUTCOME_NONE:
-                    inhibitor = JobReadinessInhibitor(
-                        cause=JobReadinessInhibitor.PENDING_DEP,
-                        related_job=dep_job_state.job)
-                    job_state.readiness_inhibitor_list.append(inhibitor)
-                # If the dependency is anything but successful add the
-                # FAILED_DEP inhibitor. In theory the PENDING_DEP code above
-                # could be discarded but this would loose context and would
-                # prevent the operator from actually understanding why a job
-                # cannot run.
-                elif dep_job_state.result.outcome != IJobResult.OUTCOME_PASS:
-                    inhibitor = JobReadinessInhibitor(
-                        cause=JobReadinessInhibitor.FAILED_DEP,
-                        related_job=dep_job_state.job)
-                    job_state.readiness_inhibitor_list.append(inhibitor)
+            for dep_name in job.get_direct_dependencies():
+                self._dependent_map.setdefault(dep_name, set()).add(job.name)
+            for resource_name in job.get_resource_dependencies():
+                self._consumer_map.setdefault(
+                    resource_name, set()).add(job.name)
+            self._job_state_map[job.name].readiness_inhibitor_list = (
+                self._compute_readiness_inhibitor_list(job))
+        logger.debug(
+            "Requirement program cache: %d hit(s), %d miss(es)",
+            ResourceProgram.cache_hit_count, ResourceProgram.cache_miss_count)
+
+    @traced("update job readiness", "session")
+    def _update_job_readiness(self, job_name_set):
+        """
+        Internal method of SessionState.
+
+        Re-computes readiness of the jobs with the specified names.
+
+        Jobs that are not on the run list are not affected, callers are
+        expected to use the reverse dependency indices to find out which
+        jobs need to be updated. When :attr:`_readiness_cross_check` is set
+        the outcome is compared against a full re-computation.
+        """
+        for job_name in job_name_set:
+            job = self._job_state_map[job_name].job
+            self._job_state_map[job_name].readiness_inhibitor_list = (
+                self._compute_readiness_inhibitor_list(job))
+        if self._readiness_cross_check:
+            self._cross_check_job_readiness()
+
+    def _cross_check_job_readiness(self):
+        """
+        Internal method of SessionState.
+
+        Ensure that the incrementally maintained readiness state is identical
+        to what :meth:`_recompute_job_readiness()` computes.
+
+        :raises AssertionError: if there is any difference
+        """
+        def get_readiness_map():
+            return {
+                job_name: [
+                    (inhibitor.cause,
+                     getattr(inhibitor.related_job, 'name', None),
+                     getattr(inhibitor.related_expression, 'text', None))
+                    for inhibitor in job_state.readiness_inhibitor_list]
+                for job_name, job_state in self._job_state_map.items()}
+        incremental = get_readiness_map()
+        self._recompute_job_readiness()
+        full = get_readiness_map()
+        if incremental != full:
+            raise AssertionError(
+                "incremental job readiness differs from full re-computation:"
+                " {!r} != {!r}".format(incremental, full))
+
+    def _compute_readiness_inhibitor_list(self, job):
+        """
+        Internal method of SessionState.
+
+        Compute the list of readiness inhibitors of a job that is on the
+        run list.
+        """
+        inhibitor_list = []
+        # Check if all job resource requirements are met
+        prog = job.get_resource_program()
+        if prog is not None:
+            try:
+                prog.evaluate_or_raise(
+                    self._resource_map, self._resource_index_map,
+                    self._resource_version_map)
+            except ExpressionCannotEvaluateError as exc:
+                # Lookup the related job (the job that provides the
+                # resources needed by the expression that cannot be
+                # evaluated)
+                related_job = self._job_state_map[
+                    exc.expression.resource_name].job
+                # Add A PENDING_RESOURCE inhibitor as we are unable to
+                # determine if the resource requirement is met or not. This
+                # can happen if the resource job did not ran for any reason
+                # (it can either be prevented from running by normal means
+                # or simply be on the run_list but just was not executed
+                # yet).
+                inhibitor = JobReadinessInhibitor(
+                    cause=JobReadinessInhibitor.PENDING_RESOURCE,
+                    related_job=related_job,
+                    related_expression=exc.expression)
+                inhibitor_list.append(inhibitor)
+            except ExpressionFailedError as exc:
+                # Lookup the related job (the job that provides the
+                # resources needed by the expression that failed)
+                related_job = self._job_state_map[
+                    exc.expression.resource_name].job
+                # Add a FAILED_RESOURCE inhibitor as we have all the data
+                # to run the requirement program but it simply returns a
+                # non-True value. This typically indicates a missing
+                # software package or necessary hardware.
+                inhibitor = JobReadinessInhibitor(
+                    cause=JobReadinessInhibitor.FAILED_RESOURCE,
+                    related_job=related_job,
+                    related_expression=exc.expression)
+                inhibitor_list.append(inhibitor)
+        # Check if all job dependencies ran successfully
+        for dep_name in sorted(job.get_direct_dependencies()):
+            dep_job_state = self._job_state_map[dep_name]
+            # If the dependency did not have a chance to run yet add the
+            # PENDING_DEP inhibitor.
+            if dep_job_state.result.outcome == IJobResult.OUTCOME_NONE:
+                inhibitor = JobReadinessInhibitor(
+                    cause=JobReadinessInhibitor.PENDING_DEP,
+                    related_job=dep_job_state.job)
+                inhibitor_list.append(inhibitor)
+            # If the dependency is anything but successful add the
+            # FAILED_DEP inhibitor. In theory the PENDING_DEP code above
+            # could be discarded but this would loose context and would
+            # prevent the operator from actually understanding why a job
+            # cannot run.
+            elif dep_job_state.result.outcome != IJobResult.OUTCOME_PASS:
+                inhibitor = JobReadinessInhibitor(
+                    cause=JobReadinessInhibitor.FAILED_DEP,
+                    related_job=dep_job_state.job)
+                inhibitor_list.append(inhibitor)
+        return inhibitor_list
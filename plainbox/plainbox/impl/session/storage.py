@@ -26,15 +26,21 @@ This module contains storage support code for handling sessions. Using the
 location. Each location is wrapped by a :class:`SessionStorage` instance. That
 latter class be used to create (allocate) and remove all of the files
 associated with a particular session.
+
+Each session storage keeps a checkpoint (a snapshot of the whole session) and,
+optionally, a journal of small records that describe what changed since that
+checkpoint was saved. See :meth:`SessionStorage.append_journal()` for details.
 """
 
 import errno
+import hashlib
 import logging
 import os
 import shutil
 import stat
 import sys
 import tempfile
+import zlib
 
 logger = logging.getLogger("plainbox.session.storage")
 
@@ -183,6 +189,11 @@ class SessionStorage:
 
     _SESSION_FILE_NEXT = 'session.next'
 
+    _JOURNAL_FILE = 'session.journal'
+
+    # Magic text at the start of the first line of the journal file
+    _JOURNAL_MAGIC = b'plainbox-journal'
+
     def __init__(self, location):
         """
         Initialize a :class:`SessionStorage` with the given location.
@@ -191,6 +202,8 @@ class SessionStorage:
         call :meth:`create()` instead.
         """
         self._location = location
+        # Digest of the most recently saved or loaded checkpoint data
+        self._checkpoint_digest = None
 
     def __repr__(self):
         return "<{} location:{!r}>".format(
@@ -306,9 +319,11 @@ class SessionStorage:
             when openat(2) is not available
         """
         if sys.version_info[0:2] >= (3, 3):
-            return self._load_checkpoint_unix_py33()
+            data = self._load_checkpoint_unix_py33()
         else:
-            return self._load_checkpoint_unix_py32()
+            data = self._load_checkpoint_unix_py32()
+        self._checkpoint_digest = self._get_digest(data)
+        return data
 
     def save_checkpoint(self, data):
         """
@@ -335,11 +350,179 @@ class SessionStorage:
         :raises NotImplementedError:
             when openat(2), renameat(2), unlinkat(2) are not available on this
             platform. Should never happen on Linux.
+
+        The checkpoint replaces both the previous checkpoint and the journal,
+        if any. The journal is removed after the new checkpoint is safely on
+        disk. Should that fail, the old journal is still ignored because it
+        refers to the previous checkpoint.
         """
         if sys.version_info[0:2] >= (3, 3):
-            return self._save_checkpoint_unix_py33(data)
+            self._save_checkpoint_unix_py33(data)
         else:
-            return self._save_checkpoint_unix_py32(data)
+            self._save_checkpoint_unix_py32(data)
+        self._checkpoint_digest = self._get_digest(data)
+        self._remove_journal()
+
+    def append_journal(self, data, sync=True):
+        """
+        Append a record to the journal of the most recent checkpoint
+
+        :param data:
+            Data of the record. It must be a bytes object without any
+            newline characters.
+        :param sync:
+            If True (the default) the record is flushed to disk with fsync(2)
+            before this method returns. If False the caller is responsible
+            for calling :meth:`sync_journal()` later.
+
+        :raises TypeError:
+            if data is not a bytes object.
+        :raises ValueError:
+            if data contains newline characters.
+        :raises IOError, OSError:
+            on various problems related to accessing the filesystem.
+
+        The journal allows to save changes to the session without saving the
+        whole session each time. Each record is opaque to the storage, it is
+        up to the caller to apply the records, in order, on top of the data
+        returned by :meth:`load_checkpoint()`. See :meth:`load_journal()`.
+
+        The journal is a text-like file. The first line identifies the
+        checkpoint (by its SHA1 digest) the journal applies to. Each of the
+        subsequent lines holds one record, prefixed by its CRC32 checksum.
+        Records are always appended so a record that is not flushed to disk
+        can only be lost (or damaged) together with all the records that
+        follow it. Such records are discarded by :meth:`load_journal()`.
+        """
+        if not isinstance(data, bytes):
+            raise TypeError("data must be bytes")
+        if b'\n' in data:
+            raise ValueError("data cannot contain newlines")
+        line = self._get_crc(data) + b' ' + data + b'\n'
+        journal_pathname = os.path.join(self._location, self._JOURNAL_FILE)
+        try:
+            journal_fd = os.open(journal_pathname, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            journal_fd = self._create_journal()
+        try:
+            num_written = os.write(journal_fd, line)
+            if num_written != len(line):
+                raise IOError("partial write?")
+            if sync:
+                os.fsync(journal_fd)
+        finally:
+            os.close(journal_fd)
+        logger.debug("Appended %d bytes to the journal", len(line))
+
+    def sync_journal(self):
+        """
+        Flush all the records appended to the journal to disk
+
+        :raises IOError, OSError:
+            on various problems related to accessing the filesystem
+
+        This is only needed after calling :meth:`append_journal()` with
+        sync=False. It does nothing if there is no journal.
+        """
+        journal_pathname = os.path.join(self._location, self._JOURNAL_FILE)
+        try:
+            journal_fd = os.open(journal_pathname, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            return
+        try:
+            os.fsync(journal_fd)
+        finally:
+            os.close(journal_fd)
+        logger.debug("Flushed the journal to disk")
+
+    def load_journal(self):
+        """
+        Load the journal of the most recent checkpoint
+
+        :returns:
+            A list of records (bytes) appended with :meth:`append_journal()`
+            since the checkpoint was saved, in the order they were appended.
+
+        :raises IOError, OSError:
+            on various problems related to accessing the filesystem
+
+        The journal is ignored if it was written for another checkpoint.
+        This happens when the process was interrupted after saving a
+        checkpoint but before the old journal got removed. The journal is
+        truncated at the first damaged record, this happens when the process
+        (or the whole machine) was interrupted while a record was appended.
+        """
+        journal_pathname = os.path.join(self._location, self._JOURNAL_FILE)
+        try:
+            with open(journal_pathname, 'rb') as stream:
+                text = stream.read()
+        except FileNotFoundError:
+            return []
+        line_list = text.split(b'\n')
+        # The last item is either empty or an incomplete line
+        line_list.pop()
+        if not line_list or line_list[0] != self._get_journal_header():
+            logger.warning("Ignoring journal of another checkpoint")
+            return []
+        record_list = []
+        for line in line_list[1:]:
+            crc, sep, data = line.partition(b' ')
+            if not sep or crc != self._get_crc(data):
+                logger.warning(
+                    "Ignoring damaged journal record and everything after it")
+                break
+            record_list.append(data)
+        return record_list
+
+    def _create_journal(self):
+        """
+        Create the journal file and write the header line
+
+        :returns: descriptor of the journal file, opened for appending
+        """
+        journal_pathname = os.path.join(self._location, self._JOURNAL_FILE)
+        header = self._get_journal_header() + b'\n'
+        journal_fd = os.open(
+            journal_pathname,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            if os.write(journal_fd, header) != len(header):
+                raise IOError("partial write?")
+            # Make sure the new directory entry is on disk
+            location_fd = os.open(self._location, os.O_DIRECTORY)
+            try:
+                os.fsync(location_fd)
+            finally:
+                os.close(location_fd)
+        except:
+            os.close(journal_fd)
+            raise
+        return journal_fd
+
+    def _remove_journal(self):
+        """
+        Remove the journal file, if any
+        """
+        try:
+            os.unlink(os.path.join(self._location, self._JOURNAL_FILE))
+        except FileNotFoundError:
+            pass
+
+    def _get_journal_header(self):
+        """
+        Compute the first line of the journal of the current checkpoint
+        """
+        if self._checkpoint_digest is None:
+            self.load_checkpoint()
+        return self._JOURNAL_MAGIC + b' ' + self._checkpoint_digest
+
+    @staticmethod
+    def _get_digest(data):
+        return hashlib.sha1(data).hexdigest().encode("ASCII")
+
+    @staticmethod
+    def _get_crc(data):
+        return "{:08x}".format(zlib.crc32(data) & 0xFFFFFFFF).encode("ASCII")
 
     def break_lock(self):
         """
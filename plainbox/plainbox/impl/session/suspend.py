@@ -109,6 +109,40 @@ class SessionSuspendHelper:
         # NOTE: gzip.compress is not deterministic on python3.2
         return gzip.compress(data)
 
+    def suspend_changes(self, session, job_name_list=(), result_name_list=(),
+                        desired_job_list=False, metadata=False):
+        """
+        Compute the data of a journal record that describes some changes
+        made to a session since it was suspended.
+
+        :param job_name_list:
+            Names of jobs that were added to the session
+        :param result_name_list:
+            Names of jobs with new results
+        :param desired_job_list:
+            Flag indicating that the desired job list has changed
+        :param metadata:
+            Flag indicating that session meta-data has changed
+        :returns bytes:
+            the serialized data, a single line of UTF-8 encoded JSON.
+
+        The record is saved by :class:`SessionStorage` as a part of
+        :meth:`SessionStorage.append_journal()`. It is much smaller than the
+        data returned by :meth:`suspend()` as it only contains the changed
+        parts of the session. See :meth:`_repr_SessionState_changes()` for
+        details.
+        """
+        json_repr = self._repr_SessionState_changes(
+            session, job_name_list, result_name_list, desired_job_list,
+            metadata)
+        return json.dumps(
+            json_repr,
+            ensure_ascii=False,
+            sort_keys=True,
+            indent=None,
+            separators=(',', ':')
+        ).encode("UTF-8")
+
     def _json_repr(self, session):
         """
         Compute the representation of all of the data that needs to be saved.
@@ -192,6 +226,43 @@ class SessionSuspendHelper:
             "metadata": self._repr_SessionMetaData(obj.metadata),
         }
 
+    def _repr_SessionState_changes(self, obj, job_name_list, result_name_list,
+                                   desired_job_list, metadata):
+        """
+        Compute the representation of changes made to :class:`SessionState`
+
+        :returns:
+            JSON-friendly representation
+        :rtype:
+            dict
+
+        The result is a dictionary with a subset of the items computed by
+        :meth:`_repr_SessionState()`. The ``jobs`` and ``results``
+        dictionaries only have the items of the jobs that were added or that
+        have new results. To restore the session those are merged with the
+        corresponding dictionaries computed earlier, the other items simply
+        replace what was computed earlier.
+        """
+        json_repr = {}
+        if job_name_list:
+            json_repr["jobs"] = {
+                job_name: obj.job_state_map[job_name].job.get_checksum()
+                for job_name in job_name_list
+            }
+        if result_name_list:
+            json_repr["results"] = {
+                job_name: [self._repr_JobResult(
+                    obj.job_state_map[job_name].result)]
+                for job_name in result_name_list
+            }
+        if desired_job_list:
+            json_repr["desired_job_list"] = [
+                job.name for job in obj.desired_job_list
+            ]
+        if metadata:
+            json_repr["metadata"] = self._repr_SessionMetaData(obj.metadata)
+        return json_repr
+
     def _repr_SessionMetaData(self, obj):
         """
         Compute the representation of :class:`SessionMetaData`.
@@ -242,16 +313,24 @@ class SessionSuspendHelper:
             ``return_code``
                 The exit code of the application.
 
+            ``resource_usage``
+                Resources used by the application (CPU times, peak memory
+                usage, block I/O and context switch counts). This key is
+                optional, it is only present if the resource usage is known.
+
         .. note::
             return_code can have unexpected values when the process was killed
             by a signal
         """
-        return {
+        result_repr = {
             "outcome": obj.outcome,
             "execution_duration": obj.execution_duration,
             "comments": obj.comments,
             "return_code": obj.return_code,
         }
+        if obj.resource_usage is not None:
+            result_repr["resource_usage"] = obj.resource_usage
+        return result_repr
 
     def _repr_MemoryJobResult(self, obj):
         """
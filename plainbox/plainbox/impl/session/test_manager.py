@@ -0,0 +1,337 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+# Written by:
+#   Zygmunt Krynicki <zygmunt.krynicki@canonical.com>
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+:mod:`plainbox.impl.session.test_manager`
+=========================================
+
+Test definitions for :mod:`plainbox.impl.session.manager` module
+"""
+
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+import threading
+
+import mock
+
+from plainbox.impl.job import JobDefinition
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.session.manager import GroupCommitHelper
+from plainbox.impl.session.manager import SessionManager
+from plainbox.impl.session.state import SessionState
+from plainbox.impl.session.storage import SessionStorage
+from plainbox.impl.session.storage import SessionStorageRepository
+from plainbox.impl.session.suspend import SessionSuspendHelper
+
+
+class SessionManagerJournalTests(TestCase):
+
+    """
+    Tests for checkpoints saved in the journal by
+    :class:`~plainbox.impl.session.manager.SessionManager`
+    """
+
+    def setUp(self):
+        self.scratch_dir = TemporaryDirectory()
+        self.repo = SessionStorageRepository(self.scratch_dir.name)
+        self.job_a = JobDefinition({'name': 'a', 'plugin': 'shell'})
+        self.job_b = JobDefinition({'name': 'b', 'plugin': 'shell'})
+        self.job_list = [self.job_a, self.job_b]
+        self.manager = SessionManager.create_session(
+            self.job_list, self.repo)
+        self.manager.checkpoint()
+
+    def tearDown(self):
+        self.scratch_dir.cleanup()
+
+    def load_session(self):
+        return SessionManager.load_session(
+            self.job_list, SessionStorage(self.manager.storage.location))
+
+    def test_changes_are_journaled(self):
+        storage = self.manager.storage
+        with mock.patch.object(storage, 'save_checkpoint') as mock_save:
+            self.manager.state.update_desired_job_list([self.job_b])
+            self.manager.checkpoint()
+            self.manager.state.update_job_result(
+                self.job_b, MemoryJobResult({'outcome': 'pass'}))
+            self.manager.state.metadata.running_job_name = 'b'
+            self.manager.checkpoint()
+            self.assertFalse(mock_save.called)
+        self.assertEqual(len(storage.load_journal()), 2)
+        state = self.load_session().state
+        self.assertEqual(state.desired_job_list, [self.job_b])
+        self.assertEqual(state.job_state_map['b'].result.outcome, 'pass')
+        self.assertEqual(state.metadata.running_job_name, 'b')
+
+    def test_nothing_changed(self):
+        with mock.patch.object(
+                self.manager.storage, 'append_journal') as mock_append:
+            self.manager.checkpoint()
+            # The same desired jobs are not a change
+            self.manager.state.update_desired_job_list([])
+            self.manager.checkpoint()
+            self.assertFalse(mock_append.called)
+
+    def test_new_jobs_are_journaled(self):
+        job_c = JobDefinition({'name': 'c', 'plugin': 'shell'})
+        self.manager.state.add_job(job_c)
+        self.manager.checkpoint()
+        self.assertEqual(len(self.manager.storage.load_journal()), 1)
+        state = SessionManager.load_session(
+            self.job_list + [job_c],
+            SessionStorage(self.manager.storage.location)).state
+        self.assertIn('c', state.job_state_map)
+
+    def test_journal_compaction(self):
+        self.manager.JOURNAL_COMPACT_MIN_SIZE = 0
+        self.manager.JOURNAL_COMPACT_RATIO = 0.0
+        storage = self.manager.storage
+        self.manager.state.update_job_result(
+            self.job_a, MemoryJobResult({'outcome': 'fail'}))
+        with mock.patch.object(
+                storage, 'save_checkpoint',
+                wraps=storage.save_checkpoint) as mock_save:
+            self.manager.checkpoint()
+            self.assertTrue(mock_save.called)
+        self.assertEqual(storage.load_journal(), [])
+        state = self.load_session().state
+        self.assertEqual(state.job_state_map['a'].result.outcome, 'fail')
+
+    def test_resumed_session_extends_journal(self):
+        self.manager.state.metadata.title = 'title'
+        self.manager.checkpoint()
+        manager = self.load_session()
+        manager.state.update_job_result(
+            self.job_a, MemoryJobResult({'outcome': 'pass'}))
+        manager.checkpoint()
+        self.assertEqual(len(manager.storage.load_journal()), 2)
+        state = self.load_session().state
+        self.assertEqual(state.metadata.title, 'title')
+        self.assertEqual(state.job_state_map['a'].result.outcome, 'pass')
+
+    def test_journal_disabled(self):
+        manager = SessionManager(
+            self.manager.state, self.manager.storage, journal=False)
+        with mock.patch.object(
+                manager.storage, 'save_checkpoint') as mock_save:
+            manager.checkpoint()
+            manager.checkpoint()
+            self.assertEqual(mock_save.call_count, 2)
+
+    def test_replaced_state(self):
+        # This is what the legacy API does
+        self.manager._state = SessionState(self.job_list)
+        with mock.patch.object(
+                self.manager.storage, 'save_checkpoint') as mock_save:
+            self.manager.checkpoint()
+            self.assertTrue(mock_save.called)
+
+
+class SessionManagerDurabilityTests(TestCase):
+
+    """
+    Tests for durability policies of
+    :class:`~plainbox.impl.session.manager.SessionManager`
+    """
+
+    def setUp(self):
+        self.scratch_dir = TemporaryDirectory()
+        self.repo = SessionStorageRepository(self.scratch_dir.name)
+        self.job_a = JobDefinition({'name': 'a', 'plugin': 'shell'})
+        self.job_b = JobDefinition({
+            'name': 'b', 'plugin': 'shell', 'exclusive': 'yes'})
+        self.manager = SessionManager.create_session(
+            [self.job_a, self.job_b], self.repo)
+        self.manager.checkpoint()
+
+    def tearDown(self):
+        self.scratch_dir.cleanup()
+
+    def run_job(self, job):
+        """
+        Checkpoint the session like plainbox run does around a job
+
+        :returns: the list of values of the sync argument of each record
+        """
+        state = self.manager.state
+        with mock.patch.object(
+                self.manager.storage, 'append_journal') as mock_append:
+            state.metadata.running_job_name = job.name
+            self.manager.checkpoint()
+            state.update_job_result(job, MemoryJobResult({'outcome': 'pass'}))
+            state.metadata.running_job_name = None
+            self.manager.checkpoint()
+        return [call[0][1] for call in mock_append.call_args_list]
+
+    def test_bad_durability(self):
+        with self.assertRaises(ValueError):
+            self.manager.durability = 'sloppy'
+
+    def test_strict(self):
+        self.assertEqual(self.manager.durability, 'strict')
+        self.assertEqual(self.run_job(self.job_a), [True, True])
+
+    def test_relaxed(self):
+        self.manager.durability = SessionManager.DURABILITY_RELAXED
+        self.assertEqual(self.run_job(self.job_a), [False, False])
+        # Checkpoints around exclusive jobs are flushed
+        self.assertEqual(self.run_job(self.job_b), [True, True])
+
+    def test_group(self):
+        self.manager.durability = SessionManager.DURABILITY_GROUP
+        with mock.patch.object(
+                GroupCommitHelper, 'schedule') as mock_schedule:
+            self.assertEqual(self.run_job(self.job_b), [False, False])
+            self.assertEqual(mock_schedule.call_count, 2)
+
+    def test_group_commit(self):
+        self.manager.durability = SessionManager.DURABILITY_GROUP
+        self.manager.group_commit_delay = 0.2
+        synced = threading.Event()
+        with mock.patch.object(
+                self.manager.storage, 'sync_journal',
+                side_effect=synced.set) as mock_sync:
+            self.run_job(self.job_a)
+            self.assertTrue(synced.wait(5))
+            # Both checkpoints were flushed together
+            self.assertEqual(mock_sync.call_count, 1)
+
+    def test_flush(self):
+        self.manager.durability = SessionManager.DURABILITY_RELAXED
+        self.run_job(self.job_a)
+        with mock.patch.object(
+                self.manager.storage, 'sync_journal') as mock_sync:
+            self.manager.flush()
+            self.assertTrue(mock_sync.called)
+
+
+class GroupCommitHelperTests(TestCase):
+
+    def test_flush_cancels_scheduled_flush(self):
+        storage = mock.Mock()
+        helper = GroupCommitHelper(storage, 60)
+        helper.schedule()
+        helper.schedule()
+        helper.flush()
+        self.assertEqual(storage.sync_journal.call_count, 1)
+        helper._thread.join(5)
+        self.assertEqual(storage.sync_journal.call_count, 1)
+        self.assertIsNone(helper._thread)
+
+    def test_errors_are_logged(self):
+        storage = mock.Mock()
+        storage.sync_journal.side_effect = OSError("boom")
+        helper = GroupCommitHelper(storage, 0)
+        with mock.patch('plainbox.impl.session.manager.logger') as logger:
+            helper.flush()
+            self.assertTrue(logger.warning.called)
+
+
+class SessionManagerCrashRecoveryTests(TestCase):
+
+    """
+    Tests showing that a session can be resumed after a crash that happened
+    at any point while a checkpoint was being written.
+
+    Data that was not flushed to disk can be lost or damaged by a crash.
+    Each test simulates that by cutting the file being written at every
+    possible offset (and by filling the rest with zeros, as some filesystems
+    do). The resumed session must always be one of the checkpointed states.
+    """
+
+    def setUp(self):
+        self.scratch_dir = TemporaryDirectory()
+        self.repo = SessionStorageRepository(self.scratch_dir.name)
+        self.job_list = [
+            JobDefinition({'name': name, 'plugin': 'shell'})
+            for name in ('a', 'b', 'c')]
+        self.manager = SessionManager.create_session(
+            self.job_list, self.repo)
+        self.manager.durability = SessionManager.DURABILITY_RELAXED
+        self.manager.checkpoint()
+        self.outcome_list = [self.get_outcomes(self.manager.state)]
+
+    def tearDown(self):
+        self.scratch_dir.cleanup()
+
+    def get_outcomes(self, state):
+        return {name: job_state.result.outcome
+                for name, job_state in state.job_state_map.items()}
+
+    def run_jobs(self):
+        for job in self.job_list:
+            self.manager.state.update_job_result(
+                job, MemoryJobResult({'outcome': 'pass'}))
+            self.manager.checkpoint()
+            self.outcome_list.append(self.get_outcomes(self.manager.state))
+
+    def read(self, filename):
+        with open(os.path.join(
+                self.manager.storage.location, filename), 'rb') as stream:
+            return stream.read()
+
+    def write(self, filename, data):
+        with open(os.path.join(
+                self.manager.storage.location, filename), 'wb') as stream:
+            stream.write(data)
+
+    def assertResumable(self):
+        state = SessionManager.load_session(
+            self.job_list,
+            SessionStorage(self.manager.storage.location)).state
+        self.assertIn(self.get_outcomes(state), self.outcome_list)
+        return state
+
+    def test_torn_journal(self):
+        self.run_jobs()
+        journal = self.read(self.manager.storage._JOURNAL_FILE)
+        for size in range(len(journal) + 1):
+            for padding in (b'', b'\0' * (len(journal) - size)):
+                self.write(
+                    self.manager.storage._JOURNAL_FILE,
+                    journal[:size] + padding)
+                self.assertResumable()
+        # The intact journal has every change
+        self.write(self.manager.storage._JOURNAL_FILE, journal)
+        self.assertEqual(
+            self.get_outcomes(self.assertResumable()), self.outcome_list[-1])
+
+    def test_torn_next_checkpoint(self):
+        self.run_jobs()
+        data = SessionSuspendHelper().suspend(self.manager.state)
+        # Crash while the next checkpoint was written, before the rename
+        for size in range(0, len(data) + 1, 7):
+            self.write(
+                self.manager.storage._SESSION_FILE_NEXT, data[:size])
+            self.assertResumable()
+
+    def test_crash_before_journal_removal(self):
+        self.run_jobs()
+        # Crash right after the new checkpoint has replaced the old one
+        with mock.patch.object(self.manager.storage, '_remove_journal'):
+            self.manager.state.update_job_result(
+                self.job_list[0], MemoryJobResult({'outcome': 'fail'}))
+            self.manager._journal = False
+            self.manager.checkpoint()
+            self.outcome_list.append(self.get_outcomes(self.manager.state))
+        # The stale journal is ignored
+        self.assertEqual(
+            self.get_outcomes(self.assertResumable()), self.outcome_list[-1])
@@ -198,6 +198,88 @@ class EndToEndTests(TestCase):
             self.suspend_data, early_cb)
         self.assertIs(session, self.seen_session)
 
+    def test_resume_lazy(self):
+        """
+        verify that local jobs are processed with lazily restored results
+        """
+        session = SessionResumeHelper(self.job_list, lazy=True).resume(
+            self.suspend_data)
+        self.assertIn('generated', session.job_state_map)
+        self.assertEqual(
+            session.job_state_map['generator'].result.io_log,
+            (IOLogRecord(0.0, 'stdout', b'name:generated'),))
+
+
+class JournalResumeTests(TestCase):
+
+    """
+    Tests for replaying journal records in
+    :meth:`~plainbox.impl.session.resume.SessionResumeHelper.resume()`
+    """
+
+    def setUp(self):
+        self.job_a = JobDefinition({'name': 'a', 'plugin': 'shell'})
+        self.job_b = JobDefinition({'name': 'b', 'plugin': 'shell'})
+        self.job_list = [self.job_a, self.job_b]
+        self.empty_result_repr = {
+            'comments': None,
+            'execution_duration': None,
+            'io_log': [],
+            'outcome': None,
+            'return_code': None,
+        }
+        self.suspend_data = gzip.compress(json.dumps({
+            'version': 1,
+            'session': {
+                'jobs': {'a': self.job_a.get_checksum()},
+                'results': {'a': [self.empty_result_repr]},
+                'desired_job_list': [],
+                'metadata': {
+                    'flags': [],
+                    'running_job_name': None,
+                    'title': 'old title'
+                },
+            }
+        }).encode("UTF-8"))
+
+    def test_replay(self):
+        """
+        verify that journal records are applied, in order, on top of the
+        suspended session
+        """
+        pass_repr = dict(self.empty_result_repr, outcome='pass')
+        fail_repr = dict(self.empty_result_repr, outcome='fail')
+        journal = [json.dumps(record).encode("UTF-8") for record in [
+            {'jobs': {'b': self.job_b.get_checksum()},
+             'results': {'b': [self.empty_result_repr]},
+             'desired_job_list': ['a', 'b']},
+            {'results': {'a': [fail_repr]}},
+            {'results': {'a': [pass_repr]},
+             'metadata': {
+                 'flags': ['incomplete'],
+                 'running_job_name': 'b',
+                 'title': 'new title'}},
+        ]]
+        session = SessionResumeHelper(self.job_list).resume(
+            self.suspend_data, None, journal)
+        self.assertEqual(
+            session.job_state_map['a'].result.outcome, 'pass')
+        self.assertEqual(session.job_state_map['b'].result.outcome, None)
+        self.assertEqual(session.desired_job_list, [self.job_a, self.job_b])
+        self.assertEqual(session.metadata.title, 'new title')
+        self.assertEqual(session.metadata.flags, {'incomplete'})
+        self.assertEqual(session.metadata.running_job_name, 'b')
+
+    def test_replay_garbage(self):
+        """
+        verify that CorruptedSessionError is raised when a journal record
+        cannot be interpreted
+        """
+        for record in (b'{', b'\xff', b'[]', b'{"results": []}'):
+            with self.assertRaises(CorruptedSessionError):
+                SessionResumeHelper(self.job_list).resume(
+                    self.suspend_data, None, [record])
+
 
 class IOLogRecordResumeTests(TestCase):
 
@@ -332,7 +414,7 @@ class JobResultResumeMixIn:
             str(boom.exception), (
                 "Value for key 'outcome' not in allowed set [None, 'pass', "
                 "'fail', 'skip', 'not-supported', 'not-implemented', "
-                "'undecided']"))
+                "'undecided', 'timeout']"))
 
     def test_build_JobResult_allows_none_outcome(self):
         """
@@ -482,6 +564,38 @@ class JobResultResumeMixIn:
         obj = SessionResumeHelper._build_JobResult(obj_repr)
         self.assertAlmostEqual(obj.execution_duration, 5.1)
 
+    def test_build_JobResult_allows_for_missing_resource_usage(self):
+        """
+        verify that _build_JobResult() allows for ``resource_usage`` to be
+        missing (sessions saved by older versions don't have it)
+        """
+        obj = SessionResumeHelper._build_JobResult(self.good_repr)
+        self.assertEqual(obj.resource_usage, None)
+
+    def test_build_JobResult_restores_resource_usage(self):
+        """
+        verify that _build_JobResult() and _build_JobResult_stub() restore
+        the value of ``resource_usage``
+        """
+        obj_repr = copy.copy(self.good_repr)
+        obj_repr['resource_usage'] = {'cpu_user_time': 1.5, 'max_rss': 1024}
+        for obj in (SessionResumeHelper._build_JobResult(obj_repr),
+                    SessionResumeHelper._build_JobResult_stub(obj_repr)):
+            self.assertEqual(
+                obj.resource_usage, {'cpu_user_time': 1.5, 'max_rss': 1024})
+
+    def test_build_JobResult_checks_type_of_resource_usage(self):
+        """
+        verify that _build_JobResult() checks if ``resource_usage`` is a
+        dictionary of numbers
+        """
+        obj_repr = copy.copy(self.good_repr)
+        obj_repr['resource_usage'] = {'cpu_user_time': "text"}
+        with self.assertRaises(CorruptedSessionError) as boom:
+            SessionResumeHelper._build_JobResult(obj_repr)
+        self.assertEqual(
+            str(boom.exception), "Each resource usage must be a number")
+
 
 class MemoryJobResultResumeTests(JobResultResumeMixIn, TestCase):
 
@@ -627,6 +741,79 @@ class DiskJobResultResumeTests(JobResultResumeMixIn, TestCase):
         self.assertEqual(obj.io_log_filename, "some-file.txt")
 
 
+class JobResultStubResumeTests(TestCase):
+
+    """
+    Tests for :class:`~plainbox.impl.session.resume.SessionResumeHelper`
+    and how it handles recreating lazily restored results from their
+    representations
+    """
+
+    memory_repr = {
+        'outcome': "pass",
+        'comments': "comments",
+        'return_code': 0,
+        'execution_duration': 1.5,
+        'io_log': [[0.0, 'stdout', 'Zm9v']]
+    }
+
+    disk_repr = {
+        'outcome': "fail",
+        'comments': None,
+        'return_code': 1,
+        'execution_duration': None,
+        'io_log_filename': "file.txt"
+    }
+
+    def test_build_JobResult_stub_restores_MemoryJobResult(self):
+        obj = SessionResumeHelper._build_JobResult_stub(self.memory_repr)
+        self.assertIsInstance(obj, MemoryJobResult)
+        self.assertEqual(obj.outcome, "pass")
+        self.assertEqual(obj.comments, "comments")
+        self.assertEqual(obj.return_code, 0)
+        self.assertEqual(obj.execution_duration, 1.5)
+        self.assertEqual(obj.io_log, (IOLogRecord(0.0, 'stdout', b'foo'),))
+
+    def test_build_JobResult_stub_restores_DiskJobResult(self):
+        obj = SessionResumeHelper._build_JobResult_stub(self.disk_repr)
+        self.assertIsInstance(obj, DiskJobResult)
+        self.assertEqual(obj.outcome, "fail")
+        self.assertEqual(obj.comments, None)
+        self.assertEqual(obj.return_code, 1)
+        self.assertEqual(obj.io_log_filename, "file.txt")
+
+    def test_build_JobResult_stub_checks_outcome_right_away(self):
+        obj_repr = copy.copy(self.disk_repr)
+        obj_repr['outcome'] = 'maybe'
+        with self.assertRaises(CorruptedSessionError):
+            SessionResumeHelper._build_JobResult_stub(obj_repr)
+
+    def test_build_JobResult_stub_checks_comments_on_access(self):
+        obj_repr = copy.copy(self.disk_repr)
+        obj_repr['comments'] = 1
+        obj = SessionResumeHelper._build_JobResult_stub(obj_repr)
+        with self.assertRaises(CorruptedSessionError) as boom:
+            obj.comments
+        self.assertEqual(
+            str(boom.exception),
+            "Value of key 'comments' is of incorrect type int")
+
+    def test_build_JobResult_stub_decodes_io_log_on_access(self):
+        obj_repr = copy.copy(self.memory_repr)
+        obj_repr['io_log'] = [[0.0, 'stdout', 'not base64!']]
+        obj = SessionResumeHelper._build_JobResult_stub(obj_repr)
+        self.assertEqual(obj.outcome, "pass")
+        with self.assertRaises(CorruptedSessionError):
+            obj.io_log
+
+    def test_build_JobResult_stub_assigned_values_are_not_loaded(self):
+        obj_repr = copy.copy(self.disk_repr)
+        obj_repr['comments'] = 1
+        obj = SessionResumeHelper._build_JobResult_stub(obj_repr)
+        obj._data['comments'] = "new comments"
+        self.assertEqual(obj.comments, "new comments")
+
+
 class DesiredJobListResumeTests(TestCase):
 
     """
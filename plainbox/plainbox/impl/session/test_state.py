@@ -79,6 +79,30 @@ class RegressionTests(TestCase):
         self.assertIsInstance(problems[0], DependencyMissingError)
         self.assertIs(problems[0].affected_job, A)
 
+    def test_update_desired_job_list_reports_all_problems(self):
+        A = make_job('A', depends='X')
+        B = make_job('B', depends='B')
+        C = make_job('C', depends='D')
+        D = make_job('D')
+        session = SessionState([A, B, C, D])
+        problems = session.update_desired_job_list([A, B, C])
+        self.assertEqual(len(problems), 2)
+        self.assertIs(problems[0].affected_job, A)
+        self.assertIs(problems[1].affected_job, B)
+        # Problematic jobs are no longer desired
+        self.assertEqual(session.desired_job_list, [C])
+        self.assertEqual(session.run_list, [D, C])
+
+    def test_update_desired_job_list_after_add_job(self):
+        A = make_job('A', depends='X')
+        session = SessionState([A])
+        self.assertEqual(len(session.update_desired_job_list([A])), 1)
+        # Once the missing job is added the problem goes away
+        X = make_job('X')
+        session.add_job(X)
+        self.assertEqual(session.update_desired_job_list([A]), [])
+        self.assertEqual(session.run_list, [X, A])
+
     def test_init_with_identical_jobs(self):
         A = make_job("A")
         second_A = make_job("A")
@@ -123,6 +147,19 @@ class SessionStateAPITests(TestCase):
         # appended in any way.
         self.assertEqual(session._resource_map, {'R': [new_res]})
 
+    def test_resource_versions(self):
+        session = SessionState([])
+        session.set_resource_list('R', [Resource({'attr': 'value'})])
+        old_version = session._resource_version_map['R']
+        session.set_resource_list('R', [Resource({'attr': 'value'})])
+        self.assertGreater(session._resource_version_map['R'], old_version)
+        # Versions are never reused, even by other sessions
+        other_session = SessionState([])
+        other_session.set_resource_list('R', [])
+        self.assertNotEqual(
+            other_session._resource_version_map['R'],
+            session._resource_version_map['R'])
+
     def test_add_job(self):
         # Define a job
         job = make_job("A")
@@ -189,6 +226,52 @@ class SessionStateAPITests(TestCase):
         self.assertEqual(len(session.job_list), 1)
         self.assertIsNot(clashing_job, session.job_list[0])
 
+    def test_add_job_list(self):
+        A = make_job("A")
+        B = make_job("B")
+        session = SessionState([A])
+        signal_list = []
+        session.on_job_state_map_changed.connect(
+            lambda: signal_list.append('changed'))
+        session.on_job_added.connect(
+            lambda job: signal_list.append(('added', job.name)))
+        session.on_job_list_added.connect(
+            lambda job_list: signal_list.append(
+                ('list_added', [job.name for job in job_list])))
+        # Identical duplicates are discarded, both of known jobs and of
+        # jobs within the list being added
+        added_job_list = session.add_job_list(
+            [make_job("A"), B, make_job("C"), make_job("C")])
+        self.assertEqual([job.name for job in added_job_list], ['B', 'C'])
+        self.assertEqual(
+            [job.name for job in session.job_list], ['A', 'B', 'C'])
+        self.assertIs(session.job_state_map['B'].job, B)
+        # Each notification is sent exactly once
+        self.assertEqual(signal_list, [
+            'changed', ('added', 'B'), ('added', 'C'),
+            ('list_added', ['B', 'C'])])
+
+    def test_add_job_list_clashing_job(self):
+        session = SessionState([make_job("A")])
+        signal_list = []
+        session.on_job_list_added.connect(signal_list.append)
+        with self.assertRaises(DependencyDuplicateError):
+            session.add_job_list(
+                [make_job("B"), make_job("A", plugin='other')])
+        # Nothing got added
+        self.assertEqual([job.name for job in session.job_list], ['A'])
+        self.assertNotIn('B', session.job_state_map)
+        self.assertEqual(signal_list, [])
+
+    def test_add_job_list_empty(self):
+        session = SessionState([make_job("A")])
+        signal_list = []
+        session.on_job_state_map_changed.connect(
+            lambda: signal_list.append('changed'))
+        session.on_job_list_added.connect(signal_list.append)
+        self.assertEqual(session.add_job_list([make_job("A")]), [])
+        self.assertEqual(signal_list, [])
+
     def test_get_estimated_duration_auto(self):
         # Define jobs with an estimated duration
         one_second = make_job("one_second", plugin="shell",
@@ -292,6 +375,8 @@ class SessionStateReactionToJobResultTests(TestCase):
         self.job_list = [
             self.job_A, self.job_R, self.job_X, self.job_Y, self.job_L]
         self.session = SessionState(self.job_list)
+        # Verify each incremental readiness update against a full one
+        self.session._readiness_cross_check = True
 
     def job_state(self, name):
         # A helper function to avoid overly long expressions
@@ -530,6 +615,81 @@ class SessionStateReactionToJobResultTests(TestCase):
         # It should be linked to the job L via the via attribute
         self.assertTrue(job_foo.via, self.job_L.get_checksum())
 
+    def test_local_job_creates_jobs_at_once(self):
+        result_L = MemoryJobResult({
+            'io_log': [
+                (0, 'stdout', b'name: foo\n'),
+                (1, 'stdout', b'plugin: manual\n'),
+                (2, 'stdout', b'\n'),
+                (3, 'stdout', b'name: bar\n'),
+                (4, 'stdout', b'plugin: manual\n'),
+                (5, 'stdout', b'\n'),
+                # This one collides with an existing job and is discarded
+                (6, 'stdout', b'name: A\n'),
+                (7, 'stdout', b'plugin: manual\n'),
+            ],
+        })
+        added_list = []
+        self.session.on_job_list_added.connect(added_list.append)
+        self.session.update_job_result(self.job_L, result_L)
+        self.assertEqual(len(added_list), 1)
+        self.assertEqual(
+            [job.name for job in added_list[0]], ['foo', 'bar'])
+        self.assertIs(self.session.job_state_map['A'].job, self.job_A)
+
+
+class SessionStateIncrementalReadinessTests(TestCase):
+
+    def setUp(self):
+        # A chain of jobs where each job depends on the previous one and on
+        # the resources produced by R, plus one unrelated job U.
+        self.job_R = make_job("R", plugin="resource")
+        self.job_list = [self.job_R, make_job("U")]
+        for index in range(5):
+            self.job_list.append(make_job(
+                "J{}".format(index),
+                depends="J{}".format(index - 1) if index else None,
+                requires="R.attr == 'value'"))
+        self.session = SessionState(self.job_list)
+        self.session._readiness_cross_check = True
+        self.session.update_desired_job_list(self.job_list)
+
+    def test_dependency_indices(self):
+        self.assertEqual(self.session._dependent_map['J0'], {'J1'})
+        self.assertEqual(
+            self.session._consumer_map['R'],
+            {'J0', 'J1', 'J2', 'J3', 'J4'})
+        self.assertNotIn('U', self.session._dependent_map)
+
+    def test_results_update_dependents(self):
+        self.session.update_job_result(self.job_R, MemoryJobResult({
+            'outcome': IJobResult.OUTCOME_PASS,
+            'io_log': [(0, 'stdout', b'attr: value\n')]}))
+        self.assertTrue(self.session.job_state_map['J0'].can_start())
+        self.assertFalse(self.session.job_state_map['J1'].can_start())
+        for job in self.job_list[2:]:
+            self.session.update_job_result(job, MemoryJobResult({
+                'outcome': IJobResult.OUTCOME_PASS}))
+        self.session.update_job_result(self.job_list[3], MemoryJobResult({
+            'outcome': IJobResult.OUTCOME_FAIL}))
+        self.assertEqual(
+            self.session.job_state_map['J2'].readiness_inhibitor_list[0].cause,
+            JobReadinessInhibitor.FAILED_DEP)
+
+    def test_set_resource_list_updates_consumers(self):
+        self.session.set_resource_list('R', [Resource({'attr': 'other'})])
+        self.assertEqual(
+            self.session.job_state_map['J0'].readiness_inhibitor_list[0].cause,
+            JobReadinessInhibitor.FAILED_RESOURCE)
+        self.session.set_resource_list('R', [Resource({'attr': 'value'})])
+        self.assertTrue(self.session.job_state_map['J0'].can_start())
+
+    def test_cross_check_detects_differences(self):
+        # Corrupt the readiness state behind the session's back
+        self.session.job_state_map['J0'].readiness_inhibitor_list = []
+        with self.assertRaises(AssertionError):
+            self.session._update_job_readiness(set())
+
 
 class SessionMetadataTests(TestCase):
 
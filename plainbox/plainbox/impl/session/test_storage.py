@@ -159,3 +159,73 @@ class SessionStorageTests(TestCase):
             data_in = storage.load_checkpoint()
             # Check if it's right
             self.assertEqual(data_out, data_in)
+
+    def test_journal(self):
+        with TemporaryDirectory() as tmp:
+            storage = SessionStorage.create(tmp)
+            storage.save_checkpoint(b'snapshot')
+            self.assertEqual(storage.load_journal(), [])
+            storage.append_journal(b'record 1')
+            storage.append_journal(b'record 2')
+            self.assertEqual(
+                storage.load_journal(), [b'record 1', b'record 2'])
+            # A fresh storage object sees the same journal
+            storage = SessionStorage(storage.location)
+            self.assertEqual(storage.load_checkpoint(), b'snapshot')
+            self.assertEqual(
+                storage.load_journal(), [b'record 1', b'record 2'])
+
+    def test_journal_checks_data(self):
+        with TemporaryDirectory() as tmp:
+            storage = SessionStorage.create(tmp)
+            storage.save_checkpoint(b'snapshot')
+            with self.assertRaises(TypeError):
+                storage.append_journal('text')
+            with self.assertRaises(ValueError):
+                storage.append_journal(b'two\nlines')
+
+    def test_journal_removed_by_checkpoint(self):
+        with TemporaryDirectory() as tmp:
+            storage = SessionStorage.create(tmp)
+            storage.save_checkpoint(b'snapshot 1')
+            storage.append_journal(b'record')
+            storage.save_checkpoint(b'snapshot 2')
+            self.assertEqual(storage.load_journal(), [])
+            self.assertFalse(os.path.exists(
+                os.path.join(storage.location, storage._JOURNAL_FILE)))
+
+    def test_journal_of_another_checkpoint(self):
+        # Simulate a crash between saving a checkpoint and removing the
+        # journal of the previous checkpoint
+        with TemporaryDirectory() as tmp:
+            storage = SessionStorage.create(tmp)
+            storage.save_checkpoint(b'snapshot 1')
+            storage.append_journal(b'record')
+            with mock.patch.object(storage, '_remove_journal'):
+                storage.save_checkpoint(b'snapshot 2')
+            self.assertEqual(storage.load_journal(), [])
+
+    def test_journal_damaged_record(self):
+        with TemporaryDirectory() as tmp:
+            storage = SessionStorage.create(tmp)
+            storage.save_checkpoint(b'snapshot')
+            storage.append_journal(b'record 1')
+            storage.append_journal(b'record 2')
+            storage.append_journal(b'record 3')
+            pathname = os.path.join(storage.location, storage._JOURNAL_FILE)
+            with open(pathname, 'rb') as stream:
+                text = stream.read()
+            with open(pathname, 'wb') as stream:
+                stream.write(text.replace(b'record 2', b'record X'))
+            self.assertEqual(storage.load_journal(), [b'record 1'])
+
+    def test_journal_incomplete_record(self):
+        with TemporaryDirectory() as tmp:
+            storage = SessionStorage.create(tmp)
+            storage.save_checkpoint(b'snapshot')
+            storage.append_journal(b'record 1')
+            storage.append_journal(b'record 2')
+            pathname = os.path.join(storage.location, storage._JOURNAL_FILE)
+            with open(pathname, 'rb+') as stream:
+                stream.truncate(os.path.getsize(pathname) - 1)
+            self.assertEqual(storage.load_journal(), [b'record 1'])
@@ -100,6 +100,22 @@ class BaseJobResultTestsTestsMixIn:
         data = self.repr_method(self.typical_result)
         self.assertEqual(data['return_code'], 1)
 
+    def test_repr_xxxJobResult_resource_usage(self):
+        """
+        verify that DiskJobResult.resource_usage is serialized correctly,
+        and only when it is known
+        """
+        data = self.repr_method(self.typical_result)
+        self.assertNotIn('resource_usage', data)
+        result = self.TESTED_CLS({
+            "resource_usage": {"cpu_user_time": 1.5, "max_rss": 1024},
+            "io_log_filename": "/nonexistent.log",
+            "io_log": [],
+        })
+        data = self.repr_method(result)
+        self.assertEqual(
+            data['resource_usage'], {"cpu_user_time": 1.5, "max_rss": 1024})
+
 
 class SuspendMemoryJobResultTests(BaseJobResultTestsTestsMixIn, TestCase):
     """
@@ -300,6 +316,47 @@ class SessionSuspendHelperTests(TestCase):
             b'{"flags":[],"running_job_name":null,"title":null},"results":{}'
             b'},"version":1}'))
 
+    def test_suspend_changes_nothing(self):
+        """
+        verify that the suspend_changes() method returns an empty JSON object
+        when nothing has changed
+        """
+        data = self.helper.suspend_changes(SessionState([]))
+        self.assertEqual(data, b'{}')
+
+    def test_suspend_changes(self):
+        """
+        verify that the suspend_changes() method returns JSON representation
+        of only the parts of the session that have changed
+        """
+        job_a = JobDefinition({'name': 'a', 'plugin': 'shell'})
+        job_b = JobDefinition({'name': 'b', 'plugin': 'shell'})
+        session = SessionState([job_a, job_b])
+        session.update_desired_job_list([job_b])
+        session.update_job_result(job_b, MemoryJobResult({'outcome': 'pass'}))
+        session.metadata.running_job_name = 'b'
+        data = self.helper._repr_SessionState_changes(
+            session, ['a'], ['b'], True, True)
+        self.assertEqual(data, {
+            'jobs': {'a': job_a.get_checksum()},
+            'results': {'b': [{
+                'comments': None,
+                'execution_duration': None,
+                'io_log': [],
+                'outcome': 'pass',
+                'return_code': None,
+            }]},
+            'desired_job_list': ['b'],
+            'metadata': {
+                'title': None,
+                'flags': [],
+                'running_job_name': 'b',
+            },
+        })
+        # The serialized form is a single line
+        self.assertNotIn(b'\n', self.helper.suspend_changes(
+            session, ['a'], ['b'], True, True))
+
 
 class GeneratedJobSuspendTests(TestCase):
     """
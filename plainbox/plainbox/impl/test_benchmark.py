@@ -0,0 +1,106 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+plainbox.impl.test_benchmark
+============================
+
+Test definitions for plainbox.impl.benchmark module
+"""
+
+from collections import OrderedDict
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+
+import mock
+
+from plainbox.abc import IJobResult
+from plainbox.impl.benchmark import Benchmark
+from plainbox.impl.benchmark import SyntheticJobGenerator
+from plainbox.impl.benchmark import SyntheticProvider
+from plainbox.impl.benchmark import get_environment
+from plainbox.impl.exporter.json import JSONSessionStateExporter
+from plainbox.impl.session.state import SessionState
+
+
+class SyntheticJobGeneratorTests(TestCase):
+
+    def setUp(self):
+        self.generator = SyntheticJobGenerator(300, seed=1)
+
+    def test_deterministic(self):
+        self.assertEqual(
+            list(self.generator.gen_job_text()),
+            list(SyntheticJobGenerator(300, seed=1).gen_job_text()))
+        self.assertNotEqual(
+            list(self.generator.gen_job_text()),
+            list(SyntheticJobGenerator(300, seed=2).gen_job_text()))
+
+    def test_jobs(self):
+        with TemporaryDirectory() as tmp:
+            self.generator.write_job_files(os.path.join(tmp, "jobs"))
+            self.assertEqual(len(os.listdir(os.path.join(tmp, "jobs"))), 2)
+            job_list = SyntheticProvider(tmp).get_builtin_jobs()
+        self.assertEqual(len(job_list), 300)
+        resource_job_list = [
+            job for job in job_list if job.plugin == 'resource']
+        self.assertEqual(len(resource_job_list), 6)
+        self.assertTrue(any(job.depends for job in job_list))
+        self.assertTrue(any(job.requires for job in job_list))
+        # The generated jobs have no problems and once all the results are
+        # known some, but not all, jobs can run
+        state = SessionState(job_list)
+        self.assertEqual(state.update_desired_job_list(job_list), [])
+        for job in job_list:
+            result = self.generator.get_result(job)
+            if job.plugin == 'resource':
+                self.assertEqual(result.outcome, IJobResult.OUTCOME_PASS)
+            state.update_job_result(job, result)
+        self.assertEqual(
+            len(state.resource_map['resource_0']),
+            SyntheticJobGenerator.RECORDS_PER_RESOURCE)
+        ready_list = [
+            job_state.can_start()
+            for job_state in state.job_state_map.values()]
+        self.assertIn(True, ready_list)
+        self.assertIn(False, ready_list)
+
+
+class BenchmarkTests(TestCase):
+
+    @mock.patch('plainbox.impl.benchmark.get_all_exporters')
+    def test_run(self, mock_get_all_exporters):
+        mock_get_all_exporters.return_value = OrderedDict([
+            ('json', JSONSessionStateExporter)])
+        result = Benchmark(100, seed=3, repeat=2).run()
+        self.assertEqual(result['num_jobs'], 100)
+        self.assertEqual(result['num_resource_jobs'], 2)
+        self.assertEqual(result['seed'], 3)
+        self.assertEqual(result['repeat'], 2)
+        self.assertEqual(sorted(result['timings']), [
+            'checkpoint', 'export_json', 'job_results', 'load_jobs',
+            'load_jobs_cached', 'recompute_readiness', 'resource_results',
+            'resume', 'session_state', 'update_desired_job_list'])
+        for elapsed in result['timings'].values():
+            self.assertGreaterEqual(elapsed, 0)
+
+    def test_get_environment(self):
+        environment = get_environment()
+        self.assertIn('plainbox_version', environment)
+        self.assertIn('python_version', environment)
+        self.assertIn('cpu_count', environment)
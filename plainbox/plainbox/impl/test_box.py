@@ -26,6 +26,8 @@ Test definitions for plainbox.impl.box module
 
 from inspect import cleandoc
 from mock import Mock
+from mock import patch
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
 from plainbox import __version__ as version
@@ -143,7 +145,7 @@ class TestMain(TestCase):
         self.maxDiff = None
         expected = """
         usage: plainbox [-h] [--version] [-c {src,deb,auto,stub,ihv}] [-v] [-D] [-C]
-                        [-T LOGGER] [-P] [-I]
+                        [-T LOGGER] [-P] [-I] [--trace-file FILE] [--profile FILE]
                         {run,self-test,sru,check-config,dev,service} ...
 
         positional arguments:
@@ -171,6 +173,10 @@ class TestMain(TestCase):
           -P, --pdb             jump into pdb (python debugger) when a command crashes
           -I, --debug-interrupt
                                 crash on SIGINT/KeyboardInterrupt, useful with --pdb
+          --trace-file FILE     write a trace of the time spent in each phase to FILE
+                                (in Chrome trace event format or, for *.jsonl files,
+                                as JSON lines)
+          --profile FILE        run with cProfile and write the statistics to FILE
 
         """
         self.assertEqual(io.combined, cleandoc(expected) + "\n")
@@ -182,7 +188,7 @@ class TestMain(TestCase):
             self.assertEqual(call.exception.args, (2,))
         expected = """
         usage: plainbox [-h] [--version] [-c {src,deb,auto,stub,ihv}] [-v] [-D] [-C]
-                        [-T LOGGER] [-P] [-I]
+                        [-T LOGGER] [-P] [-I] [--trace-file FILE] [--profile FILE]
                         {run,self-test,sru,check-config,dev,service} ...
         plainbox: error: too few arguments
         """
@@ -191,6 +197,17 @@ class TestMain(TestCase):
 
 class TestSpecial(TestCase):
 
+    def setUp(self):
+        # Job definitions are cached in XDG_CACHE_HOME/plainbox/jobs
+        # To avoid writing to the real cache, we have to select a temporary
+        # location instead
+        scratch_dir = TemporaryDirectory()
+        self.addCleanup(scratch_dir.cleanup)
+        env_patcher = patch.dict(
+            'os.environ', {'XDG_CACHE_HOME': scratch_dir.name})
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+
     def test_help(self):
         with TestIO(combined=True) as io:
             with self.assertRaises(SystemExit) as call:
@@ -25,11 +25,15 @@ Test definitions for plainbox.impl.depmgr module
 """
 
 from unittest import TestCase
+import sys
+
+from mock import patch
 
 from plainbox.impl.depmgr import DependencyCycleError
 from plainbox.impl.depmgr import DependencyDuplicateError
 from plainbox.impl.depmgr import DependencyMissingError
 from plainbox.impl.depmgr import DependencySolver
+from plainbox.impl.job import JobDefinition
 from plainbox.impl.testing_utils import make_job
 
 
@@ -311,3 +315,84 @@ class TestDependencySolver(TestCase):
         with self.assertRaises(DependencyCycleError) as call:
             DependencySolver.resolve_dependencies(job_list)
         self.assertEqual(call.exception.job_list, [A, R, A])
+
+
+class TestDependencySolverSolve(TestCase):
+
+    def test_all_problems_are_collected(self):
+        # A -> (inexisting X)
+        # B -> C -> B
+        # D -> E
+        A = make_job(name='A', depends='X')
+        B = make_job(name='B', depends='C')
+        C = make_job(name='C', depends='B')
+        D = make_job(name='D', depends='E')
+        E = make_job(name='E')
+        solver = DependencySolver([A, B, C, D, E])
+        solution, problem_list = solver.solve([A, B, D])
+        self.assertEqual(solution, [E, D])
+        self.assertEqual(len(problem_list), 2)
+        self.assertIsInstance(problem_list[0], DependencyMissingError)
+        self.assertIs(problem_list[0].affected_job, A)
+        self.assertIsInstance(problem_list[1], DependencyCycleError)
+        self.assertEqual(problem_list[1].job_list, [B, C, B])
+
+    def test_indirect_problems(self):
+        # A -> B -> (inexisting X)
+        # A -> C
+        # D -> C
+        A = make_job(name='A', depends='B C')
+        B = make_job(name='B', depends='X')
+        C = make_job(name='C')
+        D = make_job(name='D', depends='C')
+        solution, problem_list = DependencySolver([A, B, C, D]).solve([A, D])
+        # C is only a part of the solution because of D
+        self.assertEqual(solution, [C, D])
+        self.assertEqual(len(problem_list), 1)
+        self.assertIs(problem_list[0].affected_job, B)
+        self.assertEqual(problem_list[0].missing_job_name, 'X')
+
+    def test_duplicates_are_collected(self):
+        A = make_job('A')
+        another_A = make_job('A', plugin='other')
+        solution, problem_list = DependencySolver(
+            [A, another_A], strict=False).solve()
+        self.assertEqual(solution, [A])
+        self.assertEqual(len(problem_list), 1)
+        self.assertIs(problem_list[0].job, A)
+        self.assertIs(problem_list[0].duplicate_job, another_A)
+
+    def test_long_chain(self):
+        # A chain of jobs deeper than the recursion limit. Jobs are created
+        # directly as make_job() is rather slow.
+        job_list = [JobDefinition({'name': 'J0'})]
+        for index in range(1, sys.getrecursionlimit() + 1):
+            job_list.append(JobDefinition({
+                'name': 'J{}'.format(index),
+                'depends': 'J{}'.format(index - 1)}))
+        solution, problem_list = DependencySolver(job_list).solve(
+            [job_list[-1]])
+        self.assertEqual(solution, job_list)
+        self.assertEqual(problem_list, [])
+
+    def test_incremental_solve(self):
+        # A -> B, C -> (inexisting X)
+        A = make_job(name='A', depends='B')
+        B = make_job(name='B')
+        C = make_job(name='C', depends='X')
+        job_list = [A, B, C]
+        solver = DependencySolver(job_list)
+        self.assertEqual(solver.solve([A]), ([B, A], []))
+        with patch.object(
+                DependencySolver, '_get_dependency_set',
+                wraps=DependencySolver._get_dependency_set) as mock:
+            solution, problem_list = solver.solve([A, C])
+            # Only C was never looked at before
+            mock.assert_called_once_with(C)
+        self.assertEqual(solution, [B, A])
+        self.assertEqual(len(problem_list), 1)
+        # Unselecting C makes the problem go away
+        self.assertEqual(solver.solve([A]), ([B, A], []))
+        # The solution is the same as from a brand new solver
+        self.assertEqual(
+            solver.solve([B, A]), DependencySolver(job_list).solve([B, A]))
@@ -0,0 +1,207 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+plainbox.impl.test_executor
+===========================
+
+Test definitions for plainbox.impl.executor module
+"""
+
+from unittest import TestCase
+import threading
+
+from plainbox.impl.executor import JobExecutor
+from plainbox.impl.executor import JobTicket
+
+
+class _BlockingJob:
+    """
+    Job that runs until it is released or killed
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self._released = threading.Event()
+        self.killed = False
+
+    def __call__(self, log, name):
+        self.started.set()
+        self._released.wait(30)
+        log.append(name)
+
+    def release(self):
+        self._released.set()
+
+    def kill(self):
+        self.killed = True
+        self._released.set()
+
+
+class JobExecutorTests(TestCase):
+
+    def setUp(self):
+        self.executor = JobExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown, 10)
+        self.log = []
+
+    def _wait(self, ticket_list):
+        for ticket in ticket_list:
+            self.assertTrue(ticket.wait(30))
+
+    def test_invalid_max_workers(self):
+        with self.assertRaises(ValueError):
+            JobExecutor(max_workers=0)
+
+    def test_default_max_workers(self):
+        self.assertGreaterEqual(JobExecutor().max_workers, 1)
+
+    def test_run(self):
+        ticket_list = [
+            self.executor.submit('session', self.log.append, index)
+            for index in range(10)]
+        self._wait(ticket_list)
+        self.assertEqual(sorted(self.log), list(range(10)))
+        for ticket in ticket_list:
+            self.assertEqual(ticket.state, JobTicket.STATE_DONE)
+        metrics = self.executor.get_metrics()
+        self.assertEqual(metrics['done'], 10)
+        self.assertEqual(metrics['queued'], 0)
+        self.assertEqual(metrics['running'], 0)
+        self.assertLessEqual(metrics['workers'], 2)
+
+    def test_bounded(self):
+        job_list = [_BlockingJob() for index in range(4)]
+        ticket_list = [
+            self.executor.submit('session', job, self.log, index)
+            for index, job in enumerate(job_list)]
+        job_list[0].started.wait(30)
+        job_list[1].started.wait(30)
+        metrics = self.executor.get_metrics()
+        self.assertEqual(metrics['running'], 2)
+        self.assertEqual(metrics['queued'], 2)
+        self.assertEqual(metrics['workers'], 2)
+        self.assertEqual(self.executor.get_queue_depth('session'), 2)
+        self.assertFalse(job_list[2].started.is_set())
+        for job in job_list:
+            job.release()
+        self._wait(ticket_list)
+        self.assertEqual(self.executor.get_metrics()['done'], 4)
+
+    def test_sessions_served_in_turn(self):
+        executor = JobExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown, 10)
+        blocker = _BlockingJob()
+        ticket_list = [executor.submit('busy', blocker, self.log, 'busy-0')]
+        blocker.started.wait(30)
+        ticket_list += [
+            executor.submit('busy', self.log.append, 'busy-{}'.format(index))
+            for index in range(1, 4)]
+        ticket_list.append(executor.submit('other', self.log.append, 'other'))
+        self.assertEqual(executor.get_queue_depth('busy'), 3)
+        self.assertEqual(executor.get_queue_depth('other'), 1)
+        self.assertEqual(executor.get_queue_depth(), 4)
+        blocker.release()
+        self._wait(ticket_list)
+        self.assertEqual(
+            self.log, ['busy-0', 'busy-1', 'other', 'busy-2', 'busy-3'])
+
+    def test_cancel_queued(self):
+        executor = JobExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown, 10)
+        blocker = _BlockingJob()
+        first = executor.submit('session', blocker, self.log, 'first')
+        blocker.started.wait(30)
+        second = executor.submit('session', self.log.append, 'second')
+        self.assertTrue(second.cancel())
+        self.assertEqual(second.state, JobTicket.STATE_CANCELLED)
+        self.assertTrue(second.wait(0))
+        blocker.release()
+        self._wait([first])
+        self.assertEqual(self.log, ['first'])
+        self.assertFalse(second.cancel())
+        self.assertFalse(first.cancel())
+        self.assertEqual(executor.get_metrics()['cancelled'], 1)
+
+    def test_kill_running(self):
+        job = _BlockingJob()
+        ticket = self.executor.submit('session', job, self.log, 'job',
+                                      kill=job.kill)
+        job.started.wait(30)
+        self.assertTrue(ticket.cancel())
+        self.assertTrue(ticket.kill_requested)
+        self._wait([ticket])
+        self.assertTrue(job.killed)
+
+    def test_cannot_kill(self):
+        job = _BlockingJob()
+        ticket = self.executor.submit('session', job, self.log, 'job')
+        job.started.wait(30)
+        self.assertFalse(ticket.cancel())
+        job.release()
+        self._wait([ticket])
+
+    def test_failure(self):
+        def fail():
+            raise ValueError("boom")
+        ticket = self.executor.submit('session', fail)
+        ticket2 = self.executor.submit('session', self.log.append, 'next')
+        self._wait([ticket, ticket2])
+        self.assertEqual(ticket.state, JobTicket.STATE_FAILED)
+        self.assertEqual(self.log, ['next'])
+        self.assertEqual(self.executor.get_metrics()['failed'], 1)
+
+    def test_shutdown(self):
+        self.executor = JobExecutor(max_workers=1)
+        job = _BlockingJob()
+        running = self.executor.submit('session', job, self.log, 'running')
+        job.started.wait(30)
+        queued_list = [
+            self.executor.submit('session', self.log.append, index)
+            for index in range(3)]
+        threading.Timer(0.2, job.release).start()
+        self.assertTrue(self.executor.shutdown())
+        self.assertEqual(running.state, JobTicket.STATE_DONE)
+        for ticket in queued_list:
+            self.assertEqual(ticket.state, JobTicket.STATE_CANCELLED)
+        self.assertEqual(self.log, ['running'])
+        with self.assertRaises(RuntimeError):
+            self.executor.submit('session', self.log.append, 'late')
+        # Shutting down again is harmless
+        self.assertTrue(self.executor.shutdown())
+
+    def test_shutdown_kills_after_timeout(self):
+        job = _BlockingJob()
+        ticket = self.executor.submit('session', job, self.log, 'job',
+                                      kill=job.kill)
+        job.started.wait(30)
+        self.assertTrue(self.executor.shutdown(timeout=0.1))
+        self.assertTrue(job.killed)
+        self.assertEqual(ticket.state, JobTicket.STATE_DONE)
+
+    def test_shutdown_without_waiting(self):
+        self.executor = JobExecutor(max_workers=1)
+        job = _BlockingJob()
+        ticket = self.executor.submit('session', job, self.log, 'job',
+                                      kill=job.kill)
+        job.started.wait(30)
+        queued = self.executor.submit('session', self.log.append, 'queued')
+        self.executor.shutdown(wait=False)
+        self.assertTrue(job.killed)
+        self.assertEqual(queued.state, JobTicket.STATE_CANCELLED)
+        self.assertTrue(self.executor.shutdown(timeout=10))
+        self.assertEqual(ticket.state, JobTicket.STATE_DONE)
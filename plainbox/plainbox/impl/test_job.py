@@ -219,6 +219,18 @@ class TestJobDefinition(TestCase):
         job3 = JobDefinition({'estimated_duration': '123.5'})
         self.assertEqual(job3.estimated_duration, 123.5)
 
+    def test_timeout(self):
+        self.assertEqual(JobDefinition({}).timeout, None)
+        self.assertEqual(JobDefinition({'timeout': 'foo'}).timeout, None)
+        self.assertEqual(JobDefinition({'timeout': '-1'}).timeout, None)
+        self.assertEqual(JobDefinition({'timeout': '30'}).timeout, 30.0)
+
+    def test_exclusive(self):
+        self.assertFalse(JobDefinition({}).exclusive)
+        self.assertFalse(JobDefinition({'exclusive': 'no'}).exclusive)
+        self.assertTrue(JobDefinition({'exclusive': 'yes'}).exclusive)
+        self.assertTrue(JobDefinition({'exclusive': 'True'}).exclusive)
+
 
 class ParsingTests(TestCaseWithParameters):
 
@@ -27,6 +27,8 @@ Test definitions for plainbox.impl.resouce module
 import ast
 from unittest import TestCase
 
+from mock import patch
+
 from plainbox.impl.resource import CodeNotAllowed
 from plainbox.impl.resource import ExpressionCannotEvaluateError
 from plainbox.impl.resource import ExpressionFailedError
@@ -34,6 +36,7 @@ from plainbox.impl.resource import MultipleResourcesReferenced
 from plainbox.impl.resource import NoResourcesReferenced
 from plainbox.impl.resource import Resource
 from plainbox.impl.resource import ResourceExpression
+from plainbox.impl.resource import ResourceIndex
 from plainbox.impl.resource import ResourceNodeVisitor
 from plainbox.impl.resource import ResourceProgram
 from plainbox.impl.resource import ResourceProgramError
@@ -274,6 +277,86 @@ class ResourceExpressionTests(TestCase):
         self.assertRaises(TypeError, expr.evaluate, [{'a': 2}])
 
 
+class ResourceIndexTests(TestCase):
+
+    def setUp(self):
+        self.a1 = Resource({'a': 1, 'b': 'x'})
+        self.a2 = Resource({'a': 2})
+        self.a2_again = Resource({'a': 2, 'b': 'y'})
+        self.index = ResourceIndex([self.a1, self.a2, self.a2_again])
+
+    def test_lookup(self):
+        self.assertEqual(self.index.lookup('a', [2]), [self.a2, self.a2_again])
+        self.assertEqual(self.index.lookup('a', [3]), [])
+        self.assertEqual(self.index.lookup('b', ['x', 'y']),
+                         [self.a1, self.a2_again])
+        self.assertEqual(self.index.lookup('c', ['x']), [])
+
+    def test_lookup_unhashable(self):
+        index = ResourceIndex([Resource({'a': []})])
+        self.assertIsNone(index.lookup('a', [1]))
+
+    def test_lookup_checks_resource_type(self):
+        index = ResourceIndex([{'a': 2}])
+        self.assertRaises(TypeError, index.lookup, 'a', [2])
+
+
+class ResourceExpressionIndexTests(TestCase):
+
+    def assertQuery(self, text, query):
+        self.assertEqual(ResourceExpression(text)._index_query, query)
+
+    def test_index_query(self):
+        self.assertQuery("obj.a == 'x'", ('a', ['x'], True))
+        self.assertQuery("'x' == obj.a", ('a', ['x'], True))
+        self.assertQuery("obj.a in ('x', 2)", ('a', ['x', 2], True))
+        self.assertQuery("obj.a in ['x']", ('a', ['x'], True))
+        self.assertQuery(
+            "len(obj.b) > 1 and obj.a == 'x'", ('a', ['x'], False))
+
+    def test_index_query_unsupported(self):
+        self.assertQuery("obj.a != 'x'", None)
+        self.assertQuery("obj.a in 'xyz'", None)
+        self.assertQuery("'x' in obj.a", None)
+        self.assertQuery("obj.a == obj.b", None)
+        self.assertQuery("obj.a == 'x' or obj.b == 'y'", None)
+        self.assertQuery("obj.a == 1 == obj.b", None)
+
+    def test_evaluate_with_index(self):
+        resource_list = [
+            Resource({'name': 'fwts', 'version': '1'}),
+            Resource({'name': 'stress', 'version': '2'}),
+            Resource({'category': 'DISK'})]
+        index = ResourceIndex(resource_list)
+        for text in (
+                "obj.name == 'stress'",
+                "obj.name in ('stress', 'other')",
+                "obj.category == 'DISK'",
+                "obj.name == 'stress' and obj.version == '2'",
+                "obj.name == 'stress' and obj.version == '1'",
+                "obj.name == 'other'",
+                "obj.name != 'fwts'"):
+            expr = ResourceExpression(text)
+            # The result is always the same as without the index
+            self.assertEqual(
+                expr.evaluate(resource_list, index),
+                expr.evaluate(resource_list), text)
+
+    def test_evaluate_does_not_call_lambda(self):
+        expr = ResourceExpression("obj.name == 'stress'")
+        expr._lambda = None
+        resource_list = [Resource({'name': 'stress'})]
+        self.assertTrue(
+            expr.evaluate(resource_list, ResourceIndex(resource_list)))
+
+    def test_stale_index_is_ignored(self):
+        prog = ResourceProgram("obj.name == 'stress'")
+        resource_index_map = {'obj': ResourceIndex([])}
+        resource_map = {'obj': [Resource({'name': 'stress'})]}
+        self.assertTrue(
+            prog.evaluate_or_raise(resource_map, resource_index_map))
+
+
 class ResourceProgramTests(TestCase):
 
     def setUp(self):
@@ -340,3 +423,51 @@ class ResourceProgramTests(TestCase):
                 Resource({'arch': 'i386'})]
         }
         self.assertTrue(self.prog.evaluate_or_raise(resource_map))
+
+
+class ResourceProgramCacheTests(TestCase):
+
+    def setUp(self):
+        self.prog = ResourceProgram("package.name == 'fwts'")
+        self.good_map = {'package': [Resource({'name': 'fwts'})]}
+        self.bad_map = {'package': [Resource({'name': 'plainbox'})]}
+
+    def test_result_is_reused(self):
+        hit_count = ResourceProgram.cache_hit_count
+        miss_count = ResourceProgram.cache_miss_count
+        self.assertTrue(self.prog.evaluate_or_raise(
+            self.good_map, resource_version_map={'package': 1}))
+        with patch.object(ResourceExpression, 'evaluate') as mock_evaluate:
+            # The same version of the resource gives the same answer, even
+            # if resource_map is different (it should never happen)
+            self.assertTrue(self.prog.evaluate_or_raise(
+                self.bad_map, resource_version_map={'package': 1}))
+            self.assertFalse(mock_evaluate.called)
+        self.assertEqual(ResourceProgram.cache_hit_count, hit_count + 1)
+        self.assertEqual(ResourceProgram.cache_miss_count, miss_count + 1)
+
+    def test_new_version_is_evaluated(self):
+        self.prog.evaluate_or_raise(
+            self.good_map, resource_version_map={'package': 1})
+        with self.assertRaises(ExpressionFailedError) as call:
+            self.prog.evaluate_or_raise(
+                self.bad_map, resource_version_map={'package': 2})
+        self.assertIs(
+            call.exception.expression, self.prog.expression_list[0])
+        # Failures are reproduced as well
+        with self.assertRaises(ExpressionFailedError):
+            self.prog.evaluate_or_raise(
+                self.good_map, resource_version_map={'package': 2})
+
+    def test_missing_resource(self):
+        with self.assertRaises(ExpressionCannotEvaluateError):
+            self.prog.evaluate_or_raise({}, resource_version_map={})
+        with self.assertRaises(ExpressionCannotEvaluateError):
+            self.prog.evaluate_or_raise({}, resource_version_map={})
+        self.assertTrue(self.prog.evaluate_or_raise(
+            self.good_map, resource_version_map={'package': 3}))
+
+    def test_no_versions_no_caching(self):
+        self.prog.evaluate_or_raise(self.good_map)
+        with self.assertRaises(ExpressionFailedError):
+            self.prog.evaluate_or_raise(self.bad_map)
@@ -25,17 +25,49 @@ Test definitions for plainbox.impl.result module
 """
 from tempfile import TemporaryDirectory
 from unittest import TestCase
+import datetime
 import io
+import itertools
+
+import mock
 
 from plainbox.abc import IJobResult
+from plainbox.impl.result import BinaryIOLogRecordReader
+from plainbox.impl.result import BinaryIOLogRecordWriter
 from plainbox.impl.result import DiskJobResult
 from plainbox.impl.result import IOLogRecord
 from plainbox.impl.result import IOLogRecordReader
 from plainbox.impl.result import IOLogRecordWriter
 from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.result import open_io_log
+from plainbox.impl.runner import IOLogRecordGenerator
 from plainbox.impl.testing_utils import make_io_log
 
 
+def generate_io_log():
+    """
+    Make an IO log with :class:`IOLogRecordGenerator`
+
+    The command prints a line after 0.01s, one more each second for 9
+    seconds and finally a batch of three lines one second later. Delays of
+    the records are relative to the previous record.
+    """
+    start = datetime.datetime(2013, 1, 1)
+    offset_list = [0, 0.01] + [1.01 + i for i in range(10)]
+    with mock.patch('plainbox.impl.runner.datetime') as mock_datetime:
+        mock_datetime.datetime.utcnow.side_effect = [
+            start + datetime.timedelta(seconds=offset)
+            for offset in offset_list]
+        generator = IOLogRecordGenerator()
+        io_log = []
+        generator.on_new_record.connect(io_log.append)
+        generator.on_begin((), {})
+        for i in range(10):
+            generator.on_line('stdout', "line {}\n".format(i).encode())
+        generator.on_lines('stderr', [b'a\n', b'b\n', b'c\n'])
+    return io_log
+
+
 class DiskJobResultTests(TestCase):
 
     def setUp(self):
@@ -69,6 +101,55 @@ class DiskJobResultTests(TestCase):
         self.assertEqual(result.io_log, ((0, 'stdout', b'blah\n'),))
         self.assertEqual(result.return_code, 0)
 
+    def test_binary_io_log(self):
+        result = DiskJobResult({
+            'io_log_filename': make_io_log([
+                (0, 'stdout', b'blah\n'),
+                (1, 'stderr', b'meh\n'),
+            ], self.scratch_dir.name, binary=True),
+        })
+        self.assertEqual(result.io_log, (
+            (0, 'stdout', b'blah\n'), (1, 'stderr', b'meh\n')))
+
+    def test_queries(self):
+        io_log = [
+            IOLogRecord(0.0, 'stdout', b'a\n'),
+            IOLogRecord(0.5, 'stderr', b'b\n'),
+            IOLogRecord(0.5, 'stdout', b'c\n'),
+            IOLogRecord(0.5, 'stdout', b'd\n'),
+        ]
+        for binary in (False, True):
+            result = DiskJobResult({
+                'io_log_filename': make_io_log(
+                    io_log, self.scratch_dir.name, binary)})
+            self.assertEqual(result.tail(2), io_log[2:])
+            self.assertEqual(result.tail(10), io_log)
+            self.assertEqual(result.tail(0), [])
+            self.assertEqual(list(result.range(0.5, 1.5)), io_log[1:3])
+            self.assertEqual(list(result.range(1.0)), io_log[2:])
+            self.assertEqual(result.stdout_bytes(), b'a\nc\nd\n')
+
+    def test_range_of_generated_io_log(self):
+        io_log = generate_io_log()
+        # Delays are relative, batches have a delay of zero
+        self.assertEqual(
+            [record.delay for record in io_log],
+            [0.01] + [1.0] * 10 + [0.0, 0.0])
+        for binary in (False, True):
+            result = DiskJobResult({
+                'io_log_filename': make_io_log(
+                    io_log, self.scratch_dir.name, binary)})
+            self.assertEqual(list(result.range(5, 8)), io_log[5:8])
+            self.assertEqual(list(result.range(0, 0.5)), io_log[:1])
+            self.assertEqual(list(result.range(10)), io_log[10:])
+            self.assertEqual(list(result.range(10.5)), [])
+
+    def test_queries_without_io_log(self):
+        result = DiskJobResult({})
+        self.assertEqual(result.tail(1), [])
+        self.assertEqual(list(result.range(0)), [])
+        self.assertEqual(result.stdout_bytes(), b'')
+
 
 class MemoryJobResultTests(TestCase):
 
@@ -95,6 +176,22 @@ class MemoryJobResultTests(TestCase):
         self.assertEqual(result.io_log, ((0, 'stdout', b'blah\n'),))
         self.assertEqual(result.return_code, 0)
 
+    def test_queries(self):
+        result = MemoryJobResult({
+            'io_log': [(0, 'stdout', b'a\n'), (1, 'stderr', b'b\n'),
+                       (2, 'stdout', b'c\n')],
+        })
+        self.assertEqual(result.tail(1), [(2, 'stdout', b'c\n')])
+        self.assertEqual(list(result.range(1, 2)), [(1, 'stderr', b'b\n')])
+        self.assertEqual(result.stdout_bytes(), b'a\nc\n')
+
+    def test_range_of_generated_io_log(self):
+        io_log = generate_io_log()
+        result = MemoryJobResult({'io_log': io_log})
+        self.assertEqual(list(result.range(5, 8)), io_log[5:8])
+        self.assertEqual(list(result.range(0, 0.5)), io_log[:1])
+        self.assertEqual(list(result.range(10)), io_log[10:])
+
 
 class IOLogRecordWriterTests(TestCase):
 
@@ -126,3 +223,145 @@ class IOLogRecordWriterTests(TestCase):
         reader = IOLogRecordReader(stream)
         record_list = list(reader)
         self.assertEqual(record_list, [self._RECORD])
+
+
+class SmallBlockBinaryIOLogRecordWriter(BinaryIOLogRecordWriter):
+
+    BLOCK_SIZE = 64
+
+
+class BinaryIOLogRecordTests(TestCase):
+
+    def setUp(self):
+        # Delays are relative to the previous record, some records come in
+        # batches (with a delay of zero)
+        self.record_list = [
+            IOLogRecord(0.0 if i % 4 else 0.5,
+                        'stderr' if i % 3 else 'stdout',
+                        "line {}\n".format(i).encode("UTF-8"))
+            for i in range(50)]
+        self.time_list = list(itertools.accumulate(
+            record.delay for record in self.record_list))
+
+    def write(self, record_list, compress=True,
+              writer_cls=SmallBlockBinaryIOLogRecordWriter):
+        stream = io.BytesIO()
+        stream.close = lambda: None
+        with writer_cls(stream, compress) as writer:
+            for record in record_list:
+                writer.write_record(record)
+        stream.seek(0)
+        return stream
+
+    def test_write_and_read(self):
+        for compress in (True, False):
+            for writer_cls in (BinaryIOLogRecordWriter,
+                               SmallBlockBinaryIOLogRecordWriter):
+                stream = self.write(self.record_list, compress, writer_cls)
+                reader = BinaryIOLogRecordReader(stream)
+                self.assertEqual(len(reader), len(self.record_list))
+                self.assertEqual(list(reader), self.record_list)
+
+    def test_empty(self):
+        reader = BinaryIOLogRecordReader(self.write([]))
+        self.assertEqual(len(reader), 0)
+        self.assertEqual(list(reader), [])
+        self.assertIsNone(reader.read_record())
+
+    def test_read_record(self):
+        reader = BinaryIOLogRecordReader(self.write(self.record_list[:2]))
+        self.assertEqual(reader.read_record(), self.record_list[0])
+        self.assertEqual(reader.read_record(), self.record_list[1])
+        self.assertIsNone(reader.read_record())
+
+    def test_random_access(self):
+        reader = BinaryIOLogRecordReader(self.write(self.record_list))
+        self.assertEqual(len(reader), len(self.record_list))
+        # There are many (small) blocks
+        self.assertGreater(len(reader._block_offset_list), 5)
+        for start in range(len(self.record_list) + 1):
+            self.assertEqual(
+                list(reader.iter_records(start)), self.record_list[start:])
+
+    def test_random_access_reads_one_block(self):
+        reader = BinaryIOLogRecordReader(self.write(self.record_list))
+        with mock.patch.object(
+                reader, '_read_block', wraps=reader._read_block) as mock_read:
+            record = next(reader.iter_records(len(self.record_list) - 1))
+            self.assertEqual(mock_read.call_count, 1)
+        self.assertEqual(record, self.record_list[-1])
+
+    def test_zero_copy(self):
+        reader = BinaryIOLogRecordReader(self.write(self.record_list))
+        record_list = list(reader.iter_records(zero_copy=True))
+        self.assertIsInstance(record_list[0].data, memoryview)
+        self.assertEqual(
+            [bytes(record.data) for record in record_list],
+            [record.data for record in self.record_list])
+
+    def test_unclosed_stream(self):
+        stream = io.BytesIO()
+        writer = SmallBlockBinaryIOLogRecordWriter(stream)
+        for record in self.record_list:
+            writer.write_record(record)
+        # The writer was interrupted while it was writing a block
+        data = stream.getvalue()[:-5]
+        reader = BinaryIOLogRecordReader(io.BytesIO(data))
+        record_list = list(reader)
+        self.assertGreater(len(record_list), 0)
+        self.assertEqual(record_list, self.record_list[:len(record_list)])
+        self.assertEqual(len(reader), len(record_list))
+
+    def test_tail(self):
+        reader = BinaryIOLogRecordReader(self.write(self.record_list))
+        with mock.patch.object(
+                reader, '_read_block', wraps=reader._read_block) as mock_read:
+            self.assertEqual(reader.tail(3), self.record_list[-3:])
+            self.assertLessEqual(mock_read.call_count, 2)
+        self.assertEqual(reader.tail(100), self.record_list)
+
+    def _get_expected_range(self, start_time, end_time=None):
+        return [record
+                for record, time in zip(self.record_list, self.time_list)
+                if time >= start_time and (
+                    end_time is None or time < end_time)]
+
+    def test_range(self):
+        reader = BinaryIOLogRecordReader(self.write(self.record_list))
+        for start_time in self.time_list + [-1, 0.25, 100]:
+            for end_time in (start_time, start_time + 2, None):
+                self.assertEqual(
+                    list(reader.range(start_time, end_time)),
+                    self._get_expected_range(start_time, end_time))
+        # The records were spread over many (small) blocks
+        self.assertGreater(len(reader._block_offset_list), 5)
+
+    def test_range_reads_few_blocks(self):
+        reader = BinaryIOLogRecordReader(self.write(self.record_list))
+        start_time = self.time_list[40]
+        with mock.patch.object(
+                reader, '_read_block', wraps=reader._read_block) as mock_read:
+            record_list = list(reader.range(start_time, start_time + 0.25))
+            self.assertLessEqual(mock_read.call_count, 2)
+        self.assertIn(self.record_list[40], record_list)
+        self.assertEqual(
+            record_list,
+            self._get_expected_range(start_time, start_time + 0.25))
+
+    def test_not_binary(self):
+        with self.assertRaises(ValueError):
+            BinaryIOLogRecordReader(io.BytesIO(b'garbage'))
+
+    def test_older_format(self):
+        with self.assertRaises(ValueError):
+            BinaryIOLogRecordReader(io.BytesIO(b'PBIOLOG\x03'))
+
+    def test_open_io_log(self):
+        with TemporaryDirectory() as scratch_dir:
+            for binary in (True, False):
+                pathname = make_io_log(self.record_list, scratch_dir, binary)
+                with open_io_log(pathname) as reader:
+                    self.assertIsInstance(reader, (
+                        BinaryIOLogRecordReader if binary
+                        else IOLogRecordReader))
+                    self.assertEqual(list(reader), self.record_list)
@@ -24,13 +24,16 @@ plainbox.impl.test_rfc822
 Test definitions for plainbox.impl.rfc822 module
 """
 
+from functools import partial
 from io import StringIO
 from unittest import TestCase
+import random
 
 from plainbox.impl.rfc822 import Origin
 from plainbox.impl.rfc822 import RFC822Record
 from plainbox.impl.rfc822 import load_rfc822_records
 from plainbox.impl.rfc822 import dump_rfc822_records
+from plainbox.impl.rfc822 import gen_rfc822_records
 from plainbox.impl.secure.checkbox_trusted_launcher import RFC822SyntaxError
 
 
@@ -276,6 +279,99 @@ class RFC822ParserTests(TestCase, RFC822ParserTestsMixIn):
         self.assertEqual(records[0].origin, expected_origin)
 
 
+class ReferenceRFC822ParserTests(RFC822ParserTests):
+
+    loader = partial(load_rfc822_records, parser='reference')
+
+
+class RFC822ParserSelectionTests(TestCase):
+
+    def test_unknown_parser(self):
+        with self.assertRaises(ValueError):
+            gen_rfc822_records(StringIO("key:value"), parser='magic')
+
+
+class RFC822ParserEquivalenceTests(TestCase):
+    """
+    Tests that check that the fast parser behaves exactly like the reference
+    parser, including origins and errors.
+    """
+
+    corpus = [
+        "",
+        "\n\n\n",
+        "key:value",
+        "key: value\n\nkey: value\n",
+        " \n\t\nkey: value\n \n\t\r\nkey2: value2\n",
+        "key:\tvalue\twith\ttabs\t\n",
+        "key:\n\tno continuation\n",
+        "\tkey: value\n",
+        "key: first\n second\n  third\n .\n ..\n \tfourth\n",
+        "key:\n .\n\nother: \n  ..\n",
+        "key:\n  indented\n   more\n\n",
+        "k1: v1\nk2: v2\n k2 more\nk3: v3\n\n\nk1: v1\n",
+        "key: a: b: c\n:empty key\nempty value:\n",
+        "key: value\r\nother: value\r\n",
+        "key: last line without newline\n .",
+        " leading continuation\n",
+        "key: value\ngarbage\n",
+        "key: value\nkey: again\n",
+        "key: value\n multi\nkey: again\n",
+        "a: 1\n\nb: 2\n\nc: 3\nc: 4\n",
+    ]
+
+    def parse(self, text, parser, filename=None):
+        if not isinstance(text, str):
+            stream = text
+        elif filename is None:
+            stream = StringIO(text)
+        else:
+            stream = NamedStringIO(text, fake_filename=filename)
+        try:
+            return [
+                (record.data, record.origin)
+                for record in gen_rfc822_records(stream, parser=parser)]
+        except RFC822SyntaxError as exc:
+            return (exc.filename, exc.lineno, exc.msg)
+
+    def test_corpus(self):
+        for text in self.corpus:
+            for filename in (None, "file.txt"):
+                self.assertEqual(
+                    self.parse(text, 'fast', filename),
+                    self.parse(text, 'reference', filename),
+                    "mismatch for {!r}".format(text))
+
+    def test_random(self):
+        line_list = [
+            "\n", " \n", "\t\n", "key: value\n", "key:\n", "other: a\tb\n",
+            " more\n", "  indented\n", " .\n", " ..\n", "\tkey: x\n",
+            "garbage\n", "k: v: w\n", "last"]
+        rng = random.Random(0)
+        for i in range(500):
+            text = "".join(
+                rng.choice(line_list) for j in range(rng.randint(0, 12)))
+            for filename in (None, "file.txt"):
+                self.assertEqual(
+                    self.parse(text, 'fast', filename),
+                    self.parse(text, 'reference', filename),
+                    "mismatch for {!r}".format(text))
+
+    def test_line_generator(self):
+        # Session state parses output of jobs from a generator of lines
+        text = "key: value\n more\n\nkey: value2\n"
+        self.assertEqual(
+            self.parse(iter(text.splitlines(True)), 'fast'),
+            self.parse(iter(text.splitlines(True)), 'reference'))
+
+    def test_embedded_newline(self):
+        # Lines from a generator may have embedded newlines
+        lines = ["key: value\n   indented\n"]
+        self.assertEqual(
+            self.parse(iter(lines), 'fast'),
+            self.parse(iter(lines), 'reference'))
+
+
 class RFC822WriterTests(TestCase):
 
     def test_single_record(self):
@@ -29,12 +29,16 @@ from mock import Mock, patch
 from tempfile import TemporaryDirectory
 from unittest import TestCase
 import os
+import threading
+import time
 
+from plainbox.abc import IJobResult
 from plainbox.impl.job import JobDefinition
 from plainbox.impl.runner import CommandOutputWriter
 from plainbox.impl.runner import FallbackCommandOutputPrinter
 from plainbox.impl.runner import IOLogRecordGenerator
 from plainbox.impl.runner import JobRunner
+from plainbox.impl.runner import get_resource_usage
 from plainbox.impl.runner import slugify
 from plainbox.testing_utils.io import TestIO
 
@@ -70,6 +74,18 @@ class IOLogGeneratorTests(TestCase):
         self.assertEqual(self.last_record.stream_name, 'stderr')
         self.assertEqual(self.last_record.data, b'error message\n')
 
+    def test_on_lines(self):
+        builder = IOLogRecordGenerator()
+        builder.on_begin(None, None)
+        record_list = []
+        builder.on_new_record.connect(record_list.append)
+        builder.on_lines('stdout', [b'line 1\n', b'line 2\n'])
+        self.assertEqual(
+            [(record.stream_name, record.data) for record in record_list],
+            [('stdout', b'line 1\n'), ('stdout', b'line 2\n')])
+        # Lines of one batch were read at the same time
+        self.assertEqual(record_list[1].delay, 0)
+
 
 class FallbackCommandOutputPrinterTests(TestCase):
 
@@ -113,10 +129,11 @@ class CommandOutputWriterTests(TestCase):
             # Each line simply gets saved
             writer.on_line('stdout', b'text\n')
             writer.on_line('stderr', b'error\n')
+            writer.on_lines('stdout', [b'more\n', b'text\n'])
             # (but it may not be on disk yet because of buffering)
             # After the command is done the logs are left on disk
             writer.on_end(None)
-            self.assertFileContentsEqual(stdout, b'text\n')
+            self.assertFileContentsEqual(stdout, b'text\nmore\ntext\n')
             self.assertFileContentsEqual(stderr, b'error\n')
 
 
@@ -177,3 +194,144 @@ class GetScriptEnvTests(TestCase):
             self.assertIn(
                 "foo",
                 JobRunner._get_script_env(Mock(), job, only_changes=False))
+
+
+class TimeoutTests(TestCase):
+
+    def test_get_job_timeout(self):
+        runner = JobRunner(None, None)
+        self.assertEqual(runner._get_job_timeout(JobDefinition({})), None)
+        self.assertEqual(runner._get_job_timeout(JobDefinition({
+            'estimated_duration': '10'})), None)
+        self.assertEqual(runner._get_job_timeout(JobDefinition({
+            'estimated_duration': '10', 'timeout': '5'})), 5)
+
+    def test_get_job_timeout_with_multiplier(self):
+        runner = JobRunner(None, None, timeout_multiplier=3)
+        self.assertEqual(runner._get_job_timeout(JobDefinition({})), None)
+        self.assertEqual(runner._get_job_timeout(JobDefinition({
+            'estimated_duration': '10'})), 30)
+        self.assertEqual(runner._get_job_timeout(JobDefinition({
+            'estimated_duration': '10', 'timeout': '5'})), 5)
+
+    def test_timeout_outcome(self):
+        runner = JobRunner(None, None)
+        job = JobDefinition({'name': 'name', 'timeout': '5'})
+        with patch.object(runner, '_supervise_command') as mock_supervise:
+            mock_supervise.return_value = (-15, 'record', True, None)
+            result = runner._just_run_command(job, None)
+        self.assertEqual(result.outcome, IJobResult.OUTCOME_TIMEOUT)
+        self.assertEqual(result.return_code, -15)
+        self.assertEqual(result.comments, "Job killed after running for 5.0s")
+
+    def test_fail_outcome(self):
+        runner = JobRunner(None, None)
+        job = JobDefinition({'name': 'name'})
+        with patch.object(runner, '_supervise_command') as mock_supervise:
+            mock_supervise.return_value = (1, 'record', False, None)
+            result = runner._just_run_command(job, None)
+        self.assertEqual(result.outcome, IJobResult.OUTCOME_FAIL)
+
+    def test_run_command_with_timeout(self):
+        with TemporaryDirectory() as scratch_dir:
+            runner = JobRunner(
+                scratch_dir, scratch_dir,
+                command_io_delegate=Mock(spec=[]))
+            job = JobDefinition({
+                'name': 'name',
+                'plugin': 'shell',
+                'command': 'echo started; sleep 60 & sleep 60',
+                'timeout': '0.5',
+            })
+            job._provider = Mock()
+            job._provider.extra_PYTHONPATH = None
+            job._provider.extra_PATH = ""
+            job._provider.CHECKBOX_SHARE = scratch_dir
+            start = time.time()
+            result = runner.run_job(job)
+            self.assertLess(time.time() - start, 30)
+            self.assertEqual(result.outcome, IJobResult.OUTCOME_TIMEOUT)
+            self.assertEqual(
+                [record.data for record in result.get_io_log()],
+                [b'started\n'])
+            self.assertIsNotNone(result.resource_usage)
+
+    def test_resource_usage(self):
+        rusage = Mock(
+            ru_utime=1.5, ru_stime=0.5, ru_maxrss=1024, ru_inblock=1,
+            ru_oublock=2, ru_nvcsw=3, ru_nivcsw=4)
+        self.assertEqual(get_resource_usage(rusage), {
+            'cpu_user_time': 1.5,
+            'cpu_system_time': 0.5,
+            'max_rss': 1024,
+            'block_input': 1,
+            'block_output': 2,
+            'voluntary_context_switches': 3,
+            'involuntary_context_switches': 4,
+        })
+
+
+class KillTests(TestCase):
+
+    def _run_job(self, runner, scratch_dir):
+        job = JobDefinition({
+            'name': 'name',
+            'plugin': 'shell',
+            'command': 'echo started; sleep 60 & sleep 60',
+        })
+        job._provider = Mock()
+        job._provider.extra_PYTHONPATH = None
+        job._provider.extra_PATH = ""
+        job._provider.CHECKBOX_SHARE = scratch_dir
+        start = time.time()
+        result = runner.run_job(job)
+        self.assertLess(time.time() - start, 30)
+        return result
+
+    def test_kill_running_job(self):
+        with TemporaryDirectory() as scratch_dir:
+            runner = JobRunner(
+                scratch_dir, scratch_dir,
+                command_io_delegate=Mock(spec=[]))
+            threading.Timer(0.5, runner.kill).start()
+            result = self._run_job(runner, scratch_dir)
+            self.assertEqual(result.outcome, IJobResult.OUTCOME_FAIL)
+            self.assertEqual(result.return_code, -15)
+            self.assertEqual(result.comments, "Job killed on request")
+
+    def test_kill_before_start(self):
+        with TemporaryDirectory() as scratch_dir:
+            runner = JobRunner(
+                scratch_dir, scratch_dir,
+                command_io_delegate=Mock(spec=[]))
+            runner.kill()
+            result = self._run_job(runner, scratch_dir)
+            self.assertEqual(result.return_code, -15)
+            self.assertEqual(result.comments, "Job killed on request")
+
+
+class RunJobListTests(TestCase):
+
+    def test_results_follow_job_order(self):
+        # Jobs that finish in a different order than they were started
+        # must still have their results returned in the original order
+        job_list = [Mock(name='A'), Mock(name='B'), Mock(name='C')]
+        delay_map = {job_list[0]: 0.2, job_list[1]: 0.1, job_list[2]: 0}
+        runner = JobRunner(None, None)
+
+        def run_job(job, config=None):
+            time.sleep(delay_map[job])
+            return job
+
+        with patch.object(runner, 'run_job', side_effect=run_job):
+            result_list = runner.run_job_list(job_list, max_workers=3)
+        self.assertEqual(result_list, job_list)
+
+    def test_config_is_passed(self):
+        job_list = [Mock(name='A'), Mock(name='B')]
+        config = Mock(name='config')
+        runner = JobRunner(None, None)
+        with patch.object(runner, 'run_job') as mock_run_job:
+            runner.run_job_list(job_list, config, max_workers=1)
+        mock_run_job.assert_any_call(job_list[0], config)
+        mock_run_job.assert_any_call(job_list[1], config)
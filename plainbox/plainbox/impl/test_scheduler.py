@@ -0,0 +1,153 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+# Written by:
+#   Zygmunt Krynicki <zygmunt.krynicki@canonical.com>
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+plainbox.impl.test_scheduler
+============================
+
+Test definitions for plainbox.impl.scheduler module
+"""
+
+from unittest import TestCase
+import threading
+
+from plainbox.abc import IJobResult
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.scheduler import JobScheduler
+from plainbox.impl.session import SessionState
+from plainbox.impl.testing_utils import make_job
+
+
+class FakeRunner:
+    """
+    Runner that records which jobs were running at the same time
+    """
+
+    def __init__(self, outcome_map=None):
+        self.lock = threading.Lock()
+        self.running = set()
+        self.overlap_list = []
+        self.started_list = []
+        self.outcome_map = outcome_map or {}
+
+    def run_job(self, job, config=None):
+        with self.lock:
+            self.started_list.append(job.name)
+            if self.running:
+                self.overlap_list.append(
+                    (job.name, frozenset(self.running)))
+            self.running.add(job.name)
+        threading.Event().wait(0.05)
+        with self.lock:
+            self.running.remove(job.name)
+        return MemoryJobResult({
+            'outcome': self.outcome_map.get(
+                job.name, IJobResult.OUTCOME_PASS)
+        })
+
+
+class JobSchedulerTests(TestCase):
+
+    def run_session(self, job_list, runner, max_workers=4):
+        session = SessionState(job_list)
+        session.update_desired_job_list(job_list)
+        serial_list = []
+
+        def run_job_serially(job):
+            serial_list.append(job.name)
+            job_state = session.job_state_map[job.name]
+            if job_state.can_start():
+                result = runner.run_job(job)
+            else:
+                result = MemoryJobResult({
+                    'outcome': IJobResult.OUTCOME_NOT_SUPPORTED})
+            session.update_job_result(job, result)
+
+        JobScheduler(session, runner, max_workers).run(run_job_serially)
+        return session, serial_list
+
+    def test_invalid_max_workers(self):
+        with self.assertRaises(ValueError):
+            JobScheduler(None, None, 0)
+
+    def test_independent_jobs_overlap(self):
+        job_list = [make_job(name, plugin='shell') for name in 'ABC']
+        runner = FakeRunner()
+        session, serial_list = self.run_session(job_list, runner)
+        self.assertEqual(serial_list, [])
+        self.assertNotEqual(runner.overlap_list, [])
+        for job in job_list:
+            self.assertEqual(
+                session.job_state_map[job.name].result.outcome,
+                IJobResult.OUTCOME_PASS)
+
+    def test_dependencies_are_respected(self):
+        A = make_job('A', plugin='shell')
+        B = make_job('B', plugin='shell', depends='A')
+        C = make_job('C', plugin='shell', depends='B')
+        runner = FakeRunner()
+        self.run_session([A, B, C], runner)
+        self.assertEqual(runner.started_list, ['A', 'B', 'C'])
+        self.assertEqual(runner.overlap_list, [])
+
+    def test_resource_requirements_are_respected(self):
+        R = make_job('R', plugin='resource')
+        A = make_job('A', plugin='shell', requires='R.attr == "value"')
+        runner = FakeRunner()
+        session, serial_list = self.run_session([R, A], runner)
+        # R produces no resources so A can never start
+        self.assertEqual(runner.started_list, ['R'])
+        self.assertEqual(serial_list, ['A'])
+        self.assertEqual(
+            session.job_state_map['A'].result.outcome,
+            IJobResult.OUTCOME_NOT_SUPPORTED)
+
+    def test_failed_dependency(self):
+        A = make_job('A', plugin='shell')
+        B = make_job('B', plugin='shell', depends='A')
+        runner = FakeRunner({'A': IJobResult.OUTCOME_FAIL})
+        session, serial_list = self.run_session([A, B], runner)
+        self.assertEqual(runner.started_list, ['A'])
+        self.assertEqual(serial_list, ['B'])
+
+    def test_exclusive_jobs_never_overlap(self):
+        job_list = [make_job(name, plugin='shell') for name in 'ABCD']
+        job_list.append(make_job('X', plugin='shell', exclusive='yes'))
+        runner = FakeRunner()
+        session, serial_list = self.run_session(job_list, runner)
+        self.assertEqual(serial_list, ['X'])
+        for name, running in runner.overlap_list:
+            self.assertNotEqual(name, 'X')
+            self.assertNotIn('X', running)
+
+    def test_manual_jobs_run_serially(self):
+        A = make_job('A', plugin='shell')
+        M = make_job('M', plugin='manual')
+        runner = FakeRunner()
+        session, serial_list = self.run_session([A, M], runner)
+        self.assertEqual(serial_list, ['M'])
+        self.assertEqual(runner.overlap_list, [])
+
+    def test_longest_jobs_start_first(self):
+        A = make_job('A', plugin='shell', estimated_duration='1')
+        B = make_job('B', plugin='shell')
+        C = make_job('C', plugin='shell', estimated_duration='10')
+        runner = FakeRunner()
+        self.run_session([A, B, C], runner, max_workers=1)
+        self.assertEqual(runner.started_list, ['C', 'A', 'B'])
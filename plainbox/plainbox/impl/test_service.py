@@ -0,0 +1,68 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+# Written by:
+#   Zygmunt Krynicki <zygmunt.krynicki@canonical.com>
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+plainbox.impl.test_service
+==========================
+
+Test definitions for plainbox.impl.service module
+"""
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from plainbox.impl.result import DiskJobResult
+from plainbox.impl.result import IOLogRecord
+from plainbox.impl.result import MemoryJobResult
+from plainbox.impl.service import JobResultWrapper
+from plainbox.impl.testing_utils import make_io_log
+
+
+class JobResultWrapperTests(TestCase):
+
+    def setUp(self):
+        # Delays are relative to the previous record
+        self.io_log = [
+            IOLogRecord(0.0, 'stdout', b'a\n'),
+            IOLogRecord(1.0, 'stderr', b'b\n'),
+            IOLogRecord(0.0, 'stdout', b'c\n'),
+            IOLogRecord(1.0, 'stdout', b'd\n'),
+            IOLogRecord(1.0, 'stdout', b'e\n'),
+        ]
+        self.scratch_dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.scratch_dir.cleanup()
+
+    def assertRangeWorks(self, result):
+        wrapper = JobResultWrapper(result)
+        self.assertEqual(
+            list(wrapper.GetIOLogRange(1.0, 2.0)), self.io_log[1:3])
+        self.assertEqual(
+            list(wrapper.GetIOLogRange(1.5, 3.0)), self.io_log[3:4])
+        self.assertEqual(
+            list(wrapper.GetIOLogRange(3.0, 4.0)), self.io_log[4:])
+
+    def test_get_io_log_range_memory(self):
+        self.assertRangeWorks(MemoryJobResult({'io_log': self.io_log}))
+
+    def test_get_io_log_range_disk(self):
+        for binary in (False, True):
+            self.assertRangeWorks(DiskJobResult({
+                'io_log_filename': make_io_log(
+                    self.io_log, self.scratch_dir.name, binary)}))
@@ -0,0 +1,171 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+plainbox.impl.test_tracing
+==========================
+
+Test definitions for plainbox.impl.tracing module
+"""
+
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import io
+import json
+import os
+
+from plainbox.impl import tracing
+from plainbox.impl.tracing import Tracer
+from plainbox.impl.tracing import is_tracing
+from plainbox.impl.tracing import span
+from plainbox.impl.tracing import start_tracing
+from plainbox.impl.tracing import stop_tracing
+from plainbox.impl.tracing import traced
+
+
+class _Stream(io.StringIO):
+    """
+    StringIO that keeps its value around after being closed
+    """
+
+    def close(self):
+        self.final_value = self.getvalue()
+        super(_Stream, self).close()
+
+
+class TracerTests(TestCase):
+
+    def test_chrome_format(self):
+        stream = _Stream()
+        tracer = Tracer(stream)
+        with tracer.span("outer", "test", {'key': 'value'}):
+            with tracer.span("inner", "test"):
+                pass
+        tracer.close()
+        event_list = json.loads(stream.final_value)
+        # Inner spans end first, the metadata event is always the last one
+        self.assertEqual(
+            [event['name'] for event in event_list],
+            ['inner', 'outer', 'process_name'])
+        inner, outer = event_list[:2]
+        self.assertEqual(outer['ph'], 'X')
+        self.assertEqual(outer['cat'], 'test')
+        self.assertEqual(outer['args'], {'key': 'value'})
+        self.assertEqual(outer['pid'], os.getpid())
+        self.assertNotIn('args', inner)
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(
+            outer['ts'] + outer['dur'], inner['ts'] + inner['dur'])
+
+    def test_json_lines_format(self):
+        stream = _Stream()
+        tracer = Tracer(stream, Tracer.FORMAT_JSON_LINES)
+        with tracer.span("first", "test"):
+            pass
+        with tracer.span("second", "test"):
+            pass
+        tracer.close()
+        event_list = [
+            json.loads(line) for line in stream.final_value.splitlines()]
+        self.assertEqual(
+            [event['name'] for event in event_list], ['first', 'second'])
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            Tracer(_Stream(), 'xml')
+
+    def test_args_not_in_json(self):
+        stream = _Stream()
+        tracer = Tracer(stream, Tracer.FORMAT_JSON_LINES)
+        with tracer.span("span", "test", {'obj': object}):
+            pass
+        tracer.close()
+        event = json.loads(stream.final_value)
+        self.assertEqual(event['args'], {'obj': repr(object)})
+
+    def test_events_after_close_are_ignored(self):
+        stream = _Stream()
+        tracer = Tracer(stream, Tracer.FORMAT_JSON_LINES)
+        tracer.close()
+        with tracer.span("span", "test"):
+            pass
+        tracer.close()
+        self.assertEqual(stream.final_value, "")
+
+
+class TracingTests(TestCase):
+
+    def tearDown(self):
+        stop_tracing()
+
+    def test_disabled_by_default(self):
+        self.assertFalse(is_tracing())
+        self.assertIs(span("a"), span("b", "category", key='value'))
+
+    def test_start_stop(self):
+        with TemporaryDirectory() as tmp:
+            pathname = os.path.join(tmp, "trace.json")
+            start_tracing(pathname)
+            self.assertTrue(is_tracing())
+            with span("phase", "test", number=1):
+                pass
+            stop_tracing()
+            self.assertFalse(is_tracing())
+            with open(pathname, encoding='UTF-8') as stream:
+                event_list = json.load(stream)
+        self.assertEqual(event_list[0]['name'], 'phase')
+        self.assertEqual(event_list[0]['args'], {'number': 1})
+
+    def test_format_from_extension(self):
+        with TemporaryDirectory() as tmp:
+            pathname = os.path.join(tmp, "trace.jsonl")
+            start_tracing(pathname)
+            self.assertEqual(
+                tracing._tracer._format, Tracer.FORMAT_JSON_LINES)
+
+    def test_traced(self):
+
+        @traced("func", "test")
+        def func(a, b=None):
+            """doc"""
+            return a, b
+
+        self.assertEqual(func.__name__, "func")
+        self.assertEqual(func.__doc__, "doc")
+        # Works the same with tracing disabled and enabled
+        self.assertEqual(func(1, b=2), (1, 2))
+        with TemporaryDirectory() as tmp:
+            pathname = os.path.join(tmp, "trace.jsonl")
+            start_tracing(pathname)
+            self.assertEqual(func(1, b=2), (1, 2))
+            stop_tracing()
+            with open(pathname, encoding='UTF-8') as stream:
+                event = json.loads(stream.read())
+        self.assertEqual(event['name'], 'func')
+        self.assertEqual(event['cat'], 'test')
+
+    def test_span_exception(self):
+        with TemporaryDirectory() as tmp:
+            pathname = os.path.join(tmp, "trace.jsonl")
+            start_tracing(pathname)
+            with self.assertRaises(ZeroDivisionError):
+                with span("failing", "test"):
+                    1 / 0
+            stop_tracing()
+            with open(pathname, encoding='UTF-8') as stream:
+                event = json.loads(stream.read())
+        self.assertEqual(event['name'], 'failing')
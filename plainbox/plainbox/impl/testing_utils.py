@@ -35,6 +35,7 @@ import inspect
 import warnings
 
 from plainbox.impl.job import JobDefinition
+from plainbox.impl.result import BinaryIOLogRecordWriter
 from plainbox.impl.result import IOLogRecordWriter
 from plainbox.impl.result import MemoryJobResult
 from plainbox.impl.rfc822 import Origin
@@ -49,11 +50,21 @@ def MockJobDefinition(name, *args, **kwargs):
     return job
 
 
-def make_io_log(io_log, io_log_dir):
+def make_io_log(io_log, io_log_dir, binary=False):
     """
     Make the io logs serialization to json and return the saved file pathname
     WARNING: The caller has to remove the file once done with it!
+
+    If binary is True the binary format, written by
+    :class:`~plainbox.impl.result.BinaryIOLogRecordWriter`, is used instead.
     """
+    if binary:
+        with NamedTemporaryFile(
+                delete=False, suffix='.record.bin', dir=io_log_dir) as stream:
+            with BinaryIOLogRecordWriter(stream) as writer:
+                for record in io_log:
+                    writer.write_record(record)
+        return stream.name
     with NamedTemporaryFile(
         delete=False, suffix='.record.gz', dir=io_log_dir) as byte_stream, \
             GzipFile(fileobj=byte_stream, mode='wb') as gzip_stream, \
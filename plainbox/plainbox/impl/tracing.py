@@ -0,0 +1,275 @@
+# This file is part of Checkbox.
+#
+# Copyright 2013 Canonical Ltd.
+#
+# Checkbox is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Checkbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Checkbox.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+:mod:`plainbox.impl.tracing` -- phase-level tracing
+===================================================
+
+Interesting parts of plainbox (loading providers, parsing job definitions,
+solving dependencies, computing job readiness, saving checkpoints, running
+jobs and exporting results) are wrapped in *spans*. When tracing is enabled
+(see :func:`start_tracing()`) each span is written to a trace file as soon as
+it ends. When tracing is disabled, which is the default, spans cost one
+function call and nothing else.
+
+Two file formats are supported. The default is the Chrome trace event
+format, the resulting file can be loaded into ``chrome://tracing`` or any
+other compatible viewer. Files with the ``.jsonl`` extension get the same
+events written as JSON lines instead, one event per line, which is easier to
+process with command line tools.
+
+.. warning::
+
+    THIS MODULE DOES NOT HAVE STABLE PUBLIC API
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+__all__ = ['span', 'traced', 'is_tracing', 'start_tracing', 'stop_tracing',
+           'Tracer']
+
+
+logger = logging.getLogger("plainbox.tracing")
+
+# Use the most precise clock that is available
+_clock = getattr(time, 'perf_counter', time.time)
+
+# The currently active tracer, None when tracing is disabled
+_tracer = None
+
+
+class Tracer:
+    """
+    Writer of trace events.
+
+    Each completed span is written as a *complete event* (phase ``X``) with
+    the start time and the duration expressed in microseconds, relative to
+    the moment the tracer was created. Events may be written from any thread.
+    """
+
+    FORMAT_CHROME = 'chrome'
+    FORMAT_JSON_LINES = 'jsonl'
+
+    def __init__(self, stream, format=FORMAT_CHROME):
+        """
+        Initialize a tracer writing to the specified text stream
+
+        :param stream:
+            A text stream that events are written to, the stream is owned
+            by the tracer and closed by :meth:`close()`
+        :param format:
+            Either :attr:`FORMAT_CHROME` or :attr:`FORMAT_JSON_LINES`
+        """
+        if format not in (self.FORMAT_CHROME, self.FORMAT_JSON_LINES):
+            raise ValueError("Unsupported trace format: {!r}".format(format))
+        self._stream = stream
+        self._format = format
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._start = _clock()
+        if self._format == self.FORMAT_CHROME:
+            # Events are separated by commas and the array is closed in
+            # close(). Viewers accept traces where the closing bracket is
+            # missing, so a crashed run still produces a useful trace.
+            self._stream.write("[\n")
+
+    @classmethod
+    def open(cls, pathname):
+        """
+        Create a tracer writing to the specified file
+
+        The format is selected by the extension, ``.jsonl`` files get JSON
+        lines, everything else gets the Chrome trace event format.
+        """
+        if pathname.endswith('.jsonl'):
+            format = cls.FORMAT_JSON_LINES
+        else:
+            format = cls.FORMAT_CHROME
+        return cls(open(pathname, 'wt', encoding='UTF-8'), format)
+
+    def span(self, name, category, args=None):
+        """
+        Create a context manager that traces the enclosed block of code
+        """
+        return _Span(self, name, category, args)
+
+    def add_event(self, name, category, start, end, args=None):
+        """
+        Write a complete event that started and ended at the specified times
+
+        The times are values of the clock used by the tracer, as returned
+        by :meth:`now()`.
+        """
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round((start - self._start) * 1e6, 3),
+            'dur': round((end - start) * 1e6, 3),
+            'pid': self._pid,
+            'tid': threading.current_thread().ident,
+        }
+        if args:
+            event['args'] = args
+        text = json.dumps(event, default=repr)
+        with self._lock:
+            if self._stream is None:
+                return
+            if self._format == self.FORMAT_CHROME:
+                self._stream.write(text + ",\n")
+            else:
+                self._stream.write(text + "\n")
+
+    def now(self):
+        """
+        Get the current time, as used by :meth:`add_event()`
+        """
+        return _clock()
+
+    def close(self):
+        """
+        Finish the trace and close the stream
+        """
+        with self._lock:
+            if self._stream is None:
+                return
+            if self._format == self.FORMAT_CHROME:
+                # Terminate the array with a metadata event so that the
+                # output stays valid JSON despite the trailing comma above
+                self._stream.write(json.dumps({
+                    'name': 'process_name',
+                    'ph': 'M',
+                    'pid': self._pid,
+                    'args': {'name': 'plainbox'},
+                }) + "\n]\n")
+            self._stream.close()
+            self._stream = None
+
+
+class _Span:
+    """
+    Context manager that reports the enclosed block of code to a tracer
+    """
+
+    __slots__ = ('_tracer', '_name', '_category', '_args', '_start')
+
+    def __init__(self, tracer, name, category, args):
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._args = args
+        self._start = None
+
+    def __enter__(self):
+        self._start = self._tracer.now()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._tracer.add_event(
+            self._name, self._category, self._start, self._tracer.now(),
+            self._args)
+
+
+class _NullSpan:
+    """
+    Context manager that does nothing, used when tracing is disabled
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, category="plainbox", **args):
+    """
+    Create a context manager that traces the enclosed block of code
+
+    :param name:
+        Name of the span, as displayed by trace viewers
+    :param category:
+        Name of the subsystem the span belongs to
+    :param args:
+        Additional data to store along with the span, values that cannot
+        be represented in JSON are stored as their repr()
+
+    When tracing is disabled a shared, no-op, context manager is returned.
+    Callers should avoid computing expensive arguments unless
+    :func:`is_tracing()` returns True.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, category, args)
+
+
+def traced(name, category="plainbox"):
+    """
+    Decorator for functions that should be traced as a whole
+
+    The decorated function is wrapped in a :func:`span()` with the specified
+    name and category. This is not suitable for generators, as only the time
+    it takes to create them would be measured.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.span(name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def is_tracing():
+    """
+    Check if tracing is enabled
+    """
+    return _tracer is not None
+
+
+def start_tracing(pathname):
+    """
+    Start writing trace events to the specified file
+
+    Any previously started trace is finished first.
+    """
+    global _tracer
+    stop_tracing()
+    logger.debug("Writing trace events to %r", pathname)
+    _tracer = Tracer.open(pathname)
+
+
+def stop_tracing():
+    """
+    Stop tracing and finish the trace file, if any
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
@@ -22,13 +22,32 @@
 :mod:`plainbox.impl.transport.certification` -- send to certification database
 ==============================================================================
 
+Submissions are sent as a gzip-compressed multipart/form-data request, which
+is generated and streamed in chunks while the data is read. Sending is
+retried, with exponential back-off, when the connection fails or times out
+or when the server fails with a 5xx status. Submissions that still could not
+be sent are stored in an on-disk outbox and sent by the next invocation that
+uses the transport.
+
 .. warning::
 
     THIS MODULE DOES NOT HAVE STABLE PUBLIC API
 """
 
+from contextlib import contextmanager
 from logging import getLogger
+import fcntl
+import glob
+import io
+import json
+import os
 import re
+import shutil
+import tempfile
+import time
+import uuid
+import zlib
+
 import requests
 
 from plainbox.impl.transport import TransportBase
@@ -36,6 +55,12 @@ from plainbox.impl.config import Unset
 
 logger = getLogger("plainbox.transport.certification")
 
+# Time-out while waiting for the response. The server may have received the
+# data already so such requests are never sent again. Versions of requests
+# older than 2.4 only time out while waiting for the response.
+_ReadTimeout = getattr(
+    requests.exceptions, 'ReadTimeout', requests.exceptions.Timeout)
+
 
 class InvalidSecureIDError(ValueError):
     def __init__(self, value):
@@ -45,6 +70,102 @@ class InvalidSecureIDError(ValueError):
         return repr(self.value)
 
 
+def get_default_outbox_dir():
+    """
+    Get the directory where unsent submissions are kept by default
+    """
+    xdg_cache_home = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(xdg_cache_home, 'plainbox', 'outbox')
+
+
+class SubmissionOutbox:
+    """
+    Directory with submissions that could not be sent
+
+    Each submission is kept as two files with the same base name, made of
+    the time the submission was queued and a random suffix: the data itself
+    (``.xml``) and the destination URL and secure ID (``.json``). The data
+    file is renamed into place last so that interrupted writes are never
+    sent. Submissions that were rejected by the server are renamed to
+    ``.rejected`` and kept for inspection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def add(self, url, secure_id, stream):
+        """
+        Queue the rest of the data in the specified stream
+
+        :returns:
+            The pathname of the queued data
+        """
+        os.makedirs(self.path, exist_ok=True)
+        base = os.path.join(self.path, "{}-{}".format(
+            int(time.time() * 1000000), uuid.uuid4().hex[:8]))
+        with open(base + ".partial", "wb") as data_stream:
+            shutil.copyfileobj(stream, data_stream)
+            data_stream.flush()
+            os.fsync(data_stream.fileno())
+        with open(base + ".json", "wt", encoding="UTF-8") as meta_stream:
+            json.dump({'url': url, 'secure_id': secure_id}, meta_stream)
+        os.rename(base + ".partial", base + ".xml")
+        return base + ".xml"
+
+    def get_entry_list(self):
+        """
+        Get the list of queued submissions, oldest first
+
+        :returns:
+            A list of (pathname of the data, url, secure_id) tuples
+        """
+        entry_list = []
+        for pathname in sorted(glob.glob(os.path.join(self.path, "*.xml"))):
+            try:
+                with open(pathname[:-len(".xml")] + ".json", "rt",
+                          encoding="UTF-8") as stream:
+                    meta = json.load(stream)
+                entry_list.append((pathname, meta['url'], meta['secure_id']))
+            except (IOError, OSError, ValueError, KeyError) as exc:
+                logger.warning("Ignoring broken queued submission %s: %s",
+                               pathname, exc)
+        return entry_list
+
+    def remove(self, pathname):
+        """
+        Remove a submission that was sent
+        """
+        os.unlink(pathname)
+        os.unlink(pathname[:-len(".xml")] + ".json")
+
+    def reject(self, pathname):
+        """
+        Keep a submission that was rejected by the server but never send it
+        """
+        os.rename(pathname, pathname[:-len(".xml")] + ".rejected")
+
+    @contextmanager
+    def lock(self):
+        """
+        Context manager that locks the outbox
+
+        Yields True if the lock was taken and False if another process holds
+        it, the lock is never waited for.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "wb") as lock_stream:
+            try:
+                fcntl.flock(lock_stream, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                yield False
+            else:
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(lock_stream, fcntl.LOCK_UN)
+
+
 class CertificationTransport(TransportBase):
     """
     Transport for sending data to certification database.
@@ -56,6 +177,17 @@ class CertificationTransport(TransportBase):
 
    """
 
+    # Default number of seconds to wait for the connection to be established
+    DEFAULT_CONNECT_TIMEOUT = 30
+    # Default number of seconds to wait for the server between socket reads
+    DEFAULT_READ_TIMEOUT = 300
+    # Default number of times sending is retried
+    DEFAULT_RETRIES = 3
+    # Default delay before the first retry, in seconds, doubled each time
+    DEFAULT_RETRY_DELAY = 2
+    # Size of chunks of data that are compressed and sent
+    CHUNK_SIZE = 64 * 1024
+
     def __init__(self, where, options, config=None):
         """
         Initialize the Certification Transport.
@@ -64,6 +196,18 @@ class CertificationTransport(TransportBase):
         * secure_id: A 15- or 18-character alphanumeric ID for the system.
                      Valid characters are [a-zA-Z0-9]
 
+        The options string may also contain:
+        * compress: gzip (the default) or none
+        * connect_timeout: seconds to wait for the connection (30)
+        * read_timeout: seconds to wait for each response from the server
+                        (300)
+        * retries: number of times sending is retried (3)
+        * retry_delay: seconds to wait before the first retry, doubled
+                       before each next one (2)
+        * outbox: directory where submissions that could not be sent are
+                  queued, empty to disable queueing
+                  ($XDG_CACHE_HOME/plainbox/outbox)
+
         :param config:
              optional PlainBoxConfig object. If http_proxy and https_proxy
              values are set in this config object, they will be used to send
@@ -86,15 +230,47 @@ class CertificationTransport(TransportBase):
                         self.options['secure_id']):
             raise InvalidSecureIDError(("secure_id must be 15 or 18-character "
                                         "alphanumeric string"))
+        compress = self.options.get('compress', 'gzip')
+        if compress not in ('gzip', 'none'):
+            raise ValueError("compress must be either gzip or none")
+        self.compress = compress == 'gzip'
+        self.timeout = (
+            self._get_number_option(
+                'connect_timeout', float, self.DEFAULT_CONNECT_TIMEOUT),
+            self._get_number_option(
+                'read_timeout', float, self.DEFAULT_READ_TIMEOUT))
+        self.retries = self._get_number_option(
+            'retries', int, self.DEFAULT_RETRIES)
+        self.retry_delay = self._get_number_option(
+            'retry_delay', float, self.DEFAULT_RETRY_DELAY)
+        outbox_dir = self.options.get('outbox', get_default_outbox_dir())
+        self.outbox = SubmissionOutbox(outbox_dir) if outbox_dir else None
+
+    def _get_number_option(self, name, kind, default):
+        try:
+            value = kind(self.options.get(name, default))
+        except ValueError:
+            value = -1
+        if value < 0:
+            raise ValueError(
+                "{} must be a non-negative number".format(name))
+        return value
 
     def send(self, data):
         """ Sends data to the specified server.
 
+        Submissions queued by earlier invocations are sent first. If the data
+        cannot be sent because of a connection problem or a server error, it
+        is queued in the outbox before the exception is raised. Time-outs
+        while waiting for the response are neither retried nor queued as
+        the server may have received the data already.
+
         :param data:
             Data containing the xml dump to be sent to the server. This
             can be either bytes or a file-like object (BytesIO works fine too).
             If this is a file-like object, it will be read and streamed "on
-            the fly".
+            the fly". Streams that cannot be rewound are copied to a
+            temporary file first, so that sending can be retried.
 
         :returns: a dictionary with responses from the server if submission
             was successful. This should contain an 'id' key, however
@@ -110,23 +286,187 @@ class CertificationTransport(TransportBase):
         :raises requests.exceptions.HTTPError: if the server returned
             a non-success result code
         """
+        self.send_queued()
+        if isinstance(data, bytes):
+            return self._send_or_queue(io.BytesIO(data))
+        try:
+            seekable = data.seekable()
+        except AttributeError:
+            seekable = False
+        if seekable:
+            return self._send_or_queue(data)
+        with tempfile.TemporaryFile() as stream:
+            shutil.copyfileobj(data, stream)
+            stream.seek(0)
+            return self._send_or_queue(stream)
 
-        logger.debug("Sending to %s, hardware id is %s",
-                     self.url, self.options['secure_id'])
-        cert_headers = {"X_HARDWARE_ID": self.options['secure_id']}
-        form_payload = {"data": data}  # Requests takes care of properly
-                                       # handling a file-like object for
-                                       # data here.
+    def send_queued(self):
+        """
+        Send the submissions queued in the outbox by earlier invocations
+
+        Each submission is sent once, without retries. Sending stops at the
+        first submission that fails because of a connection problem or a
+        server error, the remaining ones stay queued. Submissions that time
+        out while waiting for the response are kept like rejected ones, so
+        that they are never sent twice.
+
+        :returns:
+            The number of submissions that were sent
+        """
+        if self.outbox is None:
+            return 0
         try:
-            r = requests.post(self.url, files=form_payload,
-                              headers=cert_headers, proxies=self.proxies)
-        except requests.exceptions.Timeout as error:
-            logger.warning("Request to %s timed out: %s", self.url, error)
+            with self.outbox.lock() as locked:
+                if not locked:
+                    logger.debug("Outbox %s is used by another process",
+                                 self.outbox.path)
+                    return 0
+                return self._send_outbox_entries()
+        except requests.exceptions.RequestException:
             raise
-        except requests.exceptions.ConnectionError as error:
-            logger.error("Unable to connect to %s: %s", self.url, error)
+        except (IOError, OSError) as exc:
+            # A broken outbox must not prevent sending new submissions
+            logger.error("Unable to send queued submissions from %s: %s",
+                         self.outbox.path, exc)
+            return 0
+
+    def _send_outbox_entries(self):
+        num_sent = 0
+        for pathname, url, secure_id in self.outbox.get_entry_list():
+            logger.info("Sending queued submission %s to %s", pathname, url)
+            try:
+                with open(pathname, "rb") as stream:
+                    r = self._post(url, secure_id, stream, retries=0)
+            except _ReadTimeout:
+                self.outbox.reject(pathname)
+                break
+            except requests.exceptions.ConnectionError:
+                break
+            if r.status_code >= 500:
+                break
+            try:
+                r.raise_for_status()
+            except requests.exceptions.HTTPError as error:
+                logger.error("Server rejected queued submission %s: %s",
+                             pathname, error)
+                self.outbox.reject(pathname)
+            else:
+                logger.info("Sent queued submission %s, server said %s",
+                            pathname, r.text)
+                self.outbox.remove(pathname)
+                num_sent += 1
+        return num_sent
+
+    def _send_or_queue(self, stream):
+        """
+        Send data from a seekable stream, queueing it if sending fails
+        """
+        start = stream.tell()
+        try:
+            r = self._post(self.url, self.options['secure_id'], stream,
+                           self.retries)
+        except requests.exceptions.ConnectionError:
+            self._queue(stream, start)
             raise
         if r is not None:
+            if r.status_code >= 500:
+                self._queue(stream, start)
             r.raise_for_status()  # This will raise HTTPError for status != 20x
             logger.debug("Success! Server said %s", r.text)
             return r.json()
+
+    def _queue(self, stream, start):
+        if self.outbox is None:
+            return
+        stream.seek(start)
+        try:
+            pathname = self.outbox.add(
+                self.url, self.options['secure_id'], stream)
+        except (IOError, OSError) as exc:
+            logger.error("Unable to queue submission in %s: %s",
+                         self.outbox.path, exc)
+            return
+        logger.warning("Submission queued as %s, it will be sent again"
+                       " the next time results are submitted", pathname)
+
+    def _post(self, url, secure_id, stream, retries):
+        """
+        POST data from a seekable stream, retrying with exponential back-off
+
+        Only connection problems and server errors are retried.
+
+        :returns:
+            The response of the last attempt
+        :raises requests.exceptions.Timeout:
+            If the server did not respond in time
+        :raises requests.exceptions.ConnectionError:
+            If the last attempt failed to connect
+        """
+        logger.debug("Sending to %s, hardware id is %s", url, secure_id)
+        start = stream.tell()
+        boundary = uuid.uuid4().hex
+        cert_headers = {
+            "X_HARDWARE_ID": secure_id,
+            "Content-Type": "multipart/form-data; boundary={}".format(
+                boundary),
+        }
+        if self.compress:
+            cert_headers["Content-Encoding"] = "gzip"
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                logger.info("Retrying in %.1f seconds (%d of %d)",
+                            delay, attempt, retries)
+                time.sleep(delay)
+            stream.seek(start)
+            try:
+                r = requests.post(url, data=self._gen_body(stream, boundary),
+                                  headers=cert_headers, proxies=self.proxies,
+                                  timeout=self.timeout)
+            except _ReadTimeout as error:
+                logger.error("Request to %s timed out: %s", url, error)
+                raise
+            except requests.exceptions.ConnectionError as error:
+                logger.error("Unable to connect to %s: %s", url, error)
+                if attempt == retries:
+                    raise
+            else:
+                if r is None or r.status_code < 500 or attempt == retries:
+                    return r
+                logger.warning("Server error %d when sending to %s",
+                               r.status_code, url)
+
+    def _gen_body(self, stream, boundary):
+        """
+        Generate chunks of the multipart/form-data request body
+
+        The body has a single file field named ``data`` with everything that
+        is left in the stream. The whole body is gzip-compressed unless
+        compression was disabled.
+        """
+        if self.compress:
+            # wbits of 16 + MAX_WBITS select the gzip container format
+            compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            encode = compressor.compress
+        else:
+            compressor = None
+            encode = lambda data: data
+        chunk = encode((
+            "--{}\r\n"
+            "Content-Disposition: form-data; name=\"data\";"
+            " filename=\"data\"\r\n"
+            "Content-Type: application/octet-stream\r\n"
+            "\r\n").format(boundary).encode("ASCII"))
+        while True:
+            data = stream.read(self.CHUNK_SIZE)
+            if not data:
+                break
+            chunk += encode(data)
+            if chunk:
+                yield chunk
+                chunk = b''
+        chunk += encode("\r\n--{}--\r\n".format(boundary).encode("ASCII"))
+        if compressor is not None:
+            chunk += compressor.flush()
+        yield chunk
@@ -25,17 +25,29 @@ plainbox.impl.transport.test_certification
 Test definitions for plainbox.impl.certification module
 """
 
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from io import BytesIO
 from pkg_resources import resource_string
+from socketserver import ThreadingMixIn
+from tempfile import TemporaryDirectory
 from unittest import TestCase
+import gzip
+import json
+import os
+import socket
+import threading
+import time
 
 from mock import MagicMock
 import mock
 from requests.exceptions import ConnectionError, InvalidSchema, HTTPError
+from requests.exceptions import Timeout
 import requests
 
 from plainbox.impl.transport.certification import CertificationTransport
 from plainbox.impl.transport.certification import InvalidSecureIDError
+from plainbox.impl.transport.certification import SubmissionOutbox
 from plainbox.impl.applogic import PlainBoxConfig
 
 
@@ -55,6 +67,26 @@ class CertificationTransportTests(TestCase):
         ))
         self.patcher = mock.patch('requests.post')
         self.mock_requests = self.patcher.start()
+        self.addCleanup(self.patcher.stop)
+        # Don't wait between retries and keep the outbox in a temporary
+        # directory
+        sleep_patcher = mock.patch('time.sleep')
+        sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        self.cache_dir = TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        env_patcher = mock.patch.dict(
+            os.environ, {'XDG_CACHE_HOME': self.cache_dir.name})
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+        self.expected_headers = {
+            'X_HARDWARE_ID': self.valid_secure_id,
+            'Content-Type': mock.ANY,
+            'Content-Encoding': 'gzip',
+        }
+        self.expected_timeout = (
+            CertificationTransport.DEFAULT_CONNECT_TIMEOUT,
+            CertificationTransport.DEFAULT_READ_TIMEOUT)
 
     def test_parameter_parsing(self):
         #Makes sense since I'm overriding the base class's constructor.
@@ -92,10 +124,13 @@ class CertificationTransportTests(TestCase):
             result = transport.send(dummy_data)
             self.assertIsNotNone(result)
         requests.post.assert_called_with(self.invalid_url,
-                                         files={'data': dummy_data},
-                                         headers={'X_HARDWARE_ID':
-                                         self.valid_secure_id},
-                                         proxies=None)
+                                         data=mock.ANY,
+                                         headers=self.expected_headers,
+                                         proxies=None,
+                                         timeout=self.expected_timeout)
+        # Bad URLs are neither retried nor queued
+        self.assertEqual(requests.post.call_count, 1)
+        self.assertEqual(transport.outbox.get_entry_list(), [])
 
     def test_valid_url_cant_connect(self):
         transport = CertificationTransport(self.unreachable_url,
@@ -107,10 +142,20 @@ class CertificationTransportTests(TestCase):
             result = transport.send(dummy_data)
             self.assertIsNotNone(result)
         requests.post.assert_called_with(self.unreachable_url,
-                                         files={'data': dummy_data},
-                                         headers={'X_HARDWARE_ID':
-                                                  self.valid_secure_id},
-                                         proxies=None)
+                                         data=mock.ANY,
+                                         headers=self.expected_headers,
+                                         proxies=None,
+                                         timeout=self.expected_timeout)
+        self.assertEqual(requests.post.call_count,
+                         CertificationTransport.DEFAULT_RETRIES + 1)
+        # The data is queued for the next invocation
+        entry_list = transport.outbox.get_entry_list()
+        self.assertEqual(len(entry_list), 1)
+        pathname, url, secure_id = entry_list[0]
+        self.assertEqual(url, self.unreachable_url)
+        self.assertEqual(secure_id, self.valid_secure_id)
+        with open(pathname, 'rb') as stream:
+            self.assertEqual(stream.read(), b"some data to send")
 
     def test_send_success(self):
         transport = CertificationTransport(self.valid_url,
@@ -158,10 +203,10 @@ class CertificationTransportTests(TestCase):
         self.assertTrue(result)
 
         requests.post.assert_called_with(self.valid_url,
-                                         files={'data': dummy_data},
-                                         headers={'X_HARDWARE_ID':
-                                         self.valid_secure_id},
-                                         proxies=test_proxies)
+                                         data=mock.ANY,
+                                         headers=self.expected_headers,
+                                         proxies=test_proxies,
+                                         timeout=self.expected_timeout)
 
     def test_set_only_one_proxy(self):
         test_environment = {'http_proxy': "http://1.2.3.4:5"}
@@ -181,3 +226,245 @@ class CertificationTransportTests(TestCase):
         test_proxies = {'http': "http://1.2.3.4:5"}
         self.proxy_test(test_environment, test_proxies)
 
+
+class _StandInServer(ThreadingMixIn, HTTPServer):
+    """
+    Local HTTP server that stands in for the certification website
+
+    It answers each request with the next (status code, delay) pair from
+    :attr:`response_list`, or with 200 once the list is exhausted, and keeps
+    (headers, decoded value of the data field) of each request that it
+    received in :attr:`request_list`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super(_StandInServer, self).__init__(
+            ('127.0.0.1', 0), _StandInHandler)
+        self.lock = threading.Lock()
+        self.response_list = []
+        self.request_list = []
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/submissions/submit/".format(
+            self.server_address[1])
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out close the connection before the response
+        pass
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        message = BytesParser().parsebytes(
+            "Content-Type: {}\r\n\r\n".format(
+                self.headers['Content-Type']).encode("ASCII") + body)
+        data = None
+        for part in message.get_payload():
+            if part.get_param('name', header='content-disposition') == 'data':
+                data = part.get_payload(decode=True)
+        with self.server.lock:
+            self.server.request_list.append((self.headers, data))
+            request_id = len(self.server.request_list)
+            if self.server.response_list:
+                status, delay = self.server.response_list.pop(0)
+            else:
+                status, delay = 200, 0
+        if delay:
+            time.sleep(delay)
+        response = json.dumps({'id': request_id}).encode("UTF-8")
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding') != 'chunked':
+            return self.rfile.read(int(self.headers['Content-Length']))
+        chunk_list = []
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if size == 0:
+                self.rfile.readline()
+                return b''.join(chunk_list)
+            chunk_list.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CertificationTransportServerTests(TestCase):
+
+    valid_secure_id = "a00D000000Kkk5j"
+
+    def setUp(self):
+        self.sample_xml = resource_string(
+            "plainbox", "test-data/xml-exporter/example-data.xml")
+        self.server = _StandInServer()
+        thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.outbox_dir = TemporaryDirectory()
+        self.addCleanup(self.outbox_dir.cleanup)
+
+    def _make_transport(self, url=None, **options):
+        options.setdefault('secure_id', self.valid_secure_id)
+        options.setdefault('retry_delay', '0')
+        options.setdefault('outbox', self.outbox_dir.name)
+        return CertificationTransport(
+            url or self.server.url, ",".join(
+                "{}={}".format(key, value)
+                for key, value in sorted(options.items())))
+
+    def _get_sent_data(self):
+        return [data for headers, data in self.server.request_list]
+
+    def test_send_compressed(self):
+        result = self._make_transport().send(BytesIO(self.sample_xml))
+        self.assertEqual(result, {'id': 1})
+        headers, data = self.server.request_list[0]
+        self.assertEqual(data, self.sample_xml)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Transfer-Encoding'], 'chunked')
+        self.assertEqual(headers['X_HARDWARE_ID'], self.valid_secure_id)
+
+    def test_send_uncompressed(self):
+        result = self._make_transport(compress='none').send(self.sample_xml)
+        self.assertEqual(result, {'id': 1})
+        headers, data = self.server.request_list[0]
+        self.assertEqual(data, self.sample_xml)
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_send_large(self):
+        # Many chunks, some of which compress to nothing
+        data = os.urandom(1024) * 1024
+        self._make_transport().send(BytesIO(data))
+        self.assertEqual(self._get_sent_data(), [data])
+
+    def test_send_unseekable(self):
+        stream = BytesIO(self.sample_xml)
+        stream.seekable = lambda: False
+        self._make_transport(retries='1').send(stream)
+        self.assertEqual(self._get_sent_data(), [self.sample_xml])
+
+    def test_retry_server_error(self):
+        self.server.response_list = [(503, 0), (500, 0)]
+        result = self._make_transport(retries='2').send(self.sample_xml)
+        self.assertEqual(result, {'id': 3})
+        self.assertEqual(self._get_sent_data(), [self.sample_xml] * 3)
+
+    def test_read_timeout_not_retried(self):
+        self.server.response_list = [(200, 1)]
+        transport = self._make_transport(retries='1', read_timeout='0.2')
+        with self.assertRaises(Timeout):
+            transport.send(self.sample_xml)
+        # The server got the data, it must not be sent again
+        self.assertEqual(len(self.server.request_list), 1)
+        self.assertEqual(transport.outbox.get_entry_list(), [])
+
+    def test_retry_with_backoff(self):
+        self.server.response_list = [(503, 0)] * 3
+        with mock.patch('time.sleep') as mock_sleep:
+            self._make_transport(
+                retries='3', retry_delay='1.5').send(self.sample_xml)
+        self.assertEqual(mock_sleep.call_args_list, [
+            mock.call(1.5), mock.call(3.0), mock.call(6.0)])
+
+    def test_client_error_not_retried(self):
+        self.server.response_list = [(412, 0)]
+        transport = self._make_transport()
+        with self.assertRaises(HTTPError):
+            transport.send(self.sample_xml)
+        self.assertEqual(len(self.server.request_list), 1)
+        self.assertEqual(transport.outbox.get_entry_list(), [])
+
+    def test_queue_and_send_later(self):
+        self.server.response_list = [(503, 0), (503, 0)]
+        with self.assertRaises(HTTPError):
+            self._make_transport(retries='1').send(b"first")
+        entry_list = SubmissionOutbox(self.outbox_dir.name).get_entry_list()
+        self.assertEqual(len(entry_list), 1)
+        # The queued submission is sent before the new one
+        self._make_transport().send(b"second")
+        self.assertEqual(
+            self._get_sent_data(), [b"first", b"first", b"first", b"second"])
+        self.assertEqual(
+            SubmissionOutbox(self.outbox_dir.name).get_entry_list(), [])
+
+    def test_queue_unreachable(self):
+        # Find a port that nobody listens on
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        url = "http://127.0.0.1:{}/".format(sock.getsockname()[1])
+        sock.close()
+        transport = self._make_transport(url, retries='1')
+        with self.assertRaises(ConnectionError):
+            transport.send(b"data")
+        self.assertEqual(len(transport.outbox.get_entry_list()), 1)
+        # Sending queued submissions stops at the first failure
+        transport.outbox.add(self.server.url, self.valid_secure_id,
+                             BytesIO(b"more data"))
+        self.assertEqual(transport.send_queued(), 0)
+        self.assertEqual(len(transport.outbox.get_entry_list()), 2)
+
+    def test_queued_submission_rejected(self):
+        outbox = SubmissionOutbox(self.outbox_dir.name)
+        pathname = outbox.add(
+            self.server.url, self.valid_secure_id, BytesIO(b"bad"))
+        outbox.add(self.server.url, self.valid_secure_id, BytesIO(b"good"))
+        self.server.response_list = [(412, 0)]
+        self.assertEqual(self._make_transport().send_queued(), 1)
+        self.assertEqual(self._get_sent_data(), [b"bad", b"good"])
+        self.assertEqual(outbox.get_entry_list(), [])
+        self.assertTrue(os.path.exists(
+            pathname[:-len(".xml")] + ".rejected"))
+
+    def test_queued_submission_timeout(self):
+        outbox = SubmissionOutbox(self.outbox_dir.name)
+        pathname = outbox.add(
+            self.server.url, self.valid_secure_id, BytesIO(b"slow"))
+        outbox.add(self.server.url, self.valid_secure_id, BytesIO(b"next"))
+        self.server.response_list = [(200, 1)]
+        transport = self._make_transport(read_timeout='0.2')
+        self.assertEqual(transport.send_queued(), 0)
+        self.assertEqual(self._get_sent_data(), [b"slow"])
+        self.assertEqual(len(outbox.get_entry_list()), 1)
+        self.assertTrue(os.path.exists(
+            pathname[:-len(".xml")] + ".rejected"))
+
+    def test_outbox_disabled(self):
+        self.server.response_list = [(503, 0)]
+        transport = self._make_transport(retries='0', outbox='')
+        self.assertIsNone(transport.outbox)
+        with self.assertRaises(HTTPError):
+            transport.send(self.sample_xml)
+        self.assertEqual(os.listdir(self.outbox_dir.name), [])
+
+    def test_outbox_unwritable(self):
+        # The outbox cannot be created below a regular file
+        blocker = os.path.join(self.outbox_dir.name, "file")
+        open(blocker, "wb").close()
+        outbox = os.path.join(blocker, "outbox")
+        result = self._make_transport(outbox=outbox).send(self.sample_xml)
+        self.assertEqual(result, {'id': 1})
+        self.server.response_list = [(503, 0)]
+        with self.assertRaises(HTTPError):
+            self._make_transport(
+                retries='0', outbox=outbox).send(self.sample_xml)
+
+    def test_invalid_options(self):
+        for options in ({'retries': '-1'}, {'connect_timeout': 'soon'},
+                        {'compress': 'bzip2'}):
+            with self.assertRaises(ValueError):
+                self._make_transport(**options)
@@ -60,6 +60,7 @@ job_schema = Map({
     "resources": List(String(), required=False),
     "estimated_duration": Float(required=False),
     "timeout": Int(required=False),
+    "exclusive": String(required=False),
     "user": String(required=False),
     "data": String(required=False)})
 